@@ -0,0 +1,177 @@
+# checkpoint.py - progress sidecar files for resumable analyses
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+An analysis records its progress next to its data file, in a small JSON sidecar (e.g., Psycho.color_lab.progress). If the analysis dies (preempted batch job, ctrl-c, power cut), it can be picked up where it left off with resume=True; the data file is then opened r+ and only the frames that are not on disc yet are analyzed.
+
+.. code-block:: python
+
+	cflab = ColorFeaturesLAB('Psycho')
+	cflab.analyze_movie(workers=8)		# dies at 90%
+	cflab.analyze_movie(workers=8, resume=True)	# analyzes the last 10%
+
+The sidecar holds a hash of the analysis parameters and, for each time range (one, or one per worker), the first frame whose row is not known to be on disc:
+
+.. code-block:: python
+
+	{"params": "5d41402abc4b2a76b9719d911017c592", "ranges": [[0, 86400, 77760], [86400, 172800, 163200]]}
+
+The progress is updated every time the FeatureWriter writes its buffered rows to the data file, so at most flush_interval rows of work are lost. A resume is refused if the analysis parameters differ from the ones that the interrupted analysis used. Parameters that do not change the data (display, verbose, buffer sizes, file locations...) are not part of the hash; see CHECKPOINT_IGNORED.
+
+Resumed time ranges are analyzed like the time ranges of a parallel analysis, including the warm-up of the extractors that carry state from frame to frame (see the parallel module).
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os, json, hashlib
+try:
+	import fcntl
+	HAVE_FCNTL = True
+except ImportError:
+	HAVE_FCNTL = False
+
+# parameters that do not change the analysis data
+CHECKPOINT_IGNORED = ['mode', 'display', 'verbose', 'action_dir', 'movie_extension', 'data_extension', 'seek_threshold', 'flush_interval', 'prefetch_depth']
+
+
+def params_hash(analysis_params):
+	"""
+	MD5 hash of the analysis parameters that change the data.
+	"""
+	params = dict([(k, v) for k, v in analysis_params.items() if k not in CHECKPOINT_IGNORED])
+	return hashlib.md5(json.dumps(params, sort_keys=True, default=str)).hexdigest()
+
+
+class Checkpoint:
+	"""
+	Progress sidecar of one data file. The process that starts an analysis calls start with the analysis' time ranges; the process that analyzes one of them calls track, and then its FeatureWriter calls rows_done after every write. Several processes may update the sidecar at the same time (it is locked while it is being rewritten).
+
+	::
+
+		checkpoint = Checkpoint(data_path, analysis_params)
+		checkpoint.start([(0, 172800)])
+		checkpoint.track((0, 172800), lambda row: row * 6)
+		fp = FeatureWriter(data_path, shape, checkpoint=checkpoint)
+
+	"""
+	def __init__(self, data_path, analysis_params):
+		self.data_path = data_path
+		self.path = data_path + '.progress'
+		self.params_hash = params_hash(analysis_params)
+		self.shard = None
+		self.row_frame = None
+		self._busy = False
+
+	def start(self, ranges):
+		"""
+		Start a new analysis of the (start_frame, end_frame) ranges: nothing is done yet.
+		"""
+		self._update(lambda progress: {'params': self.params_hash, 'ranges': [[start, end, start] for start, end in ranges]})
+
+	def can_resume(self):
+		"""
+		True if there is a sidecar to resume from. If there is none (the analysis was never started, or was started before progress was recorded), says so: the analysis has to start from the beginning.
+		"""
+		if os.path.exists(self.path):
+			return True
+		print "No progress file (", self.path, ") to resume from; starting from the beginning."
+		return False
+
+	def remaining(self):
+		"""
+		Return the (start_frame, end_frame) ranges that still have to be analyzed to finish the interrupted analysis (empty if it is complete). Returns None, and says why, if it cannot be resumed: the sidecar or the data file is missing, the sidecar cannot be read, or it was written with different analysis parameters.
+		"""
+		if not os.path.exists(self.path):
+			print "ERROR: No progress file (", self.path, ") to resume from."
+			return None
+		if not os.path.exists(self.data_path):
+			print "ERROR: The data file (", self.data_path, ") of the interrupted analysis is missing."
+			return None
+		progress = self._read()
+		if progress is None:
+			print "ERROR: Cannot read the progress file ", self.path
+			return None
+		if progress.get('params') != self.params_hash:
+			print "ERROR: The analysis parameters differ from the ones of the interrupted analysis; will not resume. Analyze without resume to start over."
+			return None
+		return [(done, end) for start, end, done in progress['ranges'] if done < end]
+
+	def track(self, shard, row_frame):
+		"""
+		This process analyzes the shard=(start_frame, end_frame) range; row_frame(row) is the frame that row row of the data file is analyzed from.
+		"""
+		self.shard = shard
+		self.row_frame = row_frame
+
+	def rows_done(self, next_row):
+		"""
+		All of the rows of the tracked range before next_row are on disc.
+		"""
+		if self.shard is None:
+			return
+		self._set_done(min(max(self.row_frame(next_row), self.shard[0]), self.shard[1]))
+
+	def finish(self):
+		"""
+		The tracked range is complete.
+		"""
+		if self.shard is not None:
+			self._set_done(self.shard[1])
+
+	def _set_done(self, done):
+		end = self.shard[1]
+		def update(progress):
+			# ranges are disjoint, so a range is known by its end frame (a resumed range starts later than the original)
+			for entry in progress.get('ranges', []):
+				if entry[1] == end:
+					entry[2] = max(entry[2], done)
+			return progress
+		self._update(update)
+
+	def _read(self):
+		try:
+			f = open(self.path, 'r')
+			try:
+				return json.load(f)
+			finally:
+				f.close()
+		except (IOError, ValueError):
+			return None
+
+	def _update(self, update):
+		"""
+		Read, update and rewrite the sidecar while holding a lock on it.
+		"""
+		if self._busy:
+			# a signal arrived while we were already updating: skip it, the rows are only analyzed again on resume
+			return
+		self._busy = True
+		try:
+			f = open(self.path, 'a+')
+			try:
+				if HAVE_FCNTL:
+					fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+				f.seek(0)
+				try:
+					progress = json.loads(f.read() or '{}')
+				except ValueError:
+					progress = {}
+				progress = update(progress)
+				f.seek(0)
+				f.truncate()
+				f.write(json.dumps(progress))
+				f.flush()
+				os.fsync(f.fileno())
+			finally:
+				f.close()
+		finally:
+			self._busy = False
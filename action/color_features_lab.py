@@ -44,7 +44,8 @@ The full list of settable parameters, with default values and explanations:
 +------------------------+-----------------+----------------------------------------------------+
 | grid_divs_x            | 4               | number of divisions along x axis                   |
 +------------------------+-----------------+----------------------------------------------------+
-| grid_divs_y            | 4               | number of divisions along y axis                   |
+| grid_divs_y            | 4               | number of divisions along y axis (any grid; see    |
+|                        |                 | the gridlayout module)                             |
 +------------------------+-----------------+----------------------------------------------------+
 | fps                    | 24              | fps: frames per second                             |
 +------------------------+-----------------+----------------------------------------------------+
@@ -65,15 +66,45 @@ The full list of settable parameters, with default values and explanations:
 +------------------------+-----------------+----------------------------------------------------+
 | display                | True            | launch display screen during analysis              |
 +------------------------+-----------------+----------------------------------------------------+
+| seek_threshold         | 250             | forward jumps (in frames) longer than this seek;   |
+|                        |                 | shorter ones grab through without decoding output  |
++------------------------+-----------------+----------------------------------------------------+
+| flush_interval         | 256             | analysis frames buffered in RAM between bulk       |
+|                        |                 | writes to the data file                            |
++------------------------+-----------------+----------------------------------------------------+
+| prefetch_depth         | 8               | frames decoded ahead (on a separate thread) of the |
+|                        |                 | analysis; 0 decodes on the analysis thread         |
++------------------------+-----------------+----------------------------------------------------+
+| storage_dtype          | float32         | dtype of the rows in the data file: float32,       |
+|                        |                 | float16, uint16 or uint8 (see featurefile module)  |
++------------------------+-----------------+----------------------------------------------------+
+| storage_range          | [0.0, 1.0]      | range of values that uint8/uint16 storage covers;  |
+|                        |                 | the histograms are in [0, 1]                       |
++------------------------+-----------------+----------------------------------------------------+
+| preview                | False           | analyze only one sample frame every                |
+|                        |                 | preview_interval seconds, into a low-rate data     |
+|                        |                 | file (see the preview module)                      |
++------------------------+-----------------+----------------------------------------------------+
+| preview_interval       | 10.0            | seconds between the sample frames of a preview     |
++------------------------+-----------------+----------------------------------------------------+
+| progressive            | False           | analyze coarse-to-fine: every progressive_step-th  |
+|                        |                 | row first, then the rows in between, with a        |
+|                        |                 | coverage sidecar (see the progressive module)      |
++------------------------+-----------------+----------------------------------------------------+
+| progressive_step       | 64              | rows between the samples of the first pass of a    |
+|                        |                 | progressive analysis (halved every pass)           |
++------------------------+-----------------+----------------------------------------------------+
 | Parameters for color features histograms and display...                                       |
 +------------------------+-----------------+----------------------------------------------------+
 | colorspace             | lab             | this is redundant, don't try to change it          |
 +------------------------+-----------------+----------------------------------------------------+
 | ldims                  | 16              | number of dimensions for L (luminosity)            |
 +------------------------+-----------------+----------------------------------------------------+
-| adims                  | 16              | number of dimensions for a (color)                 |
+| adims                  | 16              | number of dimensions for a (color); must equal     |
+|                        |                 | ldims                                              |
 +------------------------+-----------------+----------------------------------------------------+
-| bdims                  | 16              | number of dimensions for b (color)                 |
+| bdims                  | 16              | number of dimensions for b (color); must equal     |
+|                        |                 | ldims                                              |
 +------------------------+-----------------+----------------------------------------------------+
 | lrange                 | [0, 256]        | range to map to/from L                             |
 +------------------------+-----------------+----------------------------------------------------+
@@ -119,6 +150,13 @@ Analyze a full film:
 	cfl = ColorFeaturesLAB('Psycho')
 	cfl.analyze_movie() # Assumes that ~/Movies/action/Psycho.mov exists; returns otherwise
 
+To split the analysis of one film across several processes (each worker analyzes its own time range and writes its own rows of the output file):
+
+.. code-block:: python
+
+	cfl = ColorFeaturesLAB('Psycho')
+	cfl.analyze_movie(workers=8)
+
 This also works, so you can define your own file locations:
 
 .. code-block:: python
@@ -218,6 +256,18 @@ import numpy as np
 import json
 from segment import *
 from actiondata import *
+from framesource import *
+from parallel import *
+from featurewriter import *
+from featurereader import *
+from featurefile import *
+from gridlayout import *
+from moviemetadata import *
+from checkpoint import *
+from preview import *
+from progressive import *
+from engine import *
+from viewer import *
 ad = ActionData()
 av = ActionView()
 
@@ -233,6 +283,9 @@ class ColorFeaturesLAB:
 	If you want to run in verbose mode (to see some debug information on calculated frame offsets, analysis ranges, etc.) pass the verbose=True flag here.
 	"""
 	
+	# left behind when the object is sent to a worker process, which opens its own capture (see the parallel module)
+	_transient_state = ('capture', 'frame_source', 'conversions', 'X', 'playback_data', '_hist_index', '_hist_index_key')
+	
 	def __init__(self, filename='Vertigo', arg=None, **analysis_params):
 		"""
 		"""
@@ -254,21 +307,21 @@ class ColorFeaturesLAB:
 			self.json_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + '.json'))
 			print self.json_path
 			self.filename = filename
+			self.metadata = MovieMetadata(self.movie_path, self.json_path, filename)
 		
- 		if os.path.exists(self.json_path) is False:
- 			self._write_metadata_to_json()
-		ap['afps'] = self._read_json_value('fps')
-		
-		# try to naively get some data and store in a class var
-		if os.path.exists(self.data_path):
-			self.default_color_features_for_segment()
-		else:
-			self.X = None
+		# the metadata (afps, see _read_metadata) and the default features (X, see __getattr__) are read when they are first used
+		self._metadata_read = False
 	
 	def _check_cflab_params(self, analysis_params=None):
 		"""
 		Simple mechanism to read in default parameters while substituting custom parameters.
 		"""
+		if analysis_params is not None:
+			self._metadata_read = True # the caller's parameters (afps included) replace the ones the metadata was read into
+		if analysis_params is not None and getattr(self, 'analysis_params', None) is not None:
+			# parameters passed to analyze_movie, playback_movie, etc. add to (rather than replace) the ones the object was made with;
+			# afps is not carried over (an accessor may have read it from the metadata): it is the caller's, or the default
+			analysis_params = dict([(k, v) for k, v in self.analysis_params.items() if k != 'afps'], **analysis_params)
 		self.analysis_params = analysis_params if analysis_params is not None else self.analysis_params
 		dcfp = self.default_cflab_params()
 		for k in dcfp.keys():
@@ -299,6 +352,15 @@ class ColorFeaturesLAB:
 			'threshold' : 0.0,			# (empirical) threshold for histogram; set to a positive number to remove extremely low values
 			'verbose' : True,					# useful for debugging
 			'display' : True,					# Launch display screen
+			'seek_threshold' : 250,				# (frames) forward jumps longer than this seek, shorter ones grab through
+			'flush_interval' : 256,				# (analysis frames) rows buffered in RAM between writes to the data file
+			'prefetch_depth' : 8,				# (frames) decoded ahead of the analysis on a separate thread; 0 turns prefetching off
+			'storage_dtype' : 'float32',			# dtype of the rows in the data file: 'float32', 'float16', 'uint16' or 'uint8'
+			'storage_range' : [0.0, 1.0],			# (values) range covered by uint8/uint16 storage; the histograms are in [0, 1]
+			'preview' : False,			# analyze only one sample frame every preview_interval seconds (see the preview module)
+			'preview_interval' : 10.0,	# (seconds) between the sample frames of a preview
+			'progressive' : False,		# analyze coarse-to-fine, with a coverage sidecar (see the progressive module)
+			'progressive_step' : 64,		# (rows) between the samples of the first pass of a progressive analysis, halved every pass
 			'hist_shrink_factor' : 0.5,			# (adjustable) ratio for size of histogram window
 			'hist_width_ratio' : 0.5,			# (adjustable) ratio for width of histogram window size
 			'hist_height_ratio' : 0.5,			# (adjustable) ratio for height of histogram window size
@@ -309,32 +371,36 @@ class ColorFeaturesLAB:
 	
 	def _write_metadata_to_json(self):
 		"""
+		Make sure that the JSON metadata file is there and up to date with the movie (see the moviemetadata module). The movie is only opened if it is not.
 		"""
-		title = self.filename
-		capture = cv2.VideoCapture(self.movie_path)
-		
-		fps = capture.get(cv.CV_CAP_PROP_FPS)
-		w = float(cv.CV_CAP_PROP_FRAME_WIDTH)
-		h = float(cv.CV_CAP_PROP_FRAME_HEIGHT)
-		print 'w: ', w
-		print 'h: ', h
-		aspect = w / h
-		frames = capture.get(cv.CV_CAP_PROP_FRAME_COUNT)
-		length = float(frames) / float(fps)
-		
-		
-		movdict = {'title':title, 'fps':fps, 'aspect': aspect,'frames': frames, 'length':length}
-		fp = file(self.json_path, 'w')
-		fp.write(json.dumps(movdict))
-		fp.close()
-		del capture
+		self.metadata.read()
 		return 1
 	
 	def _read_json_value(self, key='fps'):
-# 		fp = file(self.json_path, 'r')
-		jsonfile = open(self.json_path)
-		jsondata = json.load(jsonfile)
-		return jsondata[key]
+		"""
+		Value of key in the movie's metadata, without opening the movie (see the moviemetadata module).
+		"""
+		return self.metadata.value(key)
+	
+	def _read_metadata(self):
+		"""
+		Read the movie's frame rate (afps) from its metadata (see the moviemetadata module). Done once, the first time it is needed (not when the object is constructed).
+		"""
+		if self._metadata_read:
+			return
+		self._metadata_read = True
+		self.analysis_params['afps'] = self._read_json_value('fps')
+	
+	def __getattr__(self, name):
+		"""
+		X (the default features for the whole film) is read the first time it is used.
+		"""
+		if name == 'X':
+			self.X = None
+			if os.path.exists(feature_file_path(self.data_path)):
+				self.default_color_features_for_segment()
+			return self.X
+		raise AttributeError(name)
 	
 	def all_color_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -351,8 +417,9 @@ class ColorFeaturesLAB:
 			>>> (1440, 768)
 
 		"""
+		layout = self._grid_layout()
 		res = self._color_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)
-		return (res[0].reshape(-1, 48), res[1].reshape(-1, 768))
+		return (res[0].reshape(-1, layout.size('full')), res[1].reshape(-1, layout.size('grid')))
 	
 	def full_color_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -362,7 +429,8 @@ class ColorFeaturesLAB:
 			all_color_features_for_segment(...)[0].reshape((segment.time_span.duration*4), -1)		
 
 		"""
-		self.X = self._color_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[0].reshape(-1, 48)
+		layout = self._grid_layout()
+		self.X = self._color_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, units=layout.units('full')).reshape(-1, layout.size('full'))
 		return self.X
 	
 	def gridded_color_features_for_segment(self, segment=Segment(0, -1)):
@@ -381,8 +449,7 @@ class ColorFeaturesLAB:
 			all_color_features_for_segment(...)[1].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._color_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1].reshape(-1, 768)
-		return self.X
+		return self.region_color_features_for_segment('grid', segment)
 
 	def center_quad_color_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -400,8 +467,7 @@ class ColorFeaturesLAB:
 			all_color_features_for_segment(...)[1][:,[5,6,9,10],...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._color_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][:,[5,6,9,10],...].reshape(-1, 192)
-		return self.X
+		return self.region_color_features_for_segment('center', segment)
 
 	def middle_band_color_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -419,8 +485,7 @@ class ColorFeaturesLAB:
 			all_color_features_for_segment(...)[1][:,4:12,...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._color_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][:,4:12,...].reshape(-1, 384)
-		return self.X
+		return self.region_color_features_for_segment('band', segment)
 	
 	def plus_band_color_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -438,8 +503,20 @@ class ColorFeaturesLAB:
 				all_color_features_for_segment(...)[1][:,[1,2,4,5,6,7,8,9,10,11,13,14],...].reshape(-1, 576)
 		
 		"""
+		return self.region_color_features_for_segment('plus', segment)
+
+	def region_color_features_for_segment(self, region='band', segment=Segment(0, -1)):
+		"""
+		Return the gridded histograms of a region of the grid: 'grid', 'band', 'center' or 'plus' (which scale with grid_divs_x and grid_divs_y; see the gridlayout module), or a boolean mask of grid_divs_y by grid_divs_x cells. Only the histograms of the region are read. The gridded, middle band, center quad and plus band accessors call this.
+		::
+		
+			mask = np.zeros((4, 4), dtype=bool)
+			mask[:,:2] = True # the left half of the frame
+			X = cflab.region_color_features_for_segment(mask, Segment(0, 600))
 		
-		self.X = self._color_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][:,4:12,...].reshape(-1, 576)
+		"""
+		layout = self._grid_layout()
+		self.X = self._color_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration), units=layout.units(region)).reshape(-1, layout.size(region))
 		return self.X
 	
 	def default_color_features_for_segment(self, func='middle_band_color_features_for_segment', segment=Segment(0, -1)):
@@ -448,16 +525,42 @@ class ColorFeaturesLAB:
 		"""
 		return getattr(self,func)(segment)
 
-	def _color_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=60):
+	def transpose_data_file(self, layout='region'):
+		"""
+		Rewrite the data file region-major (layout='region'), so that the middle band, center quad and plus band accessors read only (and sequentially) the histograms they return, or back to frame-major (layout='frame'), which analyses can write to (resume). See the featurefile module.
+		::
+		
+			cflab = ColorFeaturesLAB('Psycho')
+			cflab.transpose_data_file()
+			X = cflab.middle_band_color_features_for_segment(Segment(0, 600))
+		
+		"""
+		grid = self._grid_layout()
+		if layout == 'region':
+			return transpose_feature_file(self.data_path, sections=grid.sections(), units=grid.num_units, row_shape=grid.row_shape)
+		return transpose_feature_file(self.data_path, row_shape=grid.row_shape)
+
+	def _grid_layout(self):
+		"""
+		Layout of the rows of the data file for the grid and bins of the analysis parameters (see the gridlayout module): the full-frame histograms (unit 0), then the histograms of each grid cell, each of them (3, ldims). The L*, a* and b* histograms have ldims bins each.
+		"""
+		ap = self.analysis_params
+		if ap['adims'] != ap['ldims'] or ap['bdims'] != ap['ldims']:
+			raise ValueError("The L*, a* and b* histograms are stored with the same number of bins: ldims, adims and bdims must be equal (%s, %s, %s)" % (ap['ldims'], ap['adims'], ap['bdims']))
+		return grid_layout(ap['grid_divs_x'], ap['grid_divs_y'], (3, ap['ldims']), full_units=1)
+
+	def _color_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=60, units=None):
 		"""
 		This will be the interface for grabbing analysis data based on onsets and durations, translating seconds into frames.
 		Takes a file name or complete path of a data file, an onset time in seconds, and a duration in seconds.
-		Returns a tuple of memory-mapped arrays corresponding to the full-frame histogram followed by the 4 by 4 grid of histograms: ([NUMBER OF FRAMES, 1, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)], [NUMBER OF FRAMES, 16, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)])
+		Returns a tuple of float32 arrays corresponding to the full-frame histogram followed by the grid of histograms (4 by 4 by default): ([NUMBER OF FRAMES, 1, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)], [NUMBER OF FRAMES, 16, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)])
+		With units (0 is the full frame, 1-16 the grid; see _grid_layout), returns only those histograms: [NUMBER OF FRAMES, NUMBER OF UNITS, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)]. Only they are read; in a region-major data file (see transpose_data_file), the middle band is one sequential read.
 		::
 		
 			raw_hist_data = cflab_for_segment('Psycho.hist', onset_time=360, duration=360)
 		
 		"""
+		self._read_metadata()
 		ap = self.analysis_params
 		frames_per_astride = (24.0 / ap['stride']) # 24.0
 		
@@ -472,14 +575,12 @@ class ColorFeaturesLAB:
 			dur_frames = int(duration_s * frames_per_astride * (ap['afps'] / ap['fps']))
 		
 		print 'df: ', dur_frames
-		# memmap
-		
-		mapped = np.memmap(self.data_path, dtype='float32', mode='r') #, offset=onset_frame, shape=(dur_frames,17,3,16))
-		mapped = mapped.reshape((-1,17,3,16))
-		self.before = mapped.reshape((-1, (17*3*16)))
-		mapped = ad.interpolate_time(mapped, ap['afps'])
+		# map and resample (to 24 fps) only the rows of the segment
+		mapped = FeatureReader(self.data_path, self._grid_layout().row_shape).window(onset_frame, dur_frames, ap['afps'], units=units)
+		if units is not None:
+			return mapped
 
-		return (mapped[onset_frame:(onset_frame+dur_frames),0,:,:], mapped[onset_frame:(onset_frame+dur_frames),1:,:,:])
+		return (mapped[:,0,:,:], mapped[:,1:,:,:])
 
 	def convert_lab_to_l(self, data):
 		"""
@@ -521,26 +622,17 @@ class ColorFeaturesLAB:
 		Result:  duration in real seconds
 		"""
 		# ap = self._check_cflab_params(kwargs)
+		self._read_metadata()
 		ap = self.analysis_params
 		strides_per_second = float(ap['fps'] / ap['stride']) # 24 / 6 = 4
 	
 		if os.path.exists(self.movie_path) and HAVE_CV:
-			dsize = os.path.getsize(self.data_path)
-			print "dsize: ", dsize
-			# since we are reading raw color analysis data that always has the same size on disc
-			dur_total_aframes = dsize / float(((ap['grid_divs_x'] * ap['grid_divs_y'])+1) * 3 * ap['ldims'] * 4) # REGIONS * CHANNELS * BINS * BYTES
-			print 'dtaf: ', dur_total_aframes
-			dur_total_seconds = (dur_total_aframes / strides_per_second) * (ap['fps'] / ap['afps'])
-			print "total secs: ", dur_total_seconds
-			##################################
-			self.capture = cv2.VideoCapture(self.movie_path)
-			dur_total_seconds = self.capture.get(cv.CV_CAP_PROP_FRAME_COUNT) / ap['afps']
+			# frame count from the metadata; the movie is not opened (see the moviemetadata module)
+			dur_total_seconds = self.metadata.frames() / ap['afps']
 			print "mov total secs: ", dur_total_seconds
 		elif os.path.exists(self.data_path):
-			dsize = os.path.getsize(self.data_path)
-			print "dsize: ", dsize
-			# since we are reading raw color analysis data that always has the same size on disc
-			dur_total_aframes = dsize / float(((ap['grid_divs_x'] * ap['grid_divs_y'])+1) * 3 * ap['ldims'] * 4) # REGIONS * CHANNELS * BINS * BYTES
+			# row count from the data file's header (see the featurefile module); raw data files: from their size, with the REGIONS * CHANNELS * BINS layout
+			dur_total_aframes = float(feature_file_rows(self.data_path, self._grid_layout().row_shape))
 			print 'dtaf: ', dur_total_aframes
 			dur_total_seconds = (dur_total_aframes / strides_per_second) * (ap['fps'] / ap['afps'])
 			print "total secs: ", dur_total_seconds
@@ -550,15 +642,16 @@ class ColorFeaturesLAB:
 		self.analysis_params['duration'] = dur_total_seconds
 		return dur_total_seconds
 	
-	def analyze_movie(self):
+	def analyze_movie(self, workers=1, resume=False):
 		"""
 		Analyze the movie without displaying on screen. Equivalent to:
 		::
 		
 			_process_movie(mode='analyze', display=False)
 		
+		With workers > 1, the movie is split into stride-aligned time ranges that are analyzed by that many processes. With resume=True, an interrupted analysis is picked up where it left off (see the checkpoint module).
 		"""
-		self._process_movie(mode='analyze', display=False)
+		self._process_movie(mode='analyze', display=False, workers=workers, resume=resume)
 
 	def analyze_movie_with_display(self):
 		"""
@@ -569,10 +662,15 @@ class ColorFeaturesLAB:
 		"""
 		self._process_movie(mode='analyze', display=True)
 	
-	def _process_movie(self, **kwargs):
+	def _process_movie(self, workers=1, shard=None, engine=None, resume=False, **kwargs):
 		"""
 		Function for analyzing a full film or video. This is where the magic happens when we're making pixel-histogram analyses. Function will exit if neither a movie path nor a data path are supplied. This function is not intended to be called directly. Normally, call one of the two analyze_ functions instead, which will call this function.
 		
+		workers > 1 hands the analysis to a pool of processes (see the parallel module); each of them calls this function again with shard=(start_frame, end_frame) and only fills in the rows for that range.
+		
+		With engine=AnalysisEngine(...), nothing is analyzed here: the kernel and writer are added to that engine, which decodes the movie once for several extractors (see the pipeline module); engine.close() closes the writers.
+		
+		The progress of an analysis is recorded in a sidecar file; resume=True picks up an interrupted analysis where it left off (see the checkpoint module).
 		"""
 		if not HAVE_CV:
 			return
@@ -587,9 +685,11 @@ class ColorFeaturesLAB:
 		print ap
 		# ap = self.analysis_params
 				
-		self.capture = cv2.VideoCapture(self.movie_path)
+		self.frame_source = PrefetchFrameSource(FrameSource(self.movie_path, ap['seek_threshold']), ap['prefetch_depth'])
+		self.capture = self.frame_source.capture
 		
-		self._write_metadata_to_json()
+		if shard is None:
+			self._write_metadata_to_json()
 		# probably should generate and check for errors
 		
 		fps = ap['fps']
@@ -610,35 +710,6 @@ class ColorFeaturesLAB:
 			print ap['lrange'][0], ' | ', ap['arange'][0], ' | ', ap['brange'][0], ' | ', ap['lrange'][1], ' | ', ap['arange'][1], ' | ', ap['brange'][1]
 			print fps, ' | ', hist_size, ' | ', grid_size
 		
-		grid_l_star = np.zeros((16,1), dtype=np.float32)
-		grid_a_star = np.zeros((16,1), dtype=np.float32)
-		grid_b_star = np.zeros((16,1), dtype=np.float32)
-		
-		grid_mask = np.zeros(grid_size, dtype=np.float32)
-		grid_lab = np.zeros((grid_size[0], grid_size[1], 3), dtype=np.float32)
-	
-		l_star = np.zeros((16,1), dtype=np.float32)
-		a_star = np.zeros((16,1), dtype=np.float32)
-		b_star = np.zeros((16,1), dtype=np.float32)
-		
-		mask = np.zeros((frame_size[0], frame_size[1], 3), dtype=np.float32)
-		lab = np.zeros((frame_size[0], frame_size[1], 3), dtype=np.float32)
-
-		dims = ap['ldims']
-		
-		lab_min = (ap['lrange'][0], ap['arange'][0], ap['brange'][0])
-		lab_max = (ap['lrange'][1], ap['arange'][1], ap['brange'][1])
-		bin_w = int((hist_width * ap['hist_width_ratio']) / (ap['ldims'] * grid_x_divs))
-		third_bin_w = int(bin_w/3)
-	
-		l_histo = np.arange(ap['lrange'][0], ap['lrange'][1], ap['ldims']).reshape((ap['ldims'],1))
-		a_histo = np.arange(ap['arange'][0], ap['arange'][1], ap['adims']).reshape((ap['adims'],1))
-		b_histo = np.arange(ap['brange'][0], ap['brange'][1], ap['bdims']).reshape((ap['bdims'],1))
-		
-		if ap['verbose']: print third_bin_w
-				
-		histimg = np.zeros((int(hist_height*1.25), int(hist_width), 3), np.uint8)
-		
 		# get total_frame_count and set up the memmapped file
 
 		if ap['offset'] > 0:
@@ -658,7 +729,6 @@ class ColorFeaturesLAB:
 		dur_secs = ap['duration']
 		
 		stride_frames = ap['stride']
-		stride_hop = stride_frames - 1
 
 		print ap['duration']
 		print dur_secs
@@ -684,108 +754,105 @@ class ColorFeaturesLAB:
 			print "FPS: ", fps
 			print "stride_frames: ", stride_frames
 		
-		# set up memmap
+		# set up memmap and the engine's kernel: analysis writes rows, playback reads them back
+		self.grid_size = grid_size
+		row_shape = self._grid_layout().row_shape
 		if ap['mode'] == 'playback' and ap['display'] == True:
-			 fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides + dur_strides),(ap['grid_divs_x']*ap['grid_divs_y'])+1,3,ap['ldims']))
+			self.playback_data = load_feature_file(self.data_path, row_shape, rows=(offset_strides + dur_strides), decode=True)
+			fp, kernel = None, self._playback_kernel
+		elif shard is not None:
+			# the file was preallocated by the parent process (or by the interrupted analysis); only write our own rows
+			checkpoint = Checkpoint(self.data_path, ap)
+			checkpoint.track(shard, self._row_frame)
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='r+', flush_interval=ap['flush_interval'], checkpoint=checkpoint)
+			kernel = self._analysis_kernel
+		elif ap['preview']:
+			# a low-rate preview: only the sample frames (and their warm-up) are decoded, and only their rows are written (see the preview module)
+			preview = Preview(self.data_path, row_shape, ap, offset_frames, (offset_frames + dur_frames))
+			self.frame_source = preview.frame_source(self.frame_source)
+			fp, kernel = preview.writer, preview.kernel(self._analysis_kernel)
+		elif ap['progressive']:
+			# coarse-to-fine: the samples of every pass are analyzed like those of a preview, into the full data file (see the progressive module)
+			progressive = Progressive(self.data_path, row_shape, ap, dur_strides, self._row_frame, resume=resume)
+			self.frame_source = progressive.frame_source(self.frame_source)
+			fp, kernel = progressive.writer, progressive.kernel(self._analysis_kernel)
 		else:
-			fp = np.memmap(self.data_path, dtype='float32', mode='w+', shape=(dur_strides, (ap['grid_divs_x']*ap['grid_divs_x'])+1,3,ap['ldims']))
+			checkpoint = Checkpoint(self.data_path, ap)
+			if resume and checkpoint.can_resume():
+				# pick up the interrupted analysis where it left off
+				self.frame_source.release()
+				shards = checkpoint.remaining()
+				if shards:
+					process_shards(self, shards, workers)
+				elif shards is not None:
+					print 'Nothing to resume: the analysis is complete.'
+				return
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], checkpoint=checkpoint, analysis_params=ap)
+			kernel = self._analysis_kernel
+			if workers > 1 and ap['mode'] == 'analyze' and not ap['display']:
+				fp.close()
+				self.frame_source.release()
+				checkpoint.start(shard_ranges(offset_frames, (offset_frames + dur_frames), workers, stride_frames))
+				process_movie_in_parallel(self, workers, offset_frames, (offset_frames + dur_frames), align=stride_frames)
+				return
+			checkpoint.start([(offset_frames, (offset_frames + dur_frames))])
+			checkpoint.track((offset_frames, (offset_frames + dur_frames)), self._row_frame)
 		
-		# set some drawing constants
-		vert_offset = int(frame_height*ap['hist_vert_offset_ratio'])
-		grid_height_ratio = grid_height/255.
-
 		#timing state vars
 		self.frame_idx = offset_frames
 		end_frame = offset_frames + dur_frames
+		if shard is not None:
+			self.frame_idx, end_frame = shard
+		
+		if engine is not None:
+			# decode-once pipeline: the shared engine decodes the frames and runs the kernels of all of the extractors
+			self.frame_source.release()
+			self.conversions = engine.conversions
+			engine.add_kernel(kernel, fp, self.frame_idx, end_frame, step=stride_frames)
+			return
 		
+		# headless loop; display and progress reports are optional subscribers
+		engine = AnalysisEngine(self.frame_source, kernel, fp)
+		self.conversions = engine.conversions
 		if ap['display']:
-			cv.NamedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
-			cv.NamedWindow('Histogram', hist_width)
-			cv.ResizeWindow('Histogram', int(hist_width*ap['hist_width_ratio']*1.0), int(hist_height*ap['hist_height_ratio']*1.25))
-			cv.MoveWindow('Histogram', int(frame_width*ap['hist_horiz_offset_ratio']), vert_offset)
-			
-			# should probably assert that ldims == adims == bdims, but hey we trust people
-			lcolors, acolors, bcolors= range(ap['ldims']), range(ap['adims']), range(ap['bdims'])
-			for d in range (dims):
-				gray_val = (d * 192. / dims) + 32
-				lcolors[d] = cv.Scalar(255., gray_val, gray_val)
-				acolors[d] = cv.Scalar(gray_val, 128., 128.)
-				bcolors[d] = cv.Scalar(gray_val, gray_val, gray_val)
-			six_points = self.build_bars(grid_width, grid_height, bin_w, third_bin_w, grid_x_divs, grid_y_divs, 16) # 16: number of bins
-			self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
+			engine.subscribe(ColorFeaturesViewer(self, frame_size, hist_size, grid_size, playback=(fp is None)))
+		if verbose:
+			engine.subscribe(ProgressReporter(self.frame_idx, end_frame))
+		complete = False
+		try:
+			complete = engine.run(self.frame_idx, end_frame, step=stride_frames)
+		finally:
+			if fp is not None:
+				fp.close(complete)
+			self.frame_source.release()
+		
+		if fp is not None and verbose:
+			print 'FEATURE WRITER: ', fp.stats()
+		self.playback_data = None
+		if verbose:
+			print 'ENGINE: ', engine.stats()
+			print 'FRAME SOURCE: ', self.frame_source.stats()
+	
+	def _row_frame(self, row):
+		"""
+		The frame that row row of the data file is analyzed from (for the checkpoint).
+		"""
+		return row * self.analysis_params['stride']
 
-		while self.frame_idx < end_frame:
-			
-			if verbose:
-				print('fr. idx: %6i || %.4f (/%i) [ %i | %i ]' % (self.frame_idx, ((self.frame_idx - offset_frames) / float(dur_frames)), dur_frames, offset_frames, end_frame))
-
-			if (self.frame_idx%stride_frames) == 0:
-
-				# frame grab
-				ret, frame = self.capture.read()
-				curr_stride_frame = self.frame_idx/stride_frames
-				# reality check
-				if frame is None: 
-					print 'Frame error! Exiting...'
-					break # no image captured... end the processing
-				
-				# access stage (full)
-				if ap['mode'] == 'playback':
-					lbins, abins, bbins = fp[curr_stride_frame][0][0], fp[curr_stride_frame][0][1], fp[curr_stride_frame][0][2]
-					# if verbose: print (np.sum(lbins), np.sum(abins), np.sum(bbins))
-				else:
-					lbins, abins, bbins = self._analyze_image(frame, fp, curr_stride_frame, lab, lab_min, lab_max, l_star, a_star, b_star, mask, l_histo, a_histo, b_histo, 0, 0, 0, 1., thresh=ap['threshold'])
-
-				# display stage (full)
-				if ap['display']:
-					histimg[:] = 0
-					for d in range(dims):
-						# for all the bins, get the value, and scale to the size of the grid
-						lval, aval, bval = int(lbins[d]*255.), int(abins[d]*255.), int(bbins[d]*255.)
-						#draw the rectangle in the wanted color
-						self.make_rectangles(cv.fromarray(histimg), six_points, 6, 0, 0, d, [lval, aval, bval], grid_height_ratio, [lcolors, acolors, bcolors], voffset=hist_height)
-				
-				# access stage (gridded)
-				for i in range(grid_x_divs):
-					for j in range(grid_y_divs):
-						if ap['mode'] == 'playback':
-							lbins, abins, bbins = fp[(curr_stride_frame)][(j*grid_x_divs)+i+1][0], fp[curr_stride_frame][(j*grid_x_divs)+i+1][1], fp[curr_stride_frame][(j*grid_x_divs)+i+1][2]
-						else:
-							sub = frame[(i*grid_width):((i+1)*grid_width),(j*grid_height):((j+1)*grid_height)]
-							lbins, abins, bbins = self._analyze_image(sub, fp, (self.frame_idx/stride_frames), grid_lab, lab_min, lab_max, grid_l_star, grid_a_star, grid_b_star, grid_mask, l_histo, a_histo, b_histo, i, j, 1, 1., thresh=ap['threshold'])
-
-						# display stage (gridded)
-						if ap['display']:
-							for  d in range (dims):
-								# for all the bins, get the value, and scale to the size of the grid
-								lval, aval, bval = int(lbins[d]*255.), int(abins[d]*255.), int(bbins[d]*255.)
-								#draw the rectangle in the wanted color
-								self.make_rectangles(cv.fromarray(histimg), six_points, 6, i, j, d, [lval, aval, bval], grid_height_ratio, [lcolors, acolors, bcolors], voffset=0)
-				
-				#### SHOW
-				if ap['display']:
-					cv.ShowImage('Image', cv.fromarray(frame))
-					cv.ShowImage('Histogram', cv.fromarray(histimg))
-				fp.flush()
-				self.frame_idx += 1
-				
-			elif (self.frame_idx%stride_frames) == 1:
-				self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, int((self.frame_idx / stride_frames) + 1) * stride_frames)
-				self.frame_idx += stride_hop # stride_hop = 5 = stride - 1
-				
-			
-			# no need to waitkey if we are not displaying:
-			if ap['display']:
-				# handle events
-				k = cv.WaitKey (int(1000 / ap['afps']))
-				if k % 0x100 == 27:
-					# user has press the ESC key, so exit
-						break
-			
-		del fp
-		if ap['display']:
-			cv.DestroyWindow('Image')
-			cv.DestroyWindow('Histogram')	
+	def _analysis_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (analysis): one pass for the full frame and all of the grid cells, one row per stride frame.
+		"""
+		ap = self.analysis_params
+		lab = self.conversions.convert(frame_idx, frame, cv.CV_BGR2Lab)
+		return (frame_idx / ap['stride']), self._analyze_frame(frame, self.grid_size[0], self.grid_size[1], thresh=ap['threshold'], lab=lab)
+	
+	def _playback_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (playback): read the row back from the data file.
+		"""
+		curr_stride_frame = frame_idx / self.analysis_params['stride']
+		return curr_stride_frame, self.playback_data[curr_stride_frame]
 	
 	def _display_movie_frame_by_frame(self, **kwargs):
 		"""
@@ -824,12 +891,13 @@ class ColorFeaturesLAB:
 		verbose = ap['verbose']
 		
 		if have_mov is True:
-	 		self.capture = cv2.VideoCapture(self.movie_path)
+			self.frame_source = FrameSource(self.movie_path, ap['seek_threshold'])
+			self.capture = self.frame_source.capture
 			frame_width = int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
 			frame_height = int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
 		else:
 			frame_width = 800
-			frame_height = (self._read_json_value('aspect') * frame_width)
+			frame_height = int(frame_width / self._read_json_value('aspect'))
 		
 		fps = ap['fps']
 		grid_x_divs = ap['grid_divs_x']
@@ -878,7 +946,8 @@ class ColorFeaturesLAB:
 		# set up memmap
 		# mode should always be playback and dislay should always be true!!!
 		if ap['mode'] == 'playback' and ap['display'] == True and have_data:
-			fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides + dur_strides),17,3,16))
+			layout = self._grid_layout()
+			fp = load_feature_file(self.data_path, layout.row_shape, rows=(offset_strides + dur_strides), decode=True)
 					
 			# set some drawing constants
 			vert_offset = int(frame_height*ap['hist_vert_offset_ratio'])
@@ -890,15 +959,13 @@ class ColorFeaturesLAB:
 			cv2.resizeWindow('Histogram', int(hist_width*ap['hist_width_ratio']*1.0), int(hist_height*ap['hist_height_ratio']*1.275))
 			cv2.moveWindow('Histogram', int(frame_width*ap['hist_horiz_offset_ratio']), vert_offset)
 			
-			lcolors, acolors, bcolors= range(16), range(16), range(16)
+			lcolors, acolors, bcolors= range(dims), range(dims), range(dims)
 			for d in range (dims):
 				gray_val = (d * 192. / dims) + 32
 				lcolors[d] = cv.Scalar(255., gray_val, gray_val)
 				acolors[d] = cv.Scalar(gray_val, 128., 128.)
 				bcolors[d] = cv.Scalar(gray_val, gray_val, gray_val)
-			six_points = self.build_bars(grid_width, grid_height, bin_w, third_bin_w, grid_x_divs, grid_y_divs, 16) # 16: number of bins
-			if have_mov:
-				self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
+			six_points = self.build_bars(grid_width, grid_height, bin_w, third_bin_w, grid_x_divs, grid_y_divs, dims)
 		
 			self.frame_idx = offset_frames
 			playing_flag = True
@@ -910,7 +977,7 @@ class ColorFeaturesLAB:
 					
 					curr_stride_frame = self.frame_idx/stride_frames
 					if have_mov:
-						ret, frame = self.capture.read()		
+						frame = self.frame_source.read_frame(self.frame_idx)
 						if frame is None: 
 							print 'Frame error! Exiting...'
 							break # no image captured... end the processing
@@ -926,10 +993,11 @@ class ColorFeaturesLAB:
 						#draw the rectangle in the wanted color
 						self.make_rectangles(cv.fromarray(histimg), six_points, 6, 0, 0, d, [lval, aval, bval], grid_height_ratio, [lcolors, acolors, bcolors], voffset=hist_height)
 
-					# display stage (gridded)
-					for i in range(grid_x_divs):
-						for j in range(grid_y_divs):
-							lbins, abins, bbins = trio[(j*4)+i+1][0], trio[(j*4)+i+1][1], trio[(j*4)+i+1][2]
+					# display stage (gridded): i is the row, j the column of the cell
+					for i in range(grid_y_divs):
+						for j in range(grid_x_divs):
+							unit = layout.cell(i, j) + layout.cell_offset
+							lbins, abins, bbins = trio[unit][0], trio[unit][1], trio[unit][2]
 							# if verbose: print (np.sum(lbins), np.sum(abins), np.sum(bbins))
 							# display stage (grid)
 							for  d in range (dims):
@@ -942,7 +1010,6 @@ class ColorFeaturesLAB:
 					if have_mov:
 						cv.ShowImage('Image', cv.fromarray(frame))
 					cv.ShowImage('Histogram', cv.fromarray(histimg))
-					fp.flush()
 		
 					print self.frame_idx, ':: ', (float(self.frame_idx - offset_frames) / dur_frames)
 					
@@ -961,8 +1028,6 @@ class ColorFeaturesLAB:
 					self.frame_idx += 24
 				elif p_state == 9: # adv. 10 sec.
 					self.frame_idx += 240
-				if have_mov:
-					self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, self.frame_idx)				
 				
 				# handle key events
 				k = cv.WaitKey (int(1000 / ap['afps']))
@@ -1000,26 +1065,75 @@ class ColorFeaturesLAB:
 
 	def _analyze_image(self, img, mfp, fpindex, lab, lab_min, lab_max, l_star, a_star, b_star, mask, l_histo, a_histo, b_histo, i, j, grid_flag, grid_height=1, thresh=0.):
 		"""
-		Image analysis kernel function that is called to analyze each frame image. Look at the main process function to get an idea of how you would call this to return analysis data for a single image. Todo: wrap such a call into a simple one-off function call.
+		Single-image analysis kernel: one L*a*b* conversion and three histograms for one region. The main process function no longer calls this per region; see _analyze_frame, which produces the same values for the full frame and every grid cell in one pass.
 		"""
 		# ap = self._check_cflab_params(None)
 		ap = self.analysis_params
-		grid_divs_x = ap['grid_divs_x']
+		bins = ap['ldims']
+		unit = self._grid_layout().cell(i, j) + grid_flag
 		lab = cv2.cvtColor(img, cv.CV_BGR2Lab)
 		
-		item = cv2.calcHist([lab],[0],None,[16],[0,255])
+		item = cv2.calcHist([lab],[0],None,[bins],[0,255])
 		cv2.normalize(np.where(item>thresh,item,0),l_star,alpha=1.0,norm_type=cv2.NORM_L2)
-		item = cv2.calcHist([lab],[1],None,[16],[0,255])
+		item = cv2.calcHist([lab],[1],None,[bins],[0,255])
 		cv2.normalize(np.where(item>thresh,item,0),a_star,alpha=1.0,norm_type=cv2.NORM_L2)
-		item = cv2.calcHist([lab],[2],None,[16],[0,255])
+		item = cv2.calcHist([lab],[2],None,[bins],[0,255])
 		cv2.normalize(np.where(item>thresh,item,0),b_star,alpha=1.0,norm_type=cv2.NORM_L2)
 				
-		mfp[fpindex][ ((grid_divs_x*i)+j)+grid_flag ][0] = np.reshape(l_star[:], (16))
-		mfp[fpindex][ ((grid_divs_x*i)+j)+grid_flag ][1] = np.reshape(a_star[:], (16))
-		mfp[fpindex][ ((grid_divs_x*i)+j)+grid_flag ][2] = np.reshape(b_star[:], (16))
+		mfp[fpindex][unit][0] = np.reshape(l_star[:], (bins))
+		mfp[fpindex][unit][1] = np.reshape(a_star[:], (bins))
+		mfp[fpindex][unit][2] = np.reshape(b_star[:], (bins))
 		
 		return l_star[:], a_star[:], b_star[:]
-	
+
+	def _analyze_frame(self, img, grid_width, grid_height, thresh=0., lab=None):
+		"""
+		Image analysis kernel function that is called to analyze each frame image. The frame is converted to L*a*b* once. The full-frame histograms are counted on that single conversion, and all of the grid-cell histograms are counted together with one bincount over a (cell, channel, bin) index. Thresholding and L2 normalization are then applied to all (grid cells + 1) * 3 histograms at once. Binning and normalization reproduce cv2.calcHist/cv2.normalize exactly, so the results are identical to calling _analyze_image for each region.
+		Pass lab if the L*a*b* conversion of img has already been done.
+		Returns an array: [NUMBER OF REGIONS (17), NUMBER OF COLUMNS (3), NUMBER OF BINS (16)] (the row layout of _grid_layout)
+		"""
+		ap = self.analysis_params
+		bins = ap['ldims']
+		if lab is None:
+			lab = cv2.cvtColor(img, cv.CV_BGR2Lab)
+		bin_lut, index_base, num_cells = self._histogram_index(lab.shape, grid_width, grid_height)
+
+		hists = np.empty(((num_cells+1), 3, bins), dtype=np.float32)
+		for c in range(3):
+			hists[0,c] = cv2.calcHist([lab],[c],None,[bins],[0,255])[:,0]
+		# the grid only covers the upper left of the frame, so just count over its bounding box
+		crop = lab[:index_base.shape[0],:index_base.shape[1]]
+		counts = np.bincount((index_base + cv2.LUT(crop, bin_lut)).ravel(), minlength=((num_cells+1)*3*(bins+1)))
+		# last cell slot collects pixels outside of any cell, last bin collects values past the histogram range
+		hists[1:] = counts.reshape((num_cells+1), 3, (bins+1))[:num_cells,:,:bins]
+		hists = np.where(hists>thresh, hists, 0).astype(np.float32)
+
+		# cv2.normalize(..., alpha=1.0, norm_type=cv2.NORM_L2): double precision norm, single precision scaling
+		norms = np.sqrt(np.square(hists, dtype=np.float64).sum(axis=2))
+		scales = np.where(norms > np.finfo(np.float64).eps, 1.0 / np.maximum(norms, np.finfo(np.float64).eps), 0.0)
+		return hists * scales.astype(np.float32)[:,:,np.newaxis]
+
+	def _histogram_index(self, shape, grid_width, grid_height):
+		"""
+		Helper for _analyze_frame. Build (and cache for the given frame shape and grid) the bin lookup table and the per-pixel (cell, channel) offsets into the flat histogram index. Grid cells are laid out exactly as in the original per-region loop: the grid_divs_y rows of cells are grid_width pixels high and the grid_divs_x columns grid_height pixels wide (for the default parameters, the grid covers the upper left of the frame).
+		"""
+		layout = self._grid_layout()
+		key = (shape, grid_width, grid_height, layout)
+		if getattr(self, '_hist_index_key', None) == key:
+			return self._hist_index
+		bins = self.analysis_params['ldims']
+		num_cells = layout.cells
+
+		# calcHist over [0, 255] with uniform bins: 255 falls outside the range and is dropped (bin index == bins)
+		bin_lut = np.minimum(np.floor(np.arange(256) * (bins / 255.0)), bins).astype(np.uint8)
+
+		cell_map = layout.cell_map(min(shape[0], (layout.grid_divs_y*grid_width)), min(shape[1], (layout.grid_divs_x*grid_height)), grid_width, grid_height)
+		index_base = ((cell_map[:,:,np.newaxis] * 3) + np.arange(3)) * (bins+1)
+
+		self._hist_index_key = key
+		self._hist_index = (bin_lut, index_base, num_cells)
+		return self._hist_index
+
 	# GUI helper functions
 	def build_bars(self, gw, gh, bw, tbw, xdivs, ydivs, numbins):
 		"""
@@ -1027,9 +1141,9 @@ class ColorFeaturesLAB:
 		"""
 		# ap = self._check_cflab_params(None)
 		ap = self.analysis_params
-		six_points = np.ndarray((16,16,6,2), dtype=int)
-		for i in range(xdivs):
-			for j in range(ydivs):
+		six_points = np.ndarray((numbins,(xdivs*ydivs),6,2), dtype=int)
+		for i in range(ydivs):
+			for j in range(xdivs):
 				for h in range(numbins):
 					foo = six_points[h][(i*xdivs)+j]
 					foo[0] = [(j*gw)+(h * bw), (i+1)*gh]
@@ -1042,7 +1156,7 @@ class ColorFeaturesLAB:
 	
 	def make_rectangles(self, h_img, pts, num_pts, i, j, h, vals, grid_height_ratio, colors, hoffset=0, voffset=0):
 		"""
-		Display helper function. Make a bank of three bars for the histogram. (16 in total.)
+		Display helper function. Make a bank of three bars for the histogram. (One per bin.)
 		"""
 		# ap = self._check_cflab_params(None)
 		ap = self.analysis_params
@@ -0,0 +1,205 @@
+# engine.py - headless analysis loop shared by the feature extractors
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+AnalysisEngine is the frame loop that every ACTION feature extractor runs its analysis through. It is a pure compute loop: it decodes frames from a FrameSource, hands each frame to the extractor's kernel, and writes the rows that the kernel returns to a FeatureWriter. There is no highgui, no WaitKey and no printing in the loop, so headless throughput is limited only by decoding and analysis.
+
+Display and playback are optional: a viewer (see the viewer module) can subscribe to the engine, and it then receives every frame together with the row computed for it.
+
+.. code-block:: python
+
+	engine = AnalysisEngine(frame_source, kernel, writer)
+	engine.subscribe(PhaseCorrelationViewer(pcorr, (640, 360)))	# optional
+	engine.run(0, 2400)
+	print engine.stats()
+	>>> {'frames': 2400, 'rows': 2399}
+
+A kernel is a function kernel(frame_idx, frame) that returns a (row_idx, row) pair, or None for frames that do not produce a row (the first frame of a frame-to-frame analysis, frames between strides, etc.). The kernel keeps its own state from frame to frame.
+
+A viewer is any object with a show(frame_idx, frame, row) method (row is None when the kernel returned nothing) and a close() method. If show returns False, the engine stops (e.g., the user pressed ESC).
+
+Several kernels can share one engine, so that every frame is decoded only once for all of them (see the pipeline module). Each kernel is added with its own writer, frame range and step; the engine decodes every frame that any of them needs. Kernels that need the same color conversion of a frame (grayscale, L*a*b*), or the same downscaled grayscale frame, share it through the engine's FrameConversions cache (engine.conversions).
+
+.. code-block:: python
+
+	engine = AnalysisEngine(frame_source)
+	engine.add_kernel(cflab_kernel, cflab_writer, 0, 2400, step=6)
+	engine.add_kernel(pcorr_kernel, pcorr_writer, 0, 2400, first_frame=1)
+	engine.run()
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+try:
+	import cv2
+	HAVE_CV = True
+except ImportError:
+	HAVE_CV = False
+
+
+class AnalysisEngine:
+	"""
+	Headless frame loop: frame source -> kernel(s) -> feature writer(s), with optional viewers subscribed to the results.
+	"""
+	def __init__(self, frame_source, kernel=None, writer=None):
+		self.frame_source = frame_source
+		self.kernels = []
+		self.viewers = []
+		self.conversions = FrameConversions()
+		self.frames = 0
+		self.rows = 0
+		if kernel is not None:
+			self.add_kernel(kernel, writer)
+
+	def add_kernel(self, kernel, writer=None, start_frame=None, end_frame=None, step=None, first_frame=None):
+		"""
+		Add a kernel and the writer for its rows. The kernel is called for frames start_frame, start_frame + step, ... up to (not including) end_frame, and rows for frames before first_frame are not written. Anything left as None follows the arguments of run.
+		"""
+		self.kernels.append([kernel, writer, start_frame, end_frame, step, first_frame])
+
+	def subscribe(self, viewer):
+		"""
+		Add a viewer; its show(frame_idx, frame, row) method is called after every analyzed frame (with the row of the first kernel).
+		"""
+		self.viewers.append(viewer)
+
+	def run(self, start_frame=None, end_frame=None, step=1, first_frame=None):
+		"""
+		Analyze frames start_frame, start_frame + step, ... up to (not including) end_frame. Rows for frames before first_frame (warm-up frames) are computed but not written. Stops early at the end of the movie or when a viewer asks to stop. Viewers are closed at the end. Returns False if a viewer stopped the run, True otherwise.
+		
+		With several kernels, start_frame and end_frame default to the union of their frame ranges, and frames are decoded one by one unless all of the kernels share the same step.
+		"""
+		kernels = []
+		for kernel, writer, k_start, k_end, k_step, k_first in self.kernels:
+			k_start = start_frame if k_start is None else k_start
+			k_end = end_frame if k_end is None else k_end
+			k_step = step if k_step is None else k_step
+			k_first = (first_frame if first_frame is not None else k_start) if k_first is None else k_first
+			kernels.append((kernel, writer, k_start, k_end, k_step, k_first))
+		if start_frame is None:
+			start_frame = min([k[2] for k in kernels])
+		if end_frame is None:
+			end_frame = max([k[3] for k in kernels])
+		if len(set([k[4] for k in kernels])) > 1:
+			step = 1
+		try:
+			for frame_idx, frame in self.frame_source.frames(start_frame, end_frame, step):
+				self.frames += 1
+				shown = None
+				for n, (kernel, writer, k_start, k_end, k_step, k_first) in enumerate(kernels):
+					if frame_idx < k_start or frame_idx >= k_end or ((frame_idx - k_start) % k_step) != 0:
+						continue
+					result = kernel(frame_idx, frame)
+					if result is None:
+						continue
+					row_idx, row = result
+					if writer is not None and frame_idx >= k_first:
+						writer[row_idx] = row
+						self.rows += 1
+					if n == 0:
+						shown = row
+				for viewer in self.viewers:
+					if viewer.show(frame_idx, frame, shown) is False:
+						return False
+		finally:
+			for viewer in self.viewers:
+				viewer.close()
+		return True
+
+	def close(self, complete=False):
+		"""
+		Close the writers of all of the kernels. complete=True marks their analysis ranges as finished (see FeatureWriter.close).
+		"""
+		for kernel in self.kernels:
+			if kernel[1] is not None:
+				kernel[1].close(complete)
+
+	def stats(self):
+		"""
+		Return the number of frames analyzed and rows written as a dict.
+		"""
+		return {'frames': self.frames, 'rows': self.rows}
+
+
+def scaled_size(size, scale):
+	"""
+	(width, height) of an image of size (width, height) at scale (in (0.0, 1.0]) times its size.
+	"""
+	scale = float(scale)
+	if scale <= 0.0 or scale > 1.0:
+		raise ValueError("scale must be in (0.0, 1.0], not %s" % scale)
+	width, height = size
+	return (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+
+def downscale(image, scale):
+	"""
+	image at scale times its size (see scaled_size): halved with pyrDown as long as that does not go below the scale, then resized the rest of the way. At scale 1.0, image itself.
+	"""
+	size = scaled_size((image.shape[1], image.shape[0]), scale)
+	small = image
+	while (small.shape[1] / 2) >= size[0] and (small.shape[0] / 2) >= size[1]:
+		small = cv2.pyrDown(small)
+	if (small.shape[1], small.shape[0]) != size:
+		small = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+	return small
+
+
+class FrameConversions:
+	"""
+	Per-frame cache of color conversions, so that kernels sharing one engine convert each frame to grayscale (or L*a*b*, ...) only once. The converted images are shared; kernels must not modify them in place.
+
+	::
+
+		frame_gray = self.conversions.convert(frame_idx, frame, cv2.COLOR_BGR2GRAY)
+		small_gray = self.conversions.downscale(frame_idx, frame, 0.5)	# shared by the kernels that analyze at half size
+
+	"""
+	def __init__(self):
+		self.frame_idx = None
+		self.frame = None
+		self.converted = {}
+		self.conversions = 0
+		self.hits = 0
+
+	def convert(self, frame_idx, frame, code):
+		if frame_idx != self.frame_idx or frame is not self.frame:
+			self.frame_idx, self.frame = frame_idx, frame
+			self.converted = {}
+		if code not in self.converted:
+			self.converted[code] = cv2.cvtColor(frame, code)
+			self.conversions += 1
+		else:
+			self.hits += 1
+		return self.converted[code]
+
+	def downscale(self, frame_idx, frame, scale, code=None):
+		"""
+		The conversion of the frame (see convert; grayscale by default), downscaled to scale times its size (see the downscale function); cached like the conversions.
+		"""
+		if code is None:
+			code = cv2.COLOR_BGR2GRAY
+		converted = self.convert(frame_idx, frame, code)
+		if float(scale) == 1.0:
+			return converted
+		key = (code, float(scale))
+		if key not in self.converted:
+			self.converted[key] = downscale(converted, scale)
+			self.conversions += 1
+		else:
+			self.hits += 1
+		return self.converted[key]
+
+	def stats(self):
+		"""
+		Return the number of conversions done and the number of conversions shared (cache hits) as a dict.
+		"""
+		return {'conversions': self.conversions, 'hits': self.hits}
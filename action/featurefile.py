@@ -0,0 +1,499 @@
+# featurefile.py - self-describing data files: header + raw rows
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+The data files (.color_lab, .phasecorr, .opticalflow24, .tvl1) start with a small header that says what is in them, followed by the rows (analysis frames) themselves, exactly as they are laid out in memory. The data can be memory-mapped straight from the file (zero-copy), and the readers get the shape and type of the rows from the header instead of from constants.
+
+.. code-block:: python
+
+	X = load_feature_file('/Users/me/Movies/action/Psycho/Psycho.color_lab')	# read-only memmap, no copy
+	print X.shape
+	>>> (26312, 17, 3, 16)
+	print read_feature_header('/Users/me/Movies/action/Psycho/Psycho.color_lab')['stride']
+	>>> 6
+
+Layout:
+
++----------------+----------+----------------------------------------------------------------------------------+
+| bytes          | what     | notes                                                                            |
++================+==========+==================================================================================+
+| 0 - 6          | magic    | '\\x93ACTION'                                                                     |
++----------------+----------+----------------------------------------------------------------------------------+
+| 7, 8           | version  | major, minor (1, 0)                                                              |
++----------------+----------+----------------------------------------------------------------------------------+
+| 9 - 12         | length   | of the JSON header, little-endian uint32                                         |
++----------------+----------+----------------------------------------------------------------------------------+
+| 13 - ...       | header   | JSON, padded with spaces (and a newline) so that the data starts on 64 bytes     |
++----------------+----------+----------------------------------------------------------------------------------+
+| data_offset -  | data     | rows in C order                                                                  |
++----------------+----------+----------------------------------------------------------------------------------+
+
+The JSON header holds shape (rows first), dtype (numpy's description, e.g. '<f4'), fps, stride, grid ([grid_divs_x, grid_divs_y]) and the analysis_params that the file was analyzed with. The data file of a preview analysis (see the preview module) also has preview: the number of movie frames between its rows (null for other data files, whose rows are stride frames apart). A preview is written next to the data file of the full analysis (data_path + '.preview'), never over it; feature_file_path says which of the two the rows of a data file are read from.
+
+A data file that is being analyzed coarse-to-fine (see the progressive module) has a coverage sidecar next to it (data_path + '.coverage'): the number of rows (a little-endian uint64) followed by one bit per row (numpy's packbits), set for the rows that have been analyzed. read_feature_coverage returns it as a bool array, or None for data files without one; the sidecar is removed when every row is covered, and create_feature_file removes a stale one.
+
+Data files written before the header was introduced are raw rows, without a header. They are still read: for them, the caller supplies the row shape (e.g., (17, 3, 16) for ColorFeaturesLAB), and the number of rows follows from the size of the file. Readers for a newer major version of the format refuse the file.
+
+Region-major layout
+===================
+
+A row is made of units: the histograms or flow values of one grid cell, or of the full frame (17 units of (3, 16) for ColorFeaturesLAB, 65 of (2,) for PhaseCorrelation, 64 of (8,) for OpticalFlow, 72 of (2,) for OpticalFlowTVL1). The extractors' middle_band, center_quad and plus_band accessors pick some of the units of every row. In the frame-major layout (above: one row after the other) that means reading all of the rows and gathering the units out of them.
+
+A data file can also be stored region-major (see transpose_feature_file): the units are split into sections, and the data holds, for each section in turn, the rows of that section's units only. With band_sections, the sections are the full frame, the outer and middle cells of the top rows, the middle band (the middle half of the rows of the grid), and the middle and outer cells of the bottom rows:
+
+::
+
+	 T  t  t  T
+	 m  m  m  m		full frame (F), top outer (T), top middle (t),
+	 m  m  m  m		middle band (m), bottom middle (b), bottom outer (B)
+	 B  b  b  B
+
+so the middle band of a time window is one sequential read, the plus band is three, and the center quad is read from the middle band only. The header of a region-major data file has layout 'region', units (per row) and sections (the units of each section, in the order they are stored); shape is the shape of the rows as they are read (the frame-major shape). FeatureReader reads either layout; load_feature_file returns the rows of a region-major data file through RegionRows, which puts them back together as they are indexed.
+
+.. code-block:: python
+
+	transpose_feature_file('Psycho.color_lab', sections=band_sections(4, 4, cell_offset=1, full_units=[0]), units=17)	# in place
+	transpose_feature_file('Psycho.color_lab')	# and back to frame-major
+
+Compact storage
+===============
+
+The rows can be stored in less space than float32 (see the storage_dtype and storage_range analysis parameters of the extractors). On a network share, reading the data takes time in proportion to its size, so a corpus stored as uint8 loads about four times as fast as one stored as float32:
+
++----------+-------+-------------------------------------------------------------------------------------+
+| dtype    | bytes | values                                                                              |
++==========+=======+=====================================================================================+
+| float32  | 4     | as analyzed (the default)                                                           |
++----------+-------+-------------------------------------------------------------------------------------+
+| float16  | 2     | 3 significant digits, up to 65504                                                   |
++----------+-------+-------------------------------------------------------------------------------------+
+| uint16   | 2     | 65536 evenly spaced levels over storage_range                                       |
++----------+-------+-------------------------------------------------------------------------------------+
+| uint8    | 1     | 256 evenly spaced levels over storage_range                                         |
++----------+-------+-------------------------------------------------------------------------------------+
+
+Integer rows are quantized: value = (stored - zero_point) * scale. The header's quantization entry ({'scale': ..., 'zero_point': ...}) holds the mapping; it is null for float data files. zero_point is a whole number, so 0.0 is stored exactly, and values outside of storage_range are clipped to it. load_feature_file returns the rows as they are stored (compact); pass decode=True for rows that are converted to float32 as they are read, or use decode_rows:
+
+.. code-block:: python
+
+	X = load_feature_file('/Users/me/Movies/action/Psycho/Psycho.color_lab')	# uint8 memmap
+	Y = decode_rows(X[1000:2000], read_feature_header('/Users/me/Movies/action/Psycho/Psycho.color_lab')['quantization'])	# float32
+	Z = load_feature_file('/Users/me/Movies/action/Psycho/Psycho.color_lab', decode=True)	# float32, one slice at a time
+	convert_feature_file('Psycho.color_lab', 'Psycho_u8.color_lab', 'uint8', (0.0, 1.0))	# compact an existing data file
+
+scripts/benchmark_storage_dtypes.py converts the data files of some films to each of the dtypes, and reports their size, read time and the error in their self-similarity matrices.
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os, json, struct, tempfile
+import numpy as np
+
+MAGIC = '\x93ACTION'
+FORMAT_VERSION = (1, 0)
+HEADER_ALIGN = 64 # bytes; the data starts on a multiple of this
+_PREFIX_SIZE = len(MAGIC) + 2 + 4
+STORAGE_DTYPES = ['float32', 'float16', 'uint16', 'uint8']
+COVERAGE_EXTENSION = '.coverage'
+PREVIEW_EXTENSION = '.preview'
+
+
+def read_feature_header(data_path):
+	"""
+	Return the header of a data file as a dict, with the offset of the data in the file added as data_offset. Returns None for raw (headerless) data files. Raises IOError for a header of a newer major version, or one that cannot be read.
+	"""
+	fp = open(data_path, 'rb')
+	try:
+		prefix = fp.read(_PREFIX_SIZE)
+		if len(prefix) < _PREFIX_SIZE or prefix[:len(MAGIC)] != MAGIC:
+			return None
+		major, minor, header_len = struct.unpack('<BBI', prefix[len(MAGIC):])
+		if major > FORMAT_VERSION[0]:
+			raise IOError("%s: data file format version %i.%i is newer than this reader (%i.%i)" % ((data_path, major, minor) + FORMAT_VERSION))
+		try:
+			header = json.loads(fp.read(header_len))
+		except ValueError:
+			raise IOError("%s: cannot read the data file header" % data_path)
+	finally:
+		fp.close()
+	header['version'] = [major, minor]
+	header['data_offset'] = _PREFIX_SIZE + header_len
+	return header
+
+def feature_file_layout(data_path, row_shape=None, dtype='float32'):
+	"""
+	Return (data_offset, shape, dtype) of a data file. Shape and dtype come from the header; for a raw data file, they are built from row_shape and dtype (the compatibility layout) and the size of the file.
+	"""
+	header = read_feature_header(data_path)
+	if header is not None:
+		return header['data_offset'], tuple(header['shape']), np.dtype(str(header['dtype']))
+	if row_shape is None:
+		raise IOError("%s is a raw data file (no header); its row shape must be given" % data_path)
+	dtype = np.dtype(dtype)
+	row_bytes = int(np.prod(row_shape)) * dtype.itemsize
+	return 0, ((os.path.getsize(data_path) / row_bytes),) + tuple(row_shape), dtype
+
+def quantization_for(dtype, value_range=None):
+	"""
+	The quantization ({'scale': ..., 'zero_point': ...}) that stores value_range=(low, high) in the integer dtype; None for float dtypes. Raises ValueError for an integer dtype without a value_range, or for a dtype that is not one of STORAGE_DTYPES.
+	"""
+	dtype = np.dtype(dtype)
+	if dtype.name not in STORAGE_DTYPES:
+		raise ValueError("cannot store data as %s (use one of %s)" % (dtype.name, STORAGE_DTYPES))
+	if dtype.kind == 'f':
+		return None
+	if value_range is None:
+		raise ValueError("a value range is needed to store data as %s" % dtype.name)
+	low, high = float(value_range[0]), float(value_range[1])
+	if not high > low:
+		raise ValueError("empty value range: %s" % (value_range,))
+	levels = np.iinfo(dtype).max
+	scale = (high - low) / levels
+	zero_point = int(min(max(round(-low / scale), 0), levels))
+	return {'scale': scale, 'zero_point': zero_point}
+
+def encode_rows(values, dtype, quantization=None):
+	"""
+	Convert float rows to the storage dtype: quantize them (rounding to the nearest level, clipping to the range) for integer dtypes, or cast them for float ones.
+	"""
+	dtype = np.dtype(dtype)
+	if quantization is None:
+		return np.asarray(values, dtype=dtype)
+	levels = np.iinfo(dtype).max
+	q = np.rint((np.asarray(values, dtype=np.float64) / quantization['scale']) + quantization['zero_point'])
+	return np.clip(q, 0, levels).astype(dtype)
+
+def decode_rows(data, quantization=None):
+	"""
+	Convert stored rows to float32 (a copy, except for float32 data).
+	"""
+	if quantization is None:
+		return np.asarray(data, dtype=np.float32)
+	decoded = np.array(data, dtype=np.float32)
+	decoded -= quantization['zero_point']
+	decoded *= np.float32(quantization['scale'])
+	return decoded
+
+def feature_file_quantization(data_path):
+	"""
+	The quantization of a data file's rows (see quantization_for), or None if they are stored as floats (and for raw data files).
+	"""
+	header = read_feature_header(data_path)
+	if header is None:
+		return None
+	return header.get('quantization')
+
+
+class DecodedRows:
+	"""
+	Read-only float32 view of the rows of a compact data file: the stored rows are decoded only when they are indexed.
+
+	::
+
+		X = DecodedRows(load_feature_file(data_path), feature_file_quantization(data_path))
+		row = X[1000]	# float32
+
+	"""
+	def __init__(self, data, quantization=None):
+		self.data = data
+		self.quantization = quantization
+		self.shape = data.shape
+		self.dtype = np.dtype(np.float32)
+
+	def __getitem__(self, idx):
+		return decode_rows(self.data[idx], self.quantization)
+
+	def __len__(self):
+		return self.shape[0]
+
+	def __array__(self, dtype=None):
+		decoded = decode_rows(self.data, self.quantization)
+		return decoded if dtype is None else decoded.astype(dtype)
+
+
+def band_sections(grid_divs_x, grid_divs_y, cell_offset=0, full_units=[]):
+	"""
+	The sections (lists of units, in the order they are stored) of the region-major layout for a grid_divs_x by grid_divs_y grid: the full frame (full_units), top outer, top middle, middle band, bottom middle and bottom outer cells. Grid cell c (numbered row by row, as in the extractors' accessors) is unit c + cell_offset. Empty sections are left out.
+	"""
+	top, bottom = (grid_divs_y / 4), (grid_divs_y - (grid_divs_y / 4))
+	left, right = (grid_divs_x / 4), (grid_divs_x - (grid_divs_x / 4))
+	def cells(rows, middle_columns):
+		return [((row * grid_divs_x) + col + cell_offset) for row in rows for col in range(grid_divs_x) if (left <= col < right) == middle_columns]
+	sections = [list(full_units), cells(range(0, top), False), cells(range(0, top), True), [((row * grid_divs_x) + col + cell_offset) for row in range(top, bottom) for col in range(grid_divs_x)], cells(range(bottom, grid_divs_y), True), cells(range(bottom, grid_divs_y), False)]
+	return [section for section in sections if len(section) > 0]
+
+def unit_shape(row_shape, units):
+	"""
+	Shape of one unit of a row of row_shape that is made of units units.
+	"""
+	row_shape = tuple(row_shape)
+	if row_shape[0] == units:
+		return row_shape[1:]
+	if row_shape[0] % units != 0:
+		raise ValueError("rows of %s cannot be split into %i units" % (row_shape, units))
+	return ((row_shape[0] / units),) + row_shape[1:]
+
+def _section_offsets(header):
+	"""
+	Byte offset (from the start of the data) of each of the sections of a region-major data file.
+	"""
+	shape, dtype = tuple(header['shape']), np.dtype(str(header['dtype']))
+	unit_bytes = int(np.prod(unit_shape(shape[1:], header['units']))) * dtype.itemsize
+	offsets, offset = [], 0
+	for section in header['sections']:
+		offsets.append(offset)
+		offset += shape[0] * len(section) * unit_bytes
+	return offsets
+
+
+class RegionRows:
+	"""
+	Read-only view of the rows of a region-major data file, as if it were frame-major: indexing it (with a row number or a slice of rows, and optionally more indices) reads those rows of every section and puts them together.
+
+	::
+
+		X = load_feature_file(data_path)	# RegionRows, if the data file is region-major
+		row = X[1000]
+
+	"""
+	def __init__(self, data_path, header, rows=None):
+		self.data_path = data_path
+		self.dtype = np.dtype(str(header['dtype']))
+		num_rows = header['shape'][0] if rows is None else min(rows, header['shape'][0])
+		self.shape = (num_rows,) + tuple(header['shape'][1:])
+		self.units = header['units']
+		self.unit_shape = unit_shape(self.shape[1:], self.units)
+		self.sections = header['sections']
+		self._offsets = [(header['data_offset'] + offset) for offset in _section_offsets(header)]
+		self._total_rows = header['shape'][0]
+
+	def __getitem__(self, idx):
+		if isinstance(idx, tuple):
+			idx, rest = idx[0], idx[1:]
+		else:
+			rest = ()
+		if isinstance(idx, slice):
+			start, stop, step = idx.indices(self.shape[0])
+			rows = self.read(start, max(start, stop))[::step] if step > 0 else self.read(0, self.shape[0])[idx]
+		else:
+			idx = int(idx)
+			if idx < 0:
+				idx += self.shape[0]
+			if idx < 0 or idx >= self.shape[0]:
+				raise IndexError('row %i is out of bounds for a data file with %i rows' % (idx, self.shape[0]))
+			rows = self.read(idx, (idx + 1))[0]
+		return rows[rest] if len(rest) > 0 else rows
+
+	def __len__(self):
+		return self.shape[0]
+
+	def __array__(self, dtype=None):
+		rows = self.read(0, self.shape[0])
+		return rows if dtype is None else rows.astype(dtype)
+
+	def section_rows(self, section, start, stop, mode='r'):
+		"""
+		Memmap of rows start up to (not including) stop of one section: (rows, units of the section) + unit_shape. Only that byte range of the file is mapped.
+		"""
+		count = len(self.sections[section])
+		unit_bytes = int(np.prod(self.unit_shape)) * self.dtype.itemsize
+		if stop <= start:
+			return np.empty(((0, count) + self.unit_shape), dtype=self.dtype)
+		return np.memmap(self.data_path, dtype=self.dtype, mode=mode, offset=(self._offsets[section] + (start * count * unit_bytes)), shape=(((stop - start), count) + self.unit_shape))
+
+	def read(self, start, stop):
+		"""
+		Rows start up to (not including) stop, put together from all of the sections (a copy).
+		"""
+		stop = min(stop, self.shape[0])
+		rows = np.empty(((max(0, (stop - start)), self.units) + self.unit_shape), dtype=self.dtype)
+		if stop > start:
+			for section, units in enumerate(self.sections):
+				rows[:, units] = self.section_rows(section, start, stop)
+		return rows.reshape(((rows.shape[0],) + self.shape[1:]))
+
+
+def feature_file_rows(data_path, row_shape=None, dtype='float32'):
+	"""
+	Number of rows (analysis frames) in a data file: a header read, or the size of the file for raw data files.
+	"""
+	return feature_file_layout(data_path, row_shape, dtype)[1][0]
+
+def _write_header(data_path, header):
+	"""
+	Create (or overwrite) a data file that holds only the header; returns the offset of the data.
+	"""
+	header = dict([(k, v) for k, v in header.items() if k not in ('version', 'data_offset')])
+	header_json = json.dumps(header, sort_keys=True, default=str)
+	# pad so that the data starts on HEADER_ALIGN bytes; the header ends with a newline
+	header_len = len(header_json) + 1
+	header_len += (HEADER_ALIGN - ((_PREFIX_SIZE + header_len) % HEADER_ALIGN)) % HEADER_ALIGN
+	header_json = header_json + (' ' * (header_len - len(header_json) - 1)) + '\n'
+	fp = open(data_path, 'wb')
+	try:
+		fp.write(MAGIC + struct.pack('<BBI', FORMAT_VERSION[0], FORMAT_VERSION[1], header_len) + header_json)
+	finally:
+		fp.close()
+	return _PREFIX_SIZE + header_len
+
+def feature_file_path(data_path):
+	"""
+	The file that the rows of data_path are read from: the data file itself, or its preview (data_path + PREVIEW_EXTENSION; see the preview module) as long as there is no data file of a full analysis. data_path if neither exists.
+	"""
+	if not os.path.exists(data_path) and os.path.exists(data_path + PREVIEW_EXTENSION):
+		return data_path + PREVIEW_EXTENSION
+	return data_path
+
+def read_feature_coverage(data_path):
+	"""
+	The rows of a data file that have been analyzed so far, as a bool array (one entry per row), from its coverage sidecar (see the progressive module). None if it has no sidecar: all of its rows are analyzed (or are being analyzed in order).
+	"""
+	try:
+		fp = open(data_path + COVERAGE_EXTENSION, 'rb')
+		try:
+			payload = fp.read()
+		finally:
+			fp.close()
+	except IOError:
+		return None
+	if len(payload) < 8:
+		return None
+	num_rows = struct.unpack('<Q', payload[:8])[0]
+	return np.unpackbits(np.frombuffer(payload[8:], dtype=np.uint8))[:num_rows].astype(bool)
+
+def write_feature_coverage(data_path, covered):
+	"""
+	Write the coverage sidecar of a data file: covered holds one bool per row. The sidecar is written next to the data file and then renamed, so that readers never see half of it.
+	"""
+	covered = np.asarray(covered, dtype=bool)
+	target = data_path + COVERAGE_EXTENSION
+	fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=(os.path.basename(target) + '.'), dir=(os.path.dirname(os.path.abspath(target))))
+	try:
+		os.write(fd, struct.pack('<Q', len(covered)) + np.packbits(covered).tostring())
+		os.close(fd)
+		os.chmod(tmp_path, 0644)
+		os.rename(tmp_path, target)
+	except:
+		os.remove(tmp_path)
+		raise
+
+def create_feature_file(data_path, shape, dtype='float32', analysis_params=None, value_range=None):
+	"""
+	Create (or overwrite) a data file for shape rows of dtype (one of STORAGE_DTYPES), with a header, and return a writable memmap of its data. Integer dtypes store value_range=(low, high) (see quantization_for); the memmap holds the stored values, see encode_rows. analysis_params (the extractor's) go in the header, along with fps, stride, grid and (for previews) preview.
+	"""
+	dtype = np.dtype(dtype)
+	quantization = quantization_for(dtype, value_range)
+	ap = analysis_params if analysis_params is not None else {}
+	header = {
+		'shape' : list(shape),
+		'dtype' : dtype.str,
+		'quantization' : quantization,
+		'fps' : ap.get('fps'),
+		'stride' : ap.get('stride'),
+		'grid' : [ap.get('grid_divs_x'), ap.get('grid_divs_y')],
+		'preview' : ap.get('preview_frames') if ap.get('preview') else None,
+		'analysis_params' : ap
+	}
+	if os.path.exists(data_path + COVERAGE_EXTENSION):
+		# a new data file starts out without a coverage sidecar (its rows are analyzed in order)
+		os.remove(data_path + COVERAGE_EXTENSION)
+	data = np.memmap(data_path, dtype=dtype, mode='r+', offset=_write_header(data_path, header), shape=tuple(shape))
+	if quantization is not None and quantization['zero_point'] != 0 and data.size > 0:
+		# rows that are never written read as 0.0, as they do in float data files
+		data[:] = quantization['zero_point']
+	return data
+
+def load_feature_file(data_path, row_shape=None, mode='r', dtype='float32', rows=None, decode=False):
+	"""
+	Memory-map the data of a data file (zero-copy) in mode 'r', 'r+' or 'c' (copy-on-write). Shape and dtype come from the header; row_shape and dtype are only used for raw (headerless) data files. rows maps only the first rows rows. The rows are returned as they are stored; decode=True returns them as float32, decoded as they are indexed (see DecodedRows), if they are stored in a compact dtype. Region-major data files are returned as RegionRows (read-only).
+	"""
+	header = read_feature_header(data_path)
+	if header is not None and header.get('layout') == 'region':
+		if mode == 'r+':
+			raise IOError("%s is region-major, and cannot be written to; transpose it to frame-major first (see transpose_feature_file)" % data_path)
+		data = RegionRows(data_path, header, rows)
+		if decode and data.dtype != np.float32:
+			return DecodedRows(data, header.get('quantization'))
+		return data
+	data_offset, shape, dtype = feature_file_layout(data_path, row_shape, dtype)
+	if rows is not None:
+		shape = (min(rows, shape[0]),) + shape[1:]
+	if shape[0] == 0:
+		data = np.empty(shape, dtype=dtype)
+	else:
+		data = np.memmap(data_path, dtype=dtype, mode=mode, offset=data_offset, shape=shape)
+	if decode and dtype != np.float32:
+		return DecodedRows(data, feature_file_quantization(data_path))
+	return data
+
+def convert_feature_file(data_path, new_data_path, dtype, value_range=None, row_shape=None, chunk_rows=4096):
+	"""
+	Write a copy of a data file (with or without a header) with its rows stored as dtype (see create_feature_file); row_shape is needed for raw data files. Copies chunk_rows rows at a time. The copy is frame-major. Returns the new data file's header.
+	"""
+	header = read_feature_header(data_path)
+	src = load_feature_file(data_path, row_shape)
+	quantization = header.get('quantization') if header is not None else None
+	analysis_params = dict(header.get('analysis_params') or {}) if header is not None else {}
+	analysis_params['storage_dtype'] = np.dtype(dtype).name
+	analysis_params['storage_range'] = list(value_range) if value_range is not None else None
+	dst = create_feature_file(new_data_path, src.shape, dtype, analysis_params, value_range)
+	new_quantization = quantization_for(dtype, value_range)
+	for start in range(0, src.shape[0], chunk_rows):
+		dst[start:(start + chunk_rows)] = encode_rows(decode_rows(src[start:(start + chunk_rows)], quantization), dtype, new_quantization)
+	dst.flush()
+	del dst
+	return read_feature_header(new_data_path)
+
+def transpose_feature_file(data_path, new_data_path=None, sections=None, units=None, row_shape=None, dtype='float32', chunk_rows=4096):
+	"""
+	Write a data file (frame-major, region-major or raw) region-major, split into sections (lists of units; see band_sections) of rows made of units units, or frame-major if sections is None. The stored values are copied as they are (no decoding). row_shape and dtype are needed for raw data files. new_data_path=None replaces the data file (the new one is written next to it, and then renamed). Returns the new data file's header.
+	"""
+	target = new_data_path if new_data_path is not None else data_path
+	header = read_feature_header(data_path)
+	src = load_feature_file(data_path, row_shape, dtype=dtype)
+	new_header = dict(header) if header is not None else {'shape': list(src.shape), 'dtype': np.dtype(src.dtype).str, 'quantization': None}
+	for key in ('layout', 'units', 'sections'):
+		new_header.pop(key, None)
+	if sections is not None:
+		sections = [[int(unit) for unit in section] for section in sections]
+		units = units if units is not None else src.shape[1]
+		if sorted(sum(sections, [])) != range(units):
+			raise ValueError("the sections must hold each of the %i units once" % units)
+		new_header.update(layout='region', units=units, sections=sections)
+	fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=(os.path.basename(target) + '.'), dir=(os.path.dirname(os.path.abspath(target))))
+	os.close(fd)
+	try:
+		data_offset = _write_header(tmp_path, new_header)
+		num_rows = src.shape[0]
+		if sections is None:
+			dst = np.memmap(tmp_path, dtype=src.dtype, mode='r+', offset=data_offset, shape=src.shape) if num_rows > 0 else None
+			for start in range(0, num_rows, chunk_rows):
+				dst[start:(start + chunk_rows)] = src[start:(start + chunk_rows)]
+		else:
+			new_header['data_offset'] = data_offset
+			dst = RegionRows(tmp_path, new_header)
+			fp = open(tmp_path, 'r+b')
+			try:
+				fp.truncate(data_offset + (int(np.prod(src.shape)) * src.dtype.itemsize))
+			finally:
+				fp.close()
+			for start in range(0, num_rows, chunk_rows):
+				rows = np.asarray(src[start:(start + chunk_rows)]).reshape(((-1, units) + dst.unit_shape))
+				for section, section_units in enumerate(sections):
+					dst.section_rows(section, start, (start + rows.shape[0]), mode='r+')[:] = rows[:, section_units]
+		del dst
+		os.chmod(tmp_path, 0644)
+		os.rename(tmp_path, target)
+	except:
+		os.remove(tmp_path)
+		raise
+	return read_feature_header(target)
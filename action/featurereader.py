@@ -0,0 +1,343 @@
+# featurereader.py - windowed access to the memory-mapped data files
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+FeatureReader is the read side of the data files that the feature extractors write (see the featurewriter module). The extractors' _..._features_for_segment_from_onset_with_duration functions use it to get a time window of analysis frames, without mapping, loading or resampling the rest of the film. The access_stride of the access functions is handled here too: with a step, only every step-th (24 fps) row of the window is read, resampled and copied.
+
+Data files are written at the movie's actual frame rate (afps), and are resampled to 24 fps when they are read. Resampling a window gives the same values as resampling the whole film with ActionData.interpolate_time and then slicing the window out of it (to float32 precision). Only the rows under the window, plus the row on either side that the linear interpolation needs, are mapped. For 24 fps movies there is nothing to resample, and the rows are read as they are.
+
+.. code-block:: python
+
+	reader = FeatureReader('/Users/me/Movies/action/Psycho/Psycho.phasecorr', (65, 2))
+	window = reader.window(1440, 40, actual_fps=23.976)	# 10 seconds from 6:00 (at 4 analysis frames per second)
+	print window.shape, window.dtype
+	>>> (40, 65, 2) float32
+	window = reader.window(1440, 240, actual_fps=23.976, step=6)	# the same 10 seconds from a 24 fps analysis, at 4 rows per second
+	print window.shape
+	>>> (40, 65, 2)
+
+Windows are kept in a process-wide, least-recently-used cache (FEATURE_CACHE), so constructing the same extractor again, or asking for the same segment again, does not read and resample the data file again. An entry is keyed by the data file's path, modification time and size (and the modification time and inode of its coverage sidecar, if it has one), the row layout, the window (onset, count, step) and actual_fps; rewriting a data file (see the featurewriter module) drops its entries. Cached windows are read-only arrays: copy one (np.array(window)) to change it. The cache holds at most max_bytes (1 GB by default) of windows:
+
+.. code-block:: python
+
+	FEATURE_CACHE.max_bytes = 4 * (1 << 30)	# keep up to 4 GB of windows
+	print FEATURE_CACHE.stats()
+	>>> {'entries': 30, 'bytes': 412876800, 'hits': 240, 'misses': 30, 'evictions': 0}
+	FEATURE_CACHE.clear()
+	reader = FeatureReader(data_path, (512,), cache=None)	# no caching
+
+While a data file is being analyzed progressively (coarse-to-fine; see the progressive module), it has a coverage sidecar that says which of its rows have been analyzed so far. The rows that have not are interpolated linearly between the nearest covered rows on either side as they are read, so the windows are as good as the analysis is so far; a window is cached until the data file or its sidecar change.
+
+The data file of a preview analysis (see the preview module) is read in place of the data file of a full analysis, as long as there is none. It has one row every few seconds; its header says how many movie frames apart the rows are. It is resampled the same way, as if the movie ran that many times slower than actual_fps, so a window of a preview has as many rows as the same window of a full analysis, interpolated between the sample frames.
+
+Data files that are stored in a compact dtype (float16, uint16 or uint8; see the featurefile module) are decoded to float32 as they are read, only the rows of the window. Distance computations that work on the stored values can ask for them with compact=True, which returns the window in the stored dtype (quantized again after resampling, if the data is resampled); reader.quantization turns them into values:
+
+.. code-block:: python
+
+	window = reader.window(1440, 40, compact=True)	# uint8
+	values = decode_rows(window, reader.quantization)	# float32
+
+A reader that knows how many spatial units a row has (units, e.g. 64 grid cells of 8 bins for optical flow) can read some of the units only. In a region-major data file (see transpose_feature_file in the featurefile module), the units of a band are stored together, and a band such as the middle rows of the grid is one sequential read; at 24 fps it comes back as a slice of the memory map, without a copy:
+
+.. code-block:: python
+
+	reader = FeatureReader('/Users/me/Movies/action/Psycho/Psycho.opticalflow24', (512,), units=64)
+	window = reader.window(1440, 40, units=range(16, 48))	# the middle band: (40, 32, 8)
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os, threading
+import numpy as np
+from collections import OrderedDict
+from featurefile import *
+
+DEFAULT_CACHE_BYTES = 1 << 30 # 1 GB
+
+
+class FeatureCache:
+	"""
+	Least-recently-used cache of read-only feature arrays, holding at most max_bytes of them. Safe to use from several threads.
+	"""
+	def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+		self.max_bytes = max_bytes
+		self._entries = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		"""
+		Return the array stored under key (and make it the most recently used one), or None.
+		"""
+		with self._lock:
+			array = self._entries.pop(key, None)
+			if array is None:
+				self.misses += 1
+				return None
+			self._entries[key] = array
+			self.hits += 1
+			return array
+
+	def put(self, key, array):
+		"""
+		Make array read-only and store it under key, evicting the least recently used arrays to stay within max_bytes. Arrays larger than max_bytes are not stored. Returns array.
+		"""
+		array.flags.writeable = False
+		if array.nbytes > self.max_bytes:
+			return array
+		with self._lock:
+			self._remove(key)
+			self._entries[key] = array
+			self._bytes += array.nbytes
+			self._evict()
+		return array
+
+	def discard(self, data_path):
+		"""
+		Drop all of the arrays of a data file (keys start with the data file's path), or of the data file that data_path is the preview of.
+		"""
+		with self._lock:
+			for key in [key for key in self._entries if key[0] == data_path or (key[0] + PREVIEW_EXTENSION) == data_path]:
+				self._remove(key)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._bytes = 0
+
+	def stats(self):
+		"""
+		Return the number of entries and bytes held, and the number of hits, misses and evictions so far, as a dict.
+		"""
+		return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+	def _remove(self, key):
+		array = self._entries.pop(key, None)
+		if array is not None:
+			self._bytes -= array.nbytes
+
+	def _evict(self):
+		while self._bytes > self.max_bytes and len(self._entries) > 0:
+			key, array = self._entries.popitem(last=False)
+			self._bytes -= array.nbytes
+			self.evictions += 1
+
+FEATURE_CACHE = FeatureCache()
+
+
+class FeatureReader:
+	"""
+	Reads windows of rows (analysis frames) of row_shape values from a data file. The row shape and dtype in the data file's header (see the featurefile module) take precedence; row_shape and dtype are the layout of raw (headerless) data files. A row is made of units units (the grid cells and the full frame; row_shape[0] by default), and a window can be restricted to some of them. Windows are kept in cache (FEATURE_CACHE by default; None for no caching), and cached windows are returned read-only.
+
+	::
+
+		reader = FeatureReader(data_path, (17, 3, 16))
+		hists = reader.window(onset_frame, dur_frames, actual_fps=ap['afps'])
+		middle_band = reader.window(onset_frame, dur_frames, actual_fps=ap['afps'], units=range(5, 13))
+
+	"""
+	def __init__(self, data_path, row_shape, dtype='float32', cache=FEATURE_CACHE, units=None):
+		self.data_path = data_path
+		# the file the rows are read from: data_path, or its preview until there is a full analysis (see feature_file_path)
+		self.path = data_path
+		self.row_shape = tuple(row_shape)
+		self.dtype = np.dtype(dtype)
+		self.units = units if units is not None else self.row_shape[0]
+		self.unit_shape = unit_shape(self.row_shape, self.units)
+		self.row_bytes = int(np.prod(self.row_shape)) * self.dtype.itemsize
+		self.data_offset = 0
+		self.quantization = None
+		self.region_rows = None
+		self.preview_frames = None
+		self.stride = None
+		self.coverage = None
+		self.cache = cache
+		self._layout_stamp = None
+
+	def _layout(self):
+		"""
+		Read the layout (data offset, row shape, dtype, sections) and coverage of the data file, again only if the file (or its coverage sidecar) has changed, or a full analysis has replaced its preview. Returns the number of rows.
+		"""
+		path = feature_file_path(self.data_path)
+		st = os.stat(path)
+		try:
+			# the sidecar is replaced (renamed over) whenever it is written: a new inode every time
+			cst = os.stat(path + COVERAGE_EXTENSION)
+			coverage_stamp = (cst.st_mtime, cst.st_ino)
+		except OSError:
+			coverage_stamp = None
+		stamp = (path, st.st_mtime, st.st_size, coverage_stamp)
+		if stamp != self._layout_stamp:
+			self.path = path
+			header = read_feature_header(self.path)
+			self.region_rows = None
+			if header is not None and header.get('layout') == 'region':
+				# region-major: the sections are read through RegionRows
+				self.region_rows = RegionRows(self.path, header)
+				self.units = header['units']
+				self.data_offset, shape, self.dtype = header['data_offset'], tuple(header['shape']), np.dtype(str(header['dtype']))
+				self._sections = dict([(unit, (section, position)) for section, units in enumerate(header['sections']) for position, unit in enumerate(units)])
+			else:
+				self.data_offset, shape, self.dtype = feature_file_layout(self.path, self.row_shape, self.dtype)
+			self.quantization = header.get('quantization') if header is not None else None
+			self.preview_frames = header.get('preview') if header is not None else None
+			self.stride = header.get('stride') if header is not None else None
+			# a data file that is being analyzed progressively: the rows that are not covered yet are interpolated
+			self.coverage = read_feature_coverage(self.path) if coverage_stamp is not None else None
+			if self.coverage is not None and (len(self.coverage) != shape[0] or self.coverage.all()):
+				self.coverage = None
+			self.row_shape = shape[1:]
+			self.unit_shape = unit_shape(self.row_shape, self.units)
+			self.row_bytes = int(np.prod(self.row_shape)) * self.dtype.itemsize
+			self._num_rows = shape[0]
+			self._layout_stamp = stamp
+		return self._num_rows
+
+	def num_rows(self):
+		"""
+		Number of rows in the data file.
+		"""
+		return self._layout()
+
+	def rows(self, start, stop):
+		"""
+		Read-only memmap of rows start up to (not including) stop; only that byte range of the file is mapped. (For region-major data files, the rows are put together from the sections: a copy.)
+		"""
+		return self._rows(start, stop).reshape(((-1,) + self.row_shape))
+
+	def _rows(self, start, stop, units=None, step=1):
+		"""
+		Rows start, start+step, ... (up to stop) of the units (all of them, in order, if None), as (rows, units) + unit_shape. Units that are stored next to each other are returned as a memmap of only those bytes; other selections are gathered (copied) from the rows that are returned only.
+		"""
+		stop = min(stop, self.num_rows())
+		all_units = units is None or list(units) == range(self.units)
+		count = self.units if all_units else len(units)
+		if stop <= start:
+			return np.empty(((0, count) + self.unit_shape), dtype=self.dtype)
+		if self.region_rows is None:
+			data = np.memmap(self.path, dtype=self.dtype, mode='r', offset=(self.data_offset + (start * self.row_bytes)), shape=(((stop - start), self.units) + self.unit_shape))[::step]
+			if all_units:
+				return data
+			units = list(units)
+			if units == range(units[0], (units[-1] + 1)):
+				return data[:, units[0]:(units[-1] + 1)]
+			return data[:, units]
+		# region-major: read each run of units that are stored next to each other in one section
+		parts = []
+		for section, first, last in self._runs(range(self.units) if all_units else units):
+			parts.append(self.region_rows.section_rows(section, start, stop)[::step, first:(last + 1)])
+		return parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+
+	def _runs(self, units):
+		"""
+		Split units into runs that are stored next to each other: (section, first position, last position) for each run.
+		"""
+		runs = []
+		for unit in units:
+			section, position = self._sections[unit]
+			if len(runs) > 0 and runs[-1][0] == section and runs[-1][2] == (position - 1):
+				runs[-1][2] = position
+			else:
+				runs.append([section, position, position])
+		return runs
+
+	def window(self, onset, count, actual_fps=24.0, step=1, compact=False, units=None):
+		"""
+		Return rows onset, onset+step, ... (up to onset+count) of the data resampled from actual_fps to 24 fps, as a float32 array (read-only if it is kept in cache); the same rows as window(onset, count, actual_fps)[::step]. The window is cut short at the end of the data. compact=True returns the rows in the data file's dtype instead of float32. With units (a list of unit numbers), only those units of the rows are read and returned, in that order: (rows, units) + unit shape.
+		"""
+		onset = max(0, int(onset))
+		count = int(count)
+		step = max(1, int(step))
+		units = tuple([int(unit) for unit in units]) if units is not None else None
+		if self.cache is None:
+			return self._compact_window(onset, count, actual_fps, step, compact, units)
+		self._layout()
+		key = (self.data_path, self._layout_stamp, self.dtype.str, self.row_shape, onset, count, step, float(actual_fps), bool(compact), units)
+		window = self.cache.get(key)
+		if window is None:
+			window = self.cache.put(key, self._compact_window(onset, count, actual_fps, step, compact, units))
+		return window
+
+	def _compact_window(self, onset, count, actual_fps, step, compact, units):
+		self._layout()
+		if self.preview_frames:
+			# the rows of a preview are preview_frames movie frames apart, not stride
+			actual_fps = (actual_fps * (self.stride or 1)) / float(self.preview_frames)
+		if not compact or self.dtype == np.float32:
+			window = self._window(onset, count, actual_fps, step, units)
+		elif (actual_fps == 24.0 or self.num_rows() == 0) and self.coverage is None:
+			window = np.array(self._rows(onset, (onset + count), units, step))
+		else:
+			window = encode_rows(self._window(onset, count, actual_fps, step, units), self.dtype, self.quantization)
+		if units is None:
+			return window.reshape(((-1,) + self.row_shape))
+		return window
+
+	def _window(self, onset, count, actual_fps, step, units):
+		num_rows = self.num_rows()
+		if actual_fps == 24.0 or num_rows == 0:
+			if self.coverage is not None:
+				return self._covered_rows(onset, (onset + count), units)[::step]
+			# strided view: only the rows that are returned are read
+			return decode_rows(np.array(self._rows(onset, (onset + count), units, step)), self.quantization)
+
+		# same sampling points as ActionData.interpolate_time: linspace(0, num_rows-1, num_rows * 24/afps), but only the ones in the window
+		num_resampled = int(num_rows * (24.0 / actual_fps))
+		stop = min((onset + count), num_resampled)
+		if stop <= onset:
+			return np.empty(((0, (self.units if units is None else len(units))) + self.unit_shape), dtype=np.float32)
+		spacing = (num_rows - 1) / float(num_resampled - 1) if num_resampled > 1 else 0.0
+		indices = np.arange(onset, stop, step)
+		xx = indices * spacing
+		xx[indices == (num_resampled - 1)] = num_rows - 1 # linspace ends exactly on the last row
+		lo = np.minimum(np.floor(xx).astype(np.int64), (num_rows - 1))
+		hi = np.minimum((lo + 1), (num_rows - 1))
+
+		# map only the rows under the window (plus the interpolation neighbors), and read only the ones that are needed
+		first = int(lo[0])
+		if self.coverage is not None:
+			data = self._covered_rows(first, (int(hi[-1]) + 1), units)
+			lo_rows, hi_rows = data[lo - first], data[hi - first]
+		else:
+			data = self._rows(first, (int(hi[-1]) + 1), units)
+			lo_rows = decode_rows(data[lo - first], self.quantization)
+			hi_rows = decode_rows(data[hi - first], self.quantization)
+		weights = (xx - lo).astype(np.float32).reshape(((-1,) + ((1,) * (data.ndim - 1))))
+		return lo_rows + ((hi_rows - lo_rows) * weights)
+
+	def _covered_rows(self, start, stop, units):
+		"""
+		Rows start up to stop (float32) of a data file that is being analyzed progressively: the rows that are not covered yet are interpolated linearly between the nearest covered rows on either side (or are the first or last covered row, past either end of them).
+		"""
+		stop = min(stop, self.num_rows())
+		covered = np.flatnonzero(self.coverage)
+		if stop <= start or len(covered) == 0:
+			# nothing is covered yet: the rows read as 0.0, like the rows of a data file that have not been analyzed
+			return np.zeros(((max(0, (stop - start)), (self.units if units is None else len(units))) + self.unit_shape), dtype=np.float32)
+		rows = np.arange(start, stop)
+		pos = np.searchsorted(covered, rows)
+		lo = covered[np.maximum((pos - 1), 0)]
+		hi = covered[np.minimum(pos, (len(covered) - 1))]
+		exact = self.coverage[rows]
+		lo[exact] = hi[exact] = rows[exact]
+		# before the first covered row and after the last one, lo and hi are both that row
+		# read only the covered rows that the window needs
+		first = int(lo.min())
+		data = self._rows(first, (int(hi.max()) + 1), units)
+		lo_rows = decode_rows(data[lo - first], self.quantization)
+		hi_rows = decode_rows(data[hi - first], self.quantization)
+		span = np.maximum((hi - lo), 1)
+		weights = ((rows - lo) / span.astype(np.float64)).astype(np.float32).reshape(((-1,) + ((1,) * (data.ndim - 1))))
+		return lo_rows + ((hi_rows - lo_rows) * weights)
@@ -0,0 +1,202 @@
+# featurewriter.py - buffered write-back of analysis frames to the memory-mapped data files
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+FeatureWriter stands in for the numpy memmap that the feature extractors write their analysis frames into. Rows are collected in a preallocated block in RAM and written to the data file in bulk, once every flush_interval rows, instead of flushing (msync-ing) the whole mapping after every analysis frame. On network-mounted storage that per-frame flush dominates the analysis time.
+
+The buffered rows are written out when the writer is closed, and also when the process receives SIGINT (ctrl-c) or SIGTERM, so a partial analysis is always a valid prefix of the data file. A single handler serves all of the writers that are open in the process (several of them, in the pipeline module); it is installed when the first one is opened, and the previous handlers are put back when the last one is closed. Every write drops the data file's windows from the feature cache (see the featurereader module).
+
+.. code-block:: python
+
+	fp = FeatureWriter('/Users/me/Movies/action/Psycho/Psycho.phasecorr', (172800, 65, 2), flush_interval=256)
+	for i in range(172800):
+		fp[i] = analyze(i)
+	fp.close()
+	print fp.stats()
+	>>> {'rows': 172800, 'flushes': 675}
+
+Rows are indexed like the memmap itself: fp[i] = row and fp[i][j] (read) both work. To update part of a row in place, use fp.row(i), which returns a writable view of the buffered row.
+
+A new data file (mode='w+') gets a header with its shape, dtype and the analysis parameters (see the featurefile module); mode='r+' opens an existing data file, with or without a header, and fills in its rows.
+
+The rows are stored as dtype: float32, or one of the compact dtypes of the featurefile module (float16, uint16, uint8; the integer ones store value_range). The extractors always write and read float32 rows: the block in RAM holds float32 rows, and they are converted to the stored dtype when they are written to the file (and back when they are read from it).
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os, signal
+import numpy as np
+from featurereader import FEATURE_CACHE
+from featurefile import *
+
+DEFAULT_FLUSH_INTERVAL = 256 # analysis frames (rows) buffered between writes
+
+
+class FeatureWriter:
+	"""
+	Buffered writer over a memmap of a data file. Writes go to a block of flush_interval rows in RAM; the block is written to the file (and flushed) when a row outside of it is requested, on flush(), on close(), and on SIGINT/SIGTERM.
+
+	::
+
+		fp = FeatureWriter(data_path, (dur_strides, 17, 3, 16), mode='w+', flush_interval=256, dtype=ap['storage_dtype'], value_range=ap['storage_range'], analysis_params=ap)
+		fp[curr_stride_frame] = hists
+		fp.close()
+
+	"""
+	def __init__(self, data_path, shape, mode='w+', flush_interval=DEFAULT_FLUSH_INTERVAL, dtype='float32', checkpoint=None, analysis_params=None, value_range=None):
+		self.data_path = data_path
+		self.checkpoint = checkpoint
+		self.shape = tuple(shape)
+		self.flush_interval = max(1, int(flush_interval))
+		if mode == 'w+':
+			self.fp = create_feature_file(data_path, self.shape, dtype, analysis_params, value_range)
+			self.quantization = quantization_for(dtype, value_range)
+		else:
+			# an existing data file is stored the way its header says (raw data files: as dtype)
+			self.fp = load_feature_file(data_path, self.shape[1:], mode, dtype, rows=self.shape[0])
+			if self.fp.shape != self.shape:
+				raise IOError("%s holds rows of %s, not %s" % (data_path, self.fp.shape, self.shape))
+			self.quantization = feature_file_quantization(data_path)
+		FEATURE_CACHE.discard(data_path)
+		self.block = np.zeros(((self.flush_interval,) + self.shape[1:]), dtype=np.float32)
+		# the block holds rows block_start .. block_start + flush_interval; the first block_rows of them have been written to
+		self.block_start = None
+		self.block_rows = 0
+		self.rows = 0
+		self.flushes = 0
+		_register_writer(self)
+
+	def _in_block(self, idx):
+		return (self.block_start is not None) and (0 <= (idx - self.block_start) < self.flush_interval) and (idx < self.shape[0])
+
+	def row(self, idx):
+		"""
+		Return a writable view of row idx. If idx is outside the current block, the block is written out first and a new block starts at idx.
+		"""
+		if idx < 0 or idx >= self.shape[0]:
+			raise IndexError('row %i is out of bounds for a data file with %i rows' % (idx, self.shape[0]))
+		if not self._in_block(idx):
+			self.flush()
+			nrows = min(self.flush_interval, (self.shape[0] - idx))
+			# start from what is on disc, so that rows we never touch are not overwritten with zeros
+			self.block[:nrows] = decode_rows(self.fp[idx:(idx+nrows)], self.quantization)
+			self.block_start = idx
+			self.block_rows = 0
+		pos = idx - self.block_start
+		if (pos + 1) > self.block_rows:
+			self.rows += (pos + 1) - self.block_rows
+			self.block_rows = pos + 1
+		return self.block[pos]
+
+	def __setitem__(self, idx, value):
+		if isinstance(idx, tuple):
+			idx, rest = idx[0], idx[1:]
+		else:
+			rest = Ellipsis
+		if isinstance(idx, (int, long, np.integer)):
+			self.row(idx)[rest] = value
+		else:
+			# slices and fancy indexing go straight to the file
+			self.flush()
+			self.block_start = None
+			self.fp[idx if rest is Ellipsis else ((idx,) + rest)] = encode_rows(value, self.fp.dtype, self.quantization)
+			FEATURE_CACHE.discard(self.data_path)
+
+	def __getitem__(self, idx):
+		if isinstance(idx, tuple):
+			idx, rest = idx[0], idx[1:]
+		else:
+			rest = Ellipsis
+		if isinstance(idx, (int, long, np.integer)) and self._in_block(idx):
+			return self.block[idx - self.block_start][rest]
+		return decode_rows(self.fp[idx if rest is Ellipsis else ((idx,) + rest)], self.quantization)
+
+	def __len__(self):
+		return self.shape[0]
+
+	def flush(self):
+		"""
+		Write the buffered rows to the data file and flush it, then record the progress in the checkpoint (see the checkpoint module), if there is one. Cached windows of the data file are dropped.
+		"""
+		if self.fp is None or self.block_rows == 0:
+			return
+		self.fp[self.block_start:(self.block_start + self.block_rows)] = encode_rows(self.block[:self.block_rows], self.fp.dtype, self.quantization)
+		self.fp.flush()
+		self.flushes += 1
+		FEATURE_CACHE.discard(self.data_path)
+		if self.checkpoint is not None:
+			self.checkpoint.rows_done(self.block_start + self.block_rows)
+		self.block_rows = 0
+
+	def close(self, complete=False):
+		"""
+		Write out the remaining rows and close the data file. Also puts back the previous SIGINT/SIGTERM handlers. complete=True marks the analysis range as finished in the checkpoint, if there is one.
+		"""
+		self.flush()
+		if complete and self.checkpoint is not None:
+			self.checkpoint.finish()
+		_unregister_writer(self)
+		self.fp = None
+
+	def stats(self):
+		"""
+		Return the number of rows written and the number of bulk writes (flushes) as a dict.
+		"""
+		return {'rows': self.rows, 'flushes': self.flushes}
+
+
+# the writers that are open in this process; one SIGINT/SIGTERM handler flushes all of them
+_open_writers = []
+_previous_handlers = {}
+
+def _register_writer(writer):
+	_open_writers.append(writer)
+	if len(_previous_handlers) == 0:
+		for signum in (signal.SIGINT, signal.SIGTERM):
+			try:
+				_previous_handlers[signum] = signal.signal(signum, _handle_signal)
+			except ValueError:
+				# signal handlers can only be set from the main thread
+				pass
+
+def _unregister_writer(writer):
+	if writer in _open_writers:
+		_open_writers.remove(writer)
+	if len(_open_writers) == 0:
+		_restore_signal_handlers()
+
+def _restore_signal_handlers():
+	"""
+	Put back the handlers that were there before the first writer was opened, unless someone else has replaced ours since.
+	"""
+	for signum, handler in _previous_handlers.items():
+		try:
+			if signal.getsignal(signum) == _handle_signal:
+				signal.signal(signum, handler)
+		except ValueError:
+			pass
+	_previous_handlers.clear()
+
+def _handle_signal(signum, frame):
+	"""
+	Flush the open writers, then let the previous handler (KeyboardInterrupt for SIGINT, termination for SIGTERM) do its thing.
+	"""
+	previous = _previous_handlers.get(signum, signal.SIG_DFL)
+	for writer in list(_open_writers):
+		writer.flush()
+	_restore_signal_handlers()
+	if callable(previous) and previous != _handle_signal:
+		previous(signum, frame)
+	elif previous != signal.SIG_IGN:
+		# make sure that the default action is the one that runs, not this handler again
+		signal.signal(signum, signal.SIG_DFL)
+		os.kill(os.getpid(), signum)
@@ -0,0 +1,287 @@
+# framesource.py - sequential, stride-aware frame access for the feature extractors
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+FrameSource wraps an OpenCV VideoCapture and hands out frames by index. All of the ACTION feature extractors read their movies through it.
+
+Setting the capture position (CV_CAP_PROP_POS_FRAMES) makes the decoder jump back to the nearest keyframe and decode forward again. With long-GOP (H.264) sources, doing that once per analysis frame is much more expensive than simply walking the file. FrameSource therefore walks forward with grab() and only calls retrieve() for the frames that are actually requested. It only seeks when asked to go backwards, or when the forward gap is larger than seek_threshold frames.
+
+.. code-block:: python
+
+	fsrc = FrameSource('/Users/me/Movies/action/Psycho/Psycho.mov', seek_threshold=250)
+	for idx in range(0, 2400, 6):
+		frame = fsrc.read_frame(idx)
+	print fsrc.stats()
+	>>> {'decoded': 400, 'skipped': 1995, 'seeks': 0}
+
+Counters:
+
++---------+--------------------------------------------------------------+
+| decoded | frames grabbed and retrieved (returned to the caller)        |
++---------+--------------------------------------------------------------+
+| skipped | frames grabbed to move forward, but never retrieved          |
++---------+--------------------------------------------------------------+
+| seeks   | number of times the capture position was set explicitly      |
++---------+--------------------------------------------------------------+
+
+PrefetchFrameSource runs a FrameSource on a separate thread, so that decoding overlaps the analysis of earlier frames (OpenCV releases the GIL while decoding). Decoded frames go into a ring of depth preallocated frame buffers; the decoder thread blocks when all of them are waiting to be analyzed, and the analysis waits when none of them are ready. The extractors use it for analysis and playback, with 'prefetch_depth' (default 8) buffers; 0 turns prefetching off.
+
+.. code-block:: python
+
+	fsrc = PrefetchFrameSource(FrameSource(movie_path), depth=8)
+	for idx, frame in fsrc.frames(0, 2400, 6):
+		analyze(frame)
+	print fsrc.stats()
+	>>> {'decoded': 400, 'skipped': 1995, 'seeks': 0, 'depth': 8, 'waited': 0.41, 'blocked': 12.6}
+
++---------+--------------------------------------------------------------+
+| waited  | seconds the analysis waited for a decoded frame              |
++---------+--------------------------------------------------------------+
+| blocked | seconds the decoder waited for a free frame buffer           |
++---------+--------------------------------------------------------------+
+
+A frame handed out by PrefetchFrameSource is only valid until the next frame is requested: its buffer then goes back to the decoder. Copy anything that has to be kept longer.
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+try:
+	import cv2
+	import cv2.cv as cv
+	HAVE_CV = True
+except ImportError:
+	HAVE_CV = False
+
+import time, threading, Queue
+import numpy as np
+
+DEFAULT_SEEK_THRESHOLD = 250 # frames; longer forward gaps are seeked instead of grabbed
+DEFAULT_PREFETCH_DEPTH = 8 # decoded frames buffered ahead of the analysis
+
+
+class FrameSource:
+	"""
+	Sequential frame reader over a VideoCapture. Grab forward over frames that are not needed; seek only for backward jumps or forward gaps larger than seek_threshold.
+
+	::
+
+		fsrc = FrameSource(movie_path, seek_threshold=250)
+		frame = fsrc.read_frame(600)	# frame 600 (or None at the end of the movie)
+		frame = fsrc.read()			# frame 601
+
+	"""
+	def __init__(self, movie_path, seek_threshold=DEFAULT_SEEK_THRESHOLD):
+		self.movie_path = movie_path
+		self.seek_threshold = seek_threshold
+		self.capture = cv2.VideoCapture(movie_path)
+		# index of the frame that the next grab() will return
+		self.position = 0
+		self.decoded = 0
+		self.skipped = 0
+		self.seeks = 0
+
+	def get(self, prop):
+		"""
+		Pass-through to VideoCapture.get (frame size, frame count, fps, etc.).
+		"""
+		return self.capture.get(prop)
+
+	def frame_size(self):
+		"""
+		Return (width, height) of the movie's frames.
+		"""
+		return (int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH)), int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT)))
+
+	def frame_count(self):
+		return int(self.capture.get(cv.CV_CAP_PROP_FRAME_COUNT))
+
+	def seek(self, frame_idx):
+		"""
+		Explicitly set the capture position. Usually not needed: read_frame decides when a seek is worth it.
+		"""
+		self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, frame_idx)
+		self.position = frame_idx
+		self.seeks += 1
+
+	def skip_to(self, frame_idx):
+		"""
+		Move the capture position to frame_idx without retrieving anything. Returns False if the movie ended first.
+		"""
+		gap = frame_idx - self.position
+		if gap < 0 or gap > self.seek_threshold:
+			self.seek(frame_idx)
+			return True
+		while self.position < frame_idx:
+			if not self.capture.grab():
+				return False
+			self.position += 1
+			self.skipped += 1
+		return True
+
+	def read_frame(self, frame_idx, out=None):
+		"""
+		Return the frame at frame_idx, or None if it cannot be decoded (end of movie). If out is given, the frame is decoded into it when it has the right size (see read).
+		"""
+		if not self.skip_to(frame_idx):
+			return None
+		return self.read(out)
+
+	def read(self, out=None):
+		"""
+		Return the next frame in sequence, or None at the end of the movie. If out is an array of the frame's size and type, the frame is decoded into it (and out is returned) instead of into a new array.
+		"""
+		if not self.capture.grab():
+			return None
+		if out is None:
+			ret, frame = self.capture.retrieve()
+		else:
+			ret, frame = self.capture.retrieve(out)
+		self.position += 1
+		if not ret:
+			return None
+		self.decoded += 1
+		return frame
+
+	def frames(self, start_frame, end_frame, step=1):
+		"""
+		Generator over (frame_idx, frame) for frame_idx in range(start_frame, end_frame, step). Stops early at the end of the movie.
+		"""
+		for frame_idx in range(start_frame, end_frame, step):
+			frame = self.read_frame(frame_idx)
+			if frame is None:
+				return
+			yield frame_idx, frame
+
+	def stats(self):
+		"""
+		Return the decoded/skipped/seek counters as a dict.
+		"""
+		return {'decoded': self.decoded, 'skipped': self.skipped, 'seeks': self.seeks}
+
+	def release(self):
+		self.capture.release()
+
+
+class BlankFrameSource:
+	"""
+	Stand-in for a FrameSource when there is no movie file: every frame is black. Used to play back analysis data on its own.
+	"""
+	def __init__(self, frame_width, frame_height):
+		self.frame_size = (frame_width, frame_height)
+		self.decoded = 0
+
+	def frames(self, start_frame, end_frame, step=1):
+		frame = np.zeros((self.frame_size[1], self.frame_size[0], 3), np.uint8)
+		for frame_idx in range(start_frame, end_frame, step):
+			frame[:] = 0
+			self.decoded += 1
+			yield frame_idx, frame
+
+	def stats(self):
+		return {'decoded': self.decoded, 'skipped': 0, 'seeks': 0}
+
+	def release(self):
+		pass
+
+
+class PrefetchFrameSource:
+	"""
+	Decode ahead on a producer thread into a ring of depth frame buffers. Has the same frames/stats/release interface as FrameSource (and passes capture, get, frame_size and frame_count through to it). With depth=0, frames are decoded on the calling thread.
+
+	::
+
+		fsrc = PrefetchFrameSource(FrameSource(movie_path, seek_threshold=250), depth=8)
+		for frame_idx, frame in fsrc.frames(0, 2400):
+			...
+
+	"""
+	def __init__(self, frame_source, depth=DEFAULT_PREFETCH_DEPTH):
+		self.frame_source = frame_source
+		self.capture = frame_source.capture
+		self.depth = max(0, int(depth))
+		self.waited = 0.0
+		self.blocked = 0.0
+
+	def get(self, prop):
+		return self.frame_source.get(prop)
+
+	def frame_size(self):
+		return self.frame_source.frame_size()
+
+	def frame_count(self):
+		return self.frame_source.frame_count()
+
+	def frames(self, start_frame, end_frame, step=1):
+		"""
+		Generator over (frame_idx, frame) for frame_idx in range(start_frame, end_frame, step), decoded ahead on a separate thread. Stops early at the end of the movie. Each frame is only valid until the next one is requested.
+		"""
+		if self.depth == 0:
+			for frame_idx, frame in self.frame_source.frames(start_frame, end_frame, step):
+				yield frame_idx, frame
+			return
+		
+		slots = [None] * self.depth
+		free = Queue.Queue()
+		ready = Queue.Queue()
+		for slot in range(self.depth):
+			free.put(slot)
+		state = {'stop': False, 'error': None}
+		
+		def produce():
+			try:
+				for frame_idx in range(start_frame, end_frame, step):
+					t = time.time()
+					slot = free.get()
+					self.blocked += time.time() - t
+					if state['stop']:
+						return
+					frame = self.frame_source.read_frame(frame_idx, slots[slot])
+					if frame is None:
+						break
+					# keep whatever array the frame was decoded into, so that the buffer is reused next time around
+					slots[slot] = frame
+					ready.put((frame_idx, slot))
+			except Exception as e:
+				state['error'] = e
+			ready.put(None)
+		
+		producer = threading.Thread(target=produce, name='PrefetchFrameSource')
+		producer.daemon = True
+		producer.start()
+		try:
+			while True:
+				t = time.time()
+				item = ready.get()
+				self.waited += time.time() - t
+				if item is None:
+					break
+				frame_idx, slot = item
+				yield frame_idx, slots[slot]
+				# the consumer is done with the frame: hand its buffer back to the producer
+				free.put(slot)
+		finally:
+			state['stop'] = True
+			free.put(0) # wake the producer if it is waiting for a buffer
+			producer.join()
+		if state['error'] is not None:
+			raise state['error']
+
+	def stats(self):
+		"""
+		Return the counters of the FrameSource, plus the ring depth and the waited/blocked times (seconds), as a dict.
+		"""
+		stats = self.frame_source.stats()
+		stats.update({'depth': self.depth, 'waited': round(self.waited, 3), 'blocked': round(self.blocked, 3)})
+		return stats
+
+	def release(self):
+		self.frame_source.release()
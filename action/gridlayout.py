@@ -0,0 +1,214 @@
+# gridlayout.py - row layouts of the feature extractors and region masks over their grids
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+Every feature extractor divides the frame into a grid of grid_divs_x by grid_divs_y cells, and writes a row per analysis frame with the values of each cell (and of the full frame). GridLayout describes such a row for any grid and bin configuration: the units of the row (one per grid cell, plus the full-frame units), their shape, and where the full-frame units are. The extractors build their data files, their analysis kernels and their accessors from it, so a coarse 2x2 grid for a quick sweep over a corpus, or a fine 16x16 grid for shot-level work, only takes different analysis parameters:
+
+.. code-block:: python
+
+	cfl = ColorFeaturesLAB('Psycho', grid_divs_x=2, grid_divs_y=2, data_extension='.color_lab_2x2')
+	cfl.analyze_movie()
+
++------------------+---------------------+-----------+------------------+------------------+
+| extractor        | full-frame units    | unit      | default row      | row (in general) |
++==================+=====================+===========+==================+==================+
+| ColorFeaturesLAB | 1 (first)           | (3, ldims)| (17, 3, 16)      | (cells + 1, 3,   |
+|                  |                     |           |                  | ldims)           |
++------------------+---------------------+-----------+------------------+------------------+
+| PhaseCorrelation | 1 (last)            | (2,)      | (65, 2)          | (cells + 1, 2)   |
++------------------+---------------------+-----------+------------------+------------------+
+| OpticalFlow      | 0                   | (theta_   | (512,)           | (cells *         |
+|                  |                     | divs,)    |                  | theta_divs,)     |
++------------------+---------------------+-----------+------------------+------------------+
+| OpticalFlowTVL1  | theta_divs / 2      | (2,)      | (144,)           | (theta_divs +    |
+|                  | (first)             |           |                  | (cells * 2),)    |
++------------------+---------------------+-----------+------------------+------------------+
+| MotionEnergy     | 1 (first)           | (3,)      | (65, 3)          | (cells + 1, 3)   |
++------------------+---------------------+-----------+------------------+------------------+
+
+Grid cells are numbered row by row, from the upper left (cell 0) to the lower right (cell cells - 1); unit u of a row holds cell u - cell_offset.
+
+Region masks
+============
+
+A region is a boolean mask over the grid (grid_divs_y rows by grid_divs_x columns). The named regions scale with the grid: 'grid' (every cell), 'band' (the middle half of the rows), 'center' (the middle half of the rows and of the columns) and 'plus' (the middle band and the middle half of the columns), which for the default 4x4 and 8x8 grids are the cells of the extractors' middle_band, center_quad and plus_band accessors. 'full' is the full frame. Masks are computed once per grid and kept (read-only) for the life of the process; the cells and units that they select are kept as index arrays, so selecting a region out of many rows is one fancy-indexing operation:
+
+.. code-block:: python
+
+	layout = GridLayout(8, 8, (8,), flat=True)	# OpticalFlow
+	print layout.mask('center').astype(int)
+	band = layout.select(rows, 'band')	# rows: [NUMBER OF FRAMES, 512] -> [NUMBER OF FRAMES, 32, 8]
+
+A custom region is any boolean array of the grid's shape:
+
+.. code-block:: python
+
+	mask = np.zeros((8, 8), dtype=bool)
+	mask[:, :4] = True	# the left half of the frame
+	X = oflow.region_opticalflow_features_for_segment(mask, Segment(0, 600))
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import threading
+import numpy as np
+from featurefile import band_sections
+
+REGIONS = ['full', 'grid', 'band', 'center', 'plus']
+
+# (region, grid_divs_x, grid_divs_y) -> read-only boolean mask; shared by all GridLayout objects of the process
+_MASKS = {}
+_MASKS_LOCK = threading.Lock()
+# constructor arguments -> GridLayout (see grid_layout)
+_LAYOUTS = {}
+
+
+def region_mask(region, grid_divs_x, grid_divs_y):
+	"""
+	Boolean mask (grid_divs_y rows by grid_divs_x columns) of the named region ('grid', 'band', 'center' or 'plus') of a grid. Computed once per grid; the mask is read-only.
+	"""
+	key = (region, grid_divs_x, grid_divs_y)
+	with _MASKS_LOCK:
+		mask = _MASKS.get(key)
+	if mask is not None:
+		return mask
+	rows = np.arange(grid_divs_y)
+	cols = np.arange(grid_divs_x)
+	middle_rows = ((rows >= (grid_divs_y / 4)) & (rows < (grid_divs_y - (grid_divs_y / 4))))[:,np.newaxis]
+	middle_cols = ((cols >= (grid_divs_x / 4)) & (cols < (grid_divs_x - (grid_divs_x / 4))))[np.newaxis,:]
+	if region == 'grid':
+		mask = np.ones((grid_divs_y, grid_divs_x), dtype=bool)
+	elif region == 'band':
+		mask = middle_rows & np.ones((1, grid_divs_x), dtype=bool)
+	elif region == 'center':
+		mask = middle_rows & middle_cols
+	elif region == 'plus':
+		mask = middle_rows | middle_cols
+	else:
+		raise ValueError("Unknown region: %s (use one of %s, or a boolean mask)" % (region, REGIONS[1:]))
+	mask.setflags(write=False)
+	with _MASKS_LOCK:
+		_MASKS[key] = mask
+	return mask
+
+
+def grid_layout(grid_divs_x, grid_divs_y, unit_shape, full_units=0, full_first=True, flat=False):
+	"""
+	The GridLayout of a configuration, made once per process (with its masks and index arrays) and then shared.
+	"""
+	key = (int(grid_divs_x), int(grid_divs_y), tuple(unit_shape), full_units, full_first, flat)
+	with _MASKS_LOCK:
+		layout = _LAYOUTS.get(key)
+	if layout is None:
+		layout = GridLayout(*key)
+		with _MASKS_LOCK:
+			layout = _LAYOUTS.setdefault(key, layout)
+	return layout
+
+
+class GridLayout:
+	"""
+	Layout of the rows of an extractor's data file: grid_divs_x by grid_divs_y grid cells of unit_shape values each, and full_units full-frame units of the same shape, stored before (full_first=True) or after the grid cells. flat rows are stored as one dimension (units * values), otherwise as (units,) + unit_shape.
+
+	::
+
+		layout = GridLayout(4, 4, (3, 16), full_units=1)	# ColorFeaturesLAB
+		print layout.row_shape, layout.units('center')
+		>>> (17, 3, 16) [ 6  7 10 11]
+
+	"""
+	def __init__(self, grid_divs_x, grid_divs_y, unit_shape, full_units=0, full_first=True, flat=False):
+		if grid_divs_x < 1 or grid_divs_y < 1:
+			raise ValueError("A grid needs at least one division along each axis (grid_divs_x=%s, grid_divs_y=%s)" % (grid_divs_x, grid_divs_y))
+		self.grid_divs_x = int(grid_divs_x)
+		self.grid_divs_y = int(grid_divs_y)
+		self.unit_shape = tuple(unit_shape)
+		self.cells = self.grid_divs_x * self.grid_divs_y
+		self.num_units = self.cells + full_units
+		self.cell_offset = full_units if full_first else 0
+		self.full_units = range(full_units) if full_first else range(self.cells, self.num_units)
+		self.unit_size = int(np.prod(self.unit_shape))
+		self.flat = flat
+		if flat:
+			self.row_shape = ((self.num_units * self.unit_size),)
+		else:
+			self.row_shape = (self.num_units,) + self.unit_shape
+		self._units = {}
+
+	def cell(self, row, col):
+		"""
+		Number of the grid cell at row row and column col.
+		"""
+		return (row * self.grid_divs_x) + col
+
+	def mask(self, region):
+		"""
+		Boolean mask (grid_divs_y by grid_divs_x) of a named region, or region itself if it is a mask of the grid's shape.
+		"""
+		if isinstance(region, basestring):
+			return region_mask(region, self.grid_divs_x, self.grid_divs_y)
+		mask = np.asarray(region, dtype=bool)
+		if mask.shape != (self.grid_divs_y, self.grid_divs_x):
+			raise ValueError("A region mask of a %i by %i grid must have shape %s, not %s" % (self.grid_divs_x, self.grid_divs_y, (self.grid_divs_y, self.grid_divs_x), mask.shape))
+		return mask
+
+	def units(self, region):
+		"""
+		Units (in the order they are stored in a row) of a region: 'full' (the full-frame units), a named region or a boolean mask of the grid. Index arrays of named regions are kept.
+		"""
+		if isinstance(region, basestring):
+			units = self._units.get(region)
+			if units is None:
+				if region == 'full':
+					units = np.array(self.full_units, dtype=np.intp)
+				else:
+					units = np.flatnonzero(self.mask(region)) + self.cell_offset
+				units.setflags(write=False)
+				self._units[region] = units
+			return units
+		return np.flatnonzero(self.mask(region)) + self.cell_offset
+
+	def cells_of(self, region):
+		"""
+		Grid cells (numbered row by row) of a named region or boolean mask.
+		"""
+		return np.flatnonzero(self.mask(region))
+
+	def size(self, region):
+		"""
+		Number of values in a row of region.
+		"""
+		return len(self.units(region)) * self.unit_size
+
+	def select(self, rows, region):
+		"""
+		The units of region out of an array of rows (of row_shape): [NUMBER OF ROWS, NUMBER OF UNITS] + unit_shape.
+		"""
+		rows = np.asarray(rows)
+		return rows.reshape(((len(rows), self.num_units) + self.unit_shape))[:,self.units(region)]
+
+	def sections(self):
+		"""
+		Sections of the region-major layout of the data file (see band_sections in the featurefile module).
+		"""
+		return band_sections(self.grid_divs_x, self.grid_divs_y, cell_offset=self.cell_offset, full_units=self.full_units)
+
+	def cell_map(self, height, width, cell_height, cell_width, outside=None):
+		"""
+		Grid cell of every pixel of the height by width upper left of a frame, for cells of cell_height by cell_width pixels laid out row by row from the upper left corner. Pixels outside of the grid get outside (default: cells, one past the last cell).
+		"""
+		if outside is None:
+			outside = self.cells
+		rows = np.arange(height) // max(cell_height, 1)
+		cols = np.arange(width) // max(cell_width, 1)
+		cell_map = (rows[:,np.newaxis] * self.grid_divs_x) + cols[np.newaxis,:]
+		return np.where(((rows < self.grid_divs_y)[:,np.newaxis] & (cols < self.grid_divs_x)[np.newaxis,:]), cell_map, outside).astype(np.intp)
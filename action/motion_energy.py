@@ -0,0 +1,800 @@
+# motion_energy.py - gridded frame-difference energy from video frames
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+Use the motion energy extractor class for quick, corpus-wide sweeps where the angle histograms of the optical flow extractors are more than is needed. The motion energy features class steps through movie frames, downscales them to grayscale and compares every analysis frame with the previous one. For the full frame and for each region of an even 8-by-8 non-overlapping grid (the first region at the upper left, the last at the lower right), it stores three values:
+
++--------------+--------------------------------------------------------------------------+
+| value        | explanation                                                              |
++==============+==========================================================================+
+| energy       | mean absolute difference of the grayscale pixels, in [0, 1]              |
++--------------+--------------------------------------------------------------------------+
+| dx           | horizontal shift of the intensity-weighted centroid, as a fraction of    |
+|              | the width of the cell (or frame)                                         |
++--------------+--------------------------------------------------------------------------+
+| dy           | vertical shift of the intensity-weighted centroid, as a fraction of the  |
+|              | height of the cell (or frame)                                            |
++--------------+--------------------------------------------------------------------------+
+
+Everything is computed with a few vectorized NumPy operations on the whole (downscaled) frame, so the analysis runs several hundred frames per second; decoding the movie is usually the slower part. These values are stored in a binary file using Numpy memory-mapped arrays.
+
+By default every movie frame is analyzed (stride 1) and compared with the frame just before it. With a larger stride only every stride-th frame is analyzed, and it is compared with the analysis frame before it, so the values measure the motion over stride frames; the frames in between are skipped, not averaged. The access functions return every access_stride-th row (6 by default, 4 rows per second of a 24 fps film), whatever the stride of the analysis.
+
+Creation and Parameters
+=======================
+
+Instantiate the MotionEnergy class, optionally with additional keyword arguments:
+
+.. code-block:: python
+
+	menergy = MotionEnergy (fileName, param1=value1, param2=value2, ...)
+
+The global default motionenergy_features-extractor parameters are defined in a parameter dictionary:
+
+.. code-block:: python
+
+    default_motionenergy_params = {
+		'action_dir' : '~/Movies/action', # default dir
+		ETC...
+	}
+
+The full list of settable parameters, with default values and explanations:
+
++------------------------+-----------------+----------------------------------------------------+
+| keyword                | default         | explanation                                        |
++========================+=================+====================================================+
+| action_dir             | ~/Movies/action | default dir                                        |
++------------------------+-----------------+----------------------------------------------------+
+| movie_extension        | .mov            |                                                    |
++------------------------+-----------------+----------------------------------------------------+
+| data_extension         | .motionenergy   | this is what will be output and expected for input |
++------------------------+-----------------+----------------------------------------------------+
+| mode                   | analyze         | 'playback' or 'analyze'                            |
++------------------------+-----------------+----------------------------------------------------+
+| fps                    | 24              | fps: frames per second                             |
++------------------------+-----------------+----------------------------------------------------+
+| offset                 | 0               | time offset in seconds                             |
++------------------------+-----------------+----------------------------------------------------+
+| duration               | -1              | time duration in seconds, -1 (default) maps to full|
+|                        |                 | duration of media                                  |
++------------------------+-----------------+----------------------------------------------------+
+| stride                 | 1               | number of video frames to that comprise one        |
+|                        |                 | analysis frame, skips stride - 1 frames; frames    |
+|                        |                 | are compared with the analysis frame before them   |
++------------------------+-----------------+----------------------------------------------------+
+| grid_divs_x            | 8               | number of divisions along x axis                   |
++------------------------+-----------------+----------------------------------------------------+
+| grid_divs_y            | 8               | number of divisions along y axis                   |
++------------------------+-----------------+----------------------------------------------------+
+| scale                  | 0.25            | size of the grayscale frames that are compared,    |
+|                        |                 | relative to the movie (pyramid downsampling)       |
++------------------------+-----------------+----------------------------------------------------+
+| verbose                | False           | useful for debugging                               |
++------------------------+-----------------+----------------------------------------------------+
+| display                | True            | launch display screen during analysis              |
++------------------------+-----------------+----------------------------------------------------+
+| seek_threshold         | 250             | forward jumps (in frames) longer than this seek;   |
+|                        |                 | shorter ones grab through without decoding output  |
++------------------------+-----------------+----------------------------------------------------+
+| flush_interval         | 256             | analysis frames buffered in RAM between bulk       |
+|                        |                 | writes to the data file                            |
++------------------------+-----------------+----------------------------------------------------+
+| prefetch_depth         | 8               | frames decoded ahead (on a separate thread) of the |
+|                        |                 | analysis; 0 decodes on the analysis thread         |
++------------------------+-----------------+----------------------------------------------------+
+| storage_dtype          | float32         | dtype of the rows in the data file: float32,       |
+|                        |                 | float16, uint16 or uint8 (see featurefile module)  |
++------------------------+-----------------+----------------------------------------------------+
+| storage_range          | [-0.5, 1.0]     | range of values that uint8/uint16 storage covers;  |
+|                        |                 | energies are in [0, 1], shifts in [-0.5, 0.5]      |
++------------------------+-----------------+----------------------------------------------------+
+| preview                | False           | analyze only one sample frame every                |
+|                        |                 | preview_interval seconds, into a low-rate data     |
+|                        |                 | file (see the preview module)                      |
++------------------------+-----------------+----------------------------------------------------+
+| preview_interval       | 10.0            | seconds between the sample frames of a preview     |
++------------------------+-----------------+----------------------------------------------------+
+| progressive            | False           | analyze coarse-to-fine: every progressive_step-th  |
+|                        |                 | row first, then the rows in between, with a        |
+|                        |                 | coverage sidecar (see the progressive module)      |
++------------------------+-----------------+----------------------------------------------------+
+| progressive_step       | 64              | rows between the samples of the first pass of a    |
+|                        |                 | progressive analysis (halved every pass)           |
++------------------------+-----------------+----------------------------------------------------+
+
+Parameter keywords can be passed explicitly as formal arguments or as a keyword argument parameter dict:, e.g.:
+
+.. code-block:: python
+
+   menergy = MotionEnergy(fileName, scale=0.5, verbose=True )
+   menergy = MotionEnergy(fileName, **{'scale':0.5, 'verbose':True} )
+
+Using MotionEnergy
+==================
+The functions of the MotionEnergy class define the various use cases or patterns.
+
+Analyze a full film:
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	menergy.analyze_movie() # Assumes that ~/Movies/action/Psycho.mov exists; returns otherwise
+
+To split the analysis of one film across several processes (each worker starts one stride before its own time range, so that the results at the range boundaries are the same as for a single process):
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	menergy.analyze_movie(workers=8)
+
+The downscaled grayscale frames are shared with the other extractors in a decode-once pipeline that analyze at the same scale (see the pipeline module):
+
+.. code-block:: python
+
+	analyze_all('Psycho', features=['color', 'motionenergy'])
+
+To screen your film as it is analyzed (a circle for the energy and a line for the centroid shift of every grid cell):
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	menergy.analyze_movie_with_display()
+
+To play back your analysis later:
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	menergy.playback_movie()
+
+To directly access your analysis data as a memory-mapped array:
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	segment_in_seconds = Segment(60, 600) # requesting segment from 1'00" to 10'00"
+	data = menergy._motionenergy_features_for_segment_from_onset_with_duration(segment_in_seconds.time_span.start_time, segment_in_seconds.time_span.duration)
+
+More commonly, the user should use the access functions that refer to the screen area from which he/she desires data:
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	fullseg = Segment(0, menergy.determine_movie_length()) # requesting entire film
+	data = menergy.middle_band_motionenergy_features_for_segment(fullseg)
+
+
+A Note on Paths
+===============
+
+This class (as well as all feature classes in ACTION) is set up for the following directory structure. You may place your action data directories anywhere, and there can be multiple directories/databases.
+
+/Users/me/Movies/action/NAME_OF_FILM/NAME_OF_FILM.mov
+/Users/me/Movies/action/NAME_OF_FILM/NAME_OF_FILM.wav
+/Users/me/Movies/action/NAME_OF_FILM/NAME_OF_FILM.motionenergy
+...etc...
+
+
+Advanced Access
+===============
+
+Every frame of the movie is analyzed unless a stride is given. The following analyzes 24 / 4 = 6 frames per second, each compared with the frame four frames before it:
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho', stride=4, data_extension='.motionenergy_4')
+	menergy.analyze_movie()
+
+To analyze part of a film (offset and duration are in seconds):
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	menergy.analyze_movie(offset=600, duration=120)
+
+To read every row of the analysis back, rather than every sixth:
+
+.. code-block:: python
+
+	menergy = MotionEnergy('Psycho')
+	data = menergy.middle_band_motionenergy_features_for_segment(Segment(60, 600), access_stride=1)
+
+Note that choosing 'stride' values that are not factors of 24 will result in analysis rates that do not fit neatly into one second periods.
+
+
+Class Module and Specific Functions
+===================================
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+
+import sys, time, os
+# import the necessary things for OpenCV
+try:
+	import cv2
+	import cv2.cv as cv
+	HAVE_CV = True
+except ImportError:
+	print 'WARNING: Access only, use of methods other than *_motionenergy_features_for_segment, etc. will cause errors! Install OpenCV to perform analysis and display movies/data.'
+	HAVE_CV = False
+import numpy as np
+from segment import *
+from framesource import *
+from parallel import *
+from featurewriter import *
+from featurereader import *
+from featurefile import *
+from gridlayout import *
+from moviemetadata import *
+from checkpoint import *
+from preview import *
+from progressive import *
+from engine import *
+from viewer import *
+
+
+class MotionEnergy:
+	"""
+	Frame-difference energy and centroid shift of frame and 8-by-8 grid of subframes.
+
+	::
+
+		action_dir = '~/Movies/action' by default, use an "action" directory in the Movies directory; pass a different directory if necessary.
+
+	If you want to run in verbose mode (to see some debug information on calculated frame offsets, analysis ranges, etc.) pass the verbose=True flag here.
+	"""
+	
+	# left behind when the object is sent to a worker process, which opens its own capture (see the parallel module)
+	_transient_state = ('capture', 'frame_source', 'conversions', 'X', 'playback_data', '_prev_small', '_prev_centroids')
+
+	def __init__(self, filename='Vertigo', arg=None, **analysis_params):
+		"""
+		"""
+		self._initialize(filename, analysis_params)
+
+	def _initialize(self, filename, analysis_params=None):
+		"""
+		"""
+		self._check_motionenergy_params(analysis_params)
+		ap = self.analysis_params
+
+		if filename is None:
+			print 'File name missing!'
+			return
+		else:
+			self.movie_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + ap['movie_extension']))
+			self.data_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + ap['data_extension']))
+			self.json_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + '.json'))
+			self.filename = filename
+			self.metadata = MovieMetadata(self.movie_path, self.json_path, filename)
+
+		# the metadata (afps, see _read_metadata) and the default features (X, see __getattr__) are read when they are first used
+		self._metadata_read = False
+
+	def _check_motionenergy_params(self, analysis_params=None):
+		"""
+		Simple mechanism to read in default parameters while substituting custom parameters.
+		"""
+		if analysis_params is not None:
+			self._metadata_read = True # the caller's parameters (afps included) replace the ones the metadata was read into
+		if analysis_params is not None and getattr(self, 'analysis_params', None) is not None:
+			# parameters passed to analyze_movie, playback_movie, etc. add to (rather than replace) the ones the object was made with;
+			# afps is not carried over (an accessor may have read it from the metadata): it is the caller's, or the default
+			analysis_params = dict([(k, v) for k, v in self.analysis_params.items() if k != 'afps'], **analysis_params)
+		self.analysis_params = analysis_params if analysis_params is not None else self.analysis_params
+		dmep = self.default_motionenergy_params()
+		for k in dmep.keys():
+			self.analysis_params[k] = self.analysis_params.get(k, dmep[k])
+		return self.analysis_params
+
+	@staticmethod
+	def default_motionenergy_params():
+		analysis_params = {
+			'action_dir' : os.path.expanduser('~/Movies/action/'),	# default dir
+			'movie_extension' : '.mov',
+			'data_extension' : '.motionenergy',
+			'mode' : 'analyze',			# 'playback' or 'analyze'
+			'fps' : 24,					# fps: frames per second
+			'afps' : 24,				# afps: frames per second for access or alignment
+			'offset' : 0,				# time offset in seconds
+			'duration' : -1,			# time duration in seconds, -1 (default) maps to full duration of media
+			'stride' : 1,				# number of frames to that comprise one analysis point, skips stride - 1 frames
+			'grid_divs_x' : 8,
+			'grid_divs_y' : 8,
+			'scale' : 0.25,				# size of the grayscale frames that are compared, relative to the movie (pyramid downsampling)
+			'verbose' : False,			# useful for debugging
+			'display' : True,			# Launch display screen
+			'seek_threshold' : 250,		# (frames) forward jumps longer than this seek, shorter ones grab through
+			'flush_interval' : 256,		# (analysis frames) rows buffered in RAM between writes to the data file
+			'prefetch_depth' : 8,		# (frames) decoded ahead of the analysis on a separate thread; 0 turns prefetching off
+			'storage_dtype' : 'float32',	# dtype of the rows in the data file: 'float32', 'float16', 'uint16' or 'uint8'
+			'storage_range' : [-0.5, 1.0],	# (values) range covered by uint8/uint16 storage; energies are in [0, 1], shifts in [-0.5, 0.5]
+			'preview' : False,			# analyze only one sample frame every preview_interval seconds (see the preview module)
+			'preview_interval' : 10.0,	# (seconds) between the sample frames of a preview
+			'progressive' : False,		# analyze coarse-to-fine, with a coverage sidecar (see the progressive module)
+			'progressive_step' : 64		# (rows) between the samples of the first pass of a progressive analysis, halved every pass
+		}
+		return analysis_params
+
+	def _read_json_value(self, key='fps'):
+		"""
+		Value of key in the movie's metadata, without opening the movie (see the moviemetadata module).
+		"""
+		return self.metadata.value(key)
+
+	def _read_metadata(self):
+		"""
+		Read the movie's frame rate (afps) from its metadata (see the moviemetadata module). Done once, the first time it is needed (not when the object is constructed).
+		"""
+		if self._metadata_read:
+			return
+		self._metadata_read = True
+		self.analysis_params['afps'] = self._read_json_value('fps')
+
+	def __getattr__(self, name):
+		"""
+		X (the default features for the whole film) is read the first time it is used.
+		"""
+		if name == 'X':
+			self.X = None
+			if os.path.exists(feature_file_path(self.data_path)):
+				self.default_motionenergy_features_for_segment()
+			return self.X
+		raise AttributeError(name)
+
+
+	def all_motionenergy_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
+		"""
+		This will be the interface for grabbing analysis data for segments of the whole film. Uses Segment objects from ACTION!
+		Takes a movie/file name and a Segment object that describes the desired timespan.
+		Returns a tuple of arrays: the full-frame (energy, dx, dy) followed by those of the 8 by 8 grid: ([NUMBER OF FRAMES, 3], [NUMBER OF FRAMES, NUMBER OF GRID-SQUARES (64) * 3 (= 192)])
+		::
+
+			menergy = MotionEnergy('Psycho')
+			seg = Segment(360, 720) # which is the same as seg = Segment(360, duration=360)
+			raw_data = menergy.all_motionenergy_features_for_segment(seg)
+			raw_data[0].shape
+			>>> (1440, 3)
+			raw_data[1].shape
+			>>> (1440, 192)
+
+		"""
+		layout = self._grid_layout()
+		res = self._motionenergy_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride)
+		return (res[0].reshape(-1, layout.size('full')), res[1].reshape(-1, layout.size('grid')))
+
+	def full_motionenergy_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
+		"""
+		Equivalent to:
+		::
+
+			all_motionenergy_features_for_segment(...)[0]
+
+		"""
+		layout = self._grid_layout()
+		self.X = self._motionenergy_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride, units=layout.units('full')).reshape(-1, layout.size('full'))
+		return self.X
+
+	def gridded_motionenergy_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the (energy, dx, dy) values of all 64 grid cells in the following order:
+		::
+
+			 0  1  2  3  4  5  6  7
+			 8  9 10 11 12 13 14 15
+			 16 .  .  .  .  .  . 23
+			 24 .
+			 .  .
+			 .  .
+			 .  .
+			 56 .  .  .  .  .  . 63
+
+		Equivalent to:
+		::
+
+			all_motionenergy_features_for_segment(...)[1]
+
+		"""
+		return self.region_motionenergy_features_for_segment('grid', segment, access_stride)
+
+	def center_quad_motionenergy_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the gridded values after applying the following filter:
+		::
+
+			 X  X ..  X  X
+			 X 18 .. 21  X
+			 X  . ..  .  X
+			 X  . ..  .  X
+			 X 42 .. 45  X
+			 X  X ..  X  X
+
+		"""
+		return self.region_motionenergy_features_for_segment('center', segment, access_stride)
+
+	def middle_band_motionenergy_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the gridded values after applying the following filter:
+		::
+
+			 X  X ..  X  X
+			16  . ..  . 23
+			 .  . ..  .  .
+			 .  . ..  .  .
+			40  . ..  . 47
+			 X  X ..  X  X
+
+		"""
+		return self.region_motionenergy_features_for_segment('band', segment, access_stride)
+
+	def plus_band_motionenergy_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the gridded values after applying the following filter:
+		::
+
+			 X  X  2 ..  5  X  X
+			 X  X 10 .. 13  X  X
+			16  . ..        . 23
+			 .  . ..        .  .
+			 .  . ..        .  .
+			40  . ..        . 47
+			X  X  50 .. 53  X  X
+			X  X  58 .. 61  X  X
+
+		"""
+		return self.region_motionenergy_features_for_segment('plus', segment, access_stride)
+
+	def region_motionenergy_features_for_segment(self, region='band', segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the gridded (energy, dx, dy) values of a region of the grid: 'grid', 'band', 'center' or 'plus' (which scale with grid_divs_x and grid_divs_y; see the gridlayout module), or a boolean mask of grid_divs_y by grid_divs_x cells. Only the values of the region are read. The gridded, middle band, center quad and plus band accessors call this.
+		::
+
+			mask = np.zeros((8, 8), dtype=bool)
+			mask[:,:4] = True # the left half of the frame
+			X = menergy.region_motionenergy_features_for_segment(mask, Segment(0, 600))
+
+		"""
+		layout = self._grid_layout()
+		self.X = self._motionenergy_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride, units=layout.units(region)).reshape(-1, layout.size(region))
+		return self.X
+
+	def default_motionenergy_features_for_segment(self, func='middle_band_motionenergy_features_for_segment', segment=Segment(0, -1), access_stride=6):
+		"""
+		DYNAMIC ACCESS FUNCTION
+		"""
+		return getattr(self,func)(segment, access_stride)
+
+	def transpose_data_file(self, layout='region'):
+		"""
+		Rewrite the data file region-major (layout='region'), so that the middle band, center quad and plus band accessors read only (and sequentially) the values they return, or back to frame-major (layout='frame'), which analyses can write to (resume). See the featurefile module.
+		::
+
+			menergy = MotionEnergy('Psycho')
+			menergy.transpose_data_file()
+			X = menergy.middle_band_motionenergy_features_for_segment(Segment(0, 600))
+
+		"""
+		grid = self._grid_layout()
+		if layout == 'region':
+			return transpose_feature_file(self.data_path, sections=grid.sections(), units=grid.num_units, row_shape=grid.row_shape)
+		return transpose_feature_file(self.data_path, row_shape=grid.row_shape)
+
+	def _grid_layout(self):
+		"""
+		Layout of the rows of the data file for the grid of the analysis parameters (see the gridlayout module): the (energy, dx, dy) of the full frame, then of each grid cell.
+		"""
+		ap = self.analysis_params
+		return grid_layout(ap['grid_divs_x'], ap['grid_divs_y'], (3,), full_units=1, full_first=True)
+
+
+	def _motionenergy_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=-1, access_stride=1, units=None):
+		"""
+		This will be the interface for grabbing analysis data based on onsets and durations, translating seconds into frames.
+		Takes an onset time in seconds and a duration in seconds. Only every access_stride-th (24 fps) frame is read and returned.
+		Returns a tuple of arrays, the full frame and the grid cells: ([NUMBER OF FRAMES, 1, 3], [NUMBER OF FRAMES, 64, 3]).
+		With units (0 the full frame, 1-64 the grid, for the default 8 by 8 grid; see _grid_layout), returns only those units: [NUMBER OF FRAMES, NUMBER OF UNITS, 3]. Only they are read; in a region-major data file (see transpose_data_file), the middle band is one sequential read.
+		"""
+		self._read_metadata()
+		ap = self.analysis_params
+		layout = self._grid_layout()
+		frames_per_astride = (24.0 / ap['stride']) # 24.0, not ap['fps']
+
+		onset_frame = int(onset_s * frames_per_astride)
+		if duration_s < 0:
+			dur_frames = int(self.determine_movie_length() * frames_per_astride * (ap['afps'] / ap['fps']))
+		else:
+			dur_frames = int(duration_s * frames_per_astride * (ap['afps'] / ap['fps']))
+
+		try:
+			# map and resample (to 24 fps) only the rows of the segment
+			mapped = FeatureReader(self.data_path, layout.row_shape).window(onset_frame, dur_frames, ap['afps'], access_stride, units=units)
+		except (IOError, OSError):
+			print "Attempting to access data file/mem map that does not exist!"
+			return None
+		if units is not None:
+			return mapped
+		return mapped[:,:layout.cell_offset,:], mapped[:,layout.cell_offset:,:]
+
+
+	def determine_movie_length(self, **kwargs):
+		self._read_metadata()
+		ap = self.analysis_params
+		strides_per_second = float(ap['fps'] / ap['stride'])
+
+		if os.path.exists(self.movie_path) and HAVE_CV:
+			# frame count from the metadata; the movie is not opened (see the moviemetadata module)
+			dur_total_seconds = self.metadata.frames() / ap['afps']
+		elif os.path.exists(self.data_path):
+			# row count from the data file's header (see the featurefile module)
+			dur_total_aframes = float(feature_file_rows(self.data_path, self._grid_layout().row_shape))
+			dur_total_seconds = (dur_total_aframes / strides_per_second) * (ap['fps'] / ap['afps'])
+		else:
+			dur_total_seconds = -1
+			print "Cannot determine movie duration. Both the movie and data files are missing!"
+		self.analysis_params['duration'] = dur_total_seconds
+		return dur_total_seconds
+
+	def analyze_movie(self, offset=0, duration=-1, workers=1, resume=False):
+		"""
+		Analyze the movie without displaying on screen. offset and duration are in seconds. Equivalent to:
+		::
+
+			_process_movie(mode='analyze', display=False, offset=offset, duration=duration)
+
+		With workers > 1, the movie is split into time ranges that are analyzed by that many processes. With resume=True, an interrupted analysis is picked up where it left off (see the checkpoint module).
+		"""
+		self._process_movie(mode='analyze', display=False, offset=offset, duration=duration, workers=workers, resume=resume)
+
+	def analyze_movie_with_display(self, offset=0, duration=-1):
+		"""
+		Analyze the movie; display on screen. offset and duration are in seconds. Equivalent to:
+		::
+
+			_process_movie(mode='analyze', display=True, offset=offset, duration=duration)
+		"""
+		self._process_movie(mode='analyze', display=True, offset=offset, duration=duration)
+
+	def playback_movie(self, offset=0, duration=-1):
+		"""
+		Play the movie alongside the analysis data visualization. offset and duration are in seconds. Equivalent to:
+		::
+
+			_process_movie(mode='playback', display=True, offset=offset, duration=duration)
+
+		"""
+		self._process_movie(mode='playback', display=True, offset=offset, duration=duration)
+
+
+	def _process_movie(self, workers=1, shard=None, engine=None, resume=False, **kwargs):
+		"""
+		Function for analyzing a full film or video. Function will exit if neither a movie path nor a data path are supplied. This function is not intended to be called directly. Normally, call one of the analyze_ functions instead, which will call this function.
+
+		workers > 1 hands the analysis to a pool of processes (see the parallel module); each of them calls this function again with shard=(start_frame, end_frame) and only fills in the rows for that range.
+
+		With engine=AnalysisEngine(...), nothing is analyzed here: the kernel and writer are added to that engine, which decodes the movie once for several extractors (see the pipeline module); engine.close() closes the writers.
+
+		The progress of an analysis is recorded in a sidecar file; resume=True picks up an interrupted analysis where it left off (see the checkpoint module).
+		"""
+		ap = self._check_motionenergy_params(kwargs)
+		verbose = ap['verbose']
+
+		if not HAVE_CV:
+			print "WARNING: You must install OpenCV in order to analyze or view!"
+			return
+
+		have_mov = os.path.exists(self.movie_path)
+		have_data = os.path.exists(self.data_path)
+
+		if (have_mov is False) and (have_data is False):
+			print "Both movie file and data file are missing! Please supply at least one."
+			return None
+
+		if have_mov:
+			self.frame_source = PrefetchFrameSource(FrameSource(self.movie_path, ap['seek_threshold']), ap['prefetch_depth'])
+			self.capture = self.frame_source.capture
+			frame_width = int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
+			frame_height = int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
+		else:
+			frame_width = 640
+			frame_height = int(frame_width / self._read_json_value('aspect'))
+		frame_size = (frame_width, frame_height)
+
+		fps = ap['fps']
+		if ap['duration'] == 0:
+			print "Duration cannot be 0."
+			return
+		dur_secs = ap['duration']
+		dur_total_secs = self.determine_movie_length()
+		if dur_secs < 0:
+			dur_secs = dur_total_secs
+		stride_frames = ap['stride']
+
+		# check offset first, then compress duration, if needed
+		offset_secs = min(max(ap['offset'], 0), dur_total_secs)
+		dur_secs = min(max(dur_secs, 0), (dur_total_secs - offset_secs))
+		ap['duration'] = dur_secs
+		offset_strides = int(offset_secs * (fps / stride_frames))
+		dur_strides = int(dur_secs * (fps / stride_frames))
+		offset_frames = offset_strides * stride_frames
+		dur_frames = dur_strides * stride_frames
+
+		if verbose:
+			print '%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%'
+			print 'FRAME SIZE: ', frame_size, ' | SCALED: ', scaled_size(frame_size, ap['scale'])
+			print "OFFSET (STRIDES): ", offset_strides
+			print 'DUR (STRIDES): ', dur_strides
+			print "stride_frames: ", stride_frames
+
+		# set up memmap and the engine's kernel: analysis writes rows, playback reads them back
+		row_shape = self._grid_layout().row_shape
+		if ap['mode'] == 'playback' and ap['display'] == True:
+			self.playback_data = load_feature_file(self.data_path, row_shape, rows=(offset_strides + dur_strides), decode=True)
+			fp, kernel = None, self._playback_kernel
+			if not have_mov:
+				self.frame_source = BlankFrameSource(frame_width, frame_height)
+		elif not have_mov:
+			print "ERROR: Must supply a movie for analysis!"
+			return
+		elif shard is not None:
+			# the file was preallocated by the parent process (or by the interrupted analysis); only write our own rows
+			checkpoint = Checkpoint(self.data_path, ap)
+			checkpoint.track(shard, self._row_frame)
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='r+', flush_interval=ap['flush_interval'], checkpoint=checkpoint)
+			kernel = self._analysis_kernel
+		elif ap['preview']:
+			# a low-rate preview: only the sample frames (and their warm-up) are decoded, and only their rows are written (see the preview module)
+			preview = Preview(self.data_path, row_shape, ap, offset_frames, (offset_frames + dur_frames), warmup=ap['stride'], reset=self._reset_state)
+			self.frame_source = preview.frame_source(self.frame_source)
+			fp, kernel = preview.writer, preview.kernel(self._analysis_kernel)
+		elif ap['progressive']:
+			# coarse-to-fine: the samples of every pass are analyzed like those of a preview, into the full data file (see the progressive module)
+			progressive = Progressive(self.data_path, row_shape, ap, dur_strides, self._row_frame, warmup=ap['stride'], reset=self._reset_state, resume=resume)
+			self.frame_source = progressive.frame_source(self.frame_source)
+			fp, kernel = progressive.writer, progressive.kernel(self._analysis_kernel)
+		else:
+			checkpoint = Checkpoint(self.data_path, ap)
+			if resume and checkpoint.can_resume():
+				# pick up the interrupted analysis where it left off
+				self.frame_source.release()
+				shards = checkpoint.remaining()
+				if shards:
+					process_shards(self, shards, workers)
+				elif shards is not None:
+					print 'Nothing to resume: the analysis is complete.'
+				return
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], checkpoint=checkpoint, analysis_params=ap)
+			kernel = self._analysis_kernel
+			if workers > 1 and ap['mode'] == 'analyze' and not ap['display']:
+				fp.close()
+				self.frame_source.release()
+				checkpoint.start(shard_ranges(offset_frames, (offset_frames + dur_frames), workers, stride_frames))
+				process_movie_in_parallel(self, workers, offset_frames, (offset_frames + dur_frames), align=stride_frames)
+				return
+			checkpoint.start([(offset_frames, (offset_frames + dur_frames))])
+			checkpoint.track((offset_frames, (offset_frames + dur_frames)), self._row_frame)
+
+		# every analysis frame is compared with the one a stride before it: the analysis starts one stride early (if it can),
+		# and writes nothing before its own range; shards do the same, so their first rows match those of a single process
+		first_frame, end_frame = offset_frames, (offset_frames + dur_frames)
+		if shard is not None:
+			first_frame, end_frame = shard
+		self.frame_idx = max(0, (first_frame - stride_frames)) if fp is not None else first_frame
+		self._row_offset = offset_strides if fp is not None else 0
+		self._prev_small, self._prev_centroids = None, None
+
+		if engine is not None:
+			# decode-once pipeline: the shared engine decodes the frames and runs the kernels of all of the extractors
+			self.frame_source.release()
+			self.conversions = engine.conversions
+			engine.add_kernel(kernel, fp, self.frame_idx, end_frame, step=stride_frames, first_frame=first_frame)
+			return
+
+		# headless loop; display and progress reports are optional subscribers
+		engine = AnalysisEngine(self.frame_source, kernel, fp)
+		self.conversions = engine.conversions
+		if ap['display']:
+			engine.subscribe(MotionEnergyViewer(self, frame_size))
+		if verbose:
+			engine.subscribe(ProgressReporter(self.frame_idx, end_frame))
+		complete = False
+		try:
+			complete = engine.run(self.frame_idx, end_frame, step=stride_frames, first_frame=first_frame)
+		finally:
+			if fp is not None:
+				fp.close(complete)
+			self.frame_source.release()
+
+		if fp is not None and verbose:
+			print 'FEATURE WRITER: ', fp.stats()
+		self.playback_data = None
+		self._prev_small, self._prev_centroids = None, None
+		if verbose:
+			print 'ENGINE: ', engine.stats()
+			print 'FRAME SOURCE: ', self.frame_source.stats()
+
+	def _reset_state(self):
+		"""
+		Forget the previous analysis frame and its centroids, as at the start of an analysis.
+		"""
+		self._prev_small, self._prev_centroids = None, None
+
+	def _row_frame(self, row):
+		"""
+		The frame that row row of the data file is analyzed from (for the checkpoint).
+		"""
+		return (row + self._row_offset) * self.analysis_params['stride']
+
+	def _centroids(self, small):
+		"""
+		Intensity-weighted centroids of the full frame and of every grid cell of the (downscaled grayscale) image small, in units (see _grid_layout) order, as fractions of the width and height of the frame or cell: [UNITS, 2]. Cells without any intensity have their centroid at the center. The pixels to the right of and below the last whole grid cells count for the full frame only.
+		"""
+		layout = self._grid_layout()
+		grid_x_divs, grid_y_divs = layout.grid_divs_x, layout.grid_divs_y
+		height, width = small.shape
+		grid_width, grid_height = (width / grid_x_divs), (height / grid_y_divs)
+		# column and row sums of every cell: [GRID Y, GRID X, GRID WIDTH] and [GRID Y, GRID X, GRID HEIGHT]
+		cells = small[:(grid_y_divs*grid_height),:(grid_x_divs*grid_width)].reshape(grid_y_divs, grid_height, grid_x_divs, grid_width)
+		col_sums = cells.sum(axis=1, dtype=np.float64)
+		row_sums = cells.sum(axis=3, dtype=np.float64).swapaxes(1, 2)
+		centroids = np.empty((layout.num_units, 2))
+		centroids[layout.full_units] = self._weighted_positions(small.sum(axis=0, dtype=np.float64)[np.newaxis], small.sum(axis=1, dtype=np.float64)[np.newaxis])
+		centroids[layout.cell_offset:(layout.cell_offset + layout.cells)] = self._weighted_positions(col_sums.reshape(layout.cells, grid_width), row_sums.reshape(layout.cells, grid_height))
+		return centroids
+
+	@staticmethod
+	def _weighted_positions(col_sums, row_sums):
+		"""
+		(x, y) centroids, as fractions of the width and height, of images with the given column and row sums ([IMAGES, WIDTH] and [IMAGES, HEIGHT]): [IMAGES, 2]; the center (0.5, 0.5) where the sums are 0.
+		"""
+		mass = col_sums.sum(axis=-1)
+		empty = (mass == 0.0)
+		mass[empty] = 1.0
+		x = (col_sums.dot(np.arange(col_sums.shape[-1]) + 0.5) / mass) / col_sums.shape[-1]
+		y = (row_sums.dot(np.arange(row_sums.shape[-1]) + 0.5) / mass) / row_sums.shape[-1]
+		x[empty], y[empty] = 0.5, 0.5
+		return np.column_stack((x, y))
+
+	def _energies(self, prev_small, small):
+		"""
+		Mean absolute difference (in [0, 1]) of the (downscaled grayscale) images prev_small and small over the full frame and every grid cell, in units (see _grid_layout) order: [UNITS].
+		"""
+		layout = self._grid_layout()
+		grid_x_divs, grid_y_divs = layout.grid_divs_x, layout.grid_divs_y
+		height, width = small.shape
+		grid_width, grid_height = (width / grid_x_divs), (height / grid_y_divs)
+		diff = cv2.absdiff(small, prev_small)
+		cells = diff[:(grid_y_divs*grid_height),:(grid_x_divs*grid_width)].reshape(grid_y_divs, grid_height, grid_x_divs, grid_width)
+		energies = np.empty(layout.num_units)
+		energies[layout.full_units] = diff.mean() / 255.0
+		energies[layout.cell_offset:(layout.cell_offset + layout.cells)] = cells.sum(axis=(1, 3), dtype=np.float64).ravel() / (grid_width * grid_height * 255.0)
+		return energies
+
+	def _analysis_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (analysis): energy of the difference with the previous analysis frame, and the shift of the intensity-weighted centroids since then, of the full frame and each grid cell. The first frame only primes the state and returns no row.
+		"""
+		ap = self.analysis_params
+		small = self.conversions.downscale(frame_idx, frame, ap['scale'])
+		centroids = self._centroids(small)
+		result = None
+		if self._prev_small is not None:
+			row = np.column_stack((self._energies(self._prev_small, small), (centroids - self._prev_centroids)))
+			result = ((frame_idx / ap['stride']) - self._row_offset), np.float32(row)
+		self._prev_small, self._prev_centroids = small, centroids
+		return result
+
+	def _playback_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (playback): read the row back from the data file.
+		"""
+		return frame_idx, self.playback_data[(frame_idx / self.analysis_params['stride'])]
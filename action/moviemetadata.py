@@ -0,0 +1,185 @@
+# moviemetadata.py - cached movie metadata from the JSON sidecar files
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+Every movie in the action directory has a JSON sidecar (e.g., Psycho.json) with its frame rate, frame count, length, frame size and aspect ratio. MovieMetadata answers those questions from the sidecar, without opening the movie: the feature extractors use it for determine_movie_length and for their afps. The movie is only opened (with OpenCV) to write a missing sidecar, or to rewrite one that is out of date.
+
+.. code-block:: python
+
+	metadata = MovieMetadata('/Users/me/Movies/action/Psycho/Psycho.mov', '/Users/me/Movies/action/Psycho/Psycho.json')
+	print metadata.fps(), metadata.frames(), metadata.length()
+	>>> 23.976 157754.0 6579.66
+
++--------+-------------------------------------------+
+| key    | value                                     |
++========+===========================================+
+| title  | name of the film                          |
++--------+-------------------------------------------+
+| fps    | frame rate reported by the container      |
++--------+-------------------------------------------+
+| frames | frame count reported by the container     |
++--------+-------------------------------------------+
+| length | frames / fps (seconds)                    |
++--------+-------------------------------------------+
+| width  | frame width (pixels)                      |
++--------+-------------------------------------------+
+| height | frame height (pixels)                     |
++--------+-------------------------------------------+
+| aspect | width / height                            |
++--------+-------------------------------------------+
+
+A sidecar also records the modification time and size of the movie that it was made from (movie_mtime, movie_size). If the movie changes, the sidecar is made again. Sidecars without width and height (written before the frame size was recorded) hold an aspect of 0.75 for every movie, the ratio of OpenCV's property ids rather than of the frame size: they are made again from the movie, once. Sidecars that have the frame size but not the movie's stamp are trusted, and are stamped with the movie's current modification time and size; the movie is not opened for them. If the movie is not there (data files only), the sidecar is used as it is.
+
+Sidecars are read once per process and kept in memory until their own modification time or size changes, so constructing extractors for the same films over and over costs a few stat calls, not a JSON parse, and never a decoder.
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os, json, tempfile, threading
+try:
+	import cv2
+	import cv2.cv as cv
+	HAVE_CV = True
+except ImportError:
+	HAVE_CV = False
+
+# json_path -> ((mtime, size) of the sidecar, metadata dict); shared by all MovieMetadata objects of the process
+_SIDECARS = {}
+_SIDECARS_LOCK = threading.Lock()
+
+
+def _file_stamp(path):
+	"""
+	(mtime, size) of a file, or None if it does not exist.
+	"""
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (st.st_mtime, st.st_size)
+
+
+class MovieMetadata:
+	"""
+	Metadata of one movie, backed by its JSON sidecar.
+
+	::
+
+		metadata = MovieMetadata(movie_path, json_path, title='Psycho')
+		dur_total_seconds = metadata.frames() / ap['afps']
+
+	"""
+	def __init__(self, movie_path, json_path, title=None):
+		self.movie_path = movie_path
+		self.json_path = json_path
+		self.title = title if title is not None else os.path.splitext(os.path.basename(json_path))[0]
+
+	def read(self):
+		"""
+		Return the metadata as a dict, making (or remaking) the sidecar first if it is missing or was made from a different version of the movie. Raises IOError if there is neither a sidecar nor a movie.
+		"""
+		movie_stamp = _file_stamp(self.movie_path)
+		metadata = self._load()
+		if movie_stamp is None:
+			if metadata is None:
+				raise IOError("No metadata file (%s) and no movie (%s) to make one from" % (self.json_path, self.movie_path))
+			return metadata
+		if metadata is None:
+			return self.write()
+		if 'width' not in metadata or 'height' not in metadata:
+			# written with the wrong aspect: make it again
+			try:
+				return self.write()
+			except (IOError, OSError):
+				return metadata # read-only action directory, or no OpenCV: use it as it is
+		if 'movie_mtime' not in metadata or 'movie_size' not in metadata:
+			# made before movie stamps were recorded: trust it, and stamp it
+			stamped = dict(metadata)
+			stamped['movie_mtime'], stamped['movie_size'] = movie_stamp
+			try:
+				return self._save(stamped)
+			except (IOError, OSError):
+				return metadata # read-only action directory: use it as it is
+		if (metadata['movie_mtime'], metadata['movie_size']) != movie_stamp:
+			return self.write()
+		return metadata
+
+	def value(self, key):
+		return self.read()[key]
+
+	def fps(self):
+		return self.value('fps')
+
+	def frames(self):
+		return self.value('frames')
+
+	def length(self):
+		return self.value('length')
+
+	def aspect(self):
+		return self.value('aspect')
+
+	def write(self):
+		"""
+		Open the movie, and (re)write the sidecar from what the container reports. Returns the metadata dict.
+		"""
+		if not HAVE_CV:
+			raise IOError("OpenCV is needed to read the metadata of %s" % self.movie_path)
+		movie_stamp = _file_stamp(self.movie_path)
+		capture = cv2.VideoCapture(self.movie_path)
+		fps = capture.get(cv.CV_CAP_PROP_FPS)
+		width = int(capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
+		height = int(capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
+		aspect = float(width) / float(height)
+		frames = capture.get(cv.CV_CAP_PROP_FRAME_COUNT)
+		length = float(frames) / float(fps)
+		del capture
+		movdict = {'title':self.title, 'fps':fps, 'width':width, 'height':height, 'aspect': aspect,'frames': frames, 'length':length}
+		if movie_stamp is not None:
+			movdict['movie_mtime'], movdict['movie_size'] = movie_stamp
+		return self._save(movdict)
+
+	def _load(self):
+		"""
+		The sidecar's contents: from memory if it has not changed since it was last read in this process, else from disc. None if there is no sidecar.
+		"""
+		stamp = _file_stamp(self.json_path)
+		if stamp is None:
+			return None
+		with _SIDECARS_LOCK:
+			cached = _SIDECARS.get(self.json_path)
+		if cached is not None and cached[0] == stamp:
+			return cached[1]
+		jsonfile = open(self.json_path)
+		try:
+			metadata = json.load(jsonfile)
+		finally:
+			jsonfile.close()
+		with _SIDECARS_LOCK:
+			_SIDECARS[self.json_path] = (stamp, metadata)
+		return metadata
+
+	def _save(self, metadata):
+		"""
+		Write the sidecar (to a temporary file that replaces it, so that readers never see half of it) and remember it.
+		"""
+		fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=(os.path.basename(self.json_path) + '.'), dir=(os.path.dirname(self.json_path) or '.'))
+		fp = os.fdopen(fd, 'w')
+		try:
+			fp.write(json.dumps(metadata))
+		finally:
+			fp.close()
+		os.chmod(tmp_path, 0644)
+		os.rename(tmp_path, self.json_path)
+		with _SIDECARS_LOCK:
+			_SIDECARS[self.json_path] = (_file_stamp(self.json_path), metadata)
+		return metadata
@@ -68,6 +68,38 @@ The full list of settable parameters, with default values and explanations:
 +-----------------+-----------------+----------------------------------------------------+
 | display         | True            | launch display screen during analysis              |
 +-----------------+-----------------+----------------------------------------------------+
+| seek_threshold  | 250             | forward jumps (in frames) longer than this seek;   |
+|                 |                 | shorter ones grab through without decoding output  |
++-----------------+-----------------+----------------------------------------------------+
+| flush_interval  | 256             | analysis frames buffered in RAM between bulk       |
+|                 |                 | writes to the data file                            |
++-----------------+-----------------+----------------------------------------------------+
+| prefetch_depth  | 8               | frames decoded ahead (on a separate thread) of the |
+|                 |                 | analysis; 0 decodes on the analysis thread         |
++-----------------+-----------------+----------------------------------------------------+
+| storage_dtype   | float32         | dtype of the rows in the data file: float32,       |
+|                 |                 | float16, uint16 or uint8 (see featurefile module)  |
++-----------------+-----------------+----------------------------------------------------+
+| storage_range   | [0.0, 1024.0]   | range of values that uint8/uint16 storage covers;  |
+|                 |                 | larger flow sums are clipped (float16 is not)      |
++-----------------+-----------------+----------------------------------------------------+
+| preview         | False           | analyze only one sample frame every                |
+|                 |                 | preview_interval seconds, into a low-rate data     |
+|                 |                 | file (see the preview module)                      |
++-----------------+-----------------+----------------------------------------------------+
+| preview_        | 10.0            | seconds between the sample frames of a preview     |
+| interval        |                 |                                                    |
++-----------------+-----------------+----------------------------------------------------+
+| progressive     | False           | analyze coarse-to-fine: every progressive_step-th  |
+|                 |                 | row first, then the rows in between, with a        |
+|                 |                 | coverage sidecar (see the progressive module)      |
++-----------------+-----------------+----------------------------------------------------+
+| progressive_    | 64              | rows between the samples of the first pass of a    |
+| step            |                 | progressive analysis (halved every pass)           |
++-----------------+-----------------+----------------------------------------------------+
+| warmup_frames   | 240             | (parallel analysis) frames tracked before a        |
+|                 |                 | worker's time range, to rebuild the tracks         |
++-----------------+-----------------+----------------------------------------------------+
 | Parameters for the edge detector and optical flow tracker...                           |
 +-----------------+-----------------+----------------------------------------------------+
 | winSize         | (15, 15)        | @ full resolution, must be odd & square            |
@@ -88,6 +120,20 @@ The full list of settable parameters, with default values and explanations:
 +-----------------+-----------------+                                                    |
 | trackDepth      | 9               |                                                    |
 +-----------------+-----------------+----------------------------------------------------+
+| Parameters for dense flow (see Dense Flow below)...                                    |
++-----------------+-----------------+----------------------------------------------------+
+| flow_method     | lk              | 'lk' (tracked corners), or dense flow: 'farneback' |
+|                 |                 | or 'dis' (DIS needs OpenCV 3.3 or later)           |
++-----------------+-----------------+----------------------------------------------------+
+| scale           | 0.5             | size of the grayscale frames that dense flow is    |
+|                 |                 | computed on, relative to the movie                 |
++-----------------+-----------------+----------------------------------------------------+
+| dense_threshold | 0.5             | pixels moving less than this (full-resolution      |
+|                 |                 | pixels per frame) are not counted                  |
++-----------------+-----------------+----------------------------------------------------+
+| farneback       | pyr_scale 0.5,  | see OpenCV calcOpticalFlowFarneback                |
+|                 | levels 3, ...   |                                                    |
++-----------------+-----------------+----------------------------------------------------+
 
 Upon creation of an OpticalFlow object, parameter keywords can be passed explicitly as formal arguments or as a keyword argument parameter dict:, e.g.:
 
@@ -108,6 +154,15 @@ Analyze a full film:
 	oflow = OpticalFlow('Psycho')
 	oflow.analyze_movie()
 
+To split the analysis of one film across several processes:
+
+.. code-block:: python
+
+	oflow = OpticalFlow('Psycho')
+	oflow.analyze_movie(workers=8)
+
+Each worker starts tracking warmup_frames frames before its own time range and only writes rows from the start of that range. The tracks carry state from frame to frame, so the rows at a range boundary are the same as for a single process as long as every moving track alive at the boundary was started within the warm-up window.
+
 This also works, so you can define your own filing system:
 
 .. code-block:: python
@@ -158,6 +213,20 @@ There is a default stride time of 1 frames (so, actually, no striding), unless o
 	
 *Very important*: It does not make sense to skip frames when analyzing, only when accessing. Also, since optical flow is based on comparisons between consecutive frames (in our case we are limiting ourselves to first-order differences) we are comparing *all* frames in the movie, even though we then 'stride' forward to the next analysis frame upon access.  Note that choosing 'stride' values that are not factors of 24 will result in analysis rates that do not fit neatly into one second periods.
 
+Dense Flow
+==========
+
+Up to maxCorners tracked corners leave many grid cells (and some frames) with empty histograms. With flow_method='farneback' or 'dis', OpticalFlow instead computes dense optical flow between consecutive frames, on grayscale frames downscaled (through an image pyramid) to scale times the size of the movie, and bins the flow of every pixel by grid cell and angle in one pass. The rows have the same layout (and the same accessors) as the Lucas-Kanade rows; each value is the mean flow (in full-resolution pixels per frame) of the pixels of a cell in an angle bin, so rows computed at different scales are comparable. The angles are measured the same way as those of the tracks (from the pixel's position back to where it came from). The scale sets the throughput:
+
+.. code-block:: python
+
+	oflow = OpticalFlow('Psycho', flow_method='farneback', scale=0.25, data_extension='.opticalflow24_dense')
+	oflow.analyze_movie(workers=4)
+
+Parallel workers in dense mode only need one frame of warm-up.
+
+Dense and Lucas-Kanade rows are not comparable, but they share the default data_extension. The header of a data file records its flow_method, and an analysis will not replace a data file of another flow_method (data files without a header hold Lucas-Kanade rows): pass a data_extension of its own, as above, or remove the old data file first. An unknown flow_method, or 'dis' without OpenCV 3.3, is refused before any file is touched.
+
 """
 
 __version__ = '1.0'
@@ -180,12 +249,125 @@ import numpy as np
 import json
 from segment import *
 from actiondata import *
+from framesource import *
+from parallel import *
+from featurewriter import *
+from featurereader import *
+from featurefile import *
+from gridlayout import *
+from moviemetadata import *
+from checkpoint import *
+from preview import *
+from progressive import *
+from engine import *
+from viewer import *
 ad = ActionData()
 av = ActionView()
 
 QPI = math.pi / 4.0
 
 
+class TrackBuffer:
+	"""
+	The Lucas-Kanade tracks of an OpticalFlow object, stored as arrays: a ring buffer of points (capacity tracks by length points by (x, y)), a validity mask and the number of points in each track. Every live track gets a point at the same ring position (head) each frame, so propagation, pruning and the track histograms are array operations. Tracks keep the order in which they were started; slots of pruned tracks are reclaimed when new tracks no longer fit after the last slot in use.
+
+	::
+
+		tracks = TrackBuffer(100, 10)
+		tracks.start(corners)			# [NUMBER OF CORNERS, 2]
+		tracks.advance(p1, good)		# next point of every track, and which tracks to keep
+		print len(tracks), tracks.points_at_age(0)
+
+	"""
+	def __init__(self, capacity, length):
+		self.length = int(length)
+		self.points = np.zeros((max(int(capacity), 1), self.length, 2), dtype=np.float32)
+		self.valid = np.zeros(len(self.points), dtype=bool)
+		self.counts = np.zeros(len(self.points), dtype=np.intp)
+		self.head = 0
+		self.end = 0		# one past the last slot in use
+		self._live = None
+
+	def __len__(self):
+		return len(self.live())
+
+	def clear(self):
+		self.valid[:] = False
+		self.counts[:] = 0
+		self.head = 0
+		self.end = 0
+		self._live = None
+
+	def live(self):
+		"""
+		Slots of the live tracks, oldest track first.
+		"""
+		if self._live is None:
+			self._live = np.flatnonzero(self.valid[:self.end])
+		return self._live
+
+	def points_at_age(self, ages=0):
+		"""
+		Point of every live track that is ages (a number, or one per track) frames old: [NUMBER OF TRACKS, 2]. Age 0 is the last point, age counts - 1 the first.
+		"""
+		return self.points[self.live(), ((self.head - ages) % self.length)]
+
+	def advance(self, new_points, good):
+		"""
+		Add the next point ([NUMBER OF TRACKS, 2]) to the live tracks where good is True, and drop the others. Tracks longer than length lose their first point.
+		"""
+		live = self.live()
+		self.valid[live[~good]] = False
+		self.counts[live[~good]] = 0
+		kept = live[good]
+		self.head = (self.head + 1) % self.length
+		self.points[kept, self.head] = new_points[good]
+		self.counts[kept] = np.minimum(self.counts[kept] + 1, self.length)
+		self._live = kept
+
+	def start(self, new_points):
+		"""
+		Start a track (of one point) at each of new_points ([NUMBER OF POINTS, 2]), after the live tracks.
+		"""
+		num = len(new_points)
+		if num == 0:
+			return
+		if (self.end + num) > len(self.points):
+			self._compact(num)
+		slots = np.arange(self.end, (self.end + num))
+		self.points[slots, self.head] = new_points
+		self.valid[slots] = True
+		self.counts[slots] = 1
+		self.end += num
+		self._live = None
+
+	def _compact(self, room):
+		"""
+		Move the live tracks (in order) to the front, and grow the buffer if room more tracks still do not fit.
+		"""
+		live = self.live()
+		num = len(live)
+		capacity = len(self.points)
+		if (num + room) > capacity:
+			capacity = max((2 * capacity), (num + room))
+		points = np.zeros((capacity, self.length, 2), dtype=np.float32)
+		counts = np.zeros(capacity, dtype=np.intp)
+		points[:num] = self.points[live]
+		counts[:num] = self.counts[live]
+		self.points, self.counts = points, counts
+		self.valid = np.zeros(capacity, dtype=bool)
+		self.valid[:num] = True
+		self.end = num
+		self._live = None
+
+	def polylines(self):
+		"""
+		The live tracks as int32 arrays of points, first point first (for drawing).
+		"""
+		ages = np.arange(self.length)[::-1]
+		return [np.int32(self.points[slot, ((self.head - ages[(self.length - count):]) % self.length)]) for slot, count in zip(self.live(), self.counts[self.live()])]
+
+
 class OpticalFlow:
 	"""
 	Optical flow analysis of consecutive frames (see note above on stride parameter) using a Lucas-Kanade optical flow algorithm operating tracked features (corner detector) of monochrome image data.
@@ -198,6 +380,9 @@ class OpticalFlow:
 	
 	If you want to run in verbose mode (to see some debug information on calculated frame offsets, analysis ranges, etc.) pass the verbose=True flag here.
 	"""
+	
+	# left behind when the object is sent to a worker process, which opens its own capture (see the parallel module)
+	_transient_state = ('capture', 'frame_source', 'conversions', 'X', 'playback_data', 'prev_gray', '_prev_small', '_dis', '_dense_cells', '_dense_cells_key', '_dense_pixels')
 	def __init__(self, filename='Vertigo', arg=None, **analysis_params):
 		"""
 		"""
@@ -219,9 +404,10 @@ class OpticalFlow:
 			self.json_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + '.json'))
 			print self.json_path
 			self.filename = filename
+			self.metadata = MovieMetadata(self.movie_path, self.json_path, filename)
 		
 		# additional OpticalFlow-specific parameters and data structures...
-		self.tracks = []
+		self.tracks = TrackBuffer(ap['maxCorners'], ap['trackLength'])
 		self.frame_idx = 0
 		
 		self.lk_params = dict( winSize = ap['winSize'],
@@ -233,19 +419,19 @@ class OpticalFlow:
 								minDistance = ap['minDistance'],
 								blockSize = ap['blockSize'])
 		
-		# self.determine_movie_length() no need
- 		if (os.path.exists(self.json_path) != True):
- 			self._write_metadata_to_json()
-		ap['afps'] = self._read_json_value('fps')
-		
-		# try to naively get some data and store in a class var
-		if os.path.exists(self.data_path):
-			self.default_opticalflow_features_for_segment()	
+		# the metadata (afps, see _read_metadata) and the default features (X, see __getattr__) are read when they are first used
+		self._metadata_read = False
 	
 	def _check_opticalflow_params(self, analysis_params=None):
 		"""
 		Simple mechanism to read in default parameters while substituting custom parameters.
 		"""
+		if analysis_params is not None:
+			self._metadata_read = True # the caller's parameters (afps included) replace the ones the metadata was read into
+		if analysis_params is not None and getattr(self, 'analysis_params', None) is not None:
+			# parameters passed to analyze_movie, playback_movie, etc. add to (rather than replace) the ones the object was made with;
+			# afps is not carried over (an accessor may have read it from the metadata): it is the caller's, or the default
+			analysis_params = dict([(k, v) for k, v in self.analysis_params.items() if k != 'afps'], **analysis_params)
 		self.analysis_params = analysis_params if analysis_params is not None else self.analysis_params
 		dofp = self.default_opticalflow_params()
 		for k in dofp.keys():
@@ -276,8 +462,22 @@ class OpticalFlow:
 			'blockSize' : 7,
 			'trackLength' : 10,
 			'trackDepth' : 9,
+			'flow_method' : 'lk',				# 'lk' (Lucas-Kanade tracks), or dense flow: 'farneback' or 'dis'
+			'scale' : 0.5,						# (dense flow) size of the grayscale frames that the flow is computed on, relative to the movie
+			'dense_threshold' : 0.5,			# (dense flow, pixels per frame @ full resolution) slower pixels are not counted
+			'farneback' : {'pyr_scale' : 0.5, 'levels' : 3, 'winsize' : 15, 'iterations' : 3, 'poly_n' : 5, 'poly_sigma' : 1.2, 'flags' : 0},
 			'verbose' : False,			# useful for debugging
 			'display' : True,			# Launch display screen
+			'seek_threshold' : 250,		# (frames) forward jumps longer than this seek, shorter ones grab through
+			'flush_interval' : 256,		# (analysis frames) rows buffered in RAM between writes to the data file
+			'prefetch_depth' : 8,		# (frames) decoded ahead of the analysis on a separate thread; 0 turns prefetching off
+			'storage_dtype' : 'float32',	# dtype of the rows in the data file: 'float32', 'float16', 'uint16' or 'uint8'
+			'storage_range' : [0.0, 1024.0],	# (values) range covered by uint8/uint16 storage; larger flow sums are clipped
+			'preview' : False,			# analyze only one sample frame every preview_interval seconds (see the preview module)
+			'preview_interval' : 10.0,	# (seconds) between the sample frames of a preview
+			'progressive' : False,		# analyze coarse-to-fine, with a coverage sidecar (see the progressive module)
+			'progressive_step' : 64,		# (rows) between the samples of the first pass of a progressive analysis, halved every pass
+			'warmup_frames' : 240,		# (frames) parallel workers start tracking this long before their own range
 			'hist_shrink_factor' : 0.5,	# (adjustable) ratio for size of histogram window
 			'hist_width_ratio' : 1.0,	# (adjustable) ratio for width of histogram window size
 			'hist_height' : 1.0,		# (adjustable) ratio for height of histogram window size
@@ -289,28 +489,36 @@ class OpticalFlow:
 	
 	def _write_metadata_to_json(self):
 		"""
+		Make sure that the JSON metadata file is there and up to date with the movie (see the moviemetadata module). The movie is only opened if it is not.
 		"""
-		title = self.filename
-		capture = cv2.VideoCapture(self.movie_path)
-		fps = capture.get(cv.CV_CAP_PROP_FPS)
-		aspect = capture.get(cv.CV_CAP_PROP_FRAME_WIDTH / cv.CV_CAP_PROP_FRAME_HEIGHT)
-		frames = capture.get(cv.CV_CAP_PROP_FRAME_COUNT)
-		length = float(frames) / float(fps)
-		
-		
-		movdict = {'title':title, 'fps':fps, 'aspect': aspect,'frames': frames, 'length':length}
-		fp = file(self.json_path, 'w')
-		fp.write(json.dumps(movdict))
-		fp.close()
-		del capture
+		self.metadata.read()
 		return 1
 	
 	def _read_json_value(self, key='fps'):
 		"""
+		Value of key in the movie's metadata, without opening the movie (see the moviemetadata module).
+		"""
+		return self.metadata.value(key)
+	
+	def _read_metadata(self):
 		"""
-		jsonfile = open(self.json_path)
-		jsondata = json.load(jsonfile)
-		return jsondata[key]
+		Read the movie's frame rate (afps) from its metadata (see the moviemetadata module). Done once, the first time it is needed (not when the object is constructed).
+		"""
+		if self._metadata_read:
+			return
+		self._metadata_read = True
+		self.analysis_params['afps'] = self._read_json_value('fps')
+	
+	def __getattr__(self, name):
+		"""
+		X (the default features for the whole film) is read the first time it is used.
+		"""
+		if name == 'X':
+			self.X = None
+			if os.path.exists(feature_file_path(self.data_path)):
+				self.default_opticalflow_features_for_segment()
+			return self.X
+		raise AttributeError(name)
 	
 # NOTE THAT THERE IS NO <<FULL>> ACCESS FUNCTION.
 
@@ -334,7 +542,7 @@ class OpticalFlow:
 			opticalflow_features_for_segment(...)[1].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._opticalflow_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration).reshape(-1, 512)[0:-1:access_stride]
+		self.X = self._opticalflow_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride).reshape(-1, self._grid_layout().size('grid'))
 		return self.X
 	
 	def center_quad_opticalflow_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
@@ -355,9 +563,7 @@ class OpticalFlow:
 			opticalflow_features_for_segment(...)[1][:,[18..21,26..29,34..37,42..45,..],...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		cq_array = range((18*8),(22*8))+range((26*8),(30*8))+range((34*8),(38*8))+range((42*8),(46*8))
-		self.X = self._opticalflow_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[:,cq_array,...].reshape(-1, 128)[0:-1:access_stride]
-		return self.X
+		return self.region_opticalflow_features_for_segment('center', segment, access_stride)
 
 	def middle_band_opticalflow_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
 		"""
@@ -377,8 +583,7 @@ class OpticalFlow:
 			opticalflow_features_for_segment(...)[1][:,16:47,...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._opticalflow_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[:,(16*8):(48*8),...].reshape(-1, 256)[0:-1:access_stride]
-		return self.X
+		return self.region_opticalflow_features_for_segment('band', segment, access_stride)
 	
 	def plus_band_opticalflow_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
 		"""
@@ -400,8 +605,23 @@ class OpticalFlow:
 			opticalflow_features_for_segment(...)[1][:,[2..5,10..13,16..47,50..53,58..61],...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		plus_array = range((2*8),(6*8))+range((10*8),(14*8))+range((16*8),(48*8))+range((50*8),(54*8))+range((58*8),(62*8))
-		return self._opticalflow_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[:,plus_array,...].reshape(-1, 384)[0:-1:access_stride]
+		return self.region_opticalflow_features_for_segment('plus', segment, access_stride)
+
+	def region_opticalflow_features_for_segment(self, region='band', segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the gridded histograms of a region of the grid: 'grid', 'band', 'center' or 'plus' (which scale with grid_divs_x and grid_divs_y; see the gridlayout module), or a boolean mask of grid_divs_y by grid_divs_x cells. Only the histograms of the region are read. The middle band, center quad and plus band accessors call this.
+		::
+		
+			mask = np.zeros((8, 8), dtype=bool)
+			mask[:,:4] = True # the left half of the frame
+			X = oflow.region_opticalflow_features_for_segment(mask, Segment(0, 600))
+		
+		"""
+		layout = self._grid_layout()
+		self.X = self._opticalflow_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride, units=layout.units(region))
+		if self.X is not None:
+			self.X = self.X.reshape(-1, layout.size(region))
+		return self.X
 
 	
 # 	def opticalflow_for_segment(self, segment=Segment(0, -1)):
@@ -427,19 +647,43 @@ class OpticalFlow:
 		"""
 		DYNAMIC ACCESS FUNCTION
 		"""
-		return getattr(self,func)(segment)
+		return getattr(self,func)(segment, access_stride)
+
+	def transpose_data_file(self, layout='region'):
+		"""
+		Rewrite the data file region-major (layout='region'), so that the middle band, center quad and plus band accessors read only (and sequentially) the flow histograms they return, or back to frame-major (layout='frame'), which analyses can write to (resume). See the featurefile module.
+		::
+		
+			oflow = OpticalFlow('Psycho')
+			oflow.transpose_data_file()
+			X = oflow.middle_band_opticalflow_features_for_segment(Segment(0, 600))
+		
+		"""
+		grid = self._grid_layout()
+		if layout == 'region':
+			return transpose_feature_file(self.data_path, sections=grid.sections(), units=grid.num_units, row_shape=grid.row_shape)
+		return transpose_feature_file(self.data_path, row_shape=grid.row_shape)
+
+	def _grid_layout(self):
+		"""
+		Layout of the rows of the data file for the grid and angle bins of the analysis parameters (see the gridlayout module): the theta_divs angle bins of each grid cell, in one dimension.
+		"""
+		ap = self.analysis_params
+		return grid_layout(ap['grid_divs_x'], ap['grid_divs_y'], (ap['theta_divs'],), flat=True)
 	
-	def _opticalflow_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=-1):
+	def _opticalflow_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=-1, access_stride=1, units=None):
 		"""
 		This is the interface for grabbing analysis data based on onsets and durations, translating seconds into frames.
-		Takes a file name or complete path of a data file, an onset time in seconds, and a duration in seconds.
-		Returns a memory-mapped array corresponding to the reduced-dimension optical flow values: [NUMBER OF FRAMES, 512].
+		Takes a file name or complete path of a data file, an onset time in seconds, and a duration in seconds. Only every access_stride-th (24 fps) frame is read and returned.
+		Returns a float32 array corresponding to the reduced-dimension optical flow values: [NUMBER OF FRAMES, 512] (grid cells * theta_divs; see _grid_layout).
+		With units (grid cells 0-63), returns only the flow histograms of those cells: [NUMBER OF FRAMES, NUMBER OF UNITS, 8]. Only they are read; in a region-major data file (see transpose_data_file), the middle band is one sequential read.
 		
 		::
 			
 			raw_opticalflow_data = opticalflow_for_segment(onset_time=360, duration=360)
 		
 		"""
+		self._read_metadata()
 		ap = self._check_opticalflow_params()
 		frames_per_astride = (24.0 / ap['stride']) # 24.0, not ap['fps']
 		
@@ -451,17 +695,17 @@ class OpticalFlow:
 		
 		print 'df: ', dur_frames
 		try:
-			if os.path.exists(self.data_path):
-				mapped = np.memmap(self.data_path, dtype='float32', mode='r') #, offset=onset_frame, shape=(dur_frames,512))
+			if os.path.exists(feature_file_path(self.data_path)):
+				# map and resample (to 24 fps) only the rows of the segment
+				layout = self._grid_layout()
+				mapped = FeatureReader(self.data_path, layout.row_shape, units=layout.num_units).window(onset_frame, dur_frames, ap['afps'], access_stride, units=units)
 			else:
 				print "Optical flow analysis file does not exist for this film (", self.filename, "). Sorry."
 				return None
-		except IOError:
+		except (IOError, OSError):
 			print "Attempting to access data file/mem map that does not exist!"
 			return None
-		mapped = mapped.reshape((-1,512))
-		mapped = ad.interpolate_time(mapped, ap['afps'])
-		return mapped[onset_frame:(onset_frame+dur_frames),:]
+		return mapped
 
 
 	def determine_movie_length(self, **kwargs):
@@ -470,19 +714,17 @@ class OpticalFlow:
 		
 		Returns movie duration in seconds as a floating point number, taking into account frame rate.
 		"""	
+		self._read_metadata()
 		ap = self.analysis_params
 		strides_per_second = float(ap['fps'] / ap['stride'])
 	
 		if os.path.exists(self.movie_path) and HAVE_CV:
-			capture = cv2.VideoCapture(self.movie_path)
-			dur_total_seconds = capture.get(cv.CV_CAP_PROP_FRAME_COUNT) / ap['afps']
+			# frame count from the metadata; the movie is not opened (see the moviemetadata module)
+			dur_total_seconds = self.metadata.frames() / ap['afps']
 			print "mov total secs: ", dur_total_seconds
 		elif os.path.exists(self.data_path):
-			dsize = os.path.getsize(self.data_path)
-			# since we are reading raw color analysis data that always has the same size on disc!
-			# the constant had better be correct!
-			print "dsize: ", dsize
-			dur_total_aframes = dsize / float((ap['grid_divs_x'] * ap['grid_divs_y'] * ap['theta_divs']) * 4) # REGIONS * CHANNELS * BINS * BYTES
+			# row count from the data file's header (see the featurefile module); raw data files: from their size, with the REGIONS * BINS layout
+			dur_total_aframes = float(feature_file_rows(self.data_path, self._grid_layout().row_shape))
 			print 'dtaf: ', dur_total_aframes
 			dur_total_seconds = (dur_total_aframes / strides_per_second) * (ap['fps'] / ap['afps'])
 			print "total secs: ", dur_total_seconds
@@ -529,7 +771,7 @@ class OpticalFlow:
 # 		self._process_movie(movie_file, data_file, mode='playback', display=True, offset=offset, duration=duration)
 		self._playback_movie(mode='playback', display=True, offset=offset, duration=duration)
 	
-	def analyze_movie(self, offset=0, duration=-1, showrawvectors=False):
+	def analyze_movie(self, offset=0, duration=-1, showrawvectors=False, workers=1, resume=False):
 		"""
 		Analyze the movie without displaying on screen. Equivalent to:
 		
@@ -537,8 +779,9 @@ class OpticalFlow:
 		
 			_process_movie(offset=0, duration=-1)
 		
+		With workers > 1, the movie is split into time ranges that are analyzed by that many processes. With resume=True, an interrupted analysis is picked up where it left off (see the checkpoint module).
 		"""
-		self._process_movie(mode='analyze', display=False, offset=offset, duration=duration)
+		self._process_movie(mode='analyze', display=False, offset=offset, duration=duration, workers=workers, resume=resume)
 
 	def analyze_movie_with_display(self, offset=0, duration=-1, showrawvectors=False):
 		"""
@@ -550,11 +793,16 @@ class OpticalFlow:
 		"""
 		self._process_movie(mode='analyze', display=True, offset=offset, duration=duration)
 	
-	def _process_movie(self, showrawvectors=False, **kwargs):
+	def _process_movie(self, showrawvectors=False, workers=1, shard=None, engine=None, resume=False, **kwargs):
 		"""
 		Main processing function. This is where the magic happens when we're making optical-flow analyses.
 		Will exit if neither a movie path nor a data path are supplied. This function is not intended to be called directly. Normally, call one of the three more descriptive functions instead, and it will call this function.
 		
+		workers > 1 hands the analysis to a pool of processes (see the parallel module); each of them calls this function again with shard=(start_frame, end_frame) and only fills in the rows for that range.
+		
+		With engine=AnalysisEngine(...), nothing is analyzed here: the kernel and writer are added to that engine, which decodes the movie once for several extractors (see the pipeline module); engine.close() closes the writers.
+		
+		The progress of an analysis is recorded in a sidecar file; resume=True picks up an interrupted analysis where it left off (see the checkpoint module).
 		"""
 				
 # 		if not HAVE_CV:
@@ -567,8 +815,16 @@ class OpticalFlow:
 				
 		ap = self._check_opticalflow_params(kwargs)
 		verbose = ap['verbose']
+		
+		playback = (ap['mode'] == 'playback' and ap['display'] == True)
+		if not playback:
+			# an unknown flow_method (or 'dis' without OpenCV 3.3) is refused before any data file, preview or checkpoint is touched
+			flow_kernel = self._flow_kernel()
+			if shard is None and not self._same_flow_method(ap):
+				return
 				
-		self.capture = cv2.VideoCapture(self.movie_path)
+		self.frame_source = PrefetchFrameSource(FrameSource(self.movie_path, ap['seek_threshold']), ap['prefetch_depth'])
+		self.capture = self.frame_source.capture
 
 		fps = ap['fps']						
 		grid_x_divs = ap['grid_divs_x']
@@ -581,9 +837,6 @@ class OpticalFlow:
 		grid_height = int(frame_height/grid_y_divs)
 		grid_size = (grid_width, grid_height)
 
-		centers_x = range((frame_width/16),frame_width,(frame_width/8))
-		centers_y = range((frame_height/16),frame_height,(frame_height/8))
-
 		# last but not least, get total_frame_count and set up the memmapped file
 		total_frame_count = int(self.capture.get(cv.CV_CAP_PROP_FRAME_COUNT))	
 		dur_total_secs = int(total_frame_count / fps)
@@ -612,151 +865,284 @@ class OpticalFlow:
 			print 'DUR (FRAMES): ', dur_frames
 			print "FPS: ", fps
 			print "stride_frames: ", stride_frames
-		self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
-		self.frame_idx = offset_frames
-		end_frame = offset_frames + dur_frames
 		
 		# set up memmap		
-		if ap['mode'] == 'playback' and ap['display'] == True:
+		if playback:
 			print 'PLAYBACK!'
-			fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides+dur_strides),(grid_x_divs * grid_y_divs * theta_divs)))
+			self.playback_data = load_feature_file(self.data_path, self._grid_layout().row_shape, rows=(offset_strides+dur_strides), decode=True)
+			fp, kernel = None, self._playback_kernel
+		elif shard is not None:
+			# the file was preallocated by the parent process (or by the interrupted analysis); only write our own rows
+			checkpoint = Checkpoint(self.data_path, ap)
+			checkpoint.track(shard, self._row_frame)
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + self._grid_layout().row_shape), mode='r+', flush_interval=ap['flush_interval'], checkpoint=checkpoint)
+			kernel = flow_kernel
+		elif ap['preview']:
+			# a low-rate preview: only the sample frames (and their warm-up) are decoded, and only their rows are written (see the preview module)
+			# Lucas-Kanade: from the feature detection frame at least 24 frames before the sample; dense flow: the previous frame
+			warmup = 24 if ap['flow_method'] == 'lk' else 1
+			preview = Preview(self.data_path, self._grid_layout().row_shape, ap, offset_frames, (offset_frames + dur_frames), warmup=warmup, align=warmup, reset=self._reset_state)
+			self.frame_source = preview.frame_source(self.frame_source)
+			fp, kernel = preview.writer, preview.kernel(flow_kernel)
+		elif ap['progressive']:
+			# coarse-to-fine: the samples of every pass are analyzed like those of a preview, into the full data file (see the progressive module)
+			warmup = 24 if ap['flow_method'] == 'lk' else 1
+			progressive = Progressive(self.data_path, self._grid_layout().row_shape, ap, dur_strides, self._row_frame, warmup=warmup, align=warmup, reset=self._reset_state, resume=resume)
+			self.frame_source = progressive.frame_source(self.frame_source)
+			fp, kernel = progressive.writer, progressive.kernel(flow_kernel)
 		else:
+			checkpoint = Checkpoint(self.data_path, ap)
+			if resume and checkpoint.can_resume():
+				# pick up the interrupted analysis where it left off
+				self.frame_source.release()
+				shards = checkpoint.remaining()
+				if shards:
+					process_shards(self, shards, workers)
+				elif shards is not None:
+					print 'Nothing to resume: the analysis is complete.'
+				return
 			print 'ANALYZE!'
-			fp = np.memmap(self.data_path, dtype='float32', mode='w+', shape=(dur_strides,(grid_x_divs * grid_y_divs * theta_divs)))
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + self._grid_layout().row_shape), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], checkpoint=checkpoint, analysis_params=ap)
+			kernel = flow_kernel
+			if workers > 1 and ap['mode'] == 'analyze' and not ap['display']:
+				fp.close()
+				self.frame_source.release()
+				checkpoint.start(shard_ranges(offset_frames, (offset_frames + dur_frames), workers, stride_frames))
+				process_movie_in_parallel(self, workers, offset_frames, (offset_frames + dur_frames), align=stride_frames)
+				return
+			checkpoint.start([(offset_frames, (offset_frames + dur_frames))])
+			checkpoint.track((offset_frames, (offset_frames + dur_frames)), self._row_frame)
 		
 		print 'dur. strides: ', dur_strides
 		
-		self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
 		self.frame_idx = offset_frames
 		end_frame = offset_frames + dur_frames
-		tdepth = ap['trackDepth']
+		first_frame = offset_frames
+		if shard is not None:
+			# rebuild the tracks over the warm-up frames (starting on a feature detection frame), but write nothing before our own range
+			first_frame, end_frame = shard
+			if ap['flow_method'] == 'lk':
+				self.frame_idx = max(offset_frames, (((first_frame - ap['warmup_frames']) / 24) * 24))
+			else:
+				# dense flow only needs the previous frame
+				self.frame_idx = max(offset_frames, (first_frame - 1))
+			self.tracks.clear()
+			self._prev_small = None
+		self.grid_size = grid_size
+		self._row_offset = offset_strides
+		
+		if engine is not None:
+			# decode-once pipeline: the shared engine decodes the frames and runs the kernels of all of the extractors
+			self.frame_source.release()
+			self.conversions = engine.conversions
+			engine.add_kernel(kernel, fp, self.frame_idx, end_frame, step=1, first_frame=first_frame)
+			return
 		
+		# headless loop; display and progress reports are optional subscribers
+		engine = AnalysisEngine(self.frame_source, kernel, fp)
+		self.conversions = engine.conversions
 		if ap['display']:
-			cv2.namedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
-			ROOT2 = math.sqrt(2.0)
-			THETAS_X = [-32, int(-16*ROOT2), 0, int(16*ROOT2), 32, int(16*ROOT2), 0, int(-16*ROOT2)]
-			THETAS_Y = [0, int(-16*ROOT2), -32, int(-16*ROOT2), 0, int(16*ROOT2), 32, int(16*ROOT2)]
-			THETAS = [[pair[0],pair[1]] for pair in zip(THETAS_X, THETAS_Y)]
+			engine.subscribe(OpticalFlowViewer(self, frame_size))
+		if verbose:
+			engine.subscribe(ProgressReporter(self.frame_idx, end_frame))
+		complete = False
+		try:
+			complete = engine.run(self.frame_idx, end_frame, first_frame=first_frame)
+		finally:
+			if fp is not None:
+				fp.close(complete)
+			self.frame_source.release()
+		
+		if fp is not None and verbose:
+			print 'FEATURE WRITER: ', fp.stats()
+		self.playback_data = None
+		if verbose:
+			print 'ENGINE: ', engine.stats()
+			print 'FRAME SOURCE: ', self.frame_source.stats()
 
-		while self.frame_idx < end_frame:
+	def _track_frame(self, frame_gray):
+		"""
+		Follow the Lucas-Kanade tracks into frame_gray and look for new features to track (every 24th frame). Returns True if there were tracks to follow.
+		"""
+		ap = self.analysis_params
+		had_tracks = len(self.tracks) > 0
 		
-			fd = self.frame_idx - offset_strides
-			if verbose:
-				print 'fr. idx: ', self.frame_idx / float(end_frame), ' (/ ', end_frame, ')'
-			
-			ret, frame = self.capture.read()
-			frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-# 			if ap['display'] is True:
-# 				vis = frame.copy()
-			
-			# process moving points
-			if len(self.tracks) > 0:
-				img0, img1 = self.prev_gray, frame_gray
-				p0 = np.float32([tr[-1] for tr in self.tracks]).reshape(-1, 1, 2)
-				p1, st, err = cv2.calcOpticalFlowPyrLK(img0, img1, p0, None, **self.lk_params)
-				p0r, st, err = cv2.calcOpticalFlowPyrLK(img1, img0, p1, None, **self.lk_params)
-
-				d = abs(p0-p0r).reshape(-1, 2).max(-1)
-				good = d < 20
-# 				print "good: ", good
-				new_tracks = []
-				for tr, (x, y), good_flag in zip(self.tracks, p1.reshape(-1, 2), good):
-					if not good_flag:
-						continue
-					tr.append((x, y))
-					if len(tr) > ap['trackLength']:
-						del tr[0]
-					new_tracks.append(tr)
-					#if showrawvectors and ap['display']:
-					cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-				self.tracks = new_tracks
-
-				if self.frame_idx % ap['stride'] == 0:
-					
-					tracks_now = [np.int32(tr) for tr in self.tracks]
-
-					#if showrawvectors and ap['display']:
-					cv2.polylines(frame, tracks_now, isClosed=False, color=(0, 255, 0))
-										
-					try:
-						seq = tracks_now[0]
-						track_vectors = np.append( tracks_now[0][ min(len(seq)-1, tdepth) ], seq[0])
-
-						for n, tr in enumerate(tracks_now[1:]):
-							track_vectors = np.append(track_vectors, np.append(tr[ min(len(tr)-1, tdepth) ], (tr[0])))
-
-						# track_vectors is variable-length, up to max-number-of-corners
-						track_vectors = np.reshape(np.array(track_vectors, dtype='float32'), (-1,4))
-												
-						xdelta = track_vectors[:,2] - track_vectors[:,0]
-						ydelta = track_vectors[:,3] - track_vectors[:,1]
-						thetas = np.arctan2(ydelta, xdelta)
- 						mags = np.sqrt(np.add(np.power(xdelta, 2.0), np.power(ydelta, 2.0)))
-						xbin = np.floor(track_vectors[:,0] / grid_width)
-						ybin = np.floor(track_vectors[:,1] / grid_height)
-												
-						# filter out vectors less than 1 pixel!
-						weighted = np.where(mags > 5, mags, 0.0)
-# 						print weighted.shape
-						theta_vals = np.floor_divide(np.add(thetas, math.pi), QPI)
-
-						combo_bins = ((np.add((ybin * grid_x_divs), xbin) * theta_divs) + theta_vals) #  8 = num. of bins for theta!!!
-												
-						# calc. histo or write all zeros
-						if combo_bins.shape[0] > 0:
-							bins_histo, bin_edges = np.histogram(combo_bins, (grid_x_divs * grid_y_divs * theta_divs), (0., 512.), weights=weighted)
-							fp[fd] = bins_histo
-						else:
-	 						if verbose: print 'Zero! frame: ', fd
-							fp[fd] = np.zeros(512, dtype='float32') # 16*8=128 --- 64*8=512
-					except IndexError:						
- 						if verbose: print 'Index Error! frame: ', fd
-						fp[fd] = np.zeros(512, dtype='float32') # 16*8=128 --- 64*8=512					
-
-			# perform edge detection
-			if self.frame_idx % 24 == 0:
-				
-				mask = np.zeros_like(frame_gray)
-				mask[:] = 255
-				for x, y in [np.float32(tr[-1]) for tr in self.tracks]:
-					if ap['display']:
-						cv2.circle(mask, (x, y), 5, 0, -1)
-				p = cv2.goodFeaturesToTrack(frame_gray, mask = mask, **self.feature_params)
-				if p is not None:
-					for x, y in np.float32(p).reshape(-1, 2):
-						self.tracks.append([(x, y)])
-			
+		# process moving points
+		if had_tracks:
+			img0, img1 = self.prev_gray, frame_gray
+			p0 = self.tracks.points_at_age(0).reshape(-1, 1, 2)
+			p1, st, err = cv2.calcOpticalFlowPyrLK(img0, img1, p0, None, **self.lk_params)
+			p0r, st, err = cv2.calcOpticalFlowPyrLK(img1, img0, p1, None, **self.lk_params)
+
+			d = abs(p0-p0r).reshape(-1, 2).max(-1)
+			self.tracks.advance(p1.reshape(-1, 2), (d < 20))
+		return had_tracks
+
+	def _detect_features(self, frame_idx, frame_gray):
+		"""
+		Every 24th frame, start new tracks at good features to track.
+		"""
+		ap = self.analysis_params
+		# perform edge detection
+		if frame_idx % 24 == 0:
+			mask = np.zeros_like(frame_gray)
+			mask[:] = 255
 			if ap['display']:
-				# visualize frame's histograms
-				currframe = fp[self.frame_idx,:512]
-				framemin = currframe[:512].min()
-				framemax = currframe[:512].max()
-				framerange = framemax - framemin
-				if framerange > 0:
-					grays = np.multiply(np.subtract(currframe, framemin), (256.0 / framerange))
-					grays_ma = np.ma.masked_invalid(grays)
-					grays = grays_ma.filled(0.0)
-					for row in range(grid_y_divs):
-						for col in range(grid_x_divs):
-							for wdg in range(theta_divs):
-								gry = int(grays[(row*(grid_x_divs*theta_divs))+(col*theta_divs)+wdg])
-								if gry>0.0:
-									cv2.line(frame, (centers_x[col], centers_y[row]), ((centers_x[col]+THETAS_X[wdg]), (centers_y[row]+THETAS_Y[wdg])), (gry,gry,gry))
+				for x, y in self.tracks.points_at_age(0):
+					cv2.circle(mask, (int(x), int(y)), 5, 0, -1)
+			p = cv2.goodFeaturesToTrack(frame_gray, mask = mask, **self.feature_params)
+			if p is not None:
+				self.tracks.start(np.float32(p).reshape(-1, 2))
 
-				#### SHOW
-				cv.ShowImage('Image', cv.fromarray(frame))
-			
-			fp.flush()
-			self.frame_idx += 1
-			self.prev_gray = frame_gray
-			
-			if ap['display'] is True: 
-				ch = 0xFF & cv.WaitKey (int(1000 / ap['afps']))
-				if ch == 27:
-					break
-		
-		if ap['display'] is True:
-			cv2.destroyAllWindows()
+	def _track_histogram(self, fd):
+		"""
+		Histogram of the current tracks' angles (weighted by length) for every grid cell: grid_divs_x * grid_divs_y * theta_divs values.
+		"""
+		ap = self.analysis_params
+		verbose = ap['verbose']
+		grid_x_divs, grid_y_divs, theta_divs = ap['grid_divs_x'], ap['grid_divs_y'], ap['theta_divs']
+		num_bins = self._grid_layout().size('grid')
+		grid_width, grid_height = self.grid_size
+		tdepth = ap['trackDepth']
+		if len(self.tracks) == 0:
+			if verbose: print 'No tracks! frame: ', fd
+			return np.zeros(num_bins, dtype='float32')
+		
+		# from the point trackDepth frames into each track (or its last point, if it is shorter) back to its first point
+		counts = self.tracks.counts[self.tracks.live()]
+		points_from = np.int32(self.tracks.points_at_age(np.maximum(0, ((counts - 1) - tdepth)))).astype('float32')
+		points_to = np.int32(self.tracks.points_at_age(counts - 1)).astype('float32')
+		
+		xdelta = points_to[:,0] - points_from[:,0]
+		ydelta = points_to[:,1] - points_from[:,1]
+		thetas = np.arctan2(ydelta, xdelta)
+		mags = np.sqrt(np.add(np.power(xdelta, 2.0), np.power(ydelta, 2.0)))
+		xbin = np.floor(points_from[:,0] / grid_width)
+		ybin = np.floor(points_from[:,1] / grid_height)
+		
+		# filter out vectors less than 1 pixel!
+		weighted = np.where(mags > 5, mags, 0.0)
+		theta_vals = np.floor_divide(np.add(thetas, math.pi), ((2.0 * math.pi) / theta_divs))
+		
+		combo_bins = ((np.add((ybin * grid_x_divs), xbin) * theta_divs) + theta_vals)
+		bins_histo, bin_edges = np.histogram(combo_bins, num_bins, (0., float(num_bins)), weights=weighted)
+		return bins_histo
+
+	def _dense_flow(self, prev_small, small):
+		"""
+		Dense flow (in downscaled pixels) from prev_small to small: [HEIGHT, WIDTH, 2].
+		"""
+		if self.analysis_params['flow_method'] == 'dis':
+			if getattr(self, '_dis', None) is None:
+				self._dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST)
+			return self._dis.calc(prev_small, small, None)
+		return cv2.calcOpticalFlowFarneback(prev_small, small, flow=None, **self.analysis_params['farneback'])
+
+	def _dense_histogram(self, flow, frame_size):
+		"""
+		Histogram of the angles of the dense flow for every grid cell: grid_divs_x * grid_divs_y * theta_divs values, each the mean flow (in full-resolution pixels per frame) of the cell's pixels in that angle bin.
+		"""
+		ap = self.analysis_params
+		theta_divs = ap['theta_divs']
+		layout = self._grid_layout()
+		height, width = flow.shape[:2]
+		key = (height, width, layout.grid_divs_x, layout.grid_divs_y, theta_divs)
+		if getattr(self, '_dense_cells_key', None) != key:
+			# grid cell (times theta_divs) of every pixel of the downscaled frame, and the number of pixels in each cell
+			cell_map = layout.cell_map(height, width, (height / float(layout.grid_divs_y)), (width / float(layout.grid_divs_x)))
+			pixels = np.bincount(cell_map.ravel(), minlength=(layout.cells + 1))[:layout.cells]
+			self._dense_cells = cell_map.ravel() * theta_divs
+			self._dense_pixels = np.maximum(pixels, 1).astype('float32')
+			self._dense_cells_key = key
+		# like the LK tracks: from where the pixel is back to where it was
+		xdelta = flow[:,:,0].ravel() * (-float(frame_size[0]) / width)
+		ydelta = flow[:,:,1].ravel() * (-float(frame_size[1]) / height)
+		mags = np.sqrt((xdelta * xdelta) + (ydelta * ydelta))
+		weighted = np.where(mags > ap['dense_threshold'], mags, 0.0)
+		theta_vals = np.minimum(((np.arctan2(ydelta, xdelta) + math.pi) // ((2.0 * math.pi) / theta_divs)).astype(np.intp), (theta_divs - 1))
+		num_bins = layout.cells * theta_divs
+		bins_histo = np.bincount((self._dense_cells + theta_vals), weights=weighted, minlength=(num_bins + theta_divs))[:num_bins]
+		return (bins_histo.reshape(layout.cells, theta_divs) / self._dense_pixels[:,np.newaxis]).astype('float32').ravel()
+
+	def _flow_kernel(self):
+		"""
+		The analysis kernel of the flow_method.
+		"""
+		flow_method = self.analysis_params['flow_method']
+		if flow_method == 'lk':
+			return self._analysis_kernel
+		if flow_method == 'dis' and not hasattr(cv2, 'DISOpticalFlow_create'):
+			raise ValueError("flow_method 'dis' needs OpenCV 3.3 or later (use 'farneback')")
+		if flow_method not in ['farneback', 'dis']:
+			raise ValueError("Unknown flow_method: %s (use 'lk', 'farneback' or 'dis')" % flow_method)
+		self._prev_small = None
+		return self._dense_kernel
+
+	def _same_flow_method(self, analysis_params):
+		"""
+		False (and says why) if the data file that this analysis would write (the preview's, for a preview) holds rows of a different flow_method: Lucas-Kanade and dense rows have the same layout and the same default data_extension, and one must not silently replace the other. Data files without a header hold Lucas-Kanade rows.
+		"""
+		ap = analysis_params
+		path = (self.data_path + PREVIEW_EXTENSION) if ap['preview'] else self.data_path
+		if not os.path.exists(path):
+			return True
+		header = read_feature_header(path)
+		existing = (header.get('analysis_params') or {}).get('flow_method', 'lk') if header is not None else 'lk'
+		if existing == ap['flow_method']:
+			return True
+		print "ERROR: %s holds flow_method '%s' rows; will not replace them with '%s' rows. Pass a different data_extension (e.g. '.opticalflow24_dense'), or remove the data file first." % (path, existing, ap['flow_method'])
+		return False
+
+	def _reset_state(self):
+		"""
+		Forget the tracks and the previous (downscaled) frame, as at the start of a worker's time range.
+		"""
+		self.tracks.clear()
+		self._prev_small = None
+
+	def _row_frame(self, row):
+		"""
+		The frame that row row of the data file is analyzed from (for the checkpoint).
+		"""
+		return row + self._row_offset
+
+	def _analysis_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (analysis): follow the tracks into this frame; on stride frames, return the angle histogram row.
+		"""
+		frame_gray = self.conversions.convert(frame_idx, frame, cv2.COLOR_BGR2GRAY)
+		result = None
+		if self._track_frame(frame_gray) and frame_idx % self.analysis_params['stride'] == 0:
+			fd = frame_idx - self._row_offset
+			result = fd, self._track_histogram(fd)
+		self._detect_features(frame_idx, frame_gray)
+		self.prev_gray = frame_gray
+		return result
+
+	def _dense_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (dense flow analysis): on stride frames, return the angle histogram row of the dense flow from the previous frame.
+		"""
+		frame_gray = self.conversions.convert(frame_idx, frame, cv2.COLOR_BGR2GRAY)
+		small = self.conversions.downscale(frame_idx, frame, self.analysis_params['scale'])
+		result = None
+		if self._prev_small is not None and frame_idx % self.analysis_params['stride'] == 0:
+			fd = frame_idx - self._row_offset
+			flow = self._dense_flow(self._prev_small, small)
+			result = fd, self._dense_histogram(flow, (frame_gray.shape[1], frame_gray.shape[0]))
+		self._prev_small = small
+		return result
+
+	def _playback_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (playback): the tracks are followed for display only; the row is read back from the data file.
+		"""
+		frame_gray = self.conversions.convert(frame_idx, frame, cv2.COLOR_BGR2GRAY)
+		self._track_frame(frame_gray)
+		self._detect_features(frame_idx, frame_gray)
+		self.prev_gray = frame_gray
+		fd = frame_idx - self._row_offset
+		return fd, self.playback_data[fd]
 
 	def _display_movie_frame_by_frame(self, **kwargs):
 		"""
@@ -795,12 +1181,13 @@ class OpticalFlow:
 		verbose = ap['verbose']
 		
 		if have_mov is True:
-	 		self.capture = cv2.VideoCapture(self.movie_path)
+			self.frame_source = FrameSource(self.movie_path, ap['seek_threshold'])
+			self.capture = self.frame_source.capture
 			frame_width = int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
 			frame_height = int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
 		else:
 			frame_width = 800
-			frame_height = int(float(frame_width) * self._read_json_value('aspect'))
+			frame_height = int(frame_width / self._read_json_value('aspect'))
 			print self._read_json_value('aspect')
 		
 		fps = ap['fps']
@@ -815,8 +1202,7 @@ class OpticalFlow:
 		print frame_width
 		print frame_height
 		
-		centers_x = range((frame_width/16),frame_width,(frame_width/8))
-		centers_y = range((frame_height/16),frame_height,(frame_height/8))
+		centers_x, centers_y = grid_centers(frame_size, (grid_x_divs, grid_y_divs))
 		
 		if verbose:
 			print fps, ' | ', frame_size, ' | ', grid_size
@@ -871,20 +1257,17 @@ class OpticalFlow:
 		# set up memmap
 		# mode should always be playback and dislay should always be true!!!
 		if ap['mode'] == 'playback' and ap['display'] == True and have_data:
-			fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides + dur_strides),(grid_x_divs * grid_y_divs * theta_divs)))
+			fp = load_feature_file(self.data_path, self._grid_layout().row_shape, rows=(offset_strides + dur_strides), decode=True)
 			cv2.namedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
 			cv2.resizeWindow('Image', frame_width, frame_height)
-			ROOT2 = math.sqrt(2.0)
-			THETAS_X = [-32, int(-16*ROOT2), 0, int(16*ROOT2), 32, int(16*ROOT2), 0, int(-16*ROOT2)]
-			THETAS_Y = [0, int(-16*ROOT2), -32, int(-16*ROOT2), 0, int(16*ROOT2), 32, int(16*ROOT2)]
+			THETAS_X, THETAS_Y = theta_wedges(theta_divs)
 			THETAS = [[pair[0],pair[1]] for pair in zip(THETAS_X, THETAS_Y)]
 		
 		self.frame_idx = offset_frames
 		end_frame = offset_frames + dur_frames
 
 		if have_mov:
-			self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
-			ret, frame = self.capture.read()
+			frame = self.frame_source.read_frame(offset_frames)
 			if frame is None: 
 				print 'Frame error! Exiting...'
 				return # no image captured... end the processing		
@@ -903,7 +1286,7 @@ class OpticalFlow:
 			
 			if have_mov:
 				# grab next frame
-				ret, frame = self.capture.read()
+				frame = self.frame_source.read_frame(self.frame_idx)
 				if frame is None: 
 					print 'Frame error! Exiting...'
 					break # no image captured... end the processing
@@ -914,12 +1297,12 @@ class OpticalFlow:
 			for row in range(grid_y_divs):
 				for col in range(grid_x_divs):
 					if ap['mode'] == 'playback' and ap['display']:
-						currframe = fp[self.frame_idx,:512]
+						currframe = fp[self.frame_idx]
 					else:
 						return
-					currframe = fp[self.frame_idx,:512]
-					framemin = currframe[:512].min()
-					framemax = currframe[:512].max()
+					currframe = fp[self.frame_idx]
+					framemin = currframe.min()
+					framemax = currframe.max()
 					framerange = framemax - framemin
 					if framerange > 0:
 						grays = np.multiply(np.subtract(currframe, framemin), (256.0 / framerange))
@@ -941,7 +1324,6 @@ class OpticalFlow:
 				
 				#### SHOW
 				cv.ShowImage('Image', cv.fromarray(frame))
-				fp.flush()
 	
 				print self.frame_idx, ':: ', (float(self.frame_idx - offset_frames) / dur_frames)
 				
@@ -960,8 +1342,6 @@ class OpticalFlow:
 				self.frame_idx += 24
 			elif p_state == 9: # adv. 10 sec.
 				self.frame_idx += 240
-			if have_mov:
-				self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, self.frame_idx)				
 			
 			# handle key events
 			k = cv.WaitKey (int(1000 / ap['afps']))
@@ -7,7 +7,7 @@ Part of Bregman:ACTION - Cinematic information retrieval toolkit
 Overview
 ========
 
-*PLEASE NOTE*: This TVL1 OpticalFlow class is set up for access only! We provide OpenFrameworks/C++ analysis code separately.
+The TVL1 data files can be made by the OpenFrameworks/C++ analysis code that we provide separately (Mac OS X only), or by analyze_movie, which runs the Dual TV-L1 optical flow of OpenCV on the CPU (OpenCV 2.4, or OpenCV 3 and later with the optflow module of opencv_contrib), in parallel processes if you like. The analysis follows the OpenFrameworks code: the brightness (V of HSV) of frames downscaled to 256 pixels wide, flow from each frame back to the frame two frames earlier, and flow magnitudes normalized by a running average of their maximum. The grid cells are placed as the OpenFrameworks code places them (cell_geometry='openframeworks'): cells of 256/8 by 192/8 pixels of the movie frame, scaled down with the frame, so that they cover the upper left 80% of a 320 pixel wide movie. Files analyzed with cell_geometry='full' (cells that tile the whole frame) are not comparable with the OpenFrameworks ones; the header's analysis_params say which geometry a data file has (see the featurefile module).
 
 Use the TVL1 OpticalFlow class to access optical flow features. The first 16 raw bins are a histogram over 16 angle-bins (22.5 degrees per bin) of detected angles for the entire image. The second is a set of sixteen histograms, each describing a region of the image. The regions are arranged in an even 8-by-8 non-overlapping grid, with the first region at the upper left and the last at the lower right. These values are stored in a memory-mapped binary file.
 
@@ -42,7 +42,7 @@ The full list of settable parameters, with default values and explanations:
 +------------------------+-----------------+----------------------------------------------------+
 | data_extension         | .tvl1           | this is what will be output and expected for input |
 +------------------------+-----------------+----------------------------------------------------+
-| mode                   | playback        | 'playback' ONLY                                    |
+| mode                   | playback        | 'playback' or 'analyze'                            |
 +------------------------+-----------------+----------------------------------------------------+
 | fps                    | 24              | fps: frames per second                             |
 +------------------------+-----------------+----------------------------------------------------+
@@ -66,6 +66,48 @@ The full list of settable parameters, with default values and explanations:
 +------------------------+-----------------+----------------------------------------------------+
 | display                | True            | launch display screen during analysis              |
 +------------------------+-----------------+----------------------------------------------------+
+| seek_threshold         | 250             | forward jumps (in frames) longer than this seek;   |
+|                        |                 | shorter ones grab through without decoding output  |
++------------------------+-----------------+----------------------------------------------------+
+| Parameters for analysis...                                                                    |
++------------------------+-----------------+----------------------------------------------------+
+| analysis_width         | 256             | frames are downscaled to (at most) this width      |
++------------------------+-----------------+----------------------------------------------------+
+| cell_geometry          | openframeworks  | 'openframeworks': cells placed as by the           |
+|                        |                 | OpenFrameworks code (comparable with its data      |
+|                        |                 | files); 'full': cells tile the whole frame         |
++------------------------+-----------------+----------------------------------------------------+
+| frame_gap              | 2               | flow goes from each frame back to the frame this   |
+|                        |                 | many frames earlier                                |
++------------------------+-----------------+----------------------------------------------------+
+| warmup_frames          | 240             | (parallel analysis) analysis frames (every         |
+|                        |                 | stride-th frame) analyzed before a worker's time   |
+|                        |                 | range, for the running maximum                     |
++------------------------+-----------------+----------------------------------------------------+
+| flush_interval         | 256             | analysis frames buffered in RAM between bulk       |
+|                        |                 | writes to the data file                            |
++------------------------+-----------------+----------------------------------------------------+
+| prefetch_depth         | 8               | frames decoded ahead (on a separate thread) of the |
+|                        |                 | analysis; 0 decodes on the analysis thread         |
++------------------------+-----------------+----------------------------------------------------+
+| storage_dtype          | float32         | dtype of the rows in the data file: float32,       |
+|                        |                 | float16, uint16 or uint8 (see featurefile module)  |
++------------------------+-----------------+----------------------------------------------------+
+| storage_range          | [0.0, 64.0]     | range of values that uint8/uint16 storage covers   |
++------------------------+-----------------+----------------------------------------------------+
+| preview                | False           | analyze only one sample frame every                |
+|                        |                 | preview_interval seconds, into a low-rate data     |
+|                        |                 | file (see the preview module)                      |
++------------------------+-----------------+----------------------------------------------------+
+| preview_interval       | 10.0            | seconds between the sample frames of a preview     |
++------------------------+-----------------+----------------------------------------------------+
+| progressive            | False           | analyze coarse-to-fine: every progressive_step-th  |
+|                        |                 | row first, then the rows in between, with a        |
+|                        |                 | coverage sidecar (see the progressive module)      |
++------------------------+-----------------+----------------------------------------------------+
+| progressive_step       | 64              | rows between the samples of the first pass of a    |
+|                        |                 | progressive analysis (halved every pass)           |
++------------------------+-----------------+----------------------------------------------------+
 | Parameters for display...                                                                     |
 +------------------------+-----------------+----------------------------------------------------+
 | viz_width_ratio        | 1.0             | for visualization of histogram (ratio of movie     |
@@ -104,6 +146,15 @@ Analyze a full film:
 	tvl1 = OpticalFlowTVL1('Psycho')
 	tvl1.analyze_movie() # Assumes that ~/Movies/action/Psycho.mov exists; returns otherwise
 
+To split the analysis of one film across several processes:
+
+.. code-block:: python
+
+	tvl1 = OpticalFlowTVL1('Psycho')
+	tvl1.analyze_movie(workers=8)
+
+Each worker starts analyzing warmup_frames analysis frames (warmup_frames * stride movie frames) before its own time range (the normalization carries state from frame to frame) and only writes rows from the start of that range. The running average of the maximum forgets 10% per analysis frame, so after the default warm-up of 240 analysis frames, at any stride, the rows at a range boundary match those of a single process to far below float32 precision.
+
 This also works, so you can define your own file locations:
 
 .. code-block:: python
@@ -189,9 +240,34 @@ import numpy as np
 import json, math
 from segment import *
 from actiondata import *
+from framesource import *
+from featurereader import *
+from featurefile import *
+from gridlayout import *
+from moviemetadata import *
+from featurewriter import *
+from checkpoint import *
+from preview import *
+from progressive import *
+from parallel import *
+from engine import *
+from viewer import *
 ad = ActionData()
 av = ActionView()
 
+
+def _dual_tvl1():
+	"""
+	A new DualTVL1 optical flow object from whichever API this OpenCV has (2.4, 3.x, or the contrib optflow module), or None.
+	"""
+	if not HAVE_CV:
+		return None
+	for module, name in [(cv2, 'createOptFlow_DualTVL1'), (cv2, 'DualTVL1OpticalFlow_create'), (getattr(cv2, 'optflow', None), 'DualTVL1OpticalFlow_create')]:
+		if hasattr(module, name):
+			return getattr(module, name)()
+	return None
+
+
 class OpticalFlowTVL1:
 	"""
 	Optical Flow (TVL1) analysis of frame and 4-by-4 grid of subframes.
@@ -203,6 +279,9 @@ class OpticalFlowTVL1:
 	If you want to run in verbose mode (to see some debug information on calculated frame offsets, analysis ranges, etc.) pass the verbose=True flag here.
 	"""
 	
+	# left behind when the object is sent to a worker process, which opens its own capture (see the parallel module)
+	_transient_state = ('capture', 'frame_source', 'X', '_tvl1_flow', '_prev_values')
+	
 	def __init__(self, filename='Vertigo', arg=None, **analysis_params):
 		"""
 		"""
@@ -224,22 +303,21 @@ class OpticalFlowTVL1:
 			self.json_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + '.json'))
 			print self.json_path
 			self.filename = filename
+			self.metadata = MovieMetadata(self.movie_path, self.json_path, filename)
 		
-		# self.determine_movie_length() no need
-# 		if ! exists(self.json_path):
-# 			self._write_metadata_to_json()
-		ap['afps'] = self._read_json_value('fps')
-		
-		# try to naively get some data and store in a class var
-		if os.path.exists(self.data_path):
-			self.default_tvl1_features_for_segment()
-		else:
-			self.X = None
+		# the metadata (afps, see _read_metadata) and the default features (X, see __getattr__) are read when they are first used
+		self._metadata_read = False
 	
 	def _check_tvl1_params(self, analysis_params=None):
 		"""
 		Simple mechanism to read in default parameters while substituting custom parameters.
 		"""
+		if analysis_params is not None:
+			self._metadata_read = True # the caller's parameters (afps included) replace the ones the metadata was read into
+		if analysis_params is not None and getattr(self, 'analysis_params', None) is not None:
+			# parameters passed to analyze_movie, playback_movie, etc. add to (rather than replace) the ones the object was made with;
+			# afps is not carried over (an accessor may have read it from the metadata): it is the caller's, or the default
+			analysis_params = dict([(k, v) for k, v in self.analysis_params.items() if k != 'afps'], **analysis_params)
 		self.analysis_params = analysis_params if analysis_params is not None else self.analysis_params
 		dcfp = self.default_tvl1_params()
 		for k in dcfp.keys():
@@ -252,10 +330,10 @@ class OpticalFlowTVL1:
 			'action_dir' : os.path.expanduser('~/Movies/action/'),	# default dir
 			'movie_extension' : '.mov',
 			'data_extension' : '.tvl1',
-			'mode' : 'playback',				# 'playback'
+			'mode' : 'playback',				# 'playback' or 'analyze'
 			'grid_divs_x' : 8,
 			'grid_divs_y' : 8,
-			'hist_bins' : 8,					# each bin is 22.5 degrees?
+			'theta_divs' : 16,					# angle bins of the full-frame histogram (22.5 degrees each)
 			'fps' : 24,							# fps: frames per second
 			'afps' : 24,						# afps: frames per second for access or alignment
 			'offset' : 0,						# time offset in seconds
@@ -263,6 +341,19 @@ class OpticalFlowTVL1:
 			'stride' : 1,						# number of frames to that comprise one analysis point, skips stride - 1 frames
 			'verbose' : True,					# useful for debugging
 			'display' : True,					# Launch display screen
+			'seek_threshold' : 250,				# (frames) forward jumps longer than this seek, shorter ones grab through
+			'analysis_width' : 256,				# (pixels) frames are downscaled to (at most) this width for the analysis
+			'cell_geometry' : 'openframeworks',	# 'openframeworks': grid cells placed as by the OpenFrameworks analysis; 'full': cells tile the whole frame
+			'frame_gap' : 2,					# (frames) the flow goes from each frame back to the frame this many frames earlier
+			'warmup_frames' : 240,				# (analysis frames) parallel workers start analyzing this many strides before their own range
+			'flush_interval' : 256,				# (analysis frames) rows buffered in RAM between writes to the data file
+			'prefetch_depth' : 8,				# (frames) decoded ahead of the analysis on a separate thread; 0 turns prefetching off
+			'storage_dtype' : 'float32',		# dtype of the rows in the data file: 'float32', 'float16', 'uint16' or 'uint8'
+			'storage_range' : [0.0, 64.0],		# (values) range covered by uint8/uint16 storage; larger values are clipped
+			'preview' : False,			# analyze only one sample frame every preview_interval seconds (see the preview module)
+			'preview_interval' : 10.0,	# (seconds) between the sample frames of a preview
+			'progressive' : False,		# analyze coarse-to-fine, with a coverage sidecar (see the progressive module)
+			'progressive_step' : 64,		# (rows) between the samples of the first pass of a progressive analysis, halved every pass
 			'hist_shrink_factor' : 0.5,			# (adjustable) ratio for size of histogram window
 			'hist_width_ratio' : 0.5,			# (adjustable) ratio for width of histogram window size
 			'hist_height_ratio' : 0.5,			# (adjustable) ratio for height of histogram window size
@@ -273,25 +364,36 @@ class OpticalFlowTVL1:
 	
 	def _write_metadata_to_json(self):
 		"""
+		Make sure that the JSON metadata file is there and up to date with the movie (see the moviemetadata module). The movie is only opened if it is not.
 		"""
-		title = self.filename
-		capture = cv2.VideoCapture(self.movie_path)
-		fps = capture.get(cv.CV_CAP_PROP_FPS)
-		aspect = capture.get(cv.CV_CAP_PROP_FRAME_WIDTH / cv.CV_CAP_PROP_FRAME_HEIGHT)
-		frames = capture.get(cv.CV_CAP_PROP_FRAME_COUNT)
-		length = frames / fps
-		movdict = {'title':title, 'fps':fps, 'aspect': aspect,'frames': frames, 'length':length}
-		fp = file(self.json_path, 'w')
-		fp.write(json.dumps(movdict))
-		fp.close()
-		del capture
+		self.metadata.read()
 		return 1
 	
 	def _read_json_value(self, key='fps'):
-# 		fp = file(self.json_path, 'r')
-		jsonfile = open(self.json_path)
-		jsondata = json.load(jsonfile)
-		return jsondata[key]
+		"""
+		Value of key in the movie's metadata, without opening the movie (see the moviemetadata module).
+		"""
+		return self.metadata.value(key)
+	
+	def _read_metadata(self):
+		"""
+		Read the movie's frame rate (afps) from its metadata (see the moviemetadata module). Done once, the first time it is needed (not when the object is constructed).
+		"""
+		if self._metadata_read:
+			return
+		self._metadata_read = True
+		self.analysis_params['afps'] = self._read_json_value('fps')
+	
+	def __getattr__(self, name):
+		"""
+		X (the default features for the whole film) is read the first time it is used.
+		"""
+		if name == 'X':
+			self.X = None
+			if os.path.exists(feature_file_path(self.data_path)):
+				self.default_tvl1_features_for_segment()
+			return self.X
+		raise AttributeError(name)
 	
 	def all_tvl1_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -308,8 +410,9 @@ class OpticalFlowTVL1:
 			>>> (1440, 768)
 
 		"""
+		layout = self._grid_layout()
 		res = self._tvl1_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)
-		return (res[0].reshape(-1, 16), res[1].reshape(-1, 128))
+		return (res[0].reshape(-1, layout.size('full')), res[1].reshape(-1, layout.size('grid')))
 	
 	def full_tvl1_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -319,7 +422,8 @@ class OpticalFlowTVL1:
 			all_tvl1_features_for_segment(...)[0].reshape((segment.time_span.duration*4), -1)		
 
 		"""
-		self.X = self._tvl1_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[0].reshape(-1, 16)
+		layout = self._grid_layout()
+		self.X = self._tvl1_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, units=layout.units('full')).reshape(-1, layout.size('full'))
 		return self.X
 	
 	def gridded_tvl1_features_for_segment(self, segment=Segment(0, -1)):
@@ -338,8 +442,7 @@ class OpticalFlowTVL1:
 			all_tvl1_features_for_segment(...)[1].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._tvl1_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1].reshape(-1, 128)
-		return self.X
+		return self.region_tvl1_features_for_segment('grid', segment)
 
 	def center_quad_tvl1_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -357,8 +460,7 @@ class OpticalFlowTVL1:
 			all_tvl1_features_for_segment(...)[1][:,[5,6,9,10],...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._tvl1_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][ range((18*2),(22*2))+range((26*2),(30*2))+range((34*2),(38*2))+range((52*2),(56*2)) ].reshape(-1, 32)
-		return self.X
+		return self.region_tvl1_features_for_segment('center', segment)
 
 	def middle_band_tvl1_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -376,8 +478,7 @@ class OpticalFlowTVL1:
 			all_tvl1_features_for_segment(...)[1][:,::2][,16:48].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._tvl1_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][:,(16*2):(48*2)].reshape(-1, 64)
-		return self.X
+		return self.region_tvl1_features_for_segment('band', segment)
 	
 	def plus_band_tvl1_features_for_segment(self, segment=Segment(0, -1)):
 		"""
@@ -395,8 +496,14 @@ class OpticalFlowTVL1:
 				all_tvl1_features_for_segment(...)[1][:,range(2,6)+range(10,14)+range(16,48)+range(50,54)+range(58,62)].reshape(-1, 576)
 		
 		"""
-		
-		self.X = self._tvl1_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][:,range((2*2),(6*2))+range((10*2),(14*2))+range((16*2),(48*2))+range((50*2),(54*2))+range((58*2),(62*2))].reshape(-1, 96)
+		return self.region_tvl1_features_for_segment('plus', segment)
+
+	def region_tvl1_features_for_segment(self, region='band', segment=Segment(0, -1)):
+		"""
+		Return the gridded flow values of a region of the grid: 'grid', 'band', 'center' or 'plus' (which scale with grid_divs_x and grid_divs_y; see the gridlayout module), or a boolean mask of grid_divs_y by grid_divs_x cells. Only the values of the region are read. The gridded, middle band, center quad and plus band accessors call this.
+		"""
+		layout = self._grid_layout()
+		self.X = self._tvl1_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration), units=layout.units(region)).reshape(-1, layout.size(region))
 		return self.X
 	
 	def default_tvl1_features_for_segment(self, func='middle_band_tvl1_features_for_segment', segment=Segment(0, -1)):
@@ -405,16 +512,36 @@ class OpticalFlowTVL1:
 		"""
 		return getattr(self,func)(segment)
 
-	def _tvl1_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=60):
+	def transpose_data_file(self, layout='region'):
+		"""
+		Rewrite the data file region-major (layout='region'), so that the middle band, center quad and plus band accessors read only (and sequentially) the flow values they return, or back to frame-major (layout='frame'). See the featurefile module.
+		"""
+		grid = self._grid_layout()
+		if layout == 'region':
+			return transpose_feature_file(self.data_path, sections=grid.sections(), units=grid.num_units, row_shape=grid.row_shape)
+		return transpose_feature_file(self.data_path, row_shape=grid.row_shape)
+
+	def _grid_layout(self):
+		"""
+		Layout of the rows of the data file for the grid and bins of the analysis parameters (see the gridlayout module), in units of pairs of values: the full-frame histogram (theta_divs values, theta_divs / 2 units), then the mean and standard deviation of the normalized flow magnitude of each grid cell (see _tvl1_row), in one dimension.
+		"""
+		ap = self.analysis_params
+		if ap['theta_divs'] % 2 != 0:
+			raise ValueError("The full-frame histogram is stored in pairs of values: theta_divs must be even (%s)" % ap['theta_divs'])
+		return grid_layout(ap['grid_divs_x'], ap['grid_divs_y'], (2,), full_units=(ap['theta_divs'] / 2), flat=True)
+
+	def _tvl1_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=60, units=None):
 		"""
 		This will be the interface for grabbing analysis data based on onsets and durations, translating seconds into frames.
 		Takes a file name or complete path of a data file, an onset time in seconds, and a duration in seconds.
-		Returns a tuple of memory-mapped arrays corresponding to the full-frame histogram followed by the 4 by 4 grid of histograms: ([NUMBER OF FRAMES, 1, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)], [NUMBER OF FRAMES, 16, NUMBER OF COLUMNS (3), NUMBER OF BINS (16)])
+		Returns a tuple of float32 arrays corresponding to the full-frame flow histogram followed by the grid of flow values (8 by 8 by default): ([NUMBER OF FRAMES, 16], [NUMBER OF FRAMES, 128])
+		With units (pairs of values: 0-7 the full-frame histogram, 8-71 the grid, by default; see _grid_layout), returns only those values: [NUMBER OF FRAMES, NUMBER OF UNITS, 2]. Only they are read; in a region-major data file (see transpose_data_file), the middle band is one sequential read.
 		::
 		
 			raw_tvl1_data = tvl1_for_segment('Psycho.hist', onset_time=360, duration=360)
 		
 		"""
+		self._read_metadata()
 		ap = self.analysis_params
 		frames_per_astride = (24.0 / ap['stride']) # 24.0 == ap['fps']
 
@@ -424,16 +551,18 @@ class OpticalFlowTVL1:
 
 		onset_frame = int(onset_s * frames_per_astride)
 		if duration_s < 0:
-			dur_frames = self.determine_movie_length() * frames_per_astride * (ap['afps'] / ap['fps']) # convert back to aframes
+			dur_frames = int(self.determine_movie_length() * frames_per_astride * (ap['afps'] / ap['fps'])) # convert back to aframes
 		else:
-			dur_frames = duration_s * frames_per_astride * (ap['afps'] / ap['fps'])
+			dur_frames = int(duration_s * frames_per_astride * (ap['afps'] / ap['fps']))
 		
-		# memmap
 		print dur_frames
-		mapped = np.memmap(self.data_path, dtype='float32', mode='r') #, offset=onset_frame, shape=(dur_frames,(128+16)))
-		mapped = mapped.reshape((-1,144))
-		mapped = ad.interpolate_time(mapped, ap['afps'])
-		return (mapped[(onset_frame+dur_frames),:16], mapped[onset:(onset_frame+dur_frames),16:])
+		# map and resample (to 24 fps) only the rows of the segment
+		layout = self._grid_layout()
+		mapped = FeatureReader(self.data_path, layout.row_shape, units=layout.num_units).window(onset_frame, dur_frames, ap['afps'], units=units)
+		if units is not None:
+			return mapped
+		full_size = layout.size('full')
+		return (mapped[:,:full_size], mapped[:,full_size:])
 		
 	
 # 	def playback_movie_frame_by_frame(self, offset=None, duration=None):
@@ -459,22 +588,247 @@ class OpticalFlowTVL1:
 # 		
 # 		self._display_movie_frame_by_frame(mode='playback', display=True, offset=offset_s, duration=dur_s)
 # 	
+	def analyze_movie(self, offset=0, duration=-1, workers=1, resume=False):
+		"""
+		Analyze the movie (TVL1 optical flow on the CPU) without displaying on screen. Equivalent to:
+		
+		::
+		
+			_process_movie(offset=0, duration=-1)
+		
+		With workers > 1, the movie is split into time ranges that are analyzed by that many processes. With resume=True, an interrupted analysis is picked up where it left off (see the checkpoint module).
+		"""
+		self._process_movie(mode='analyze', display=False, offset=offset, duration=duration, workers=workers, resume=resume)
+
+	def analyze_movie_with_display(self, offset=0, duration=-1):
+		"""
+		Analyze the movie; display (the video only) on screen. Equivalent to:
+		
+		::
+		
+			_process_movie(offset=0, duration=-1, display=True)
+		"""
+		self._process_movie(mode='analyze', display=True, offset=offset, duration=duration)
+
+	def _process_movie(self, workers=1, shard=None, engine=None, resume=False, **kwargs):
+		"""
+		Main processing function for TVL1 analyses. Will exit if the movie is missing or OpenCV has no DualTVL1 optical flow. This function is not intended to be called directly; call analyze_movie instead.
+		
+		workers > 1 hands the analysis to a pool of processes (see the parallel module); each of them calls this function again with shard=(start_frame, end_frame) and only fills in the rows for that range.
+		
+		With engine=AnalysisEngine(...), nothing is analyzed here: the kernel and writer are added to that engine, which decodes the movie once for several extractors (see the pipeline module).
+		
+		The progress of an analysis is recorded in a sidecar file; resume=True picks up an interrupted analysis where it left off (see the checkpoint module).
+		"""
+		if not HAVE_CV:
+			print "WARNING: You must install OpenCV in order to analyze or view!"
+			return
+		if (self.movie_path is None) or (self.data_path is None) or not os.path.exists(self.movie_path):
+			print "ERROR: Must supply a movie for analysis!"
+			return
+		if _dual_tvl1() is None:
+			print "ERROR: This OpenCV has no DualTVL1 optical flow (it is in OpenCV 2.4, and in the optflow module of opencv_contrib for OpenCV 3 and later)."
+			return
+		
+		ap = self._check_tvl1_params(kwargs)
+		verbose = ap['verbose']
+		
+		self.frame_source = PrefetchFrameSource(FrameSource(self.movie_path, ap['seek_threshold']), ap['prefetch_depth'])
+		self.capture = self.frame_source.capture
+		
+		fps = ap['fps']
+		total_frame_count = int(self.capture.get(cv.CV_CAP_PROP_FRAME_COUNT))
+		dur_total_secs = int(total_frame_count / fps)
+		stride_frames = ap['stride']
+		if ap['duration'] < 0:
+			dur_secs = dur_total_secs
+		else:
+			dur_secs = ap['duration']
+		
+		offset_secs = min(max(ap['offset'], 0), dur_total_secs)
+		dur_secs = min(max(dur_secs, 0), (dur_total_secs - offset_secs))
+		offset_strides = int(offset_secs * (fps / stride_frames))
+		dur_strides = int(dur_secs * (fps / stride_frames))
+		offset_frames = offset_strides * stride_frames
+		dur_frames = dur_strides * stride_frames
+		
+		if verbose:
+			print '%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%'
+			print 'FRAMES: ', total_frame_count
+			print "OFFSET (STRIDES): ", offset_strides
+			print 'DUR (STRIDES): ', dur_strides
+			print "stride_frames: ", stride_frames
+		
+		row_shape = self._grid_layout().row_shape
+		kernel = self._analysis_kernel
+		if shard is not None:
+			# the file was preallocated by the parent process (or by the interrupted analysis); only write our own rows
+			checkpoint = Checkpoint(self.data_path, ap)
+			checkpoint.track(shard, self._row_frame)
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='r+', flush_interval=ap['flush_interval'], checkpoint=checkpoint)
+		elif ap['preview']:
+			# a low-rate preview: only the sample frames (and their warm-up) are decoded, and only their rows are written (see the preview module)
+			preview = Preview(self.data_path, row_shape, ap, offset_frames, (offset_frames + dur_frames), warmup=ap['frame_gap'], reset=self._reset_state)
+			self.frame_source = preview.frame_source(self.frame_source)
+			fp, kernel = preview.writer, preview.kernel(self._analysis_kernel)
+		elif ap['progressive']:
+			# coarse-to-fine: the samples of every pass are analyzed like those of a preview, into the full data file (see the progressive module)
+			progressive = Progressive(self.data_path, row_shape, ap, dur_strides, self._row_frame, warmup=ap['frame_gap'], reset=self._reset_state, resume=resume)
+			self.frame_source = progressive.frame_source(self.frame_source)
+			fp, kernel = progressive.writer, progressive.kernel(self._analysis_kernel)
+		else:
+			checkpoint = Checkpoint(self.data_path, ap)
+			if resume and checkpoint.can_resume():
+				# pick up the interrupted analysis where it left off
+				self.frame_source.release()
+				shards = checkpoint.remaining()
+				if shards:
+					process_shards(self, shards, workers)
+				elif shards is not None:
+					print 'Nothing to resume: the analysis is complete.'
+				return
+			print 'ANALYZE!'
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], checkpoint=checkpoint, analysis_params=ap)
+			if workers > 1 and not ap['display']:
+				fp.close()
+				self.frame_source.release()
+				checkpoint.start(shard_ranges(offset_frames, (offset_frames + dur_frames), workers, stride_frames))
+				process_movie_in_parallel(self, workers, offset_frames, (offset_frames + dur_frames), align=stride_frames)
+				return
+			checkpoint.start([(offset_frames, (offset_frames + dur_frames))])
+			checkpoint.track((offset_frames, (offset_frames + dur_frames)), self._row_frame)
+		
+		self.frame_idx = offset_frames
+		end_frame = offset_frames + dur_frames
+		first_frame = offset_frames
+		if shard is not None:
+			# rebuild the previous frames and the running maximum over the warm-up frames, but write nothing before our own range
+			first_frame, end_frame = shard
+			self.frame_idx = max(offset_frames, (first_frame - (ap['warmup_frames'] * ap['stride'])))
+		self._row_offset = offset_strides
+		self._prev_values = []
+		self._mag_max_avg = 1.0
+		
+		if engine is not None:
+			self.frame_source.release()
+			engine.add_kernel(kernel, fp, self.frame_idx, end_frame, step=1, first_frame=first_frame)
+			return
+		
+		# headless loop; display and progress reports are optional subscribers
+		engine = AnalysisEngine(self.frame_source, kernel, fp)
+		if ap['display']:
+			engine.subscribe(FrameViewer(delay=int(1000 / ap['afps'])))
+		if verbose:
+			engine.subscribe(ProgressReporter(self.frame_idx, end_frame))
+		complete = False
+		try:
+			complete = engine.run(self.frame_idx, end_frame, first_frame=first_frame)
+		finally:
+			fp.close(complete)
+			self.frame_source.release()
+		if verbose:
+			print 'FEATURE WRITER: ', fp.stats()
+			print 'ENGINE: ', engine.stats()
+			print 'FRAME SOURCE: ', self.frame_source.stats()
+
+	def _reset_state(self):
+		"""
+		Forget the previous frames, as at the start of an analysis. The running maximum of the flow carries on.
+		"""
+		self._prev_values = []
+
+	def _row_frame(self, row):
+		"""
+		The frame that row row of the data file is analyzed from (for the checkpoint).
+		"""
+		return (row + self._row_offset) * self.analysis_params['stride']
+
+	def _analysis_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (analysis): on stride frames, the row of the TVL1 flow from frame_idx - frame_gap to frame_idx.
+		"""
+		ap = self.analysis_params
+		height, width = frame.shape[:2]
+		scale = min(1.0, (ap['analysis_width'] / float(width)))
+		size = (max(1, int(width * scale)), max(1, int(height * scale)))
+		# brightness (the V of HSV) of the downscaled frame
+		values = cv2.resize(frame, size, interpolation=cv2.INTER_AREA).max(axis=2)
+		result = None
+		if len(self._prev_values) == ap['frame_gap'] and frame_idx % ap['stride'] == 0:
+			if getattr(self, '_tvl1_flow', None) is None:
+				self._tvl1_flow = _dual_tvl1()
+			# flow from this frame back to the earlier one
+			flow = self._tvl1_flow.calc(values, self._prev_values[0], None)
+			result = ((frame_idx / ap['stride']) - self._row_offset), self._tvl1_row(flow, scale)
+		self._prev_values = (self._prev_values + [values])[-ap['frame_gap']:]
+		return result
+
+	def _tvl1_row(self, flow, scale=1.0):
+		"""
+		One row of the data file from a TVL1 flow field (of a movie frame downscaled by scale): the full-frame histogram of the flow's angles (weighted by magnitude), then the mean and standard deviation of the flow magnitude in each grid cell (see _cell_map). The magnitudes are normalized by a running average of their maximum (and set to 0 within 5 pixels of the edges), as in the openFrameworks analysis.
+		"""
+		ap = self.analysis_params
+		theta_divs = ap['theta_divs']
+		layout = self._grid_layout()
+		height, width = flow.shape[:2]
+		magnitude, angle = cv2.cartToPolar(flow[:,:,0], flow[:,:,1], angleInDegrees=True)
+		border = np.zeros_like(magnitude)
+		border[5:-5,5:-5] = magnitude[5:-5,5:-5]
+		magnitude = border
+		self._mag_max_avg = (float(magnitude.max()) * 0.1) + (self._mag_max_avg * 0.9)
+		magnitude = magnitude / self._mag_max_avg
+		
+		row = np.zeros(layout.row_shape, dtype='float32')
+		theta_vals = np.minimum((np.floor(angle) * (theta_divs / 360.0)).astype(np.intp), (theta_divs - 1))
+		row[:theta_divs] = np.bincount(theta_vals.ravel(), weights=magnitude.ravel(), minlength=theta_divs) / math.sqrt(height * width)
+		
+		cell_map = self._cell_map(height, width, scale).ravel()
+		pixels = np.maximum(np.bincount(cell_map, minlength=(layout.cells + 1))[:layout.cells], 1)
+		means = np.bincount(cell_map, weights=magnitude.ravel(), minlength=(layout.cells + 1))[:layout.cells] / pixels
+		squares = np.bincount(cell_map, weights=np.square(magnitude.ravel()), minlength=(layout.cells + 1))[:layout.cells] / pixels
+		cells = row[(layout.cell_offset * 2):].reshape(layout.cells, 2)
+		cells[:,0] = means
+		cells[:,1] = np.sqrt(np.maximum((squares - np.square(means)), 0.0))
+		return row
+
+	def _cell_map(self, height, width, scale):
+		"""
+		Grid cell of every pixel of a height by width flow field (of a movie frame downscaled by scale); pixels outside of the cells get layout.cells. With cell_geometry 'full', the cells tile the flow field. With 'openframeworks', they are placed as the openFrameworks analysis places them: analysis_width/grid_divs_x by (analysis_width * 3/4)/grid_divs_y pixels of the movie frame each (whole pixels), from its upper left corner, scaled by scale and truncated to whole pixels.
+		"""
+		ap = self.analysis_params
+		layout = self._grid_layout()
+		if ap['cell_geometry'] not in ('openframeworks', 'full'):
+			raise ValueError("Unknown cell_geometry: %s (use 'openframeworks' or 'full')" % ap['cell_geometry'])
+		if ap['cell_geometry'] == 'full':
+			return layout.cell_map(height, width, int(height / layout.grid_divs_y), int(width / layout.grid_divs_x))
+		cell_width = int(ap['analysis_width'] / float(layout.grid_divs_x))
+		cell_height = int((ap['analysis_width'] * 0.75) / layout.grid_divs_y)
+		def positions(size, cell_size, divs):
+			cells = np.empty(size, dtype=np.intp)
+			cells[:] = -1
+			for n in range(divs):
+				start = int((n * cell_size) * scale)
+				cells[start:(start + int(cell_size * scale))] = n
+			return cells
+		rows = positions(height, cell_height, layout.grid_divs_y)
+		cols = positions(width, cell_width, layout.grid_divs_x)
+		inside = (rows >= 0)[:,np.newaxis] & (cols >= 0)[np.newaxis,:]
+		return np.where(inside, ((rows[:,np.newaxis] * layout.grid_divs_x) + cols[np.newaxis,:]), layout.cells).astype(np.intp)
+
 	def determine_movie_length(self, **kwargs):
 	
 		# ap = self._check_tvl1_params(kwargs)
+		self._read_metadata()
 		ap = self.analysis_params
 		strides_per_second = (ap['fps'] / ap['stride'])
 	
 		if os.path.exists(self.movie_path) and HAVE_CV:
-			capture = cv2.VideoCapture(self.movie_path)
-			dur_total_seconds = int(capture.get(cv.CV_CAP_PROP_FRAME_COUNT) / ap['fps'])
+			# frame count from the metadata; the movie is not opened (see the moviemetadata module)
+			dur_total_seconds = int(self.metadata.frames() / ap['fps'])
 			print "mov total secs: ", dur_total_seconds
 		elif os.path.exists(self.data_path):
-			dsize = os.path.getsize(self.data_path)
-			print "dsize: ", dsize
-			# since we are reading raw tvl1 analysis data that always has the same size on disc!
-			# the constant had better be correct!
-			dur_total_aframes = dsize / float(((ap['grid_divs_x'] * ap['grid_divs_y'] * 2) + 16) * 4) # REGIONS * CHANNELS + 16 * BYTES
+			# row count from the data file's header (see the featurefile module); raw data files: from their size, with the (HISTOGRAM BINS + REGIONS) * CHANNELS layout
+			dur_total_aframes = float(feature_file_rows(self.data_path, self._grid_layout().row_shape))
 			print 'dtaf: ', dur_total_aframes
 			dur_total_seconds = (dur_total_aframes / strides_per_second) * (ap['fps'] / ap['afps'])
 			print "total secs: ", dur_total_seconds
@@ -530,7 +884,8 @@ class OpticalFlowTVL1:
 		hist_size = (hist_width, hist_height)
 		
 		if have_mov is True:
-	 		self.capture = cv2.VideoCapture(self.movie_path)
+			self.frame_source = FrameSource(self.movie_path, ap['seek_threshold'])
+			self.capture = self.frame_source.capture
 			frame_width = int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
 			frame_height = int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
 			frame_size = (frame_width, frame_height)
@@ -593,7 +948,8 @@ class OpticalFlowTVL1:
 		# set up memmap
 		# mode should always be playback and dislay should always be true!!!
 		if ap['mode'] == 'playback' and ap['display'] == True and have_data:
-			fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides + dur_strides),((8*8*2)+16)))
+			full_size = self._grid_layout().size('full')
+			fp = load_feature_file(self.data_path, self._grid_layout().row_shape, rows=(offset_strides + dur_strides), decode=True)
 			if have_mov:
 				cv2.namedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
 				cv2.resizeWindow('Image', frame_width, frame_height)
@@ -604,8 +960,7 @@ class OpticalFlowTVL1:
 		end_frame = offset_frames + dur_frames
 
 		if have_mov:
-			self.capture.set(cv2.cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
-			ret, frame = self.capture.read()
+			frame = self.frame_source.read_frame(offset_frames)
 			if frame is None: 
 				print 'Frame error! Exiting...'
 				return # no image captured... end the processing		
@@ -613,7 +968,7 @@ class OpticalFlowTVL1:
 # 		else:
 # 			frame = np.empty((frame_height, frame_width), np.uint8)
 
-		two_points = self.build_bars(100, 20) # 16: number of bins
+		two_points = self.build_bars(100, 20)
 		
 		self.frame_idx += 1
 		playing_flag = True
@@ -626,14 +981,14 @@ class OpticalFlowTVL1:
 			
 			if have_mov:
 				# grab next frame
-				ret, frame = self.capture.read()
+				frame = self.frame_source.read_frame(self.frame_idx)
 				if frame is None: 
 					print 'Frame error! Exiting...'
 					break # no image captured... end the processing
 			
 			# display stage (gridded)
 			if ap['mode'] == 'playback' and ap['display']:
-				currframe = fp[self.frame_idx,:16]
+				currframe = fp[self.frame_idx,:full_size]
 				histimg[:] = 0 
 			else:
 				return
@@ -644,13 +999,12 @@ class OpticalFlowTVL1:
 			if np.isnan(normed_frame).any() != True:
 				for i, val in enumerate(normed_frame):
 					#draw the rectangle in the wanted color
-					self.make_rectangles(cv.fromarray(histimg), two_points, val, hist_height, hoffset=int((hist_width/16.0)*i))
+					self.make_rectangles(cv.fromarray(histimg), two_points, val, hist_height, hoffset=int((hist_width/float(full_size))*i))
 			
 			#### SHOW
 			if have_mov:
 				cv.ShowImage('Image', cv.fromarray(frame))
 			cv.ShowImage('Histo', cv.fromarray(histimg))
-			fp.flush()
 
 			print self.frame_idx, ':: ', (float(self.frame_idx - offset_frames) / dur_frames)
 				
@@ -669,8 +1023,6 @@ class OpticalFlowTVL1:
 				self.frame_idx += 24
 			elif p_state == 9: # adv. 10 sec.
 				self.frame_idx += 240
-			if have_mov:
-				self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, self.frame_idx)				
 			
 			# handle key events
 			k = cv.WaitKey (int(1000 / ap['afps']))
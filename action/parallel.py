@@ -0,0 +1,97 @@
+# parallel.py - intra-film parallel analysis by time-range sharding
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+Split the analysis of one film across several worker processes. The analysis range is cut into contiguous, stride-aligned time ranges (shards). Each worker opens its own VideoCapture and writes its own disjoint rows of the same preallocated output memmap, so no merging is needed afterwards. The extractor is copied to the workers without the attributes listed in the _transient_state of its class (the capture, the frame-to-frame state and any data loaded for playback).
+
+You normally do not call this module directly; pass workers=N to an extractor's analyze_movie function instead:
+
+.. code-block:: python
+
+	cflab = ColorFeaturesLAB('Psycho')
+	cflab.analyze_movie(workers=8)
+
+Extractors that carry state from frame to frame start each shard a little early (warm-up) and only write rows from the start of their own range:
+
++------------------+-----------------------------------------------------------------------+
+| ColorFeaturesLAB | no warm-up; every analysis frame is independent                       |
++------------------+-----------------------------------------------------------------------+
+| PhaseCorrelation | two frames of warm-up (frame-to-frame state of the grid cells)        |
++------------------+-----------------------------------------------------------------------+
+| OpticalFlow      | 'warmup_frames' frames of warm-up to rebuild the Lucas-Kanade tracks  |
+|                  | (dense flow: one frame)                                               |
++------------------+-----------------------------------------------------------------------+
+| OpticalFlowTVL1  | 'warmup_frames' strides of warm-up (running maximum of the flow)      |
++------------------+-----------------------------------------------------------------------+
+| MotionEnergy     | one stride of warm-up (the previous analysis frame)                   |
++------------------+-----------------------------------------------------------------------+
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import copy, multiprocessing
+
+
+def shard_ranges(start_frame, end_frame, workers, align=1):
+	"""
+	Split the frame range [start_frame, end_frame) into at most workers contiguous (start, end) ranges. Every range starts a whole number of align frames (the stride) after start_frame.
+
+	::
+
+		shard_ranges(0, 2400, 4, align=6)
+		>>> [(0, 600), (600, 1200), (1200, 1800), (1800, 2400)]
+
+	"""
+	units = (end_frame - start_frame) / align
+	workers = max(1, min(workers, units))
+	bounds = [start_frame + (((units * w) / workers) * align) for w in range(workers + 1)]
+	bounds[-1] = end_frame
+	return [(bounds[w], bounds[w+1]) for w in range(workers) if bounds[w] < bounds[w+1]]
+
+def _shard_extractor(extractor):
+	"""
+	Shallow copy of an extractor that can be sent to a worker process, without the attributes named in the _transient_state of its class (captures are not picklable, and the worker rebuilds its frame-to-frame state and data itself).
+	"""
+	transient = getattr(extractor, '_transient_state', ())
+	clone = copy.copy(extractor)
+	clone.__dict__ = dict([(k, v) for k, v in extractor.__dict__.items() if k not in transient])
+	clone.analysis_params = dict(extractor.analysis_params)
+	return clone
+
+def _process_shard(job):
+	"""
+	Worker function: analyze one shard. Must be at module level so that the pool can pickle it.
+	"""
+	extractor, shard = job
+	extractor._process_movie(shard=shard, **extractor.analysis_params)
+	return shard
+
+def process_movie_in_parallel(extractor, workers, start_frame, end_frame, align=1):
+	"""
+	Analyze [start_frame, end_frame) with a pool of worker processes. The extractor's output memmap must already exist at full size; each worker opens it r+ and fills in its own rows. Returns the list of shards that were processed.
+	"""
+	return process_shards(extractor, shard_ranges(start_frame, end_frame, workers, align), workers)
+
+def process_shards(extractor, shards, workers=1):
+	"""
+	Analyze the given (start_frame, end_frame) shards into the existing output memmap: with a pool of up to workers processes, or one after the other in this process if workers is 1. Used to resume interrupted analyses (see the checkpoint module). Returns the list of shards that were processed.
+	"""
+	if workers <= 1 or len(shards) <= 1:
+		return [_process_shard((extractor, shard)) for shard in shards]
+	job_extractor = _shard_extractor(extractor)
+	pool = multiprocessing.Pool(min(workers, len(shards)))
+	try:
+		done = pool.map(_process_shard, [(job_extractor, shard) for shard in shards])
+	finally:
+		pool.close()
+		pool.join()
+	return done
@@ -60,6 +60,49 @@ The full list of settable parameters, with default values and explanations:
 +------------------------+-----------------+----------------------------------------------------+
 | display                | True            | launch display screen during analysis              |
 +------------------------+-----------------+----------------------------------------------------+
+| seek_threshold         | 250             | forward jumps (in frames) longer than this seek;   |
+|                        |                 | shorter ones grab through without decoding output  |
++------------------------+-----------------+----------------------------------------------------+
+| flush_interval         | 256             | analysis frames buffered in RAM between bulk       |
+|                        |                 | writes to the data file                            |
++------------------------+-----------------+----------------------------------------------------+
+| prefetch_depth         | 8               | frames decoded ahead (on a separate thread) of the |
+|                        |                 | analysis; 0 decodes on the analysis thread         |
++------------------------+-----------------+----------------------------------------------------+
+| storage_dtype          | float32         | dtype of the rows in the data file: float32,       |
+|                        |                 | float16, uint16 or uint8 (see featurefile module)  |
++------------------------+-----------------+----------------------------------------------------+
+| storage_range          | [-0.5, 0.5]     | range of values that uint8/uint16 storage covers;  |
+|                        |                 | shifts are fractions of a cell, in [-0.5, 0.5]     |
++------------------------+-----------------+----------------------------------------------------+
+| preview                | False           | analyze only one sample frame every                |
+|                        |                 | preview_interval seconds, into a low-rate data     |
+|                        |                 | file (see the preview module)                      |
++------------------------+-----------------+----------------------------------------------------+
+| preview_interval       | 10.0            | seconds between the sample frames of a preview     |
++------------------------+-----------------+----------------------------------------------------+
+| progressive            | False           | analyze coarse-to-fine: every progressive_step-th  |
+|                        |                 | row first, then the rows in between, with a        |
+|                        |                 | coverage sidecar (see the progressive module)      |
++------------------------+-----------------+----------------------------------------------------+
+| progressive_step       | 64              | rows between the samples of the first pass of a    |
+|                        |                 | progressive analysis (halved every pass)           |
++------------------------+-----------------+----------------------------------------------------+
+| batched_fft            | False           | correlate the stacked grid cells together, one DFT |
+|                        |                 | per frame (see below); False: phaseCorrelateRes    |
+|                        |                 | for every cell                                     |
++------------------------+-----------------+----------------------------------------------------+
+| scale                  | 1.0             | size of the grayscale frames that are correlated,  |
+|                        |                 | relative to the movie (see below)                  |
++------------------------+-----------------+----------------------------------------------------+
+| roi                    | grid            | grid cells that are correlated: 'grid', 'band',    |
+|                        |                 | 'center', 'plus' (see gridlayout module) or a      |
+|                        |                 | boolean grid mask, as nested lists; others are 0   |
++------------------------+-----------------+----------------------------------------------------+
+| full_frame_reference   | previous        | frame that the full frame is correlated against:   |
+|                        |                 | 'previous' or 'first' (of the run, as in older     |
+|                        |                 | data files; see below)                             |
++------------------------+-----------------+----------------------------------------------------+
 | Parameters for display...                                                                     |
 +------------------------+-----------------+----------------------------------------------------+
 | viz_width_ratio        | 1.0             | for visualization of histogram (ratio of movie     |
@@ -90,6 +133,29 @@ Analyze a full film:
 	pcorr = PhaseCorrelation('Psycho')
 	pcorr.analyze_movie() # Assumes that ~/Movies/action/Psycho.mov exists; returns otherwise
 
+To split the analysis of one film across several processes (each worker starts two frames before its own time range, so that the results at the range boundaries are the same as for a single process):
+
+.. code-block:: python
+
+	pcorr = PhaseCorrelation('Psycho')
+	pcorr.analyze_movie(workers=8)
+
+With batched_fft=True the grid cells of a frame are correlated together: the cells are stacked and windowed at once, every frame is transformed only once (the spectra of the previous frame are kept), and the cross-power spectra, the inverse transforms and the peaks of all of the cells are computed as one stack. This is about 1.4 times as fast as phaseCorrelateRes for every cell on HD frames. The values differ systematically from those of phaseCorrelateRes, because the cell-by-cell path applies the window twice to the previous frame's cells and the batched one only once. Most of them are within about 0.01, but now and then a cell finds a different peak altogether. Data files from the two paths should not be compared with each other, so the cell-by-cell path stays the default, and the header of every data file records batched_fft with the rest of its analysis_params (see the featurefile module).
+
+For HD masters, correlating at full resolution is several times slower than real time. With scale < 1.0 the grayscale frames are downsampled (halved with pyrDown, then resized the rest of the way) before they are correlated. The shifts are stored as fractions of the frame and of the cells, so the values stay comparable to those of a full-resolution analysis. roi limits the analysis to the grid cells of a region, e.g. the middle band of a letterboxed film; the full-frame values are then correlated over the bounding box of those cells, and the other cells are 0. scripts/benchmark_phasecorr_scale.py reports the throughput of each scale against its agreement with the full-resolution values:
+
+.. code-block:: python
+
+	pcorr = PhaseCorrelation('Psycho', scale=0.25, roi='band', data_extension='.phasecorr_quarter')
+	pcorr.analyze_movie()
+
+The full-frame values (unit 64 of the default grid) are the shift of the whole frame against the previous frame, like those of the grid cells. Data files written before the header recorded full_frame_reference (and raw data files) correlated every frame against the first frame of the run instead; phaseCorrelateRes applies its window to that first frame in place (unless the frame is padded for the DFT), so it is windowed again on every call. full_frame_reference='first' writes values like those, for comparison with older data files. Since every row then depends on all of the frames before it, such an analysis cannot be split up: it is refused with workers > 1, resume, preview or progressive.
+
+.. code-block:: python
+
+	pcorr = PhaseCorrelation('Psycho', full_frame_reference='first', data_extension='.phasecorr_first')
+	pcorr.analyze_movie()
+
 This also works, so you can define your own file locations:
 
 .. code-block:: python
@@ -186,10 +252,93 @@ import numpy as np
 import json
 from segment import *
 from actiondata import *
+from framesource import *
+from parallel import *
+from featurewriter import *
+from featurereader import *
+from featurefile import *
+from gridlayout import *
+from moviemetadata import *
+from checkpoint import *
+from preview import *
+from progressive import *
+from engine import *
+from viewer import *
 ad = ActionData()
 av = ActionView()
 
 
+def _fft_shift_index(n):
+	"""
+	Order of the n rows (or columns) of a correlation surface after swapping its quadrants (the center of the surface is zero shift). Like OpenCV's, for odd n the last row stays where it is.
+	"""
+	mid = n >> 1
+	index = np.r_[np.arange(mid, (2 * mid)), np.arange(0, mid)]
+	return np.r_[index, [(2 * mid)]] if n % 2 else index
+
+def _spectra(images, window, dft_size):
+	"""
+	Spectra of a stack of images ([NUMBER OF IMAGES, HEIGHT, WIDTH]) after applying window to every one of them: real DFTs, zero-padded to dft_size, in OpenCV's packed (CCS) layout.
+	"""
+	num, height, width = np.shape(images)
+	spectra = np.zeros(((num,) + tuple(dft_size)), dtype=np.float32)
+	np.multiply(images, window, out=spectra[:,:height,:width])
+	for spectrum in spectra:
+		cv2.dft(spectrum, dst=spectrum)
+	return spectra
+
+def _cross_power(prev_spectra, spectra, dft_size):
+	"""
+	Normalized cross-power spectra (packed, see _spectra) of two stacks of spectra. The complex values in the rows are multiplied for the whole stack at once (as rows of one array); those in the packed first (and, for an even width, last) column are pairs of rows, and are done separately.
+	"""
+	rows, cols = dft_size
+	num = len(spectra)
+	prev_rows, cur_rows = prev_spectra.reshape((num * rows), cols), spectra.reshape((num * rows), cols)
+	cross = cv2.mulSpectrums(prev_rows, cur_rows, cv2.DFT_ROWS, conjB=True)
+	magnitude = cv2.mulSpectrums(cross, cross, cv2.DFT_ROWS, conjB=True)
+	last = (cols - 1) if (cols % 2) == 0 else cols
+	magnitude[:,2:last:2] = magnitude[:,1:last:2]
+	cv2.sqrt(magnitude, magnitude)
+	# where the magnitude is 0 the cross-power is too, and stays 0
+	cv2.max(magnitude, float(np.finfo(np.float32).tiny), magnitude)
+	cv2.divide(cross, magnitude, cross)
+	cross = cross.reshape(spectra.shape)
+	for col in ([0, (cols - 1)] if (cols % 2) == 0 else [0]):
+		prev_col, cur_col = prev_spectra[:,:,col], spectra[:,:,col]
+		re, im = slice(1, (rows - 1), 2), slice(2, rows, 2)
+		cross_re = (prev_col[:,re] * cur_col[:,re]) + (prev_col[:,im] * cur_col[:,im])
+		cross_im = (prev_col[:,im] * cur_col[:,re]) - (prev_col[:,re] * cur_col[:,im])
+		col_magnitude = np.hypot(cross_re, cross_im)
+		col_magnitude[col_magnitude == 0.0] = np.inf
+		cross[:,re,col], cross[:,im,col] = (cross_re / col_magnitude), (cross_im / col_magnitude)
+		# the real values: the first row, and the last one for an even height
+		real = [0, (rows - 1)] if (rows % 2) == 0 else [0]
+		cross[:,real,col] = np.sign(prev_col[:,real] * cur_col[:,real])
+	return cross
+
+def _phase_correlate(prev_spectra, spectra, dft_size):
+	"""
+	Phase correlation of two stacks of spectra (see _spectra): the shift ((x, y), in pixels) of every image against the previous one, with sub-pixel accuracy (the centroid of the 5 by 5 pixels around the peak), and the response (the energy in those pixels, up to about 1.0 for a clean shift).
+	"""
+	rows, cols = dft_size
+	surfaces = _cross_power(prev_spectra, spectra, dft_size)
+	for surface in surfaces:
+		cv2.idft(surface, dst=surface, flags=(cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE))
+	num = len(surfaces)
+	# the surfaces are not shifted (zero shift is at [0, 0]); the peaks and the boxes around them are found in shifted coordinates
+	row_index, col_index = _fft_shift_index(rows), _fft_shift_index(cols)
+	peaks = surfaces.reshape(num, -1).argmax(axis=1)
+	peak_y, peak_x = np.argsort(row_index)[(peaks // cols)], np.argsort(col_index)[(peaks % cols)]
+	# 5 by 5 pixels around each peak; pixels outside of the (shifted) surface count as 0
+	box = np.arange(-2, 3)
+	box_y, box_x = (peak_y[:,np.newaxis] + box), (peak_x[:,np.newaxis] + box)
+	inside = ((box_y >= 0) & (box_y < rows))[:,:,np.newaxis] & ((box_x >= 0) & (box_x < cols))[:,np.newaxis,:]
+	weights = surfaces[np.arange(num)[:,np.newaxis,np.newaxis], row_index[np.clip(box_y, 0, (rows - 1))][:,:,np.newaxis], col_index[np.clip(box_x, 0, (cols - 1))][:,np.newaxis,:]] * inside
+	responses = weights.sum(axis=2).sum(axis=1)
+	centroid_x = (weights.sum(axis=1) * box_x).sum(axis=1) / (responses + np.finfo(float).eps)
+	centroid_y = (weights.sum(axis=2) * box_y).sum(axis=1) / (responses + np.finfo(float).eps)
+	return np.column_stack((((cols / 2.0) - centroid_x), ((rows / 2.0) - centroid_y))), responses
+
 class PhaseCorrelation:
 	"""
 	Phase correlation of frame and 8-by-8 grid of subframes.
@@ -201,6 +350,9 @@ class PhaseCorrelation:
 	If you want to run in verbose mode (to see some debug information on calculated frame offsets, analysis ranges, etc.) pass the verbose=True flag here.
 	"""
 	
+	# left behind when the object is sent to a worker process, which opens its own capture (see the parallel module)
+	_transient_state = ('capture', 'frame_source', 'conversions', 'X', 'playback_data', '_prev_frame_gray', '_prev_sub_grays', '_fhann', '_ghann', '_prev_frame_spectrum', '_prev_cell_spectra')
+	
 	def __init__(self, filename='Vertigo', arg=None, **analysis_params):
 		"""
 		"""
@@ -222,22 +374,21 @@ class PhaseCorrelation:
 			self.json_path = os.path.join(os.path.expanduser(ap['action_dir']), filename, (filename + '.json'))
 			print self.json_path
 			self.filename = filename
+			self.metadata = MovieMetadata(self.movie_path, self.json_path, filename)
 
-		# self.determine_movie_length() no need
- 		if (os.path.exists(self.json_path) != True):
- 			self._write_metadata_to_json()
-		ap['afps'] = self._read_json_value('fps')
-
-		# try to naively get some data and store in a class var
-		if os.path.exists(self.data_path):
-			self.default_phasecorr_features_for_segment()
-		else:
-			self.X = None
+		# the metadata (afps, see _read_metadata) and the default features (X, see __getattr__) are read when they are first used
+		self._metadata_read = False
 	
 	def _check_pcorr_params(self, analysis_params=None):
 		"""
 		Simple mechanism to read in default parameters while substituting custom parameters.
 		"""
+		if analysis_params is not None:
+			self._metadata_read = True # the caller's parameters (afps included) replace the ones the metadata was read into
+		if analysis_params is not None and getattr(self, 'analysis_params', None) is not None:
+			# parameters passed to analyze_movie, playback_movie, etc. add to (rather than replace) the ones the object was made with;
+			# afps is not carried over (an accessor may have read it from the metadata): it is the caller's, or the default
+			analysis_params = dict([(k, v) for k, v in self.analysis_params.items() if k != 'afps'], **analysis_params)
 		self.analysis_params = analysis_params if analysis_params is not None else self.analysis_params
 		dpcp = self.default_phasecorr_params()
 		for k in dpcp.keys():
@@ -262,6 +413,19 @@ class PhaseCorrelation:
 			'grid_divs_y' : 8,
 			'verbose' : False,			# useful for debugging
 			'display' : True,			# Launch display screen
+			'seek_threshold' : 250,		# (frames) forward jumps longer than this seek, shorter ones grab through
+			'flush_interval' : 256,		# (analysis frames) rows buffered in RAM between writes to the data file
+			'prefetch_depth' : 8,		# (frames) decoded ahead of the analysis on a separate thread; 0 turns prefetching off
+			'storage_dtype' : 'float32',	# dtype of the rows in the data file: 'float32', 'float16', 'uint16' or 'uint8'
+			'storage_range' : [-0.5, 0.5],	# (values) range covered by uint8/uint16 storage; the shifts are fractions of a cell
+			'preview' : False,			# analyze only one sample frame every preview_interval seconds (see the preview module)
+			'preview_interval' : 10.0,	# (seconds) between the sample frames of a preview
+			'progressive' : False,		# analyze coarse-to-fine, with a coverage sidecar (see the progressive module)
+			'progressive_step' : 64,		# (rows) between the samples of the first pass of a progressive analysis, halved every pass
+			'batched_fft' : False,		# correlate the stacked grid cells together, one DFT per frame (False: one OpenCV phaseCorrelateRes call per cell, as in older data files)
+			'scale' : 1.0,				# size of the grayscale frames that are correlated, relative to the movie (pyramid downsampling)
+			'roi' : 'grid',				# grid cells that are correlated: a region of the gridlayout module ('grid', 'band', 'center', 'plus') or a boolean mask (nested lists)
+			'full_frame_reference' : 'previous',	# the full frame is correlated against the 'previous' frame, or against the 'first' frame of the run (as in older data files)
 			'viz_shrink_factor' : 0.5,	# (adjustable) ratio for size of histogram window
 			'viz_width_ratio' : 1.0,	# (adjustable) ratio for width of histogram window size
 			'viz_height_ratio' : 1.0,	# (adjustable) ratio for height of histogram window size
@@ -272,27 +436,36 @@ class PhaseCorrelation:
 
 	def _write_metadata_to_json(self):
 		"""
+		Make sure that the JSON metadata file is there and up to date with the movie (see the moviemetadata module). The movie is only opened if it is not.
 		"""
-		title = self.filename
-		capture = cv2.VideoCapture(self.movie_path)
-		fps = capture.get(cv.CV_CAP_PROP_FPS)
-		aspect = capture.get(cv.CV_CAP_PROP_FRAME_WIDTH / cv.CV_CAP_PROP_FRAME_HEIGHT)
-		frames = capture.get(cv.CV_CAP_PROP_FRAME_COUNT)
-		length = float(frames) / float(fps)
-		
-		
-		movdict = {'title':title, 'fps':fps, 'aspect': aspect,'frames': frames, 'length':length}
-		fp = file(self.json_path, 'w')
-		fp.write(json.dumps(movdict))
-		fp.close()
-		del capture
+		self.metadata.read()
 		return 1
 	
 	def _read_json_value(self, key='fps'):
-# 		fp = file(self.json_path, 'r')
-		jsonfile = open(self.json_path)
-		jsondata = json.load(jsonfile)
-		return jsondata[key]
+		"""
+		Value of key in the movie's metadata, without opening the movie (see the moviemetadata module).
+		"""
+		return self.metadata.value(key)
+	
+	def _read_metadata(self):
+		"""
+		Read the movie's frame rate (afps) from its metadata (see the moviemetadata module). Done once, the first time it is needed (not when the object is constructed).
+		"""
+		if self._metadata_read:
+			return
+		self._metadata_read = True
+		self.analysis_params['afps'] = self._read_json_value('fps')
+	
+	def __getattr__(self, name):
+		"""
+		X (the default features for the whole film) is read the first time it is used.
+		"""
+		if name == 'X':
+			self.X = None
+			if os.path.exists(feature_file_path(self.data_path)):
+				self.default_phasecorr_features_for_segment()
+			return self.X
+		raise AttributeError(name)
 
 
 	def all_phasecorr_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
@@ -311,8 +484,9 @@ class PhaseCorrelation:
 			>>> (1440, 768)
 		
 		"""
-		res = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[0:-1:access_stride]
-		return (res[0].reshape(-1, 2), res[1].reshape(-1, 128))
+		layout = self._grid_layout()
+		res = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride)
+		return (res[0].reshape(-1, layout.size('full')), res[1].reshape(-1, layout.size('grid')))
 	
 	def full_phasecorr_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
 		"""
@@ -322,7 +496,8 @@ class PhaseCorrelation:
 			phasecorr_features_for_segment(...)[0].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[0].reshape(-1, 2)[0:-1:access_stride, :]
+		layout = self._grid_layout()
+		self.X = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride, units=layout.units('full')).reshape(-1, layout.size('full'))
 		return self.X
 	
 	def gridded_phasecorr_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
@@ -345,8 +520,7 @@ class PhaseCorrelation:
 			phasecorr_features_for_segment(...)[1].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[1].reshape(-1, 128)[::access_stride,:]
-		return self.X
+		return self.region_phasecorr_features_for_segment('grid', segment, access_stride)
 	
 	def center_quad_phasecorr_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
 		"""
@@ -366,9 +540,7 @@ class PhaseCorrelation:
 			phasecorr_features_for_segment(...)[1][:,[18..21,26..29,34..37,42..45,..],...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		cq_array = range(18,22)+range(26,30)+range(34,38)+range(42,46)
-		self.X = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[1][:,cq_array,...].reshape(-1, 32)[::access_stride,:]
-		return self.X
+		return self.region_phasecorr_features_for_segment('center', segment, access_stride)
 
 	def middle_band_phasecorr_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
 		"""
@@ -388,8 +560,7 @@ class PhaseCorrelation:
 			phasecorr_features_for_segment(...)[1][:,16:47,...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		self.X = self._phasecorr_features_for_segment_from_onset_with_duration(int(segment.time_span.start_time), int(segment.time_span.duration))[1][:,16:48,...].reshape(-1, 64)[::access_stride,:]
-		return self.X
+		return self.region_phasecorr_features_for_segment('band', segment, access_stride)
 	
 	def plus_band_phasecorr_features_for_segment(self, segment=Segment(0, -1), access_stride=6):
 		"""
@@ -411,8 +582,21 @@ class PhaseCorrelation:
 			phasecorr_features_for_segment(...)[1][:,[2..5,10..13,16..47,50..53,58..61],...].reshape((segment.time_span.duration*4), -1)
 		
 		"""
-		plus_array = range(2,6)+range(10,14)+range(16,48)+range(50,54)+range(58,62)
-		return self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration)[1][:,plus_array,...].reshape(-1, 96)[::access_stride,-1]
+		return self.region_phasecorr_features_for_segment('plus', segment, access_stride)
+
+	def region_phasecorr_features_for_segment(self, region='band', segment=Segment(0, -1), access_stride=6):
+		"""
+		Return the gridded phase correlations of a region of the grid: 'grid', 'band', 'center' or 'plus' (which scale with grid_divs_x and grid_divs_y; see the gridlayout module), or a boolean mask of grid_divs_y by grid_divs_x cells. Only the phase correlations of the region are read. The gridded, middle band, center quad and plus band accessors call this.
+		::
+		
+			mask = np.zeros((8, 8), dtype=bool)
+			mask[:,:4] = True # the left half of the frame
+			X = pcorr.region_phasecorr_features_for_segment(mask, Segment(0, 600))
+		
+		"""
+		layout = self._grid_layout()
+		self.X = self._phasecorr_features_for_segment_from_onset_with_duration(segment.time_span.start_time, segment.time_span.duration, access_stride, units=layout.units(region)).reshape(-1, layout.size(region))
+		return self.X
 
 	def default_phasecorr_features_for_segment(self, func='middle_band_phasecorr_features_for_segment', segment=Segment(0, -1), access_stride=6):
 		"""
@@ -420,14 +604,39 @@ class PhaseCorrelation:
 		"""
 		return getattr(self,func)(segment, access_stride)
 
+	def transpose_data_file(self, layout='region'):
+		"""
+		Rewrite the data file region-major (layout='region'), so that the middle band, center quad and plus band accessors read only (and sequentially) the phase correlations they return, or back to frame-major (layout='frame'), which analyses can write to (resume). See the featurefile module.
+		::
+		
+			pcorr = PhaseCorrelation('Psycho')
+			pcorr.transpose_data_file()
+			X = pcorr.middle_band_phasecorr_features_for_segment(Segment(0, 600))
+		
+		"""
+		grid = self._grid_layout()
+		if layout == 'region':
+			return transpose_feature_file(self.data_path, sections=grid.sections(), units=grid.num_units, row_shape=grid.row_shape)
+		return transpose_feature_file(self.data_path, row_shape=grid.row_shape)
 
-	def _phasecorr_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=-1):
+	def _grid_layout(self):
+		"""
+		Layout of the rows of the data file for the grid of the analysis parameters (see the gridlayout module): the (x, y) phase correlation of each grid cell, then of the full frame.
+		"""
+		ap = self.analysis_params
+		return grid_layout(ap['grid_divs_x'], ap['grid_divs_y'], (2,), full_units=1, full_first=False)
+
+
+	def _phasecorr_features_for_segment_from_onset_with_duration(self, onset_s=0, duration_s=-1, access_stride=1, units=None):
 		"""
 		This will be the interface for grabbing analysis data based on onsets and durations, translating seconds into frames.
-		Takes a file name or complete path of a data file, an onset time in seconds, and a duration in seconds.
+		Takes a file name or complete path of a data file, an onset time in seconds, and a duration in seconds. Only every access_stride-th (24 fps) frame is read and returned.
 		Returns a tuple of memory-mapped arrays...
+		With units (0-63 the grid, 64 the full frame, for the default 8 by 8 grid; see _grid_layout), returns only those phase correlations: [NUMBER OF FRAMES, NUMBER OF UNITS, 2]. Only they are read; in a region-major data file (see transpose_data_file), the middle band is one sequential read.
 		"""
+		self._read_metadata()
 		ap = self.analysis_params
+		layout = self._grid_layout()
 		frames_per_astride = (24.0 / ap['stride']) # 24.0, not ap['fps']
 
 		print ap['fps']
@@ -443,14 +652,15 @@ class PhaseCorrelation:
 		print 'df: ', dur_frames
 		# print "data path: ", self.data_path
 		try:
-			mapped = np.memmap(self.data_path, dtype='float32', mode='r')
-		except IOError:
+			# map and resample (to 24 fps) only the rows of the segment
+			mapped = FeatureReader(self.data_path, layout.row_shape).window(onset_frame, dur_frames, ap['afps'], access_stride, units=units)
+		except (IOError, OSError):
 			print "Attempting to access data file/mem map that does not exist!"
 			return None
 		print mapped.shape
-		mapped = mapped.reshape((-1,65,2))
-		mapped = ad.interpolate_time(mapped, ap['afps'])
-		return mapped[onset_frame:(onset_frame+dur_frames),64,:], mapped[onset_frame:(onset_frame+dur_frames),:64,:]
+		if units is not None:
+			return mapped
+		return mapped[:,layout.cells,:], mapped[:,:layout.cells,:]
 
 
 	def playback_movie_frame_by_frame(self, offset=0, duration=-1):
@@ -478,19 +688,17 @@ class PhaseCorrelation:
 
 
 	def determine_movie_length(self, **kwargs):
+		self._read_metadata()
 		ap = self.analysis_params
 		strides_per_second = float(ap['fps'] / ap['stride'])
 		
 		if os.path.exists(self.movie_path) and HAVE_CV:
-	 		self.capture = cv2.VideoCapture(self.movie_path)
-			dur_total_seconds = self.capture.get(cv.CV_CAP_PROP_FRAME_COUNT) / ap['afps']
+			# frame count from the metadata; the movie is not opened (see the moviemetadata module)
+			dur_total_seconds = self.metadata.frames() / ap['afps']
 			print "mov total secs: ", dur_total_seconds
 		elif os.path.exists(self.data_path):
-			dsize = os.path.getsize(self.data_path)
-			# since we are reading raw color analysis data that always has the same size on disc!
-			# the constant had better be correct!
-			print "dsize: ", dsize
-			dur_total_aframes = dsize / float(((ap['grid_divs_x'] * ap['grid_divs_y'])+1) * 2 * 4) # REGIONS * CHANNELS * BINS * BYTES
+			# row count from the data file's header (see the featurefile module); raw data files: from their size, with the REGIONS * CHANNELS layout
+			dur_total_aframes = float(feature_file_rows(self.data_path, self._grid_layout().row_shape))
 			print 'dtaf: ', dur_total_aframes
 			dur_total_seconds = (dur_total_aframes / strides_per_second) * (ap['fps'] / ap['afps'])
 			print "total secs: ", dur_total_seconds
@@ -500,15 +708,16 @@ class PhaseCorrelation:
 		self.analysis_params['duration'] = dur_total_seconds			
 		return dur_total_seconds
 
-	def analyze_movie(self):
+	def analyze_movie(self, workers=1, resume=False):
 		"""
 		Analyze the movie without displaying on screen. Equivalent to:
 		::
 		
 			_process_movie(movie_file='Psycho.mov', data_file='Psycho.color_lab', offset=0, duration=-1, stride=6, display=False)
 		
+		With workers > 1, the movie is split into time ranges that are analyzed by that many processes. With resume=True, an interrupted analysis is picked up where it left off (see the checkpoint module).
 		"""
-		self._process_movie(mode='analyze', display=False)
+		self._process_movie(mode='analyze', display=False, workers=workers, resume=resume)
 
 	def analyze_movie_with_display(self):
 		"""
@@ -520,11 +729,16 @@ class PhaseCorrelation:
 		self._process_movie(mode='analyze', display=True)
 
 
-	def _process_movie(self, **kwargs):
+	def _process_movie(self, workers=1, shard=None, engine=None, resume=False, **kwargs):
 	
 		"""
 			Function for analyzing a full film or video. This is where the magic happens when we're making analyses. Function will exit if neither a movie path nor a data path are supplied. This function is not intended to be called directly. Normally, call one of the two analyze_ functions instead, which will call this function.
 		
+			workers > 1 hands the analysis to a pool of processes (see the parallel module); each of them calls this function again with shard=(start_frame, end_frame) and only fills in the rows for that range.
+			
+			With engine=AnalysisEngine(...), nothing is analyzed here: the kernel and writer are added to that engine, which decodes the movie once for several extractors (see the pipeline module); engine.close() closes the writers.
+			
+			The progress of an analysis is recorded in a sidecar file; resume=True picks up an interrupted analysis where it left off (see the checkpoint module).
 		"""
 
 		ap = self._check_pcorr_params(kwargs)
@@ -548,7 +762,8 @@ class PhaseCorrelation:
 		print ap
 
 		if have_mov:
-	 		self.capture = cv2.VideoCapture(self.movie_path)
+			self.frame_source = PrefetchFrameSource(FrameSource(self.movie_path, ap['seek_threshold']), ap['prefetch_depth'])
+			self.capture = self.frame_source.capture
 			frame_width = int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
 			frame_height = int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
 		else:
@@ -559,19 +774,15 @@ class PhaseCorrelation:
 		grid_x_divs = ap['grid_divs_x']
 		grid_y_divs = ap['grid_divs_y']
 		frame_size = (frame_width, frame_height)
-		grid_width = int(frame_width/grid_x_divs)
-		grid_height = int(frame_height/grid_y_divs)
+		# the frames are correlated at scale times their size; the shifts are fractions of the (scaled) frame and cells
+		analysis_size = scaled_size(frame_size, ap['scale'])
+		grid_width = int(analysis_size[0]/grid_x_divs)
+		grid_height = int(analysis_size[1]/grid_y_divs)
 		grid_size = (grid_width, grid_height)
 		
-		centers_x = range((frame_width/16),frame_width,(frame_width/8))
-		centers_y = range((frame_height/16),frame_height,(frame_height/8))
-		
 		if verbose:
-			print fps, ' | ', frame_size, ' | ', grid_size
+			print fps, ' | ', frame_size, ' | ', analysis_size, ' | ', grid_size
 		
-		# container for prev. frame's grayscale subframes
-		prev_sub_grays = []								
-
 		if ap['offset'] > 0:
 			offset_secs = ap['offset']
 		else:
@@ -589,7 +800,6 @@ class PhaseCorrelation:
 		dur_secs = ap['duration']
 		
 		stride_frames = ap['stride']
-		stride_hop = stride_frames - 1
 
 		print "1. ", ap['duration']
 		print "2. ", dur_secs
@@ -604,7 +814,7 @@ class PhaseCorrelation:
 		
 		if verbose:
 			print '%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%'
-			print 'DUR TOTAL: ', dur_total_secs
+			print 'DUR TOTAL: ', ap['duration']
 			print "OFFSET (SECONDS): ", offset_secs
 			print "OFFSET (STRIDES): ", offset_strides
 			print "OFFSET (FRAMES): ", offset_frames
@@ -616,122 +826,230 @@ class PhaseCorrelation:
 			print "FPS: ", fps
 			print "stride_frames: ", stride_frames
 		
-		# set up memmap
+		# set up memmap and the engine's kernel: analysis writes rows, playback reads them back
+		self.frame_size, self.analysis_size, self.grid_size = frame_size, analysis_size, grid_size
+		row_shape = self._grid_layout().row_shape
+		if not (ap['mode'] == 'playback' and ap['display'] == True):
+			# an roi that selects none of the grid cells is refused before any data file, preview or checkpoint is touched
+			self._roi_cells, self._full_box = self._roi()
+			if ap['full_frame_reference'] not in ('previous', 'first'):
+				raise ValueError("Unknown full_frame_reference '%s': use 'previous' or 'first'" % ap['full_frame_reference'])
+			if ap['full_frame_reference'] == 'first' and (shard is not None or resume or workers > 1 or ap['preview'] or ap['progressive']):
+				print "ERROR: with full_frame_reference 'first' every row depends on all of the frames before it; analyze the movie from start to end in one process (no workers, resume, preview or progressive)."
+				return
 		if ap['mode'] == 'playback' and ap['display'] == True:
-			fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides + dur_strides),(64+1),2))
+			self.playback_data = load_feature_file(self.data_path, row_shape, rows=(offset_strides + dur_strides), decode=True)
+			fp, kernel = None, self._playback_kernel
+			if not have_mov:
+				self.frame_source = BlankFrameSource(frame_width, frame_height)
+		elif not have_mov:
+			print "ERROR: Must supply a movie for analysis!"
+			return
+		elif shard is not None:
+			# the file was preallocated by the parent process (or by the interrupted analysis); only write our own rows
+			checkpoint = Checkpoint(self.data_path, ap)
+			checkpoint.track(shard, self._row_frame)
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='r+', flush_interval=ap['flush_interval'], checkpoint=checkpoint)
+			kernel = self._batched_kernel if ap['batched_fft'] else self._analysis_kernel
+		elif ap['preview']:
+			# a low-rate preview: only the sample frames (and their warm-up) are decoded, and only their rows are written (see the preview module)
+			preview = Preview(self.data_path, row_shape, ap, offset_frames, (offset_frames + dur_frames), warmup=2, reset=self._reset_state)
+			self.frame_source = preview.frame_source(self.frame_source)
+			fp, kernel = preview.writer, preview.kernel(self._batched_kernel if ap['batched_fft'] else self._analysis_kernel)
+		elif ap['progressive']:
+			# coarse-to-fine: the samples of every pass are analyzed like those of a preview, into the full data file (see the progressive module)
+			progressive = Progressive(self.data_path, row_shape, ap, dur_strides, self._row_frame, warmup=2, reset=self._reset_state, resume=resume)
+			self.frame_source = progressive.frame_source(self.frame_source)
+			fp, kernel = progressive.writer, progressive.kernel(self._batched_kernel if ap['batched_fft'] else self._analysis_kernel)
 		else:
-			fp = np.memmap(self.data_path, dtype='float32', mode='w+', shape=(dur_strides,(64+1),2))
-		
-		if ap['display']:
-			cv.NamedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
-			cv.ResizeWindow('Image', frame_width, frame_height)
+			checkpoint = Checkpoint(self.data_path, ap)
+			if resume and checkpoint.can_resume():
+				# pick up the interrupted analysis where it left off
+				self.frame_source.release()
+				shards = checkpoint.remaining()
+				if shards:
+					process_shards(self, shards, workers)
+				elif shards is not None:
+					print 'Nothing to resume: the analysis is complete.'
+				return
+			fp = FeatureWriter(self.data_path, ((dur_strides,) + row_shape), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], checkpoint=checkpoint, analysis_params=ap)
+			kernel = self._batched_kernel if ap['batched_fft'] else self._analysis_kernel
+			if workers > 1 and ap['mode'] == 'analyze' and not ap['display']:
+				fp.close()
+				self.frame_source.release()
+				checkpoint.start(shard_ranges(offset_frames, (offset_frames + dur_frames), workers, stride_frames))
+				process_movie_in_parallel(self, workers, offset_frames, (offset_frames + dur_frames), align=stride_frames)
+				return
+			checkpoint.start([(offset_frames, (offset_frames + dur_frames))])
+			checkpoint.track((offset_frames, (offset_frames + dur_frames)), self._row_frame)
 		
+		# the first frame only primes the frame-to-frame state, so the first row is offset_frames + 1
 		self.frame_idx = offset_frames
 		end_frame = offset_frames + dur_frames
-
-		if have_mov:
-			self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
-			ret, frame = self.capture.read()
-			if frame is None: 
-				print 'Frame error! Exiting...'
-				return # no image captured... end the processing		
-			frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-			prev_frame_gray = np.float32(frame_gray[:])
+		first_frame = offset_frames + 1
+		if shard is not None:
+			# a shard starts two frames early and writes nothing before its own range: without batched_fft, the grid cells
+			# of the previous frame have already been through phaseCorrelateRes once (which applies the window in place)
+			first_frame, end_frame = max(shard[0], first_frame), shard[1]
+			self.frame_idx = max((first_frame - 2), offset_frames)
+		elif fp is None:
+			self.frame_idx = first_frame
+		self._prev_frame_gray, self._prev_sub_grays = None, None
+		self._prev_frame_spectrum, self._prev_cell_spectra = None, None
+		
+		if engine is not None:
+			# decode-once pipeline: the shared engine decodes the frames and runs the kernels of all of the extractors
+			self.frame_source.release()
+			self.conversions = engine.conversions
+			engine.add_kernel(kernel, fp, self.frame_idx, end_frame, step=1, first_frame=first_frame)
+			return
 		
-			fhann = cv2.createHanningWindow((frame_width,frame_height), cv2.CV_32FC1)
-			ghann = cv2.createHanningWindow((grid_width,grid_height), cv2.CV_32FC1)
+		# headless loop; display and progress reports are optional subscribers
+		engine = AnalysisEngine(self.frame_source, kernel, fp)
+		self.conversions = engine.conversions
+		if ap['display']:
+			engine.subscribe(PhaseCorrelationViewer(self, frame_size))
+		if verbose:
+			engine.subscribe(ProgressReporter(self.frame_idx, end_frame))
+		complete = False
+		try:
+			complete = engine.run(self.frame_idx, end_frame, first_frame=first_frame)
+		finally:
+			if fp is not None:
+				fp.close(complete)
+			self.frame_source.release()
+		
+		if fp is not None and verbose:
+			print 'FEATURE WRITER: ', fp.stats()
+		self.playback_data = None
+		self._prev_frame_gray, self._prev_sub_grays = None, None
+		self._prev_frame_spectrum, self._prev_cell_spectra = None, None
+		if verbose:
+			print 'ENGINE: ', engine.stats()
+			print 'FRAME SOURCE: ', self.frame_source.stats()
+	
+	def _reset_state(self):
+		"""
+		Forget the previous frame (its grid cells and spectra), as at the start of an analysis.
+		"""
+		self._prev_frame_gray, self._prev_sub_grays = None, None
+		self._prev_frame_spectrum, self._prev_cell_spectra = None, None
+
+	def _row_frame(self, row):
+		"""
+		The frame that row row of the data file is analyzed from (for the checkpoint).
+		"""
+		return row
+
+	def _roi(self):
+		"""
+		The grid cells that are analyzed (those of the 'roi' region, see the gridlayout module), and the (left, top, right, bottom) box of the (scaled) frame that the full-frame values are correlated over: the whole frame for the 'grid' roi, otherwise the bounding box of the roi's cells.
+		"""
+		ap = self.analysis_params
+		layout = self._grid_layout()
+		grid_width, grid_height = self.grid_size
+		cells = layout.cells_of(ap['roi'])
+		if len(cells) == 0:
+			raise ValueError("The roi selects none of the grid cells")
+		if len(cells) == layout.cells:
+			return cells, (0, 0, self.analysis_size[0], self.analysis_size[1])
+		rows, cols = (cells // layout.grid_divs_x), (cells % layout.grid_divs_x)
+		return cells, ((cols.min() * grid_width), (rows.min() * grid_height), ((cols.max() + 1) * grid_width), ((rows.max() + 1) * grid_height))
+
+	def _analysis_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (analysis): phase correlation of the full frame and of each grid cell against the previous frame (the full frame against the first frame, with full_frame_reference='first'). The first frame only primes the state and returns no row.
+		"""
+		ap = self.analysis_params
+		grid_x_divs, grid_y_divs = ap['grid_divs_x'], ap['grid_divs_y']
+		grid_width, grid_height = self.grid_size
+		frame_gray = self.conversions.downscale(frame_idx, frame, ap['scale'])
+		
+		left, top, right, bottom = self._full_box
+		frame_width, frame_height = (right - left), (bottom - top)
+		full_gray = frame_gray[top:bottom, left:right]
+		
+		if self._prev_frame_gray is None:
+			self._prev_frame_gray = np.float32(full_gray)
+			self._prev_sub_grays = [None] * (grid_x_divs * grid_y_divs)
+			for cell in self._roi_cells:
+				row, col = divmod(cell, grid_x_divs)
+				self._prev_sub_grays[cell] = np.float32(frame_gray[(row*grid_height):((row+1)*grid_height), (col*grid_width):((col+1)*grid_width)])
+			self._fhann = cv2.createHanningWindow((frame_width,frame_height), cv2.CV_32FC1)
+			self._ghann = cv2.createHanningWindow((grid_width,grid_height), cv2.CV_32FC1)
+			return None
 		
-			for row in range(grid_y_divs):
-				for col in range(grid_x_divs):
-					prev_sub_grays += [np.float32(frame_gray[(row*grid_height):((row+1)*grid_height), (col*grid_width):((col+1)*grid_width)])]
+		layout = self._grid_layout()
+		pcorrs = np.zeros(layout.row_shape, dtype='float32')
+		
+		# full frame
+		fret, fres = cv2.phaseCorrelateRes(self._prev_frame_gray, np.float32(full_gray), self._fhann)
+		if abs(fres) > 0.01:
+			pcorrs[layout.full_units[0]] = [(fret[0]/frame_width),(fret[1]/frame_height)]
+		
+		# gridded
+		for cell in self._roi_cells:
+			row, col = divmod(cell, grid_x_divs)
+			sub_gray = np.float32(frame_gray[(row*grid_height):((row+1)*grid_height), (col*grid_width):((col+1)*grid_width)][:])
+			gret, gres = cv2.phaseCorrelateRes(self._prev_sub_grays[cell], sub_gray, self._ghann)
+			self._prev_sub_grays[cell] = sub_gray
+			if abs(gres) > 0.7: # WAS 0.01!!!!
+				pcorrs[cell] = [(gret[0]/grid_width),(gret[1]/grid_height)]
+		
+		if ap['full_frame_reference'] == 'previous':
+			self._prev_frame_gray = np.float32(full_gray)
+		return frame_idx, pcorrs
+	
+	def _batched_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (analysis, batched_fft): phase correlation of the full frame and of all of the grid cells against the previous frame (the full frame against the first frame, with full_frame_reference='first'), with one DFT of every cell (and of the full frame) per frame. The spectra of the previous frame are kept, not recomputed. The first frame only primes the state and returns no row.
+		"""
+		ap = self.analysis_params
+		layout = self._grid_layout()
+		grid_x_divs, grid_y_divs = layout.grid_divs_x, layout.grid_divs_y
+		grid_width, grid_height = self.grid_size
+		frame_gray = self.conversions.downscale(frame_idx, frame, ap['scale'])
+		
+		left, top, right, bottom = self._full_box
+		frame_width, frame_height = (right - left), (bottom - top)
+		
+		if self._prev_frame_spectrum is None:
+			self._fhann = cv2.createHanningWindow((frame_width,frame_height), cv2.CV_32FC1)
+			self._ghann = cv2.createHanningWindow((grid_width,grid_height), cv2.CV_32FC1)
+			self._frame_dft_size = (cv2.getOptimalDFTSize(frame_height), cv2.getOptimalDFTSize(frame_width))
+			self._cell_dft_size = (cv2.getOptimalDFTSize(grid_height), cv2.getOptimalDFTSize(grid_width))
+		
+		# the grid cells of the roi, row by row: [CELLS, GRID HEIGHT, GRID WIDTH]
+		cells = frame_gray[:(grid_y_divs*grid_height),:(grid_x_divs*grid_width)].reshape(grid_y_divs, grid_height, grid_x_divs, grid_width).swapaxes(1, 2).reshape(layout.cells, grid_height, grid_width)
+		if len(self._roi_cells) < layout.cells:
+			cells = cells[self._roi_cells]
+		frame_spectrum = _spectra(frame_gray[np.newaxis,top:bottom,left:right], self._fhann, self._frame_dft_size)
+		cell_spectra = _spectra(cells, self._ghann, self._cell_dft_size)
+		prev_frame_spectrum, prev_cell_spectra = self._prev_frame_spectrum, self._prev_cell_spectra
+		self._prev_cell_spectra = cell_spectra
+		if prev_frame_spectrum is None or ap['full_frame_reference'] == 'previous':
+			self._prev_frame_spectrum = frame_spectrum
+		if prev_frame_spectrum is None:
+			return None
 		
-		else:
-			frame = np.empty((frame_width, frame_height), np.uint8)
-			print frame.shape
-
-		self.frame_idx += 1
+		pcorrs = np.zeros(layout.row_shape, dtype='float32')
 		
-		print "<<< ", frame.mean()
-# 		cv.ShowImage('Image', cv.fromarray(frame))
-
-
-
-		while self.frame_idx < end_frame:
-			
-			if (self.frame_idx % 1000) == 0: print 'fr. idx: ', self.frame_idx, ' (', self.frame_idx / float(end_frame), ' | ', end_frame, ')'
-
-			if have_mov:
-				# grab next frame
-				ret, frame = self.capture.read()
-				if frame is None: 
-					print 'Frame error! Exiting...'
-					break # no image captured... end the processing
-				frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-			else:
-				frame[:] = 0
-			
-			# display stage (full)
-			if ap['mode'] == 'playback' and ap['display']:
-				fret = fp[self.frame_idx][64]
-				# print fret
-			elif have_mov:
-				fret, fres = cv2.phaseCorrelateRes(prev_frame_gray, np.float32(frame_gray[:]), fhann)
-				print fret
-				if abs(fres) > 0.01:
-					fp[self.frame_idx][64] = [(fret[0]/frame_width),(fret[1]/frame_height)]
-				else:
-					fp[self.frame_idx][64] = [0,0]
-			else:
-				return
-			
-			# display stage (gridded)
-			for row in range(grid_y_divs):
-				for col in range(grid_x_divs):
-					if ap['mode'] == 'playback' and ap['display']:
-						cell = ((row*8)+col)
-						gret = fp[self.frame_idx][cell]
-					elif have_mov:
-						sub_gray = np.float32(frame_gray[(row*grid_height):((row+1)*grid_height), (col*grid_width):((col+1)*grid_width)][:])
-						gret, gres = cv2.phaseCorrelateRes(prev_sub_grays[(row*grid_x_divs)+col], sub_gray, ghann)
-						prev_sub_grays[(row*grid_x_divs)+col] = sub_gray
-						if abs(gres) > 0.7: # WAS 0.01!!!!
-							fp[self.frame_idx][(row*grid_x_divs)+col] = [(gret[0]/grid_width),(gret[1]/grid_height)]
- 						else:
-							fp[self.frame_idx][(row*grid_x_divs)+col] = [0,0]
-					else:
-						return
-					
-					if ap['display'] and (gret[0] != 0 and gret[1] != 0):
-						print gret
-						print grid_size
-						print centers_x[col]
-						print centers_y[row]
-						xval = int(min((gret[0]*1000), grid_size[0])+centers_x[col])
-						yval = int(min((gret[1]*1000), grid_size[1])+centers_y[row])
-						# print ((centers_x[i], centers_y[j], xval, yval), False, (0,255,255))
-						print (centers_x[col], centers_y[row])	
-						print (xval, yval)
-						cv2.line(frame, (centers_x[col], centers_y[row]), (xval, yval), (255,255,255))
-				
-			#### SHOW
-			if ap['display'] and have_mov:
-				print "<<< ", frame.mean()
-				cv.ShowImage('Image', cv.fromarray(frame))
-			fp.flush()
-			
-			self.frame_idx += 1
-			if have_mov:
-				self.prev_gray = np.float32(frame_gray[:])
-			
-			# handle events for abort
-			k = cv.WaitKey (int(1000 / ap['afps']))	
-			if k % 0x100 == 27:
-				# user has press the ESC key, so exit
-					break
+		# full frame
+		fret, fres = _phase_correlate(prev_frame_spectrum, frame_spectrum, self._frame_dft_size)
+		if abs(fres[0]) > 0.01:
+			pcorrs[layout.full_units[0]] = fret[0] / [frame_width, frame_height]
 		
-		del fp
-		if ap['display']:
-			cv2.destroyAllWindows()
+		# gridded
+		gret, gres = _phase_correlate(prev_cell_spectra, cell_spectra, self._cell_dft_size)
+		moved = np.flatnonzero(np.abs(gres) > 0.7)
+		pcorrs[(layout.cell_offset + self._roi_cells[moved])] = gret[moved] / [grid_width, grid_height]
+		return frame_idx, pcorrs
+	
+	def _playback_kernel(self, frame_idx, frame):
+		"""
+		Engine kernel (playback): read the row back from the data file.
+		"""
+		return frame_idx, self.playback_data[frame_idx]
 	
 	
 	def _display_movie_frame_by_frame(self, **kwargs):
@@ -771,12 +1089,13 @@ class PhaseCorrelation:
 		verbose = ap['verbose']
 		
 		if have_mov is True:
-	 		self.capture = cv2.VideoCapture(self.movie_path)
+			self.frame_source = FrameSource(self.movie_path, ap['seek_threshold'])
+			self.capture = self.frame_source.capture
 			frame_width = int(self.capture.get(cv.CV_CAP_PROP_FRAME_WIDTH))
 			frame_height = int(self.capture.get(cv.CV_CAP_PROP_FRAME_HEIGHT))
 		else:
 			frame_width = 800
-			frame_height = int(float(frame_width) * self._read_json_value('aspect'))
+			frame_height = int(frame_width / self._read_json_value('aspect'))
 			print self._read_json_value('aspect')
 		
 		fps = ap['fps']
@@ -790,8 +1109,7 @@ class PhaseCorrelation:
 		print frame_width
 		print frame_height
 		
-		centers_x = range((frame_width/16),frame_width,(frame_width/8))
-		centers_y = range((frame_height/16),frame_height,(frame_height/8))
+		centers_x, centers_y = grid_centers(frame_size, (grid_x_divs, grid_y_divs))
 		
 		if verbose:
 			print fps, ' | ', frame_size, ' | ', grid_size
@@ -846,7 +1164,7 @@ class PhaseCorrelation:
 		# set up memmap
 		# mode should always be playback and dislay should always be true!!!
 		if ap['mode'] == 'playback' and ap['display'] == True and have_data:
-			fp = np.memmap(self.data_path, dtype='float32', mode='r', shape=((offset_strides + dur_strides),(64+1),2))
+			fp = load_feature_file(self.data_path, self._grid_layout().row_shape, rows=(offset_strides + dur_strides), decode=True)
 			cv2.namedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
 			cv2.resizeWindow('Image', frame_width, frame_height)
 		
@@ -854,8 +1172,7 @@ class PhaseCorrelation:
 		end_frame = offset_frames + dur_frames
 
 		if have_mov:
-			self.capture.set(cv2.cv.CV_CAP_PROP_POS_FRAMES, offset_frames)
-			ret, frame = self.capture.read()
+			frame = self.frame_source.read_frame(offset_frames)
 			if frame is None: 
 				print 'Frame error! Exiting...'
 				return # no image captured... end the processing		
@@ -875,7 +1192,7 @@ class PhaseCorrelation:
 			
 			if have_mov:
 				# grab next frame
-				ret, frame = self.capture.read()
+				frame = self.frame_source.read_frame(self.frame_idx)
 				if frame is None: 
 					print 'Frame error! Exiting...'
 					break # no image captured... end the processing
@@ -886,7 +1203,7 @@ class PhaseCorrelation:
 			for row in range(grid_y_divs):
 				for col in range(grid_x_divs):
 					if ap['mode'] == 'playback' and ap['display']:
-						cell = ((row*8)+col)
+						cell = ((row*grid_x_divs)+col)
 						gret = fp[self.frame_idx][cell]
 					else:
 						return
@@ -904,7 +1221,6 @@ class PhaseCorrelation:
 						cv2.line(frame, (centers_x[col], centers_y[row]), (xval, yval), (255,255,255))
 				#### SHOW
 				cv.ShowImage('Image', cv.fromarray(frame))
-				fp.flush()
 	
 				print self.frame_idx, ':: ', (float(self.frame_idx - offset_frames) / dur_frames)
 				
@@ -923,8 +1239,6 @@ class PhaseCorrelation:
 				self.frame_idx += 24
 			elif p_state == 9: # adv. 10 sec.
 				self.frame_idx += 240
-			if have_mov:
-				self.capture.set(cv.CV_CAP_PROP_POS_FRAMES, self.frame_idx)				
 			
 			# handle key events
 			k = cv.WaitKey (int(1000 / ap['afps']))
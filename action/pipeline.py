@@ -0,0 +1,116 @@
+# pipeline.py - decode-once analysis of several features in one pass over a film
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+Getting the color, phase correlation and optical flow features of a film with the extractors' own analyze_movie functions takes three passes over the movie, and each pass decodes every frame again. analyze_all does all of them in one pass: every frame is decoded once, and its grayscale and L*a*b* conversions are done once, for all of the requested extractors. Each extractor still writes its own data file, with the same contents as its analyze_movie function would have written.
+
+.. code-block:: python
+
+	analyze_all('Psycho')
+	analyze_all('Psycho', features=['color', 'phasecorr'], action_dir='~/somewhere')
+
+Parameters that are passed to analyze_all go to all of the extractors. Parameters for one of them only can be given by passing features as a dict:
+
+.. code-block:: python
+
+	analyze_all('Psycho', features={'color': {'stride': 4}, 'opticalflow': {'trackLength': 32}})
+
++--------------+------------------+----------------+
+| feature      | extractor        | data file      |
++==============+==================+================+
+| color        | ColorFeaturesLAB | .color_lab     |
++--------------+------------------+----------------+
+| phasecorr    | PhaseCorrelation | .phasecorr     |
++--------------+------------------+----------------+
+| opticalflow  | OpticalFlow      | .opticalflow24 |
++--------------+------------------+----------------+
+| tvl1         | OpticalFlowTVL1  | .tvl1          |
++--------------+------------------+----------------+
+| motionenergy | MotionEnergy     | .motionenergy  |
++--------------+------------------+----------------+
+
+The combined pass runs in one process; use the extractors' analyze_movie(workers=N) to analyze one feature with several processes.
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os
+from color_features_lab import *
+from phase_correlation import *
+from opticalflow import *
+from opticalflow_tvl1 import *
+from motion_energy import *
+from framesource import *
+from engine import *
+from viewer import *
+
+FEATURES = {
+	'color' : ColorFeaturesLAB,
+	'phasecorr' : PhaseCorrelation,
+	'opticalflow' : OpticalFlow,
+	'tvl1' : OpticalFlowTVL1,
+	'motionenergy' : MotionEnergy
+}
+
+
+def analyze_all(title, features=['color', 'phasecorr', 'opticalflow'], offset=0, duration=-1, **analysis_params):
+	"""
+	Analyze the movie for all of the features (see FEATURES) in one pass. features is a list of feature names, or a dict of feature name -> parameters for that feature only. offset and duration are in seconds; duration=-1 analyzes to the end of the movie.
+
+	Returns a dict of feature name -> extractor.
+	"""
+	if not HAVE_CV:
+		print "WARNING: You must install OpenCV in order to analyze or view!"
+		return None
+	if not isinstance(features, dict):
+		features = dict([(feature, {}) for feature in features])
+	for feature in features:
+		if feature not in FEATURES:
+			print "ERROR: Unknown feature: ", feature, " (use one of ", sorted(FEATURES.keys()), ")"
+			return None
+
+	extractors = {}
+	for feature, params in features.items():
+		feature_params = dict(analysis_params)
+		feature_params.update(params)
+		extractors[feature] = FEATURES[feature](title, **feature_params)
+
+	first = extractors.values()[0]
+	ap = first.analysis_params
+	verbose = ap['verbose']
+	if not os.path.exists(first.movie_path):
+		print "ERROR: Must supply a movie for analysis!"
+		return None
+	frame_source = PrefetchFrameSource(FrameSource(first.movie_path, ap['seek_threshold']), ap['prefetch_depth'])
+
+	# every extractor adds its kernel and writer to the one engine; each one works out its own duration (duration=-1) and frame rate, as its analyze_movie does
+	engine = AnalysisEngine(frame_source)
+	for feature, extractor in extractors.items():
+		extractor._process_movie(engine=engine, mode='analyze', display=False, offset=offset, duration=duration)
+	if len(engine.kernels) == 0:
+		frame_source.release()
+		return None
+
+	if verbose:
+		engine.subscribe(ProgressReporter(min([k[2] for k in engine.kernels]), max([k[3] for k in engine.kernels])))
+	complete = False
+	try:
+		complete = engine.run()
+	finally:
+		engine.close(complete)
+		frame_source.release()
+
+	if verbose:
+		print 'ENGINE: ', engine.stats()
+		print 'CONVERSIONS: ', engine.conversions.stats()
+		print 'FRAME SOURCE: ', frame_source.stats()
+	return extractors
@@ -0,0 +1,167 @@
+# preview.py - quick low-rate preview analyses
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+A full analysis decodes every frame of a film (or every stride-th one) and can take hours. A preview analysis only looks at one sample frame every preview_interval seconds: the frames in between are skipped with grab() (or a seek, for gaps longer than seek_threshold frames; see the framesource module) and never retrieved, so a preview of a new film is ready almost as soon as it is ingested. Pass preview=True to any of the extractors:
+
+.. code-block:: python
+
+	cflab = ColorFeaturesLAB('Psycho', preview=True, preview_interval=5.0)
+	cflab.analyze_movie()
+	X = cflab.middle_band_color_features_for_segment(Segment(0, 600))	# read like a full analysis
+
+The preview is written next to the extractor's data file (data_path + '.preview'), with one row per sample, so that a preview never overwrites a full analysis, nor the checkpoint of an interrupted one. Its header marks it as a preview: preview holds the number of movie frames between its rows (see the featurefile module), and the analysis_params hold preview and preview_interval. As long as there is no data file of a full analysis, the accessors read the preview in its place (see feature_file_path in the featurefile module), like any other data file: FeatureReader resamples its rows to 24 fps with linear interpolation, the same way as it resamples the rows of a film that does not run at 24 fps, so the windows they return have as many rows as those of a full analysis. Once a full analysis has been started, its data file is read instead.
+
+Extractors that carry state from frame to frame decode a few warm-up frames before every sample, and start every sample from a clean state, like the time ranges of a parallel analysis (see the parallel module). Except where noted, the rows of a preview are the same as the rows of the sample frames in a full analysis:
+
++------------------+---------------------------------------------------------------+
+| ColorFeaturesLAB | the sample frame only                                         |
++------------------+---------------------------------------------------------------+
+| PhaseCorrelation | the two frames before the sample                              |
++------------------+---------------------------------------------------------------+
+| OpticalFlow      | Lucas-Kanade: tracks from the feature detection frame at      |
+|                  | least 24 frames before the sample (the rows differ from those |
+|                  | of a full analysis for tracks that are older than that);      |
+|                  | dense flow: the frame before the sample                       |
++------------------+---------------------------------------------------------------+
+| OpticalFlowTVL1  | the frame_gap frames before the sample (the running maximum   |
+|                  | that normalizes the flow carries over from sample to sample,  |
+|                  | so the rows are close to those of a full analysis)            |
++------------------+---------------------------------------------------------------+
+| MotionEnergy     | the analysis frame a stride before the sample                 |
++------------------+---------------------------------------------------------------+
+
+OpenCV's VideoCapture does not say which frames are keyframes, so the samples are evenly spaced in time rather than on the keyframes of the movie.
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+from featurewriter import *
+
+
+def preview_interval_frames(analysis_params):
+	"""
+	Number of movie frames between the samples of a preview: preview_interval seconds, rounded to a whole number of strides (at least one).
+	"""
+	ap = analysis_params
+	stride = ap['stride']
+	return max(1, int(round((ap['preview_interval'] * ap['fps']) / float(stride)))) * stride
+
+
+class Preview:
+	"""
+	The sample frames of a preview of [start_frame, end_frame), and the writer of its data file (data_path + PREVIEW_EXTENSION). Wraps the extractor's frame source (only the samples and their warm-up frames are decoded) and kernel (only the rows of the samples are written, one after the other). warmup is the number of frames decoded before each sample, starting on a multiple of align frames; reset (if given) is called before the first of them, to clear the extractor's frame-to-frame state.
+
+	::
+
+		preview = Preview(self.data_path, row_shape, ap, offset_frames, (offset_frames + dur_frames), warmup=2, reset=self._reset_state)
+		self.frame_source = preview.frame_source(self.frame_source)
+		fp, kernel = preview.writer, preview.kernel(self._analysis_kernel)
+
+	"""
+	def __init__(self, data_path, row_shape, analysis_params, start_frame, end_frame, warmup=0, align=1, reset=None):
+		ap = analysis_params
+		self.interval_frames = preview_interval_frames(ap)
+		self.samples = range(start_frame, end_frame, self.interval_frames)
+		self.rows = dict([(frame_idx, row) for row, frame_idx in enumerate(self.samples)])
+		self.warmup = max(0, int(warmup))
+		self.align = max(1, int(align))
+		self.reset = reset
+		# next to the data file of a full analysis (and its checkpoint), which are left as they are
+		self.writer = FeatureWriter((data_path + PREVIEW_EXTENSION), ((len(self.samples),) + tuple(row_shape)), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], analysis_params=dict(ap, preview_frames=self.interval_frames))
+
+	def frame_source(self, frame_source):
+		"""
+		Wrap frame_source so that it only hands out the sample frames and their warm-up frames.
+		"""
+		return SampledFrameSource(frame_source, self)
+
+	def kernel(self, kernel):
+		"""
+		Wrap an engine kernel so that it returns rows for the sample frames only, numbered as the rows of the preview.
+		"""
+		rows = self.rows
+		def preview_kernel(frame_idx, frame):
+			result = kernel(frame_idx, frame)
+			if result is None or frame_idx not in rows:
+				return None
+			return rows[frame_idx], result[1]
+		return preview_kernel
+
+	def windows(self, start_frame, end_frame, step=1):
+		"""
+		The (first frame, sample frame) of every sample in [start_frame, end_frame) (see sample_windows).
+		"""
+		return sample_windows(self.samples, start_frame, end_frame, step, self.warmup, self.align)
+
+
+def sample_windows(samples, start_frame, end_frame, step=1, warmup=0, align=1):
+	"""
+	The (first frame, sample frame) of every one of samples (in increasing order) in [start_frame, end_frame): the frames first, first + step, ... up to the sample are decoded for it, first being warmup frames before the sample, on a multiple of align. Windows that would overlap the previous one continue from it instead (and first is None).
+	"""
+	windows = []
+	last = None
+	for sample in samples:
+		if sample < start_frame or sample >= end_frame or ((sample - start_frame) % step) != 0:
+			continue
+		first = max(start_frame, (((sample - warmup) / align) * align))
+		# on the engine's frame grid
+		first = start_frame + (((first - start_frame) + step - 1) / step) * step
+		if last is not None and first <= last:
+			windows.append((None, sample))
+		else:
+			windows.append((first, sample))
+		last = sample
+	return windows
+
+
+class SampledFrameSource:
+	"""
+	Frame source (see the framesource module) that hands out only the frames of the sample windows of a preview (see Preview.windows) or of a progressive analysis (see the progressive module). Everything else is passed through to the frame source it wraps.
+	"""
+	def __init__(self, frame_source, preview):
+		self.frame_source = frame_source
+		self.capture = getattr(frame_source, 'capture', None)
+		self.preview = preview
+
+	def get(self, prop):
+		return self.frame_source.get(prop)
+
+	def frame_size(self):
+		return self.frame_source.frame_size()
+
+	def frame_count(self):
+		return self.frame_source.frame_count()
+
+	def frames(self, start_frame, end_frame, step=1):
+		"""
+		Generator over (frame_idx, frame) for the frames of the sample windows in [start_frame, end_frame). Stops early at the end of the movie.
+		"""
+		last = None
+		for first, sample in self.preview.windows(start_frame, end_frame, step):
+			if first is None:
+				first = last + step
+			elif self.preview.reset is not None:
+				self.preview.reset()
+			frame_idx = None
+			for frame_idx, frame in self.frame_source.frames(first, (sample + 1), step):
+				yield frame_idx, frame
+			if frame_idx != sample:
+				# the end of the movie
+				return
+			last = sample
+
+	def stats(self):
+		return self.frame_source.stats()
+
+	def release(self):
+		self.frame_source.release()
@@ -0,0 +1,196 @@
+# progressive.py - coarse-to-fine analyses with a coverage sidecar
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+A full analysis fills its data file from the start of the film to the end, so the end of the film is only there when the whole analysis is done. A progressive analysis fills the same data file coarse-to-fine instead: first every progressive_step-th row (64 by default), then the rows halfway between those, then the rows halfway between all of those, and so on until every row is analyzed. Pass progressive=True to any of the extractors:
+
+.. code-block:: python
+
+	cflab = ColorFeaturesLAB('Psycho', progressive=True)
+	cflab.analyze_movie()	# in another process, or while browsing
+
+	# at any time, while the analysis is still running:
+	X = cflab.middle_band_color_features_for_segment(Segment(0, 600))
+	print segment_coverage(cflab, Segment(0, 600))
+	>>> 0.125
+
+Which rows have been analyzed so far is kept in a coverage sidecar next to the data file (data_path + '.coverage'; see read_feature_coverage in the featurefile module). It is updated every time the analysis writes its rows to the data file (every flush_interval rows, and on SIGINT/SIGTERM), and removed once every row is covered: from then on the data file is the same as that of a full analysis. While the sidecar is there, FeatureReader interpolates the rows that are not covered yet linearly between the nearest covered rows on either side (and repeats the first or last covered row past either end), so the accessors return windows of the usual shape, as good as the analysis is so far, and segmentation or browsing can start after the first pass. segment_coverage says how much of a window is analyzed rather than interpolated.
+
+The passes are made of sample frames, like a preview (see the preview module): only the samples and their warm-up frames are decoded, the frames in between are skipped, and extractors that carry state from frame to frame start every sample from a clean state, after the same warm-up as for a preview. Where the samples of a pass are close enough that their warm-up frames overlap (the later passes), the frames are decoded in one run. Its rows are those of a full analysis, except for the Lucas-Kanade optical flow and the TVL1 flow, which are as close to them as the rows of a preview are (see the preview module).
+
+Every pass skips through the film again (with grab(), or with a seek for gaps longer than seek_threshold frames; see the framesource module), and the warm-up frames of the samples are decoded on top of the frames of a full analysis, so a progressive analysis takes longer than a full one: two to four times as long on short test clips, with the default progressive_step. The first pass (a 64th of the rows) is there after a small part of that.
+
+resume=True picks up an interrupted progressive analysis with the rows that are not covered yet, in the same order.
+
++----------------------+---------+--------------------------------------------------------------------+
+| param                | default | notes                                                              |
++======================+=========+====================================================================+
+| progressive          | False   | analyze coarse-to-fine, with a coverage sidecar                    |
++----------------------+---------+--------------------------------------------------------------------+
+| progressive_step     | 64      | rows between the samples of the first pass (halved every pass)     |
++----------------------+---------+--------------------------------------------------------------------+
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import os
+import numpy as np
+from featurewriter import *
+from featurereader import *
+from checkpoint import *
+from preview import *
+from segment import *
+
+
+def progressive_passes(num_rows, step, covered=None):
+	"""
+	Rows 0 .. num_rows-1 in coarse-to-fine order, as a list of passes (arrays of rows, in increasing order): every step-th row first, then the rows halfway between them, and so on (step is halved every pass) down to every row. Rows that are already covered (a bool array) are left out.
+	"""
+	done = np.zeros(num_rows, dtype=bool) if covered is None else np.array(covered, dtype=bool)
+	step = max(1, int(step))
+	passes = []
+	while True:
+		rows = np.arange(0, num_rows, step)
+		rows = rows[~done[rows]]
+		done[rows] = True
+		if len(rows) > 0:
+			passes.append(rows)
+		if step == 1:
+			return passes
+		step = max(1, (step / 2))
+
+
+class Progressive:
+	"""
+	The passes of a progressive analysis of the num_rows rows of a data file, its coverage and the writer of its data file. Wraps the extractor's frame source (only the samples of each pass and their warm-up frames are decoded, pass after pass) and kernel (only the rows of the samples are written, and marked as covered once they are on disc). row_frame maps a row of the data file to the frame it is analyzed from; it is only called when the analysis starts. warmup, align and reset are those of a preview (see the preview module). resume=True keeps the rows that the coverage sidecar of an interrupted analysis says are covered.
+
+	::
+
+		progressive = Progressive(self.data_path, row_shape, ap, dur_strides, self._row_frame, warmup=2, reset=self._reset_state, resume=resume)
+		self.frame_source = progressive.frame_source(self.frame_source)
+		fp, kernel = progressive.writer, progressive.kernel(self._analysis_kernel)
+
+	"""
+	def __init__(self, data_path, row_shape, analysis_params, num_rows, row_frame, warmup=0, align=1, reset=None, resume=False):
+		ap = analysis_params
+		self.data_path = data_path
+		self.num_rows = num_rows
+		self.row_frame = row_frame
+		self.step = ap['progressive_step']
+		self.warmup = max(0, int(warmup))
+		self.align = max(1, int(align))
+		self.reset = reset
+		# the rows of the samples that are still to be analyzed, by frame, pass by pass (filled in when the analysis starts)
+		self.passes = None
+		# rows that have been written, but are not on disc yet
+		self.written = []
+		# a full analysis, interrupted or not, cannot be resumed progressively
+		checkpoint = Checkpoint(data_path, ap)
+		if os.path.exists(checkpoint.path):
+			os.remove(checkpoint.path)
+		covered = read_feature_coverage(data_path) if resume else None
+		if covered is not None and len(covered) == num_rows:
+			self.covered = covered
+			self.writer = FeatureWriter(data_path, ((num_rows,) + tuple(row_shape)), mode='r+', flush_interval=ap['flush_interval'], checkpoint=self)
+		else:
+			self.covered = np.zeros(num_rows, dtype=bool)
+			self.writer = FeatureWriter(data_path, ((num_rows,) + tuple(row_shape)), mode='w+', flush_interval=ap['flush_interval'], dtype=ap['storage_dtype'], value_range=ap['storage_range'], checkpoint=self, analysis_params=ap)
+		write_feature_coverage(data_path, self.covered)
+
+	def frame_source(self, frame_source):
+		"""
+		Wrap frame_source so that it hands out the samples of every pass and their warm-up frames, one pass after the other.
+		"""
+		return SampledFrameSource(frame_source, self)
+
+	def kernel(self, kernel):
+		"""
+		Wrap an engine kernel so that it returns rows for the samples that are still to be analyzed only. (Under a shared engine that decodes the frames itself, in order, such as the pipeline's, every row is returned.)
+		"""
+		def progressive_kernel(frame_idx, frame):
+			result = kernel(frame_idx, frame)
+			if self.passes is None:
+				if result is not None:
+					self.written.append(result[0])
+				return result
+			# only the samples of the pass under way: those of the later passes also come by as warm-up frames
+			row = self.passes[0].pop(frame_idx, None) if len(self.passes) > 0 else None
+			if row is None:
+				return None
+			if len(self.passes[0]) == 0:
+				self.passes.pop(0)
+			if result is None:
+				# nothing to write for this sample (as in a full analysis): it is covered as it is
+				self.covered[row] = True
+				return None
+			self.written.append(result[0])
+			return result
+		return progressive_kernel
+
+	def windows(self, start_frame, end_frame, step=1):
+		"""
+		The (first frame, sample frame) windows (see sample_windows in the preview module) of every pass in turn, for the samples in [start_frame, end_frame) that are not covered yet.
+		"""
+		self.passes = []
+		windows = []
+		for rows in progressive_passes(self.num_rows, self.step, self.covered):
+			frames = dict([(self.row_frame(int(row)), int(row)) for row in rows])
+			pass_windows = sample_windows(sorted(frames), start_frame, end_frame, step, self.warmup, self.align)
+			if len(pass_windows) > 0:
+				self.passes.append(dict([(sample, frames[sample]) for first, sample in pass_windows]))
+				windows += pass_windows
+		return windows
+
+	def rows_done(self, next_row):
+		"""
+		Called by the writer when it has written its rows up to next_row to the data file: the rows of the samples in that block are covered.
+		"""
+		start = self.writer.block_start
+		on_disc = [row for row in self.written if start <= row < next_row]
+		self.written = [row for row in self.written if not (start <= row < next_row)]
+		self.covered[on_disc] = True
+		write_feature_coverage(self.data_path, self.covered)
+
+	def finish(self):
+		"""
+		Called by the writer when the analysis is complete: the coverage sidecar is removed if every row is covered.
+		"""
+		if self.passes is None:
+			# analyzed in order, from start to end
+			self.covered[:] = True
+		if self.covered.all():
+			path = self.data_path + COVERAGE_EXTENSION
+			if os.path.exists(path):
+				os.remove(path)
+		else:
+			write_feature_coverage(self.data_path, self.covered)
+
+
+def segment_coverage(extractor, segment=Segment(0, -1)):
+	"""
+	The fraction of the rows of an extractor's data file under segment (seconds, as the accessors read them) that have been analyzed rather than interpolated, while the data file is being analyzed progressively. 1.0 for data files without a coverage sidecar.
+	"""
+	covered = read_feature_coverage(extractor.data_path)
+	if covered is None or len(covered) == 0:
+		return 1.0
+	extractor._read_metadata()
+	ap = extractor.analysis_params
+	# the rows are stride movie frames apart (at afps)
+	rows_per_sec = ap['afps'] / float(ap['stride'])
+	first = max(0, int(segment.time_span.start_time * rows_per_sec))
+	if segment.time_span.duration < 0:
+		last = len(covered)
+	else:
+		last = min(len(covered), (int(segment.time_span.end_time * rows_per_sec) + 1))
+	if last <= first:
+		return 1.0
+	return float(covered[first:last].mean())
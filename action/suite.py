@@ -4,10 +4,24 @@ from color_features_lab import *
 from phase_correlation import *
 from opticalflow import *
 from opticalflow_tvl1 import *
+from motion_energy import *
 from segment import *
 from actiondata import *
 from distance import *
 from action_filmdb import *
+from framesource import *
+from parallel import *
+from featurewriter import *
+from engine import *
+from viewer import *
+from pipeline import *
+from checkpoint import *
+from featurereader import *
+from moviemetadata import *
+from featurefile import *
+from gridlayout import *
+from preview import *
+from progressive import *
 
 ad = ActionData()
 av = ActionView()
@@ -0,0 +1,265 @@
+# viewer.py - optional on-screen display for the analysis engine
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+"""
+Part of Bregman:ACTION - Cinematic information retrieval toolkit
+
+Overview
+========
+
+Viewers are the display side of the ACTION feature extractors. The analysis itself runs headless in the AnalysisEngine (see the engine module); a viewer subscribes to the engine and is handed every frame together with the row of features that was computed (analysis) or read back from the data file (playback) for it. All of the highgui calls (windows, drawing, WaitKey) live here.
+
+.. code-block:: python
+
+	engine = AnalysisEngine(frame_source, kernel, writer)
+	engine.subscribe(OpticalFlowViewer(oflow, frame_size))
+	engine.run(0, 2400)
+
++------------------------+-----------------------------------------------------------------+
+| FrameViewer            | shows the movie frames; ESC stops the engine                    |
++------------------------+-----------------------------------------------------------------+
+| ColorFeaturesViewer    | frames plus a window with the full-frame and gridded histograms |
++------------------------+-----------------------------------------------------------------+
+| PhaseCorrelationViewer | frames with the phase correlation vector of every grid cell     |
++------------------------+-----------------------------------------------------------------+
+| OpticalFlowViewer      | frames with the LK tracks and the angle histogram of every cell |
++------------------------+-----------------------------------------------------------------+
+| MotionEnergyViewer     | frames with the motion energy and centroid shift of every cell  |
++------------------------+-----------------------------------------------------------------+
+| ProgressReporter       | no display; prints the analysis progress (verbose mode)         |
++------------------------+-----------------------------------------------------------------+
+
+"""
+__version__ = '1.0'
+__author__ = 'Thomas Stoll'
+__copyright__ = "Copyright (C) 2012  Michael Casey, Thomas Stoll, Dartmouth College, All Rights Reserved"
+__license__ = "gpl 2.0 or higher"
+__email__ = 'thomas.m.stoll@dartmouth.edu'
+
+import math
+try:
+	import cv2
+	import cv2.cv as cv
+	HAVE_CV = True
+except ImportError:
+	HAVE_CV = False
+
+import numpy as np
+
+
+def grid_centers(frame_size, grid_divs):
+	"""
+	Centers (x and y pixel positions) of the columns and rows of a grid_divs (x, y) grid over a frame of frame_size (width, height).
+	"""
+	frame_width, frame_height = frame_size
+	grid_x_divs, grid_y_divs = grid_divs
+	centers_x = [((frame_width * ((2 * col) + 1)) / (2 * grid_x_divs)) for col in range(grid_x_divs)]
+	centers_y = [((frame_height * ((2 * row) + 1)) / (2 * grid_y_divs)) for row in range(grid_y_divs)]
+	return centers_x, centers_y
+
+def theta_wedges(theta_divs, length=32):
+	"""
+	End points (x and y offsets, length pixels long) of the lines that show the theta_divs angle bins of the optical flow histograms: bin 0 points left (-pi), and the bins go around clockwise on screen.
+	"""
+	angles = [(-math.pi + ((2.0 * math.pi * wdg) / theta_divs)) for wdg in range(theta_divs)]
+	return [int(length * math.cos(angle)) for angle in angles], [int(length * math.sin(angle)) for angle in angles]
+
+
+class FrameViewer:
+	"""
+	Show each frame in the 'Image' window and wait delay ms for a key. Returns False from show (which stops the engine) when the user presses ESC.
+	"""
+	def __init__(self, delay=41):
+		self.delay = delay
+		cv.NamedWindow('Image', cv.CV_WINDOW_AUTOSIZE)
+
+	def show(self, frame_idx, frame, row):
+		cv.ShowImage('Image', cv.fromarray(frame))
+		return self.wait()
+
+	def wait(self):
+		k = cv.WaitKey(self.delay)
+		# user has pressed the ESC key, so exit
+		return (k % 0x100) != 27
+
+	def close(self):
+		cv2.destroyAllWindows()
+
+
+class ColorFeaturesViewer(FrameViewer):
+	"""
+	Display for ColorFeaturesLAB: the frame, plus a 'Histogram' window with the L*a*b* bars for the full frame (bottom) and for each grid cell.
+	"""
+	def __init__(self, cflab, frame_size, hist_size, grid_size, playback=False):
+		ap = cflab.analysis_params
+		FrameViewer.__init__(self, delay=int(1000 / ap['afps']))
+		self.cflab = cflab
+		self.playback = playback
+		frame_width, frame_height = frame_size
+		hist_width, hist_height = hist_size
+		grid_width, grid_height = grid_size
+		self.grid_divs = (ap['grid_divs_x'], ap['grid_divs_y'])
+		self.layout = cflab._grid_layout()
+		self.dims = ap['ldims']
+		self.hist_height = hist_height
+		self.grid_height_ratio = grid_height/255.
+		self.histimg = np.zeros((int(hist_height*1.25), int(hist_width), 3), np.uint8)
+
+		bin_w = int((hist_width * ap['hist_width_ratio']) / (ap['ldims'] * ap['grid_divs_x']))
+		third_bin_w = int(bin_w/3)
+		vert_offset = int(frame_height*ap['hist_vert_offset_ratio'])
+
+		cv.NamedWindow('Histogram', hist_width)
+		cv.ResizeWindow('Histogram', int(hist_width*ap['hist_width_ratio']*1.0), int(hist_height*ap['hist_height_ratio']*1.25))
+		cv.MoveWindow('Histogram', int(frame_width*ap['hist_horiz_offset_ratio']), vert_offset)
+
+		# ldims == adims == bdims (see ColorFeaturesLAB._grid_layout)
+		lcolors, acolors, bcolors= range(ap['ldims']), range(ap['adims']), range(ap['bdims'])
+		for d in range (self.dims):
+			gray_val = (d * 192. / self.dims) + 32
+			lcolors[d] = cv.Scalar(255., gray_val, gray_val)
+			acolors[d] = cv.Scalar(gray_val, 128., 128.)
+			bcolors[d] = cv.Scalar(gray_val, gray_val, gray_val)
+		self.colors = [lcolors, acolors, bcolors]
+		self.six_points = cflab.build_bars(grid_width, grid_height, bin_w, third_bin_w, ap['grid_divs_x'], ap['grid_divs_y'], self.dims)
+
+	def _draw_bars(self, i, j, bins, voffset):
+		lbins, abins, bbins = bins[0], bins[1], bins[2]
+		for d in range(self.dims):
+			# for all the bins, get the value, and scale to the size of the grid
+			lval, aval, bval = int(lbins[d]*255.), int(abins[d]*255.), int(bbins[d]*255.)
+			#draw the rectangle in the wanted color
+			self.cflab.make_rectangles(cv.fromarray(self.histimg), self.six_points, 6, i, j, d, [lval, aval, bval], self.grid_height_ratio, self.colors, voffset=voffset)
+
+	def show(self, frame_idx, frame, hists):
+		if hists is not None:
+			grid_x_divs, grid_y_divs = self.grid_divs
+			self.histimg[:] = 0
+			# full frame
+			self._draw_bars(0, 0, hists[0], self.hist_height)
+			# gridded: the bars of the cell in row i, column j
+			for i in range(grid_y_divs):
+				for j in range(grid_x_divs):
+					self._draw_bars(i, j, hists[self.layout.cell(i, j) + self.layout.cell_offset], 0)
+		cv.ShowImage('Image', cv.fromarray(frame))
+		cv.ShowImage('Histogram', cv.fromarray(self.histimg))
+		return self.wait()
+
+	def close(self):
+		cv.DestroyWindow('Image')
+		cv.DestroyWindow('Histogram')
+
+
+class PhaseCorrelationViewer(FrameViewer):
+	"""
+	Display for PhaseCorrelation: a line from the center of every grid cell in the direction of its (scaled) phase correlation vector.
+	"""
+	def __init__(self, pcorr, frame_size):
+		ap = pcorr.analysis_params
+		FrameViewer.__init__(self, delay=int(1000 / ap['afps']))
+		frame_width, frame_height = frame_size
+		self.grid_divs = (ap['grid_divs_x'], ap['grid_divs_y'])
+		self.grid_size = (int(frame_width/ap['grid_divs_x']), int(frame_height/ap['grid_divs_y']))
+		self.centers_x, self.centers_y = grid_centers(frame_size, self.grid_divs)
+		cv.ResizeWindow('Image', frame_width, frame_height)
+
+	def show(self, frame_idx, frame, pcorrs):
+		if pcorrs is not None:
+			grid_x_divs, grid_y_divs = self.grid_divs
+			for row in range(grid_y_divs):
+				for col in range(grid_x_divs):
+					gret = pcorrs[(row*grid_x_divs)+col]
+					if (gret[0] != 0 and gret[1] != 0):
+						xval = int(min((gret[0]*1000), self.grid_size[0])+self.centers_x[col])
+						yval = int(min((gret[1]*1000), self.grid_size[1])+self.centers_y[row])
+						cv2.line(frame, (self.centers_x[col], self.centers_y[row]), (xval, yval), (255,255,255))
+		cv.ShowImage('Image', cv.fromarray(frame))
+		return self.wait()
+
+
+class MotionEnergyViewer(FrameViewer):
+	"""
+	Display for MotionEnergy: for every grid cell, a circle whose size shows its motion energy, and a line from its center in the direction of its (scaled) centroid shift.
+	"""
+	def __init__(self, menergy, frame_size):
+		ap = menergy.analysis_params
+		FrameViewer.__init__(self, delay=int(1000 / ap['afps']))
+		frame_width, frame_height = frame_size
+		self.layout = menergy._grid_layout()
+		self.grid_size = (int(frame_width/ap['grid_divs_x']), int(frame_height/ap['grid_divs_y']))
+		self.centers_x, self.centers_y = grid_centers(frame_size, (ap['grid_divs_x'], ap['grid_divs_y']))
+		cv.ResizeWindow('Image', frame_width, frame_height)
+
+	def show(self, frame_idx, frame, row):
+		if row is not None:
+			grid_width, grid_height = self.grid_size
+			for grid_row in range(self.layout.grid_divs_y):
+				for col in range(self.layout.grid_divs_x):
+					energy, dx, dy = row[(self.layout.cell_offset + self.layout.cell(grid_row, col))]
+					center = (self.centers_x[col], self.centers_y[grid_row])
+					radius = int(min((energy * 4.0), 1.0) * (min(grid_width, grid_height) / 2))
+					if radius > 0:
+						cv2.circle(frame, center, radius, (0,255,255))
+					if (dx != 0 or dy != 0):
+						cv2.line(frame, center, (int(center[0] + (dx * grid_width * 4)), int(center[1] + (dy * grid_height * 4))), (255,255,255))
+		cv.ShowImage('Image', cv.fromarray(frame))
+		return self.wait()
+
+
+class OpticalFlowViewer(FrameViewer):
+	"""
+	Display for OpticalFlow: the current LK tracks, and for every grid cell a wedge of lines whose brightness shows the weight of each angle bin.
+	"""
+	def __init__(self, oflow, frame_size):
+		ap = oflow.analysis_params
+		FrameViewer.__init__(self, delay=int(1000 / ap['afps']))
+		self.oflow = oflow
+		frame_width, frame_height = frame_size
+		self.divs = (ap['grid_divs_x'], ap['grid_divs_y'], ap['theta_divs'])
+		self.centers_x, self.centers_y = grid_centers(frame_size, self.divs[:2])
+		self.thetas_x, self.thetas_y = theta_wedges(ap['theta_divs'])
+
+	def show(self, frame_idx, frame, currframe):
+		grid_x_divs, grid_y_divs, theta_divs = self.divs
+		tracks_now = self.oflow.tracks.polylines()
+		for tr in tracks_now:
+			cv2.circle(frame, (int(tr[-1][0]), int(tr[-1][1])), 2, (0, 255, 0), -1)
+		cv2.polylines(frame, tracks_now, isClosed=False, color=(0, 255, 0))
+
+		# visualize frame's histograms
+		if currframe is not None:
+			framemin = currframe.min()
+			framemax = currframe.max()
+			framerange = framemax - framemin
+			if framerange > 0:
+				grays = np.multiply(np.subtract(currframe, framemin), (256.0 / framerange))
+				grays_ma = np.ma.masked_invalid(grays)
+				grays = grays_ma.filled(0.0)
+				for row in range(grid_y_divs):
+					for col in range(grid_x_divs):
+						for wdg in range(theta_divs):
+							gry = int(grays[(row*(grid_x_divs*theta_divs))+(col*theta_divs)+wdg])
+							if gry>0.0:
+								cv2.line(frame, (self.centers_x[col], self.centers_y[row]), ((self.centers_x[col]+self.thetas_x[wdg]), (self.centers_y[row]+self.thetas_y[wdg])), (gry,gry,gry))
+		cv.ShowImage('Image', cv.fromarray(frame))
+		return self.wait()
+
+
+class ProgressReporter:
+	"""
+	Not a display: prints where the analysis is every few (default 1000) frames. Subscribed by the extractors in verbose mode.
+	"""
+	def __init__(self, start_frame, end_frame, every=1000):
+		self.start_frame = start_frame
+		self.end_frame = end_frame
+		self.every = every
+		self.next_report = start_frame
+
+	def show(self, frame_idx, frame, row):
+		if frame_idx >= self.next_report:
+			print('fr. idx: %6i || %.4f (/%i) [ %i | %i ]' % (frame_idx, ((frame_idx - self.start_frame) / float(max(1, (self.end_frame - self.start_frame)))), (self.end_frame - self.start_frame), self.start_frame, self.end_frame))
+			self.next_report = frame_idx + self.every
+		return True
+
+	def close(self):
+		pass
@@ -0,0 +1,73 @@
+import glob, os, time, argparse
+import numpy as np
+from action.suite import *
+
+ACTIONDIR = '/Volumes/ACTION'
+SCALES = [1.0, 0.5, 0.25, 0.125]
+DURATION = 60 # seconds of each film (from the offset) that are analyzed at every scale
+
+def analyze(title, scale, params):
+	"""
+	Analyze title at scale into a data file of its own (removed afterwards). Return the seconds taken, the frames analyzed and the rows (float32).
+	"""
+	pcorr = PhaseCorrelation(title, action_dir=ACTIONDIR, data_extension=('.phasecorr_scale_%g' % scale), scale=scale, **params)
+	t = time.time()
+	pcorr.analyze_movie()
+	secs = time.time() - t
+	try:
+		X = np.array(load_feature_file(pcorr.data_path, decode=True))
+	finally:
+		for path in [pcorr.data_path, (pcorr.data_path + '.progress')]:
+			if os.path.exists(path):
+				os.remove(path)
+	return secs, (len(X) * pcorr.analysis_params['stride']), X
+
+def agreement(X, Y):
+	"""
+	Agreement of rows Y with the full-resolution rows X ([NUMBER OF FRAMES, 65, 2]): correlation and mean absolute difference of the full-frame shifts, mean absolute difference of the cell shifts where both have one (fractions of a cell), and the fraction of cells that agree on whether they have one (response above the threshold).
+	"""
+	full_x, full_y = X[:,-1].ravel(), Y[:,-1].ravel()
+	if full_x.std() > 0.0 and full_y.std() > 0.0:
+		full_corr = np.corrcoef(full_x, full_y)[0, 1]
+	else:
+		full_corr = float(np.all(full_x == full_y))
+	full_err = np.abs(full_x - full_y).mean()
+	moved_x, moved_y = X[:,:-1].any(axis=2), Y[:,:-1].any(axis=2)
+	both = moved_x & moved_y
+	cell_err = np.abs(X[:,:-1][both] - Y[:,:-1][both]).mean() if both.any() else 0.0
+	return full_corr, full_err, cell_err, np.mean(moved_x == moved_y)
+
+def benchmark(title, scales, params):
+	print title, ' offset: ', params['offset'], ' duration: ', params['duration'], ' roi: ', params['roi']
+	print '    scale   frames/s   x real time   full corr   full err   cell err   same cells'
+	X = None
+	for scale in sorted(scales, reverse=True):
+		secs, frames, Y = analyze(title, scale, params)
+		fps = frames / max(secs, 1e-6)
+		if X is None:
+			# the largest scale is the reference
+			X = Y
+		full_corr, full_err, cell_err, same_cells = agreement(X, Y)
+		print '    %-6g %9.1f %13.2f %11.4f %10.2e %10.2e %12.4f' % (scale, fps, (fps / params['fps']), full_corr, full_err, cell_err, same_cells)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Throughput of phase correlation at each scale against its agreement with the full-resolution values.')
+	parser.add_argument("actiondir")
+	parser.add_argument("titles", nargs='*')
+	parser.add_argument("--scales", type=float, nargs='+', default=SCALES)
+	parser.add_argument("--offset", type=float, default=0)
+	parser.add_argument("--duration", type=float, default=DURATION)
+	parser.add_argument("--roi", default='grid')
+	parser.add_argument("--movie-extension", default='.mov')
+	args = parser.parse_args()
+
+	if args.actiondir is not None:
+		ACTIONDIR = args.actiondir
+
+	os.chdir(ACTIONDIR)
+	titles = args.titles if len(args.titles) > 0 else sorted([os.path.dirname(file) for file in glob.glob('*/*.json')])
+	scales = args.scales if 1.0 in args.scales else ([1.0] + args.scales)
+	params = {'movie_extension': args.movie_extension, 'offset': args.offset, 'duration': args.duration, 'roi': args.roi, 'fps': 24, 'verbose': False}
+
+	for title in titles:
+		benchmark(title, scales, params)
@@ -0,0 +1,77 @@
+import glob, os, time, shutil, tempfile, argparse
+import numpy as np
+from action.suite import *
+
+ACTIONDIR = '/Volumes/ACTION'
+NUM_ROWS = 2000 # rows (evenly spaced over the film) that go into a similarity matrix; the matrix is NUM_ROWS x NUM_ROWS
+
+# data extension -> (row shape of raw data files, default parameters of the extractor that writes them)
+FEATURES = {
+	'.color_lab' : ((17, 3, 16), ColorFeaturesLAB.default_cflab_params()),
+	'.phasecorr' : ((65, 2), PhaseCorrelation.default_phasecorr_params()),
+	'.opticalflow24' : ((512,), OpticalFlow.default_opticalflow_params()),
+	'.motionenergy' : ((65, 3), MotionEnergy.default_motionenergy_params())
+}
+
+def read_time(data_path):
+	"""
+	Seconds to read a data file and decode it to float32, and the bytes read. The file was just written, so it is read from the page cache: on a network share, the read time grows with the bytes.
+	"""
+	t = time.time()
+	X = np.array(load_feature_file(data_path, decode=True))
+	return (time.time() - t), os.path.getsize(data_path)
+
+def similarity_loss(X, Y):
+	"""
+	Compare the self-similarity (Euclidean distance) matrices of float32 rows X and decoded rows Y: largest and mean absolute error (relative to the largest distance), and the fraction of rows whose nearest neighbor stays the same.
+	"""
+	DX = euc2(X, X)
+	DY = euc2(Y, Y)
+	scale = max(DX.max(), np.finfo(np.float32).eps)
+	err = np.abs(DX - DY) / scale
+	np.fill_diagonal(DX, np.inf)
+	np.fill_diagonal(DY, np.inf)
+	same_nn = np.mean(DX.argmin(1) == DY.argmin(1))
+	return err.max(), err.mean(), same_nn
+
+def benchmark(data_path, row_shape, storage_range, tmp_dir, num_rows=NUM_ROWS):
+	X = np.array(load_feature_file(data_path, row_shape, decode=True))
+	if len(X) == 0:
+		return
+	picks = np.unique(np.linspace(0, (len(X) - 1), min(num_rows, len(X))).astype(int))
+	X = X.reshape((len(X), -1))[picks]
+	print os.path.basename(data_path), ' rows: ', len(picks), ' range: ', storage_range
+	print '    dtype      MB   read (s)   max err   mean err   same nn'
+	for dtype in STORAGE_DTYPES:
+		new_path = os.path.join(tmp_dir, (dtype + '_' + os.path.basename(data_path)))
+		convert_feature_file(data_path, new_path, dtype, storage_range, row_shape)
+		secs, nbytes = read_time(new_path)
+		Y = np.array(load_feature_file(new_path, decode=True))
+		Y = Y.reshape((len(Y), -1))[picks]
+		max_err, mean_err, same_nn = similarity_loss(X, Y)
+		print '    %-8s %7.1f %9.3f %9.2e %9.2e %9.4f' % (dtype, (nbytes / 1048576.0), secs, max_err, mean_err, same_nn)
+		os.remove(new_path)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Size, read time and similarity matrix accuracy of the data files stored as each of the storage dtypes.')
+	parser.add_argument("actiondir")
+	parser.add_argument("titles", nargs='*')
+	parser.add_argument("--rows", type=int, default=NUM_ROWS)
+	args = parser.parse_args()
+
+	if args.actiondir is not None:
+		ACTIONDIR = args.actiondir
+
+	os.chdir(ACTIONDIR)
+	titles = args.titles if len(args.titles) > 0 else sorted([os.path.dirname(file) for file in glob.glob('*/*.json')])
+
+	tmp_dir = tempfile.mkdtemp()
+	try:
+		for title in titles:
+			for ext in sorted(FEATURES.keys()):
+				data_path = os.path.join(ACTIONDIR, title, (title + ext))
+				if os.path.exists(data_path):
+					row_shape, params = FEATURES[ext]
+					benchmark(data_path, row_shape, params['storage_range'], tmp_dir, args.rows)
+	finally:
+		shutil.rmtree(tmp_dir)
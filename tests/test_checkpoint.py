@@ -0,0 +1,119 @@
+# test_checkpoint.py - the time ranges that a resumed (or parallel) analysis picks up
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import multiprocessing, os, shutil, sys, tempfile, unittest, StringIO
+import numpy as np
+from action.featurewriter import *
+from action.checkpoint import *
+from action.parallel import shard_ranges
+
+
+def work(path, ap, shard):
+	"""
+	Worker process: report the rows of its shard (one row every 6 frames) one by one, as its FeatureWriter would with flush_interval=1.
+	"""
+	checkpoint = Checkpoint(path, ap)
+	checkpoint.track(shard, lambda row: row * 6)
+	for row in range((shard[0] / 6), (shard[1] / 6)):
+		checkpoint.rows_done(row + 1)
+	checkpoint.finish()
+
+
+class CheckpointTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.color_lab')
+		self.ap = {'stride': 6, 'grid_divs_x': 4, 'grid_divs_y': 4, 'verbose': False}
+		# Checkpoint.remaining says why it cannot resume
+		self.stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+
+	def tearDown(self):
+		sys.stdout = self.stdout
+		shutil.rmtree(self.tmp)
+
+	def analyze(self, rows, shard, flush_interval=16, complete=False):
+		"""
+		Write rows of the shard=(start_frame, end_frame) range (one row every 6 frames) to the data file, as an analysis that stops after them would.
+		"""
+		checkpoint = Checkpoint(self.path, self.ap)
+		checkpoint.track(shard, lambda row: row * 6)
+		fp = FeatureWriter(self.path, (100, 3), mode='r+', flush_interval=flush_interval, checkpoint=checkpoint)
+		for row in rows:
+			fp[row] = float(row)
+		fp.close(complete)
+
+	def start(self, ranges):
+		FeatureWriter(self.path, (100, 3), analysis_params=self.ap).close()
+		Checkpoint(self.path, self.ap).start(ranges)
+
+	def test_interrupted_analysis(self):
+		self.start([(0, 600)])
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [(0, 600)])
+		# dies after row 40: the rows are flushed on close, so frame 41 * 6 is the first one to do again
+		self.analyze(range(41), (0, 600))
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [(246, 600)])
+		self.analyze(range(41, 100), (246, 600), complete=True)
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [])
+		np.testing.assert_array_equal(load_feature_file(self.path)[:, 0], np.arange(100))
+
+	def test_parallel_ranges(self):
+		ranges = shard_ranges(0, 600, 3, align=6)
+		self.start(ranges)
+		self.analyze(range(0, 34), ranges[0], complete=True)
+		self.analyze(range(34, 50), ranges[1])
+		remaining = Checkpoint(self.path, self.ap).remaining()
+		self.assertEqual(remaining, [(300, ranges[1][1]), ranges[2]])
+		# a resumed range is known by its end frame
+		self.analyze(range(50, 67), remaining[0], complete=True)
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [ranges[2]])
+
+	def test_refused(self):
+		self.assertFalse(Checkpoint(self.path, self.ap).can_resume())
+		self.assertTrue(Checkpoint(self.path, self.ap).remaining() is None)
+		self.start([(0, 600)])
+		self.assertTrue(Checkpoint(self.path, self.ap).can_resume())
+		# different parameters
+		self.assertTrue(Checkpoint(self.path, dict(self.ap, stride=4)).remaining() is None)
+		# parameters that do not change the data do not count
+		self.assertEqual(Checkpoint(self.path, dict(self.ap, verbose=True)).remaining(), [(0, 600)])
+		# no data file
+		os.remove(self.path)
+		self.assertTrue(Checkpoint(self.path, self.ap).remaining() is None)
+
+	def test_unreadable_progress_file(self):
+		self.start([(0, 600)])
+		f = open(self.path + '.progress', 'w')
+		f.write('{"params": "')
+		f.close()
+		self.assertTrue(Checkpoint(self.path, self.ap).remaining() is None)
+		# starting over replaces it
+		self.start([(0, 600)])
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [(0, 600)])
+
+	def test_progress_never_goes_back(self):
+		self.start([(0, 600)])
+		checkpoint = Checkpoint(self.path, self.ap)
+		checkpoint.track((0, 600), lambda row: row * 6)
+		checkpoint.rows_done(50)
+		checkpoint.rows_done(20)
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [(300, 600)])
+		# nor beyond the end of the range
+		checkpoint.rows_done(500)
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [])
+
+	def test_concurrent_workers(self):
+		ranges = shard_ranges(0, 1200, 4, align=6)
+		self.start(ranges)
+		workers = [multiprocessing.Process(target=work, args=(self.path, self.ap, shard)) for shard in ranges]
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+			self.assertEqual(worker.exitcode, 0)
+		# none of the updates of one worker was lost to another one rewriting the file
+		self.assertEqual(Checkpoint(self.path, self.ap).remaining(), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,248 @@
+# test_featurefile.py - data file round trips, in every storage dtype and both layouts
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import os, shutil, struct, tempfile, unittest
+import numpy as np
+from action.featurefile import *
+from action.featurewriter import FeatureWriter
+
+
+def _tolerance(dtype, value_range):
+	"""
+	Largest error of a stored value: half a quantization level for integer dtypes.
+	"""
+	quantization = quantization_for(dtype, value_range)
+	if quantization is not None:
+		return (quantization['scale'] / 2.0) + 1e-6
+	return 1e-3 if np.dtype(dtype) == np.float16 else 0.0
+
+
+class DataFileTestCase(unittest.TestCase):
+	"""
+	A temporary directory, and rows of 17 units to write to data files in it.
+	"""
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.color_lab')
+		# 17 units (the full frame and a 4x4 grid) of 3 x 4 values, in [0, 1)
+		self.values = np.random.RandomState(0).random_sample((30, 17, 3, 4)).astype(np.float32)
+		self.ap = {'fps': 24, 'stride': 6, 'grid_divs_x': 4, 'grid_divs_y': 4}
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def write(self, path, dtype, value_range=(0.0, 1.0)):
+		data = create_feature_file(path, self.values.shape, dtype, self.ap, value_range)
+		data[:] = encode_rows(self.values, dtype, quantization_for(dtype, value_range))
+		data.flush()
+		del data
+
+
+class FeatureFileTestCase(DataFileTestCase):
+
+	def test_header(self):
+		self.write(self.path, 'float32')
+		header = read_feature_header(self.path)
+		self.assertEqual(header['version'], list(FORMAT_VERSION))
+		self.assertEqual(tuple(header['shape']), self.values.shape)
+		self.assertEqual(header['fps'], 24)
+		self.assertEqual(header['analysis_params'], self.ap)
+		self.assertTrue(header['preview'] is None)
+		self.assertTrue(header['quantization'] is None)
+		# the rows follow the header, from a multiple of HEADER_ALIGN on
+		self.assertEqual(os.path.getsize(self.path), header['data_offset'] + self.values.nbytes)
+		self.assertEqual(header['data_offset'] % HEADER_ALIGN, 0)
+		self.assertEqual(feature_file_rows(self.path), 30)
+		self.assertEqual(feature_file_layout(self.path, (3,), 'uint8'), (header['data_offset'], self.values.shape, np.dtype(np.float32)))
+
+	def test_zero_copy(self):
+		self.write(self.path, 'float32')
+		data = load_feature_file(self.path)
+		self.assertTrue(isinstance(data, np.memmap))
+		self.assertFalse(data.flags.writeable)
+		np.testing.assert_array_equal(load_feature_file(self.path, rows=5), self.values[:5])
+		# r+ writes through to the file; c (copy-on-write) does not
+		data = load_feature_file(self.path, mode='r+')
+		data[3] = 0.5
+		data.flush()
+		del data
+		data = load_feature_file(self.path, mode='c')
+		data[4] = 0.25
+		del data
+		data = load_feature_file(self.path)
+		self.assertEqual(data[3].min(), 0.5)
+		np.testing.assert_array_equal(data[4], self.values[4])
+
+	def test_unreadable_headers(self):
+		self.write(self.path, 'float32')
+		data_offset = read_feature_header(self.path)['data_offset']
+		f = open(self.path, 'r+b')
+		# a newer major version
+		f.seek(len(MAGIC))
+		f.write(struct.pack('<B', (FORMAT_VERSION[0] + 1)))
+		f.close()
+		self.assertRaises(IOError, read_feature_header, self.path)
+		self.assertRaises(IOError, load_feature_file, self.path)
+		# a newer minor version is fine
+		f = open(self.path, 'r+b')
+		f.seek(len(MAGIC))
+		f.write(struct.pack('<BB', FORMAT_VERSION[0], (FORMAT_VERSION[1] + 1)))
+		# a damaged header
+		f.seek(data_offset - 8)
+		f.write('\x00' * 8)
+		f.close()
+		self.assertRaises(IOError, read_feature_header, self.path)
+
+	def test_raw_data_files(self):
+		# data files written before the header: the row shape comes from the caller
+		self.values.tofile(self.path)
+		self.assertTrue(read_feature_header(self.path) is None)
+		self.assertEqual(feature_file_rows(self.path, (17, 3, 4)), 30)
+		np.testing.assert_array_equal(np.array(load_feature_file(self.path, (17, 3, 4))), self.values)
+		self.assertRaises(IOError, feature_file_layout, self.path)
+
+
+class RegionLayoutTestCase(DataFileTestCase):
+
+	def test_round_trip_region_major(self):
+		sections = band_sections(4, 4, cell_offset=1, full_units=[0])
+		self.assertEqual(sorted(sum(sections, [])), range(17))
+		for dtype in STORAGE_DTYPES:
+			self.write(self.path, dtype)
+			frame_major = np.array(load_feature_file(self.path))
+			region_path = self.path + '.region'
+			header = transpose_feature_file(self.path, region_path, sections=sections, units=17)
+			self.assertEqual(header['layout'], 'region')
+			self.assertEqual(tuple(header['shape']), self.values.shape)
+			rows = load_feature_file(region_path)
+			self.assertTrue(isinstance(rows, RegionRows))
+			self.assertEqual(rows.shape, self.values.shape)
+			# indexed as if it were frame-major, in the stored dtype
+			np.testing.assert_array_equal(np.array(rows), frame_major)
+			np.testing.assert_array_equal(rows[7], frame_major[7])
+			np.testing.assert_array_equal(rows[-1], frame_major[-1])
+			np.testing.assert_array_equal(rows[5:9], frame_major[5:9])
+			np.testing.assert_array_equal(rows[2:20:3], frame_major[2:20:3])
+			np.testing.assert_array_equal(rows[4, 3], frame_major[4, 3])
+			self.assertRaises(IndexError, rows.__getitem__, 30)
+			decoded = np.array(load_feature_file(region_path, decode=True))
+			self.assertTrue(np.abs(decoded - self.values).max() <= _tolerance(dtype, (0.0, 1.0)), dtype)
+			# and back to frame-major, value for value
+			transpose_feature_file(region_path)
+			self.assertTrue(read_feature_header(region_path).get('layout') is None)
+			np.testing.assert_array_equal(np.array(load_feature_file(region_path)), frame_major)
+
+	def test_region_major_is_read_only(self):
+		self.write(self.path, 'float32')
+		transpose_feature_file(self.path, sections=band_sections(4, 4, cell_offset=1, full_units=[0]), units=17)
+		self.assertRaises(IOError, load_feature_file, self.path, None, 'r+')
+
+	def test_band_sections(self):
+		# the full frame, top outer and middle cells, the middle band, bottom middle and outer cells
+		self.assertEqual(band_sections(4, 4, cell_offset=1, full_units=[0]), [[0], [1, 4], [2, 3], range(5, 13), [14, 15], [13, 16]])
+		# a grid too small for top and bottom rows is all middle band
+		self.assertEqual(band_sections(3, 2), [range(6)])
+
+	def test_sections_are_contiguous(self):
+		self.write(self.path, 'float32')
+		transpose_feature_file(self.path, sections=band_sections(4, 4, cell_offset=1, full_units=[0]), units=17)
+		rows = load_feature_file(self.path)
+		self.assertTrue(isinstance(rows, RegionRows))
+		# the middle band of a time window: one memmap, no copy
+		middle_band = rows.section_rows(3, 5, 25)
+		self.assertTrue(isinstance(middle_band, np.memmap))
+		np.testing.assert_array_equal(middle_band, self.values[5:25, 5:13])
+		self.assertEqual(rows.section_rows(3, 25, 5).shape, (0, 8, 3, 4))
+		# every unit in exactly one section
+		self.assertRaises(ValueError, transpose_feature_file, self.path, (self.path + '.region'), [[0, 1], [1, 2]], 17)
+		self.assertRaises(ValueError, transpose_feature_file, self.path, (self.path + '.region'), [range(16)], 17)
+
+
+class StorageDtypeTestCase(DataFileTestCase):
+
+	def test_round_trip_every_dtype(self):
+		for dtype in STORAGE_DTYPES:
+			self.write(self.path, dtype)
+			header = read_feature_header(self.path)
+			self.assertEqual(tuple(header['shape']), self.values.shape)
+			self.assertEqual(np.dtype(str(header['dtype'])), np.dtype(dtype))
+			self.assertEqual(header['stride'], 6)
+			self.assertEqual(header['grid'], [4, 4])
+			self.assertEqual(header['data_offset'] % HEADER_ALIGN, 0)
+			stored = load_feature_file(self.path)
+			self.assertEqual(stored.dtype, np.dtype(dtype))
+			decoded = np.array(load_feature_file(self.path, decode=True))
+			self.assertEqual(decoded.dtype, np.float32)
+			self.assertTrue(np.abs(decoded - self.values).max() <= _tolerance(dtype, (0.0, 1.0)), dtype)
+
+	def test_unwritten_rows_read_as_zero(self):
+		# a range around 0.0: the zero point is not the lowest level
+		for dtype in STORAGE_DTYPES:
+			data = create_feature_file(self.path, (4, 8), dtype, self.ap, (-1.0, 1.0))
+			data[1] = encode_rows(np.full(8, 0.5), dtype, quantization_for(dtype, (-1.0, 1.0)))
+			del data
+			decoded = np.array(load_feature_file(self.path, decode=True))
+			np.testing.assert_array_equal(decoded[[0, 2, 3]], np.zeros((3, 8), dtype=np.float32))
+			self.assertTrue(np.abs(decoded[1] - 0.5).max() <= _tolerance(dtype, (-1.0, 1.0)))
+
+	def test_quantization_clips_to_the_range(self):
+		quantization = quantization_for('uint8', (0.0, 1.0))
+		np.testing.assert_array_equal(encode_rows([-0.5, 0.0, 1.0, 7.0], 'uint8', quantization), [0, 0, 255, 255])
+		self.assertRaises(ValueError, quantization_for, 'uint8')
+		self.assertRaises(ValueError, quantization_for, 'int32', (0.0, 1.0))
+		self.assertRaises(ValueError, quantization_for, 'uint16', (1.0, 1.0))
+
+	def test_convert_feature_file(self):
+		self.write(self.path, 'float32')
+		new_path = self.path + '.uint8'
+		header = convert_feature_file(self.path, new_path, 'uint8', (0.0, 1.0))
+		self.assertEqual(header['analysis_params']['storage_dtype'], 'uint8')
+		self.assertEqual(header['analysis_params']['stride'], 6)
+		decoded = np.array(load_feature_file(new_path, decode=True))
+		self.assertTrue(np.abs(decoded - self.values).max() <= _tolerance('uint8', (0.0, 1.0)))
+
+	def test_quantized_writers(self):
+		fp = FeatureWriter(self.path, (6, 4), flush_interval=4, dtype='uint16', value_range=(-1.0, 1.0))
+		for row in range(6):
+			fp[row] = (row / 5.0) - 0.5
+		# rows are decoded as they are read back, from RAM or from the data file
+		self.assertTrue(abs(fp[5][0] - 0.5) <= _tolerance('uint16', (-1.0, 1.0)))
+		self.assertTrue(abs(fp[1][0] + 0.3) <= _tolerance('uint16', (-1.0, 1.0)))
+		fp.close()
+		self.assertEqual(load_feature_file(self.path).dtype, np.uint16)
+		# r+ takes the quantization from the header
+		fp = FeatureWriter(self.path, (6, 4), mode='r+', flush_interval=4)
+		fp.row(2)[:] = 0.75
+		fp.close()
+		decoded = np.array(load_feature_file(self.path, decode=True))
+		expected = np.repeat(((np.arange(6) / 5.0) - 0.5)[:, np.newaxis], 4, axis=1)
+		expected[2] = 0.75
+		self.assertTrue(np.abs(decoded - expected).max() <= _tolerance('uint16', (-1.0, 1.0)))
+
+
+class PreviewFileTestCase(DataFileTestCase):
+
+	def test_feature_file_path(self):
+		self.assertEqual(feature_file_path(self.path), self.path)
+		self.write(self.path + PREVIEW_EXTENSION, 'float32')
+		self.assertEqual(feature_file_path(self.path), self.path + PREVIEW_EXTENSION)
+		self.write(self.path, 'float32')
+		self.assertEqual(feature_file_path(self.path), self.path)
+
+
+class CoverageTestCase(DataFileTestCase):
+
+	def test_coverage_round_trip(self):
+		self.assertTrue(read_feature_coverage(self.path) is None)
+		# not a whole number of bytes
+		covered = np.random.RandomState(1).random_sample(37) > 0.5
+		write_feature_coverage(self.path, covered)
+		np.testing.assert_array_equal(read_feature_coverage(self.path), covered)
+		# a new data file starts without one
+		self.write(self.path, 'float32')
+		self.assertTrue(read_feature_coverage(self.path) is None)
+
+
+if __name__ == '__main__':
+	unittest.main()
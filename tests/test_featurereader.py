@@ -0,0 +1,282 @@
+# test_featurereader.py - windows of the data files, against resampling the whole film
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import os, shutil, sys, tempfile, unittest, StringIO
+import numpy as np
+from action.featurefile import *
+from action.featurereader import *
+from action.actiondata import ActionData
+
+
+def interpolate_time(data, actual_fps):
+	"""
+	The whole film resampled to 24 fps, the old way (ActionData.interpolate_time prints as it goes).
+	"""
+	stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+	try:
+		return ActionData().interpolate_time(data, actual_fps)
+	finally:
+		sys.stdout = stdout
+
+
+class FeatureReaderTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.phasecorr')
+		self.values = np.random.RandomState(0).random_sample((97, 5, 2)).astype(np.float32)
+		data = create_feature_file(self.path, self.values.shape, 'float32', {'stride': 1})
+		data[:] = self.values
+		del data
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_window_parity_with_interpolate_time(self):
+		for cache in (None, FEATURE_CACHE):
+			reader = FeatureReader(self.path, (5, 2), cache=cache)
+			for actual_fps in (23.976, 25.0, 29.97, 30.0, 12.0):
+				resampled = interpolate_time(self.values.astype(np.float64), actual_fps)
+				for onset, count in [(0, 10), (0, len(resampled)), (13, 40), (7, 50), (len(resampled) - 5, 20)]:
+					window = reader.window(onset, count, actual_fps)
+					expected = resampled[onset:(onset + count)]
+					self.assertEqual(window.shape, expected.shape, (actual_fps, onset, count))
+					self.assertTrue(np.allclose(window, expected, atol=1e-5), (actual_fps, onset, count))
+
+	def test_24_fps_windows_are_the_rows(self):
+		reader = FeatureReader(self.path, (5, 2))
+		np.testing.assert_array_equal(reader.window(10, 30), self.values[10:40])
+		np.testing.assert_array_equal(reader.window(90, 30), self.values[90:])
+		self.assertEqual(reader.window(200, 10).shape, (0, 5, 2))
+
+	def test_window_bounds(self):
+		reader = FeatureReader(self.path, (5, 2), cache=None)
+		self.assertEqual(reader.num_rows(), 97)
+		# only the rows that are asked for are mapped
+		rows = reader.rows(20, 30)
+		self.assertTrue(isinstance(rows, np.memmap))
+		np.testing.assert_array_equal(rows, self.values[20:30])
+		np.testing.assert_array_equal(reader.window(-5, 10), self.values[:10])
+		for actual_fps in (24.0, 30.0, 12.0):
+			resampled = int(97 * (24.0 / actual_fps))
+			# cut short at the end of the (resampled) data
+			self.assertEqual(len(reader.window((resampled - 3), 10, actual_fps)), 3)
+			self.assertEqual(reader.window((resampled + 3), 10, actual_fps).shape, (0, 5, 2))
+			self.assertEqual(reader.window(10, 0, actual_fps).shape, (0, 5, 2))
+
+
+
+class CoverageWindowsTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.phasecorr')
+		self.values = np.random.RandomState(0).random_sample((97, 5, 2)).astype(np.float32)
+		data = create_feature_file(self.path, self.values.shape, 'float32', {'stride': 1})
+		data[:] = self.values
+		del data
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_coverage_interpolation(self):
+		# rows that are not covered hold garbage: they must not be read
+		rows = np.arange(20, dtype=np.float32)
+		data = create_feature_file(self.path, (20, 3), 'float32')
+		data[:] = -100.0
+		for row in (4, 8, 16):
+			data[row] = rows[row]
+		del data
+		covered = np.zeros(20, dtype=bool)
+		covered[[4, 8, 16]] = True
+		write_feature_coverage(self.path, covered)
+		reader = FeatureReader(self.path, (3,))
+		window = reader.window(0, 20)
+		# the first covered row before it, linear in between, the last covered row after it
+		expected = np.concatenate([np.full(4, 4.0), np.arange(4, 17), np.full(3, 16.0)])
+		np.testing.assert_array_almost_equal(window[:, 0], expected)
+		np.testing.assert_array_almost_equal(reader.window(5, 6, step=2)[:, 1], expected[5:11:2])
+		# every row covered: the sidecar no longer matters
+		write_feature_coverage(self.path, np.ones(20, dtype=bool))
+		self.assertEqual(reader.window(0, 20).min(), -100.0)
+
+	def test_nothing_covered_reads_as_zero(self):
+		write_feature_coverage(self.path, np.zeros(len(self.values), dtype=bool))
+		self.assertEqual(np.abs(FeatureReader(self.path, (5, 2)).window(0, 40)).max(), 0.0)
+
+
+
+class PreviewWindowsTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_preview_until_there_is_a_full_analysis(self):
+		data_path = os.path.join(self.tmp, 'Test.color_lab')
+		# one row every 48 frames (stride 6): 8 times as few rows as a full analysis
+		preview = create_feature_file((data_path + PREVIEW_EXTENSION), (10, 2), 'float32', {'stride': 6, 'preview': True, 'preview_frames': 48})
+		preview[:] = np.arange(10, dtype=np.float32)[:, np.newaxis]
+		del preview
+		reader = FeatureReader(data_path, (2,))
+		window = reader.window(0, 100)
+		# resampled as if the movie ran at 24 * 6 / 48 = 3 fps
+		self.assertEqual(window.shape, (80, 2))
+		np.testing.assert_array_almost_equal(window, interpolate_time(np.repeat(np.arange(10.0)[:, np.newaxis], 2, axis=1), 3.0), 5)
+		full = create_feature_file(data_path, (80, 2), 'float32', {'stride': 6})
+		full[:] = 7.0
+		del full
+		self.assertEqual(reader.window(0, 100).min(), 7.0)
+
+
+
+class RegionWindowsTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.phasecorr')
+		self.values = np.random.RandomState(0).random_sample((97, 5, 2)).astype(np.float32)
+		data = create_feature_file(self.path, self.values.shape, 'float32', {'stride': 1})
+		data[:] = self.values
+		del data
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_units(self):
+		region_path = self.path + '.region'
+		transpose_feature_file(self.path, region_path, sections=[[0], [3, 4], [1, 2]], units=5)
+		for path in (self.path, region_path):
+			reader = FeatureReader(path, (5, 2), units=5)
+			np.testing.assert_array_equal(reader.window(3, 20, units=[1, 2]), self.values[3:23, 1:3])
+			np.testing.assert_array_equal(reader.window(3, 20, units=[4, 0]), self.values[3:23][:, [4, 0]])
+			self.assertTrue(np.allclose(reader.window(3, 20, 30.0, units=[3]), FeatureReader(self.path, (5, 2), cache=None).window(3, 20, 30.0)[:, [3]]))
+
+
+
+class CompactWindowsTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.phasecorr')
+		self.values = np.random.RandomState(0).random_sample((97, 5, 2)).astype(np.float32)
+		data = create_feature_file(self.path, self.values.shape, 'float32', {'stride': 1})
+		data[:] = self.values
+		del data
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_compact_windows(self):
+		uint8_path = self.path + '.uint8'
+		convert_feature_file(self.path, uint8_path, 'uint8', (0.0, 1.0))
+		reader = FeatureReader(uint8_path, (5, 2))
+		window = reader.window(0, 40, compact=True)
+		self.assertEqual(window.dtype, np.uint8)
+		np.testing.assert_array_equal(decode_rows(window, reader.quantization), reader.window(0, 40))
+		self.assertTrue(np.abs(reader.window(0, 40) - self.values[:40]).max() <= reader.quantization['scale'])
+
+
+
+class AccessStrideTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.opticalflow')
+		self.values = np.random.RandomState(1).random_sample((101, 5, 2)).astype(np.float32)
+		data = create_feature_file(self.path, self.values.shape, 'float32', {'stride': 1})
+		data[:] = self.values
+		del data
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_strided_windows(self):
+		reader = FeatureReader(self.path, (5, 2), cache=None)
+		np.testing.assert_array_equal(reader.window(10, 30, step=6), self.values[10:40:6])
+		for actual_fps in (24.0, 23.976, 29.97, 12.0):
+			resampled = interpolate_time(self.values.astype(np.float64), actual_fps)
+			for onset, count, step in [(0, len(resampled), 6), (7, 50, 6), (0, len(resampled), 4), (3, 40, 7), (len(resampled) - 5, 20, 2)]:
+				window = reader.window(onset, count, actual_fps, step)
+				# the rows of the whole window, every step-th one
+				np.testing.assert_array_equal(window, reader.window(onset, count, actual_fps)[::step])
+				self.assertTrue(np.allclose(window, resampled[onset:(onset + count)][::step], atol=1e-5), (actual_fps, onset, count, step))
+				np.testing.assert_array_equal(reader.window(onset, count, actual_fps, step, units=[4, 1]), reader.window(onset, count, actual_fps, units=[4, 1])[::step])
+
+	def test_strided_compact_windows(self):
+		uint8_path = self.path + '.uint8'
+		convert_feature_file(self.path, uint8_path, 'uint8', (0.0, 1.0))
+		reader = FeatureReader(uint8_path, (5, 2), cache=None)
+		for actual_fps in (24.0, 29.97):
+			window = reader.window(5, 60, actual_fps, 6, compact=True)
+			self.assertEqual(window.dtype, np.uint8)
+			np.testing.assert_array_equal(window, reader.window(5, 60, actual_fps, compact=True)[::6])
+
+
+
+class FeatureCacheTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.phasecorr')
+		self.values = np.random.RandomState(0).random_sample((97, 5, 2)).astype(np.float32)
+		data = create_feature_file(self.path, self.values.shape, 'float32', {'stride': 1})
+		data[:] = self.values
+		del data
+
+	def tearDown(self):
+		FEATURE_CACHE.clear()
+		shutil.rmtree(self.tmp)
+
+	def test_cached_windows(self):
+		reader = FeatureReader(self.path, (5, 2))
+		first = reader.window(0, 40, 30.0)
+		self.assertTrue(FeatureReader(self.path, (5, 2)).window(0, 40, 30.0) is first)
+		self.assertFalse(first.flags.writeable)
+		# rewriting the data file drops its windows
+		data = load_feature_file(self.path, mode='r+')
+		data[:] = 0.0
+		data.flush()
+		del data
+		FEATURE_CACHE.discard(self.path)
+		self.assertEqual(np.abs(reader.window(0, 40, 30.0)).max(), 0.0)
+
+	def test_least_recently_used_are_evicted(self):
+		cache = FeatureCache(max_bytes=400)
+		for n in range(3):
+			cache.put(('a', n), np.zeros(25, dtype=np.float32))
+		cache.get(('a', 0))
+		# 4 arrays of 100 bytes fit; the fifth evicts the one used longest ago
+		cache.put(('a', 3), np.zeros(25, dtype=np.float32))
+		cache.put(('a', 4), np.zeros(25, dtype=np.float32))
+		self.assertTrue(cache.get(('a', 1)) is None)
+		self.assertTrue(cache.get(('a', 0)) is not None)
+		self.assertEqual(cache.stats()['evictions'], 1)
+		self.assertEqual(cache.stats()['bytes'], 400)
+		# too large to keep at all
+		big = np.zeros(200, dtype=np.float32)
+		self.assertTrue(cache.put(('b', 0), big) is big)
+		self.assertTrue(cache.get(('b', 0)) is None)
+		self.assertEqual(cache.stats()['entries'], 4)
+
+	def test_discard(self):
+		cache = FeatureCache()
+		for key in [('x.color_lab', 0), ('x.color_lab', 1), ('y.color_lab', 0)]:
+			cache.put(key, np.zeros(4))
+		# writing the preview of a data file drops the windows read through the data file's path
+		cache.discard('x.color_lab' + PREVIEW_EXTENSION)
+		self.assertTrue(cache.get(('x.color_lab', 0)) is None)
+		self.assertTrue(cache.get(('y.color_lab', 0)) is not None)
+		self.assertEqual(cache.stats()['entries'], 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,80 @@
+# test_featurewriter.py - bulk writes, and the rows that are saved when the analysis is interrupted
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import os, shutil, signal, tempfile, unittest
+import numpy as np
+import action.featurewriter as featurewriter
+from action.featurewriter import *
+
+
+class FeatureWriterTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.color_lab')
+		self.signals = []
+		self.handlers = dict([(signum, signal.signal(signum, self.handler)) for signum in (signal.SIGINT, signal.SIGTERM)])
+
+	def tearDown(self):
+		for writer in list(featurewriter._open_writers):
+			writer.close()
+		for signum, handler in self.handlers.items():
+			signal.signal(signum, handler)
+		shutil.rmtree(self.tmp)
+
+	def handler(self, signum, frame):
+		self.signals.append(signum)
+
+	def test_bulk_writes(self):
+		fp = FeatureWriter(self.path, (10, 3), flush_interval=4)
+		for row in range(10):
+			fp[row] = float(row)
+		# rows 0-3 and 4-7 are written, 8 and 9 are still in RAM
+		self.assertEqual(fp.stats(), {'rows': 10, 'flushes': 2})
+		self.assertEqual(fp[9][0], 9.0)
+		fp.close()
+		self.assertEqual(fp.stats(), {'rows': 10, 'flushes': 3})
+		np.testing.assert_array_equal(load_feature_file(self.path)[:, 2], np.arange(10))
+		# r+ only replaces the rows that are written to
+		fp = FeatureWriter(self.path, (10, 3), mode='r+', flush_interval=4)
+		fp[5] = -1.0
+		fp.row(6)[1] = -2.0
+		fp.close()
+		data = load_feature_file(self.path)
+		np.testing.assert_array_equal(data[:, 0], [0, 1, 2, 3, 4, -1, 6, 7, 8, 9])
+		np.testing.assert_array_equal(data[6], [6.0, -2.0, 6.0])
+
+	def test_one_handler_for_all_writers(self):
+		first = FeatureWriter(self.path, (10, 3))
+		second = FeatureWriter(self.path + '.2', (10, 3))
+		for signum in (signal.SIGINT, signal.SIGTERM):
+			self.assertTrue(signal.getsignal(signum) == featurewriter._handle_signal)
+		first.close()
+		self.assertTrue(signal.getsignal(signal.SIGINT) == featurewriter._handle_signal)
+		# the last writer puts back the handlers that were there before the first one
+		second.close()
+		for signum in (signal.SIGINT, signal.SIGTERM):
+			self.assertEqual(signal.getsignal(signum), self.handler)
+
+	def test_handler_replaced_in_between_is_kept(self):
+		fp = FeatureWriter(self.path, (10, 3))
+		signal.signal(signal.SIGTERM, signal.SIG_IGN)
+		fp.close()
+		self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_IGN)
+		self.assertEqual(signal.getsignal(signal.SIGINT), self.handler)
+
+	def test_signal_saves_the_buffered_rows(self):
+		writers = [FeatureWriter((self.path + str(n)), (10, 3), flush_interval=16) for n in range(2)]
+		for fp in writers:
+			for row in range(5):
+				fp[row] = float(row + 1)
+		os.kill(os.getpid(), signal.SIGTERM)
+		# the rows were written, then the previous handler ran
+		self.assertEqual(self.signals, [signal.SIGTERM])
+		for n in range(2):
+			np.testing.assert_array_equal(load_feature_file(self.path + str(n))[:, 0], [1, 2, 3, 4, 5, 0, 0, 0, 0, 0])
+		self.assertEqual(signal.getsignal(signal.SIGTERM), self.handler)
+
+
+if __name__ == '__main__':
+	unittest.main()
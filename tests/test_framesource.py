@@ -0,0 +1,138 @@
+# test_framesource.py - which frames are grabbed, retrieved and seeked to
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import unittest
+import numpy as np
+import action.framesource as framesource
+from action.framesource import *
+
+
+class FakeCapture:
+	"""
+	Stand-in for a VideoCapture over a movie of length frames: every pixel of frame n is n (mod 256). Records the positions that are set.
+	"""
+	def __init__(self, length):
+		self.length = length
+		self.position = 0
+		self.sets = []
+		self.released = False
+
+	def grab(self):
+		if self.position >= self.length:
+			return False
+		self.position += 1
+		return True
+
+	def retrieve(self, out=None):
+		if out is None:
+			out = np.empty((4, 6, 3), dtype=np.uint8)
+		out[:] = (self.position - 1) % 256
+		return True, out
+
+	def set(self, prop, value):
+		self.sets.append(value)
+		self.position = value
+
+	def get(self, prop):
+		return self.length
+
+	def release(self):
+		self.released = True
+
+
+def frame_source(length, seek_threshold=DEFAULT_SEEK_THRESHOLD):
+	"""
+	A FrameSource over a FakeCapture, instead of a VideoCapture of a movie.
+	"""
+	video_capture, framesource.cv2.VideoCapture = framesource.cv2.VideoCapture, (lambda movie_path: FakeCapture(length))
+	try:
+		return FrameSource('Test.mov', seek_threshold)
+	finally:
+		framesource.cv2.VideoCapture = video_capture
+
+
+@unittest.skipIf(not HAVE_CV, 'OpenCV is not installed')
+class FrameSourceTestCase(unittest.TestCase):
+
+	def test_stride_grabs_forward(self):
+		fsrc = frame_source(100)
+		for frame_idx in range(0, 60, 6):
+			self.assertEqual(fsrc.read_frame(frame_idx)[0, 0, 0], frame_idx)
+		# only the requested frames are retrieved, the ones in between are grabbed
+		self.assertEqual(fsrc.stats(), {'decoded': 10, 'skipped': 45, 'seeks': 0})
+		self.assertEqual(fsrc.capture.sets, [])
+		self.assertEqual(fsrc.read()[0, 0, 0], 55)
+
+	def test_seeks(self):
+		fsrc = frame_source(1000, seek_threshold=10)
+		fsrc.read_frame(0)
+		# longer than seek_threshold: seek instead of grabbing through
+		self.assertEqual(fsrc.read_frame(100)[0, 0, 0], 100)
+		# backwards
+		self.assertEqual(fsrc.read_frame(50)[0, 0, 0], 50)
+		# short forward gaps are grabbed
+		self.assertEqual(fsrc.read_frame(60)[0, 0, 0], 60)
+		self.assertEqual(fsrc.capture.sets, [100, 50])
+		self.assertEqual(fsrc.stats(), {'decoded': 4, 'skipped': 9, 'seeks': 2})
+
+	def test_end_of_movie(self):
+		fsrc = frame_source(20)
+		self.assertEqual([frame_idx for frame_idx, frame in fsrc.frames(0, 40, 6)], [0, 6, 12, 18])
+		self.assertTrue(fsrc.read_frame(22) is None)
+
+	def test_read_into_buffer(self):
+		fsrc = frame_source(20)
+		out = np.zeros((4, 6, 3), dtype=np.uint8)
+		self.assertTrue(fsrc.read_frame(7, out) is out)
+		self.assertEqual(out.min(), 7)
+
+
+
+@unittest.skipIf(not HAVE_CV, 'OpenCV is not installed')
+class PrefetchFrameSourceTestCase(unittest.TestCase):
+
+	def frames(self, depth, length, start_frame, end_frame, step):
+		"""
+		(frame_idx, first pixel) of the frames that a PrefetchFrameSource of depth hands out, copied as they arrive.
+		"""
+		fsrc = PrefetchFrameSource(frame_source(length), depth)
+		return [(frame_idx, int(frame[0, 0, 0])) for frame_idx, frame in fsrc.frames(start_frame, end_frame, step)], fsrc
+
+	def test_same_frames_as_frame_source(self):
+		expected = [(frame_idx, frame[0, 0, 0]) for frame_idx, frame in frame_source(200).frames(3, 150, 7)]
+		for depth in (0, 1, 3, 8):
+			frames, fsrc = self.frames(depth, 200, 3, 150, 7)
+			self.assertEqual(frames, expected, depth)
+			self.assertEqual(fsrc.stats()['decoded'], len(expected))
+
+	def test_end_of_movie(self):
+		for depth in (0, 4):
+			frames, fsrc = self.frames(depth, 20, 0, 100, 6)
+			self.assertEqual([frame_idx for frame_idx, value in frames], [0, 6, 12, 18])
+
+	def test_buffers_are_reused(self):
+		fsrc = PrefetchFrameSource(frame_source(100), 2)
+		buffers = set()
+		for frame_idx, frame in fsrc.frames(0, 50):
+			buffers.add(id(frame))
+		self.assertTrue(len(buffers) <= 2)
+
+	def test_stopping_early(self):
+		fsrc = PrefetchFrameSource(frame_source(1000), 2)
+		for frame_idx, frame in fsrc.frames(0, 1000):
+			if frame_idx == 10:
+				break
+		# the decoder thread stops too: the source can be read again
+		frames, fsrc = self.frames(2, 1000, 500, 510, 5)
+		self.assertEqual(frames, [(500, 500 % 256), (505, 505 % 256)])
+
+	def test_decoder_errors_are_raised(self):
+		fsrc = frame_source(100)
+		def grab():
+			raise IOError('broken movie')
+		fsrc.capture.grab = grab
+		self.assertRaises(IOError, list, PrefetchFrameSource(fsrc, 2).frames(0, 10))
+
+
+if __name__ == '__main__':
+	unittest.main()
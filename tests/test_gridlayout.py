@@ -0,0 +1,91 @@
+# test_gridlayout.py - the rows of the extractors and the region masks, for square and non-square grids
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import unittest
+import numpy as np
+from action.gridlayout import *
+
+
+class RegionMaskTestCase(unittest.TestCase):
+
+	def test_default_grid(self):
+		# the cells of the extractors' middle_band, center_quad and plus_band accessors
+		layout = GridLayout(4, 4, (3, 16), full_units=1)
+		self.assertEqual(list(layout.cells_of('band')), range(4, 12))
+		self.assertEqual(list(layout.cells_of('center')), [5, 6, 9, 10])
+		self.assertEqual(list(layout.cells_of('plus')), [1, 2] + range(4, 12) + [13, 14])
+		self.assertEqual(list(layout.units('center')), [6, 7, 10, 11])
+		self.assertEqual(list(layout.units('full')), [0])
+
+	def test_non_square_grid(self):
+		# 8 columns by 4 rows: the middle rows are 1 and 2, the middle columns 2 to 5
+		layout = GridLayout(8, 4, (2,))
+		self.assertEqual(layout.mask('band').shape, (4, 8))
+		self.assertEqual(list(layout.cells_of('band')), range(8, 24))
+		self.assertEqual(list(layout.cells_of('center')), range(10, 14) + range(18, 22))
+		plus = layout.mask('plus')
+		np.testing.assert_array_equal(plus.sum(axis=1), [4, 8, 8, 4])
+		np.testing.assert_array_equal(plus.sum(axis=0), [2, 2, 4, 4, 4, 4, 2, 2])
+		# 3 columns by 2 rows: too small for outer rows or columns, so every region is the whole grid
+		layout = GridLayout(3, 2, (2,))
+		self.assertEqual(list(layout.cells_of('band')), range(6))
+		self.assertEqual(list(layout.cells_of('center')), range(6))
+
+	def test_masks_are_shared_and_read_only(self):
+		mask = region_mask('center', 8, 4)
+		self.assertTrue(GridLayout(8, 4, (3,), full_units=1).mask('center') is mask)
+		self.assertRaises(ValueError, mask.__setitem__, (0, 0), True)
+		self.assertFalse(GridLayout(8, 4, (3,)).units('band').flags.writeable)
+		self.assertRaises(ValueError, region_mask, 'middle', 4, 4)
+
+	def test_custom_masks(self):
+		layout = GridLayout(8, 4, (2,), full_units=1)
+		mask = np.zeros((4, 8), dtype=bool)
+		mask[:, :4] = True
+		self.assertEqual(list(layout.units(mask)), [(cell + 1) for row in range(4) for cell in range((row * 8), ((row * 8) + 4))])
+		# rows by columns, not columns by rows
+		self.assertRaises(ValueError, layout.units, np.ones((8, 4), dtype=bool))
+
+
+class GridLayoutTestCase(unittest.TestCase):
+
+	def test_row_shapes(self):
+		self.assertEqual(GridLayout(4, 4, (3, 16), full_units=1).row_shape, (17, 3, 16))
+		self.assertEqual(GridLayout(8, 8, (8,), flat=True).row_shape, (512,))
+		self.assertEqual(GridLayout(6, 2, (2,), full_units=1, full_first=False).row_shape, (13, 2))
+		self.assertRaises(ValueError, GridLayout, 0, 4, (2,))
+
+	def test_full_units_last(self):
+		# PhaseCorrelation: the full frame after the grid cells
+		layout = GridLayout(6, 2, (2,), full_units=1, full_first=False)
+		self.assertEqual(list(layout.units('full')), [12])
+		self.assertEqual(list(layout.units('center')), range(1, 5) + range(7, 11))
+		self.assertEqual(layout.sections()[0], [12])
+
+	def test_select(self):
+		# a flat row of 8 columns by 4 rows of 3 values, with no full-frame units
+		layout = GridLayout(8, 4, (3,), flat=True)
+		rows = np.arange(5 * 96).reshape((5, 96))
+		band = layout.select(rows, 'band')
+		self.assertEqual(band.shape, (5, 16, 3))
+		np.testing.assert_array_equal(band[2, 0], rows[2, 24:27])
+		self.assertEqual(layout.size('band'), 48)
+
+	def test_cell_map(self):
+		layout = GridLayout(3, 2, (2,))
+		cell_map = layout.cell_map(5, 7, 2, 2)
+		self.assertEqual(cell_map.shape, (5, 7))
+		self.assertEqual(cell_map[0, 0], 0)
+		self.assertEqual(cell_map[3, 5], 5)
+		# the pixels past the last row or column of cells
+		self.assertEqual(cell_map[4, 0], 6)
+		self.assertEqual(cell_map[0, 6], 6)
+		self.assertEqual(layout.cell_map(5, 7, 2, 2, outside=-1)[4, 6], -1)
+
+	def test_grid_layout_is_made_once(self):
+		self.assertTrue(grid_layout(8, 4, (2,), 1) is grid_layout(8, 4, [2], 1))
+		self.assertFalse(grid_layout(8, 4, (2,), 1) is grid_layout(4, 8, (2,), 1))
+
+
+if __name__ == '__main__':
+	unittest.main()
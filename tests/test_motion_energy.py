@@ -0,0 +1,52 @@
+# test_motion_energy.py - the centroids and energies of the full frame and of the grid cells
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import unittest
+import numpy as np
+from action.motion_energy import *
+
+
+class CentroidsTestCase(unittest.TestCase):
+
+	def setUp(self):
+		# 4 columns by 2 rows of cells of 4 by 5 pixels, and a margin to the right and below that only the full frame covers
+		self.menergy = MotionEnergy('Test', grid_divs_x=4, grid_divs_y=2)
+		self.small = np.zeros((11, 18), dtype=np.uint8)
+
+	def test_weighted_positions(self):
+		col_sums = np.array([[1.0, 0.0, 0.0, 1.0], [0.0, 0.0, 0.0, 2.0], [0.0, 0.0, 0.0, 0.0]])
+		row_sums = np.array([[2.0, 0.0], [0.0, 2.0], [0.0, 0.0]])
+		# as fractions of the width and height, from the centers of the pixels; the center where there is no intensity
+		np.testing.assert_array_almost_equal(MotionEnergy._weighted_positions(col_sums, row_sums), [[0.5, 0.25], [0.875, 0.75], [0.5, 0.5]])
+
+	def test_centroids(self):
+		# one pixel in cell 6 (row 1, column 2), at x 1 and y 2 of the cell
+		self.small[7, 9] = 200
+		centroids = self.menergy._centroids(self.small)
+		self.assertEqual(centroids.shape, (9, 2))
+		np.testing.assert_array_almost_equal(centroids[0], [(9.5 / 18), (7.5 / 11)])
+		np.testing.assert_array_almost_equal(centroids[7], [(1.5 / 4), (2.5 / 5)])
+		np.testing.assert_array_equal(np.delete(centroids, [0, 7], axis=0), np.full((7, 2), 0.5))
+
+	def test_margin_counts_for_the_full_frame_only(self):
+		self.small[10, 17] = 100
+		self.small[0, 0] = 100
+		centroids = self.menergy._centroids(self.small)
+		np.testing.assert_array_almost_equal(centroids[0], [(9.0 / 18), (5.5 / 11)])
+		np.testing.assert_array_almost_equal(centroids[1], [(0.5 / 4), (0.5 / 5)])
+		np.testing.assert_array_equal(centroids[2:], np.full((7, 2), 0.5))
+
+	@unittest.skipIf(not HAVE_CV, 'OpenCV is not installed')
+	def test_energies(self):
+		small = self.small.copy()
+		# all of cell 3 (row 0, column 3) changes by 255, and one pixel of the margin
+		small[:5, 12:16] = 255
+		small[10, 17] = 255
+		energies = self.menergy._energies(self.small, small)
+		self.assertAlmostEqual(energies[0], (21 / (11 * 18.0)))
+		self.assertAlmostEqual(energies[4], 1.0)
+		np.testing.assert_array_equal(np.delete(energies, [0, 4]), np.zeros(7))
+
+
+if __name__ == '__main__':
+	unittest.main()
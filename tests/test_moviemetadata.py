@@ -0,0 +1,92 @@
+# test_moviemetadata.py - when the JSON sidecar of a movie is read, trusted or made again
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import json, os, shutil, tempfile, unittest
+import action.moviemetadata as moviemetadata
+from action.moviemetadata import *
+
+
+class Metadata(MovieMetadata):
+	"""
+	MovieMetadata that makes its sidecar up instead of opening the movie with OpenCV, and counts how often it does.
+	"""
+	def __init__(self, movie_path, json_path):
+		MovieMetadata.__init__(self, movie_path, json_path)
+		self.writes = 0
+
+	def write(self):
+		self.writes += 1
+		metadata = {'title': self.title, 'fps': 24.0, 'width': 640, 'height': 360, 'aspect': (640 / 360.0), 'frames': 240.0, 'length': 10.0}
+		metadata['movie_mtime'], metadata['movie_size'] = moviemetadata._file_stamp(self.movie_path)
+		return self._save(metadata)
+
+
+class MovieMetadataTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.movie_path = os.path.join(self.tmp, 'Test.mov')
+		self.json_path = os.path.join(self.tmp, 'Test.json')
+		self.write_file(self.movie_path, 'not really a movie', 1000)
+
+	def tearDown(self):
+		moviemetadata._SIDECARS.clear()
+		shutil.rmtree(self.tmp)
+
+	def write_file(self, path, contents, mtime):
+		f = open(path, 'w')
+		f.write(contents)
+		f.close()
+		os.utime(path, (mtime, mtime))
+
+	def write_sidecar(self, metadata, mtime=2000):
+		self.write_file(self.json_path, json.dumps(metadata), mtime)
+
+	def test_made_once(self):
+		metadata = Metadata(self.movie_path, self.json_path)
+		self.assertEqual(metadata.aspect(), 640 / 360.0)
+		self.assertEqual(metadata.frames(), 240.0)
+		self.assertEqual(metadata.writes, 1)
+		# read back from the sidecar, by this object or another one
+		self.assertEqual(Metadata(self.movie_path, self.json_path).length(), 10.0)
+		self.assertEqual(metadata.writes, 1)
+
+	def test_remade_when_the_movie_changes(self):
+		metadata = Metadata(self.movie_path, self.json_path)
+		metadata.read()
+		self.write_file(self.movie_path, 'a different cut of the movie', 3000)
+		metadata.read()
+		self.assertEqual(metadata.writes, 2)
+		self.assertEqual(json.load(open(self.json_path))['movie_mtime'], 3000)
+
+	def test_old_sidecars(self):
+		# written before the movie stamps were recorded: trusted, and stamped
+		self.write_sidecar({'fps': 25.0, 'width': 720, 'height': 576, 'aspect': 1.25, 'frames': 250.0, 'length': 10.0})
+		metadata = Metadata(self.movie_path, self.json_path)
+		self.assertEqual(metadata.fps(), 25.0)
+		self.assertEqual(metadata.writes, 0)
+		self.assertEqual(json.load(open(self.json_path))['movie_mtime'], 1000)
+		# written without the frame size: made again
+		self.write_sidecar({'fps': 25.0, 'aspect': 1.25, 'frames': 250.0, 'length': 10.0}, 2500)
+		self.assertEqual(metadata.fps(), 24.0)
+		self.assertEqual(metadata.writes, 1)
+
+	def test_sidecar_without_movie(self):
+		metadata = Metadata(os.path.join(self.tmp, 'Missing.mov'), self.json_path)
+		self.assertRaises(IOError, metadata.read)
+		self.write_sidecar({'fps': 25.0, 'width': 720, 'height': 576, 'aspect': 1.25, 'frames': 250.0, 'length': 10.0})
+		self.assertEqual(metadata.length(), 10.0)
+		self.assertEqual(metadata.writes, 0)
+
+	def test_read_once_per_process(self):
+		self.write_sidecar({'fps': 25.0, 'width': 720, 'height': 576, 'aspect': 1.25, 'frames': 250.0, 'length': 10.0, 'movie_mtime': 1000, 'movie_size': 18})
+		first = Metadata(self.movie_path, self.json_path).read()
+		# unchanged sidecar: the dict in memory, for every object
+		self.assertTrue(Metadata(self.movie_path, self.json_path).read() is first)
+		# rewritten by someone else: read again
+		self.write_sidecar(dict(first, fps=30.0), 2100)
+		self.assertEqual(Metadata(self.movie_path, self.json_path).fps(), 30.0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,52 @@
+# test_parallel.py - the time ranges of a parallel analysis, and what is sent to its workers
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import pickle, unittest
+from action.parallel import *
+from action.parallel import _shard_extractor
+
+
+class Extractor:
+	_transient_state = ('capture', '_prev_gray')
+
+	def __init__(self):
+		self.analysis_params = {'stride': 6}
+		self.data_path = '/tmp/Test.color_lab'
+		# not picklable
+		self.capture = lambda: None
+		self._prev_gray = [0.0] * 4
+
+
+class ShardRangesTestCase(unittest.TestCase):
+
+	def test_shard_ranges(self):
+		self.assertEqual(shard_ranges(0, 2400, 4, align=6), [(0, 600), (600, 1200), (1200, 1800), (1800, 2400)])
+		for start, end, workers, align in [(0, 1000, 3, 6), (17, 1003, 7, 4), (0, 10, 8, 6), (5, 6, 4, 1), (100, 2500, 1, 6)]:
+			ranges = shard_ranges(start, end, workers, align)
+			self.assertTrue(0 < len(ranges) <= workers)
+			# contiguous, and covering the whole range
+			self.assertEqual(ranges[0][0], start)
+			self.assertEqual(ranges[-1][1], end)
+			for (a, b), (c, d) in zip(ranges[:-1], ranges[1:]):
+				self.assertEqual(b, c)
+			for first, last in ranges:
+				self.assertTrue(first < last)
+				self.assertEqual((first - start) % align, 0)
+
+
+class ShardExtractorTestCase(unittest.TestCase):
+
+	def test_transient_state_stays_behind(self):
+		extractor = Extractor()
+		clone = pickle.loads(pickle.dumps(_shard_extractor(extractor), 2))
+		self.assertEqual(clone.data_path, extractor.data_path)
+		self.assertFalse(hasattr(clone, 'capture'))
+		self.assertFalse(hasattr(clone, '_prev_gray'))
+		# the worker's parameters are its own
+		clone.analysis_params['stride'] = 4
+		self.assertEqual(extractor.analysis_params['stride'], 6)
+		self.assertTrue(callable(extractor.capture))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,107 @@
+# test_preview.py - which frames a preview decodes, and which rows they go to
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import os, shutil, tempfile, unittest
+import numpy as np
+from action.featurefile import *
+from action.preview import *
+
+AP = {'fps': 24, 'stride': 6, 'preview_interval': 1.0, 'progressive_step': 8, 'flush_interval': 4, 'storage_dtype': 'float32', 'storage_range': None}
+
+
+def run(writer, kernel, windows, step):
+	"""
+	Decode the frames of the (first frame, sample frame) windows of a preview or progressive analysis, as SampledFrameSource does, and write the rows that its kernel returns. Returns the frames that were decoded.
+	"""
+	decoded = []
+	for first, sample in windows:
+		first = (decoded[-1] + step) if first is None else first
+		for frame_idx in range(first, (sample + 1), step):
+			decoded.append(frame_idx)
+			result = kernel(frame_idx, None)
+			if result is not None:
+				writer[result[0]] = result[1]
+	return decoded
+
+
+class FakeFrameSource:
+	"""
+	Frame source over a movie of length frames, without frames; records the frames that are handed out.
+	"""
+	def __init__(self, length):
+		self.length = length
+		self.decoded = []
+
+	def frames(self, start_frame, end_frame, step=1):
+		for frame_idx in range(start_frame, min(end_frame, self.length), step):
+			self.decoded.append(frame_idx)
+			yield frame_idx, None
+
+
+class SampleWindowsTestCase(unittest.TestCase):
+
+	def test_preview_interval_frames(self):
+		self.assertEqual(preview_interval_frames(dict(AP, preview_interval=10.0)), 240)
+		# a whole number of strides
+		self.assertEqual(preview_interval_frames(dict(AP, preview_interval=10.0, stride=7)), 238)
+		self.assertEqual(preview_interval_frames(dict(AP, preview_interval=0.01)), 6)
+
+	def test_sample_windows(self):
+		self.assertEqual(sample_windows([0, 240, 480], 0, 720, 1, warmup=2), [(0, 0), (238, 240), (478, 480)])
+		# warm-up from a multiple of align, never before start_frame
+		self.assertEqual(sample_windows([100, 240], 90, 720, 1, warmup=5, align=8), [(90, 100), (232, 240)])
+		# samples outside of the range, or off the engine's frame grid, are skipped
+		self.assertEqual(sample_windows([0, 10, 240, 720], 0, 720, 6, warmup=6), [(0, 0), (234, 240)])
+		# warm-up that overlaps the previous window continues from it
+		self.assertEqual(sample_windows([12, 18, 24], 0, 720, 6, warmup=12), [(0, 12), (None, 18), (None, 24)])
+
+
+class PreviewTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.color_lab')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_preview_rows(self):
+		# a full analysis is already there
+		full = create_feature_file(self.path, (40, 2), 'float32', AP)
+		full[:] = -1.0
+		del full
+		preview = Preview(self.path, (2,), dict(AP, preview=True), 0, 240, warmup=6)
+		self.assertEqual(preview.samples, range(0, 240, 24))
+		kernel = preview.kernel(lambda frame_idx, frame: ((frame_idx / 6), np.array([frame_idx, 1.0])))
+		decoded = run(preview.writer, kernel, preview.windows(0, 240, 6), 6)
+		preview.writer.close(True)
+		# only the samples and their warm-up frames (on the stride grid) are decoded
+		self.assertEqual(decoded, [0] + sum([[sample - 6, sample] for sample in range(24, 240, 24)], []))
+		# one row per sample, in order, next to the data file of the full analysis
+		rows = np.array(load_feature_file(self.path + PREVIEW_EXTENSION))
+		np.testing.assert_array_equal(rows[:, 0], range(0, 240, 24))
+		header = read_feature_header(self.path + PREVIEW_EXTENSION)
+		self.assertEqual(header['preview'], 24)
+		self.assertEqual(np.array(load_feature_file(self.path)).min(), -1.0)
+
+	def test_sampled_frame_source(self):
+		resets = []
+		preview = Preview(self.path, (2,), dict(AP, preview=True), 0, 240, warmup=12, reset=(lambda: resets.append(True)))
+		fsrc = FakeFrameSource(100)
+		frames = [frame_idx for frame_idx, frame in preview.frame_source(fsrc).frames(0, 240, 6)]
+		preview.writer.close(True)
+		# samples 24 frames apart with 12 frames of warm-up; the movie ends before sample 120
+		self.assertEqual(frames, [0, 12, 18, 24, 36, 42, 48, 60, 66, 72, 84, 90, 96])
+		self.assertEqual(fsrc.decoded, frames)
+		# a clean state before every sample (sample 120 too: the end of the movie is only found then)
+		self.assertEqual(len(resets), 6)
+		# the windows that overlap the previous one continue from it, without a reset
+		preview = Preview(self.path, (2,), dict(AP, preview=True, preview_interval=0.25), 0, 240, warmup=12, reset=(lambda: resets.append(True)))
+		frames = [frame_idx for frame_idx, frame in preview.frame_source(FakeFrameSource(100)).frames(0, 36, 6)]
+		preview.writer.close(True)
+		self.assertEqual(frames, range(0, 36, 6))
+		self.assertEqual(len(resets), 7)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,110 @@
+# test_progressive.py - which frames a progressive analysis decodes, which rows they go to, and which rows are covered
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import os, shutil, tempfile, unittest
+import numpy as np
+from action.featurefile import *
+from action.progressive import *
+from action.segment import Segment
+from tests.test_preview import AP, run
+
+
+class FakeExtractor:
+	"""
+	The attributes of an extractor that segment_coverage reads: a data file, and rows one stride of 6 frames at 24 fps apart.
+	"""
+	def __init__(self, data_path):
+		self.data_path = data_path
+		self.analysis_params = {'afps': 24.0, 'stride': 6}
+
+	def _read_metadata(self):
+		pass
+
+
+class ProgressivePassesTestCase(unittest.TestCase):
+
+	def test_progressive_passes(self):
+		passes = progressive_passes(20, 8)
+		self.assertEqual([list(rows) for rows in passes], [[0, 8, 16], [4, 12], [2, 6, 10, 14, 18], [1, 3, 5, 7, 9, 11, 13, 15, 17, 19]])
+		for num_rows, step in [(1, 64), (100, 64), (97, 7), (64, 64), (10, 1)]:
+			rows = np.concatenate(progressive_passes(num_rows, step))
+			self.assertEqual(sorted(rows), range(num_rows))
+		covered = np.zeros(20, dtype=bool)
+		covered[[0, 4, 5]] = True
+		self.assertEqual([list(rows) for rows in progressive_passes(20, 8, covered)], [[8, 16], [12], [2, 6, 10, 14, 18], [1, 3, 7, 9, 11, 13, 15, 17, 19]])
+
+
+class ProgressiveTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, 'Test.color_lab')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def progressive(self, resume=False):
+		progressive = Progressive(self.path, (2,), AP, 40, (lambda row: row * 6), warmup=6, resume=resume)
+		return progressive, progressive.kernel(lambda frame_idx, frame: ((frame_idx / 6), np.array([frame_idx, 1.0])))
+
+	def test_progressive_rows(self):
+		# 40 rows, one every 6 frames
+		row_frame = lambda row: row * 6
+		progressive = Progressive(self.path, (2,), AP, 40, row_frame, warmup=6)
+		kernel = progressive.kernel(lambda frame_idx, frame: ((frame_idx / 6), np.array([frame_idx, 1.0])))
+		# stop after the first pass: rows 0, 8, 16, 24 and 32
+		first_pass = len(progressive_passes(40, 8)[0])
+		windows = progressive.windows(0, 240, 6)
+		self.assertEqual([sample for first, sample in windows[:first_pass]], [0, 48, 96, 144, 192])
+		run(progressive.writer, kernel, windows[:first_pass], 6)
+		progressive.writer.close(False)
+		covered = read_feature_coverage(self.path)
+		np.testing.assert_array_equal(np.flatnonzero(covered), [0, 8, 16, 24, 32])
+		# resume: the rest of the passes, in order, and the rows of a full analysis in the end
+		progressive = Progressive(self.path, (2,), AP, 40, row_frame, warmup=6, resume=True)
+		kernel = progressive.kernel(lambda frame_idx, frame: ((frame_idx / 6), np.array([frame_idx, 1.0])))
+		windows = progressive.windows(0, 240, 6)
+		self.assertEqual([sample for first, sample in windows[:4]], [24, 72, 120, 168])
+		run(progressive.writer, kernel, windows, 6)
+		progressive.writer.close(True)
+		self.assertTrue(read_feature_coverage(self.path) is None)
+		rows = np.array(load_feature_file(self.path))
+		np.testing.assert_array_equal(rows[:, 0], np.arange(0, 240, 6))
+		np.testing.assert_array_equal(rows[:, 1], np.ones(40))
+	def test_covered_once_on_disc(self):
+		progressive, kernel = self.progressive()
+		windows = progressive.windows(0, 240, 6)
+		covered = []
+		for window in windows[:3]:
+			run(progressive.writer, kernel, [window], 6)
+			covered.append(list(np.flatnonzero(read_feature_coverage(self.path))))
+		# a row is covered when the block of rows it is in has been written (flush_interval 4)
+		self.assertEqual(covered, [[], [0], [0, 8]])
+		progressive.writer.close(False)
+		np.testing.assert_array_equal(np.flatnonzero(read_feature_coverage(self.path)), [0, 8, 16])
+
+	def test_shared_engine(self):
+		# an engine that decodes every frame in order (the pipeline's) does not ask for the windows: every row is kept
+		progressive, kernel = self.progressive()
+		for frame_idx in range(0, 240, 6):
+			row, values = kernel(frame_idx, None)
+			progressive.writer[row] = values
+		progressive.writer.close(True)
+		self.assertTrue(read_feature_coverage(self.path) is None)
+		np.testing.assert_array_equal(np.array(load_feature_file(self.path))[:, 0], np.arange(0, 240, 6))
+
+	def test_segment_coverage(self):
+		extractor = FakeExtractor(self.path)
+		self.assertEqual(segment_coverage(extractor), 1.0)
+		# 4 rows a second: the first 5 seconds are covered
+		covered = np.zeros(40, dtype=bool)
+		covered[:20] = True
+		write_feature_coverage(self.path, covered)
+		self.assertEqual(segment_coverage(extractor), 0.5)
+		self.assertEqual(segment_coverage(extractor, Segment(0, 4.0)), 1.0)
+		self.assertEqual(segment_coverage(extractor, Segment(5.0, 10.0)), 0.0)
+		self.assertEqual(segment_coverage(extractor, Segment(20.0, 30.0)), 1.0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,85 @@
+# test_trackbuffer.py - the Lucas-Kanade tracks of OpticalFlow
+# Bregman:ACTION - Cinematic information retrieval toolkit
+
+import unittest
+import numpy as np
+from action.opticalflow import TrackBuffer
+
+
+def points(*xs):
+	return np.array([[x, (x * 10.0)] for x in xs], dtype=np.float32)
+
+
+class TrackBufferTestCase(unittest.TestCase):
+
+	def test_start_and_advance(self):
+		tracks = TrackBuffer(4, 3)
+		self.assertEqual(len(tracks), 0)
+		tracks.start(points(1, 2, 3))
+		self.assertEqual(len(tracks), 3)
+		np.testing.assert_array_equal(tracks.points_at_age(0), points(1, 2, 3))
+		# the second track is lost
+		tracks.advance(points(11, 12, 13), np.array([True, False, True]))
+		self.assertEqual(len(tracks), 2)
+		np.testing.assert_array_equal(tracks.points_at_age(0), points(11, 13))
+		np.testing.assert_array_equal(tracks.points_at_age(1), points(1, 3))
+		np.testing.assert_array_equal(tracks.counts[tracks.live()], [2, 2])
+
+	def test_tracks_keep_their_last_points(self):
+		tracks = TrackBuffer(2, 3)
+		tracks.start(points(0))
+		for step in range(1, 6):
+			tracks.advance(points(step), np.array([True]))
+		# length 3: the first points have been dropped
+		self.assertEqual(tracks.counts[tracks.live()][0], 3)
+		np.testing.assert_array_equal(tracks.points_at_age(np.array([2])), points(3))
+		np.testing.assert_array_equal(tracks.polylines()[0], np.int32(points(3, 4, 5)))
+
+	def test_slots_are_reclaimed_in_order(self):
+		tracks = TrackBuffer(4, 2)
+		tracks.start(points(1, 2, 3, 4))
+		tracks.advance(points(11, 12, 13, 14), np.array([False, True, False, True]))
+		# does not fit after the last slot in use: the live tracks move to the front
+		tracks.start(points(5, 6))
+		self.assertEqual(len(tracks.points), 4)
+		np.testing.assert_array_equal(tracks.points_at_age(0), points(12, 14, 5, 6))
+		# and the buffer grows when they still do not fit
+		tracks.start(points(7, 8, 9))
+		self.assertEqual(len(tracks), 7)
+		self.assertTrue(len(tracks.points) >= 7)
+		np.testing.assert_array_equal(tracks.points_at_age(0), points(12, 14, 5, 6, 7, 8, 9))
+		np.testing.assert_array_equal(tracks.counts[tracks.live()], [2, 2, 1, 1, 1, 1, 1])
+		self.assertEqual([len(line) for line in tracks.polylines()], [2, 2, 1, 1, 1, 1, 1])
+
+	def test_ages_per_track(self):
+		tracks = TrackBuffer(4, 4)
+		tracks.start(points(0))
+		tracks.advance(points(1), np.array([True]))
+		# started a frame later
+		tracks.start(points(10))
+		for step in range(2, 4):
+			tracks.advance(points(step, (step + 9)), np.array([True, True]))
+		counts = tracks.counts[tracks.live()]
+		np.testing.assert_array_equal(counts, [4, 3])
+		# the first point of each track, and the point tdepth = 1 after it (as the track histograms read them)
+		np.testing.assert_array_equal(tracks.points_at_age(counts - 1), points(0, 10))
+		np.testing.assert_array_equal(tracks.points_at_age(np.maximum(0, ((counts - 1) - 1))), points(1, 11))
+		tracks.advance(points(4, 13), np.array([True, True]))
+		np.testing.assert_array_equal(tracks.points_at_age(tracks.counts[tracks.live()] - 1), points(1, 10))
+		# every track lost
+		tracks.advance(points(5, 14), np.array([False, False]))
+		self.assertEqual(len(tracks), 0)
+		self.assertEqual(tracks.points_at_age(0).shape, (0, 2))
+		self.assertEqual(tracks.polylines(), [])
+
+	def test_clear(self):
+		tracks = TrackBuffer(4, 2)
+		tracks.start(points(1, 2))
+		tracks.clear()
+		self.assertEqual(len(tracks), 0)
+		tracks.start(points(3))
+		np.testing.assert_array_equal(tracks.points_at_age(0), points(3))
+
+
+if __name__ == '__main__':
+	unittest.main()